@@ -5,7 +5,7 @@ Main process to setup and manage all the other working processes
 """
 
 import multiprocessing as mp
-import queue
+import pathlib
 import time
 
 from pymavlink import mavutil
@@ -15,27 +15,86 @@ from modules.common.modules.logger import logger_main_setup
 from modules.common.modules.read_yaml import read_yaml
 from modules.command import command
 from modules.command import command_worker
+from modules.command_writer import command_writer_worker
+from modules.telemetry import telemetry
 from modules.heartbeat import heartbeat_receiver_worker
 from modules.heartbeat import heartbeat_sender_worker
+from modules.mavlink_reader import mavlink_reader_worker
+from modules.mavlink_recorder import mavlink_recorder_worker
+from modules.mavlink_router import mavlink_router
+from modules.mavlink_router import mavlink_router_worker
 from modules.telemetry import telemetry_worker
+from utilities.workers import thread_worker_host
+from utilities.workers import latency_trace
+from utilities.workers import pipeline as worker_pipeline
 from utilities.workers import queue_proxy_wrapper
+from utilities.workers import worker_autoscaler
 from utilities.workers import worker_controller
 from utilities.workers import worker_manager
+from utilities.workers import worker_supervisor
 
 
 # MAVLink connection
 CONNECTION_STRING = "tcp:localhost:12345"
+# Local UDP address of the router that relays the connection to a connection of each worker
+# None to pass the connection to every worker instead
+MAVLINK_ROUTER_ADDRESS = ("127.0.0.1", 14560)
+
+# Workers are forked as they inherit the connection, which cannot be pickled
+# "forkserver" and "spawn" require workers to open their own connection
+WORKER_START_METHOD = "fork"
+# Imported once by the forkserver instead of by every worker on start and restart
+FORKSERVER_PRELOAD_MODULES = [
+    "pymavlink.mavutil",
+    "modules.command.command_worker",
+    "modules.command_writer.command_writer_worker",
+    "modules.heartbeat.heartbeat_receiver_worker",
+    "modules.heartbeat.heartbeat_sender_worker",
+    "modules.mavlink_reader.mavlink_reader_worker",
+    "modules.mavlink_recorder.mavlink_recorder_worker",
+    "modules.mavlink_router.mavlink_router_worker",
+    "modules.telemetry.telemetry_worker",
+]
 
 # =================================================================================================
 #                            ↓ BOOTCAMPERS MODIFY BELOW THIS COMMENT ↓
 # =================================================================================================
 # Set queue max sizes (<= 0 for infinity)
+# Per worker on the side of the queue with more workers, producers or consumers
+QUEUE_DEPTH_PER_WORKER = 50
+# Command only needs the freshest telemetry, so a slow command worker skips stale samples
+# Only with TELEMETRY_SHARD_KEY, scaled command workers need a blocking queue to see the backlog
+TELEMETRY_QUEUE_POLICY = queue_proxy_wrapper.QueueProxyWrapper.POLICY_LATEST
+# The MAVLink reader never waits for a slow subscriber, which would hold up the others
+# The heartbeat receiver only needs to know whether a heartbeat arrived since its last check
+HEARTBEAT_MESSAGE_QUEUE_POLICY = queue_proxy_wrapper.QueueProxyWrapper.POLICY_LATEST
+MESSAGE_QUEUE_POLICY = queue_proxy_wrapper.QueueProxyWrapper.POLICY_DROP_OLDEST
 
 # Set worker counts
+# Only 1 worker can read the connection, it publishes each message to the workers that use it
+MAVLINK_READER_COUNT = 1
 HEARTBEAT_SENDER_COUNT = 1
 HEARTBEAT_RECEIVER_COUNT = 1
 TELEMETRY_COUNT = 1
 COMMAND_COUNT = 1
+# Only 1 worker writes commands, so it sees every command to coalesce and rate limit
+COMMAND_WRITER_COUNT = 1
+# A process per worker, the only backend whose stalled workers can be killed and restarted
+# BACKEND_THREAD and BACKEND_HOSTED_THREAD save the processes, but only log stalls
+WORKER_BACKEND = worker_manager.WorkerManager.BACKEND_PROCESS
+# Telemetry of each vehicle always goes to the same command worker, keeping its averages right
+# This fixes the number of command workers at COMMAND_COUNT and turns their autoscaler off
+# None shares 1 blocking queue between them instead, scaled by measured service time
+TELEMETRY_SHARD_KEY = telemetry.get_system_id
+# Without TELEMETRY_SHARD_KEY, command workers are scaled within these bounds
+# to keep up with the telemetry queue
+COMMAND_MIN_COUNT = 1
+COMMAND_MAX_COUNT = 3
+# Pin command workers to an isolated core (e.g. {3} with isolcpus=3) and raise their priority
+# None leaves the default scheduling, realtime priority requires CAP_SYS_NICE
+# Only worker processes can be scheduled on their own, other backends reject these
+COMMAND_CPU_AFFINITY = None
+COMMAND_REALTIME_PRIORITY = None
 
 # Any other constants
 TARGET_POSITION = command.Position(10, 20, 30)
@@ -44,8 +103,42 @@ Z_SPEED = 1  # m/s
 ANGLE_TOLERANCE = 5  # deg
 TURNING_SPEED = 5  # deg/s
 HEARTBEAT_PERIOD = 1  # seconds
+# Each command is sent at most once per interval per vehicle, the newest decision replacing
+# any not yet sent, instead of once for every telemetry sample out of tolerance
+COMMAND_MIN_INTERVALS = {
+    mavutil.mavlink.MAV_CMD_CONDITION_CHANGE_ALT: 0.5,  # seconds
+    mavutil.mavlink.MAV_CMD_CONDITION_YAW: 0.5,  # seconds
+}
+COMMAND_DEFAULT_MIN_INTERVAL = 0.0  # seconds
 MAIN_LOOP_DURATION = 100  # seconds
 MAIN_LOOP_SLEEP = 1  # seconds
+MAIN_QUEUE_BATCH_SIZE = 100  # Maximum items read from each queue per main loop iteration
+SUPERVISOR_POLL_PERIOD = 0.5  # seconds
+RESTART_INITIAL_BACKOFF = 0.5  # seconds
+RESTART_MAX_BACKOFF = 30  # seconds
+RESTART_MAX_COUNT = 5  # Restarts within the window before a worker is considered crash looping
+RESTART_WINDOW = 60  # seconds
+COMMAND_TARGET_DRAIN_TIME = 0.5  # seconds
+COMMAND_SERVICE_TIME = 0.005  # seconds per telemetry sample, until measured
+SCALE_DOWN_DELAY = 5  # seconds
+QUEUE_INSTRUMENTATION = True  # Record depth, throughput, and wait time of each queue
+QUEUE_SNAPSHOT_PERIOD = 10  # seconds
+SHUTDOWN_TIMEOUT = 3  # seconds, workers can take a receive timeout to notice the exit request
+# Time without progress before a worker is killed and restarted, longer than 1 loop iteration
+# Threads cannot be killed, so with the thread backends stalls are only logged
+MAVLINK_READER_STALL_TIMEOUT = 5  # seconds, read timeout
+MAVLINK_ROUTER_STALL_TIMEOUT = 5  # seconds, read timeout
+MAVLINK_RECORDER_STALL_TIMEOUT = 5  # seconds, read timeout
+HEARTBEAT_STALL_TIMEOUT = 10  # seconds, receive timeout and period
+TELEMETRY_STALL_TIMEOUT = 5  # seconds, receive window
+COMMAND_STALL_TIMEOUT = 5  # seconds, input queue timeout
+COMMAND_WRITER_STALL_TIMEOUT = 5  # seconds, input queue timeout
+# Latency of each command from receiving telemetry to sending, logged with the queue statistics
+# Traces are also written to this file in the log directory, None to not write them
+LATENCY_TRACE_FILE_NAME = "latency_traces.jsonl"
+# Every frame received is recorded to this tlog in the log directory, with a time index
+# beside it, None to not record. Requires the router, which gives the recorder every frame
+RECORDING_FILE_NAME = "flight.tlog"
 
 # =================================================================================================
 #                            ↑ BOOTCAMPERS MODIFY ABOVE THIS COMMENT ↑
@@ -56,6 +149,11 @@ def main() -> int:
     """
     Main function.
     """
+    # Set before creating any controller, queue, or worker so they all use the same start method
+    mp.set_start_method(WORKER_START_METHOD, force=True)
+    if WORKER_START_METHOD == "forkserver":
+        mp.set_forkserver_preload(FORKSERVER_PRELOAD_MODULES)
+
     # Configuration settings
     result, config = read_yaml.open_config(logger.CONFIG_FILE_PATH)
     if not result:
@@ -66,7 +164,7 @@ def main() -> int:
     assert config is not None
 
     # Setup main logger
-    result, main_logger, _ = logger_main_setup.setup_main_logger(config)
+    result, main_logger, logging_path = logger_main_setup.setup_main_logger(config)
     if not result:
         print("ERROR: Failed to create main logger")
         return -1
@@ -90,170 +188,346 @@ def main() -> int:
     # Create a multiprocess manager for synchronized queues
     mp_manager = mp.Manager()
 
-    # Create queues
-    heartbeat_report_queue = queue_proxy_wrapper.QueueProxyWrapper(mp_manager)
-    telemetry_report_queue = queue_proxy_wrapper.QueueProxyWrapper(mp_manager)
-    command_output_queue = queue_proxy_wrapper.QueueProxyWrapper(mp_manager)
-
-    # Create worker properties for each worker type (what inputs it takes, how many workers)
-    # Heartbeat sender
-    result, heartbeat_sender_properties = worker_manager.WorkerProperties.create(
-        count=HEARTBEAT_SENDER_COUNT,
-        target=heartbeat_sender_worker.heartbeat_sender_worker,
-        work_arguments=(connection, HEARTBEAT_PERIOD, {}),
-        input_queues=[],
-        output_queues=[],
-        controller=controller,
-        local_logger=main_logger,
-    )
+    # Each worker gets its own connection to the router, which alone uses the vehicle connection
+    # Without the router, every worker is given the vehicle connection
+    router = None
+    reader_connection = connection
+    heartbeat_sender_connection = connection
+    command_writer_connection = connection
+    if MAVLINK_ROUTER_ADDRESS is not None:
+        result, router = mavlink_router.MavlinkRouter.create(
+            connection, MAVLINK_ROUTER_ADDRESS, main_logger
+        )
+        if not result:
+            main_logger.error("Failed to create MAVLink router")
+            return -1
+
+        assert router is not None
+
+        reader_connection = router.create_connection(mavlink_reader_worker.MESSAGE_TYPES)
+        heartbeat_sender_connection = router.create_connection([])
+        command_writer_connection = router.create_connection([])
+
+    # Reads the connection for the hosted thread workers, unless the router does
+    # Not read at all with other backends, where the reader stage reads it
+    host_connection = None
+    if router is None and WORKER_BACKEND == worker_manager.WorkerManager.BACKEND_HOSTED_THREAD:
+        host_connection = connection
+
+    result, thread_host = thread_worker_host.ThreadWorkerHost.create(host_connection, main_logger)
     if not result:
-        main_logger.error("Failed to create heartbeat sender properties")
+        main_logger.error("Failed to create thread worker host")
         return -1
 
-    assert heartbeat_sender_properties is not None
-    # Heartbeat receiver
-    result, heartbeat_receiver_properties = worker_manager.WorkerProperties.create(
-        count=HEARTBEAT_RECEIVER_COUNT,
-        target=heartbeat_receiver_worker.heartbeat_receiver_worker,
-        work_arguments=(connection, HEARTBEAT_PERIOD),
-        input_queues=[],
-        output_queues=[heartbeat_report_queue],
-        controller=controller,
-        local_logger=main_logger,
-    )
-    if not result:
-        main_logger.error("Failed to create heartbeat receiver properties")
-        return -1
+    assert thread_host is not None
 
-    assert heartbeat_receiver_properties is not None
-    # Telemetry
-    result, telemetry_properties = worker_manager.WorkerProperties.create(
-        count=TELEMETRY_COUNT,
-        target=telemetry_worker.telemetry_worker,
-        work_arguments=(connection, {}),
-        input_queues=[],
-        output_queues=[telemetry_report_queue],
+    # Declare each worker type (what inputs it takes, how many workers) and the queues between them
+    result, pipeline = worker_pipeline.Pipeline.create(
+        mp_manager=mp_manager,
         controller=controller,
         local_logger=main_logger,
+        queue_depth_per_worker=QUEUE_DEPTH_PER_WORKER,
+        is_instrumented=QUEUE_INSTRUMENTATION,
+        thread_host=thread_host,
     )
     if not result:
-        main_logger.error("Failed to create telemetry properties")
+        main_logger.error("Failed to create pipeline")
         return -1
 
-    assert telemetry_properties is not None
-    # Command
-    result, command_properties = worker_manager.WorkerProperties.create(
-        count=COMMAND_COUNT,
-        target=command_worker.command_worker,
-        work_arguments=(
-            connection,
-            TARGET_POSITION,
-            HEIGHT_TOLERANCE,
-            Z_SPEED,
-            ANGLE_TOLERANCE,
-            TURNING_SPEED,
-        ),
-        input_queues=[telemetry_report_queue],
-        output_queues=[command_output_queue],
-        controller=controller,
-        local_logger=main_logger,
+    assert pipeline is not None
+
+    result = (
+        pipeline.add_stage(
+            "mavlink_reader",
+            mavlink_reader_worker.mavlink_reader_worker,
+            MAVLINK_READER_COUNT,
+            (reader_connection,),
+            WORKER_BACKEND,
+            stall_timeout=MAVLINK_READER_STALL_TIMEOUT,
+        )
+        and pipeline.add_stage(
+            "heartbeat_sender",
+            heartbeat_sender_worker.heartbeat_sender_worker,
+            HEARTBEAT_SENDER_COUNT,
+            (heartbeat_sender_connection, HEARTBEAT_PERIOD),
+            WORKER_BACKEND,
+            stall_timeout=HEARTBEAT_STALL_TIMEOUT,
+        )
+        and pipeline.add_stage(
+            "heartbeat_receiver",
+            heartbeat_receiver_worker.heartbeat_receiver_worker,
+            HEARTBEAT_RECEIVER_COUNT,
+            (HEARTBEAT_PERIOD,),
+            WORKER_BACKEND,
+            stall_timeout=HEARTBEAT_STALL_TIMEOUT,
+        )
+        and pipeline.add_stage(
+            "telemetry",
+            telemetry_worker.telemetry_worker,
+            TELEMETRY_COUNT,
+            (),
+            WORKER_BACKEND,
+            stall_timeout=TELEMETRY_STALL_TIMEOUT,
+        )
+        and pipeline.add_stage(
+            "command",
+            command_worker.command_worker,
+            COMMAND_COUNT,
+            (
+                TARGET_POSITION,
+                HEIGHT_TOLERANCE,
+                Z_SPEED,
+                ANGLE_TOLERANCE,
+                TURNING_SPEED,
+            ),
+            WORKER_BACKEND,
+            cpu_affinity=COMMAND_CPU_AFFINITY,
+            realtime_priority=COMMAND_REALTIME_PRIORITY,
+            stall_timeout=COMMAND_STALL_TIMEOUT,
+        )
+        and pipeline.add_stage(
+            "command_writer",
+            command_writer_worker.command_writer_worker,
+            COMMAND_WRITER_COUNT,
+            (
+                command_writer_connection,
+                COMMAND_MIN_INTERVALS,
+                COMMAND_DEFAULT_MIN_INTERVAL,
+                QUEUE_SNAPSHOT_PERIOD,
+            ),
+            WORKER_BACKEND,
+            stall_timeout=COMMAND_WRITER_STALL_TIMEOUT,
+        )
+        and pipeline.add_queue(
+            "heartbeat_messages",
+            "mavlink_reader",
+            "heartbeat_receiver",
+            policy=HEARTBEAT_MESSAGE_QUEUE_POLICY,
+        )
+        and pipeline.add_queue(
+            "telemetry_messages", "mavlink_reader", "telemetry", policy=MESSAGE_QUEUE_POLICY
+        )
+        and pipeline.add_queue("command_ack", "mavlink_reader", None, policy=MESSAGE_QUEUE_POLICY)
+        and pipeline.add_queue("heartbeat_report", "heartbeat_receiver", None)
+        and pipeline.add_queue(
+            "telemetry_report",
+            "telemetry",
+            "command",
+            policy=(
+                TELEMETRY_QUEUE_POLICY
+                if TELEMETRY_SHARD_KEY is not None
+                else queue_proxy_wrapper.QueueProxyWrapper.POLICY_BLOCK
+            ),
+            shard_key=TELEMETRY_SHARD_KEY,
+        )
+        and pipeline.add_queue("command_output", "command", None)
+        and pipeline.add_queue("command_intents", "command", "command_writer")
+        and pipeline.add_queue(
+            "command_writer_statistics", "command_writer", None, policy=MESSAGE_QUEUE_POLICY
+        )
+        and pipeline.add_queue(
+            "command_traces", "command_writer", None, policy=MESSAGE_QUEUE_POLICY
+        )
     )
+    if router is not None:
+        result = (
+            result
+            and pipeline.add_stage(
+                "mavlink_router",
+                mavlink_router_worker.mavlink_router_worker,
+                1,
+                (router, QUEUE_SNAPSHOT_PERIOD),
+                WORKER_BACKEND,
+                stall_timeout=MAVLINK_ROUTER_STALL_TIMEOUT,
+            )
+            and pipeline.add_queue(
+                "router_statistics", "mavlink_router", None, policy=MESSAGE_QUEUE_POLICY
+            )
+        )
+
+    if router is not None and RECORDING_FILE_NAME is not None:
+        result = (
+            result
+            and pipeline.add_stage(
+                "mavlink_recorder",
+                mavlink_recorder_worker.mavlink_recorder_worker,
+                1,
+                (
+                    router.create_connection(None),
+                    pathlib.Path(logging_path, RECORDING_FILE_NAME),
+                    QUEUE_SNAPSHOT_PERIOD,
+                ),
+                WORKER_BACKEND,
+                stall_timeout=MAVLINK_RECORDER_STALL_TIMEOUT,
+            )
+            and pipeline.add_queue(
+                "recorder_statistics", "mavlink_recorder", None, policy=MESSAGE_QUEUE_POLICY
+            )
+        )
+
     if not result:
-        main_logger.error("Failed to create command properties")
+        main_logger.error("Failed to declare pipeline")
         return -1
 
-    assert command_properties is not None
-
-    # Create the workers (processes) and obtain their managers
-    worker_managers = []
-
-    result, heartbeat_sender_manager = worker_manager.WorkerManager.create(
-        worker_properties=heartbeat_sender_properties,
-        local_logger=main_logger,
-    )
-    if not result:
-        main_logger.error("Failed to create heartbeat sender manager")
+    # Create the queues and the workers (processes)
+    if not pipeline.build():
+        main_logger.error("Failed to build pipeline")
         return -1
 
-    assert heartbeat_sender_manager is not None
-    worker_managers.append(heartbeat_sender_manager)
+    command_ack_queue = pipeline.get_queue("command_ack")
+    heartbeat_report_queue = pipeline.get_queue("heartbeat_report")
+    command_output_queue = pipeline.get_queue("command_output")
+    command_writer_statistics_queue = pipeline.get_queue("command_writer_statistics")
+    command_trace_queue = pipeline.get_queue("command_traces")
+    command_manager = pipeline.get_manager("command")
+    # None without the router
+    router_statistics_queue = pipeline.get_queue("router_statistics")
+    # None without the router or when not recording
+    recorder_statistics_queue = pipeline.get_queue("recorder_statistics")
 
-    result, heartbeat_receiver_manager = worker_manager.WorkerManager.create(
-        worker_properties=heartbeat_receiver_properties,
-        local_logger=main_logger,
-    )
+    # Get Pylance to stop complaining
+    assert command_ack_queue is not None
+    assert heartbeat_report_queue is not None
+    assert command_output_queue is not None
+    assert command_writer_statistics_queue is not None
+    assert command_trace_queue is not None
+    assert command_manager is not None
 
-    if not result:
-        main_logger.error("Failed to create heartbeat receiver manager")
-        return -1
+    # Start worker processes, from producers to consumers
+    pipeline.start()
 
-    assert heartbeat_receiver_manager is not None
-    worker_managers.append(heartbeat_receiver_manager)
+    # Started after any worker processes are forked, hosted thread workers run once it starts
+    thread_host.start()
 
-    result, telemetry_manager = worker_manager.WorkerManager.create(
-        worker_properties=telemetry_properties, local_logger=main_logger
-    )
-    if not result:
-        main_logger.error("Failed to create telemetry manager")
-        return -1
-    assert telemetry_manager is not None
-    worker_managers.append(telemetry_manager)
+    main_logger.info("Started Worker Processes")
 
-    result, command_manager = worker_manager.WorkerManager.create(
-        worker_properties=command_properties, local_logger=main_logger
+    # Scale command workers with the telemetry backlog, unless each has its own shard
+    autoscalers = []
+    if TELEMETRY_SHARD_KEY is None:
+        result, command_scaling_policy = worker_autoscaler.ScalingPolicy.create(
+            min_count=COMMAND_MIN_COUNT,
+            max_count=COMMAND_MAX_COUNT,
+            target_drain_time=COMMAND_TARGET_DRAIN_TIME,
+            service_time=COMMAND_SERVICE_TIME,
+            scale_down_delay=SCALE_DOWN_DELAY,
+            local_logger=main_logger,
+        )
+        if not result:
+            main_logger.error("Failed to create command scaling policy")
+            return -1
+
+        assert command_scaling_policy is not None
+
+        result, command_autoscaler = worker_autoscaler.WorkerAutoscaler.create(
+            manager=command_manager,
+            policy=command_scaling_policy,
+            local_logger=main_logger,
+        )
+        if not result:
+            main_logger.error("Failed to create command autoscaler")
+            return -1
+
+        assert command_autoscaler is not None
+        autoscalers.append(command_autoscaler)
+
+    # Restart any worker that dies or stalls (process backend only), backing off if it keeps dying
+    result, supervisor = worker_supervisor.WorkerSupervisor.create(
+        worker_managers=pipeline.get_managers(),
+        poll_period=SUPERVISOR_POLL_PERIOD,
+        initial_backoff=RESTART_INITIAL_BACKOFF,
+        max_backoff=RESTART_MAX_BACKOFF,
+        max_restarts=RESTART_MAX_COUNT,
+        crash_loop_window=RESTART_WINDOW,
+        autoscalers=autoscalers,
+        local_logger=main_logger,
     )
     if not result:
-        main_logger.error("Failed to create command manager")
+        main_logger.error("Failed to create supervisor")
         return -1
-    assert command_manager is not None
-    worker_managers.append(command_manager)
 
-    # Start worker processes
-    for manager in worker_managers:
-        manager.start_workers()
+    assert supervisor is not None
+    supervisor.start()
 
-    main_logger.info("Started Worker Processes")
+    # Aggregate the traces of the commands sent, and keep them for offline analysis
+    latency_statistics = latency_trace.LatencyStatistics()
+    trace_exporter = None
+    if LATENCY_TRACE_FILE_NAME is not None:
+        result, trace_exporter = latency_trace.TraceExporter.create(
+            pathlib.Path(logging_path, LATENCY_TRACE_FILE_NAME), main_logger
+        )
+        if not result:
+            main_logger.warning("Latency traces will not be written")
 
     # Main's work: read from all queues that output to main, and log any commands that we make
     start_time = time.time()
+    previous_snapshot_time = start_time
     try:
         while time.time() - start_time < MAIN_LOOP_DURATION:
             if not connection.target_system:
                 main_logger.warning("Drone disconnected")
                 break
 
-            try:
-                heartbeat_data = heartbeat_report_queue.queue.get_nowait()
-                main_logger.info(f"Received heartbeat: {heartbeat_data}")
+            # Drain whatever backlog has built up since the last iteration
+            # Telemetry is consumed by the command workers, main only sees their responses
+            for command_ack in command_ack_queue.get_many(MAIN_QUEUE_BATCH_SIZE):
+                main_logger.info(f"Received command acknowledgement: {command_ack}")
 
-                telemetry_data = telemetry_report_queue.queue.get_nowait()
-                main_logger.info(f"Received telemetry: {telemetry_data}")
+            for heartbeat_data in heartbeat_report_queue.get_many(MAIN_QUEUE_BATCH_SIZE):
+                main_logger.info(f"Received heartbeat: {heartbeat_data}")
 
-                command_response = command_output_queue.queue.get_nowait()
+            for command_response in command_output_queue.get_many(MAIN_QUEUE_BATCH_SIZE):
                 main_logger.info(f"Received command response: {command_response}")
-            except queue.Empty:
-                pass
+
+            # Traces end when the command writer has written their command
+            for trace in command_trace_queue.get_many(MAIN_QUEUE_BATCH_SIZE):
+                latency_statistics.record(trace)
+                if trace_exporter is not None:
+                    trace_exporter.export(trace)
+
+            for writer_snapshot in command_writer_statistics_queue.get_many(MAIN_QUEUE_BATCH_SIZE):
+                main_logger.info(f"Command writer statistics: {writer_snapshot}")
+
+            if time.time() - previous_snapshot_time >= QUEUE_SNAPSHOT_PERIOD:
+                previous_snapshot_time = time.time()
+                snapshot = pipeline.get_snapshot()
+                if snapshot is not None:
+                    main_logger.info(f"Pipeline statistics: {snapshot}")
+
+                for latency_snapshot in latency_statistics.snapshot():
+                    main_logger.info(f"Latency: {latency_snapshot}")
+
+            if router_statistics_queue is not None:
+                for router_snapshot in router_statistics_queue.get_many(MAIN_QUEUE_BATCH_SIZE):
+                    main_logger.info(f"Router statistics: {router_snapshot}")
+
+            if recorder_statistics_queue is not None:
+                for recorder_snapshot in recorder_statistics_queue.get_many(MAIN_QUEUE_BATCH_SIZE):
+                    main_logger.info(f"Recorder statistics: {recorder_snapshot}")
 
             time.sleep(MAIN_LOOP_SLEEP)
 
     except KeyboardInterrupt:
         main_logger.info("Keyboard interrupt received")
 
-    # Stop the processes
-    controller.request_exit()
+    # Stop restarting workers before asking them to exit
+    supervisor.stop()
+    for restart_statistics in supervisor.get_restart_statistics():
+        main_logger.info(f"Restart statistics: {restart_statistics}")
 
-    main_logger.info("Requested exit")
+    # Stop the processes from END TO START, stuck workers are terminated at the deadline
+    # Then free whatever the stopped workers left in the queues
+    for stage_name, stage_statistics in pipeline.shutdown(SHUTDOWN_TIMEOUT).items():
+        for stop_statistics in stage_statistics:
+            main_logger.info(f"Worker stop: {stage_name}: {stop_statistics}")
 
-    # Fill and drain queues from END TO START
-    command_output_queue.fill_and_drain_queue()
-    telemetry_report_queue.fill_and_drain_queue()
-    heartbeat_report_queue.fill_and_drain_queue()
+    thread_host.stop()
+    if router is not None:
+        router.close()
 
-    main_logger.info("Queues cleared")
+    if trace_exporter is not None:
+        trace_exporter.close()
+        main_logger.info(f"Latency traces written to {trace_exporter.path}")
 
-    # Clean up worker processes
-    for manager in worker_managers:
-        manager.join_workers()
     main_logger.info("Stopped")
 
     # We can reset controller in case we want to reuse it
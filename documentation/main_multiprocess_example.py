@@ -6,27 +6,23 @@ python -m documentation.main_multiprocess_example
 """
 
 import multiprocessing as mp
+import pathlib
 import time
 
-from documentation.multiprocess_example.add_random import add_random_worker
-from documentation.multiprocess_example.concatenator import concatenator_worker
-from documentation.multiprocess_example.countup import countup_worker
 from modules.common.modules.logger import logger
 from modules.common.modules.logger import logger_main_setup
 from modules.common.modules.read_yaml import read_yaml
-from utilities.workers import queue_proxy_wrapper
+from utilities.workers import pipeline
 from utilities.workers import worker_controller
-from utilities.workers import worker_manager
 
 
-# Play with these numbers to see queue bottlenecks
-COUNTUP_TO_ADD_RANDOM_QUEUE_MAX_SIZE = 5
-ADD_RANDOM_TO_CONCATENATOR_QUEUE_MAX_SIZE = 5
+PIPELINE_CONFIG_FILE_PATH = pathlib.Path("documentation", "multiprocess_example", "pipeline.yaml")
 
-# Play with these numbers to see process bottlenecks
-COUNTUP_WORKER_COUNT = 2
-ADD_RANDOM_WORKER_COUNT = 2
-CONCATENATOR_WORKER_COUNT = 2
+# Play with this number to see queue bottlenecks
+# Queue size per worker should be at least 1 so that every producer and consumer can make progress
+QUEUE_DEPTH_PER_WORKER = 3
+
+SHUTDOWN_TIMEOUT = 5  # seconds
 
 
 # main() is required for early return
@@ -62,122 +58,41 @@ def main() -> int:
     # See 2nd note: https://docs.python.org/3/library/multiprocessing.html#pipes-and-queues
     mp_manager = mp.Manager()
 
-    # Queue maxsize should always be >= the larger of producers/consumers count
-    # Example: Producers 3, consumers 2, so queue maxsize minimum is 3
-    countup_to_add_random_queue = queue_proxy_wrapper.QueueProxyWrapper(
-        mp_manager,
-        COUNTUP_TO_ADD_RANDOM_QUEUE_MAX_SIZE,
-    )
-    add_random_to_concatenator_queue = queue_proxy_wrapper.QueueProxyWrapper(
-        mp_manager,
-        ADD_RANDOM_TO_CONCATENATOR_QUEUE_MAX_SIZE,
-    )
-
-    # Worker properties
-    result, countup_worker_properties = worker_manager.WorkerProperties.create(
-        count=COUNTUP_WORKER_COUNT,  # How many workers
-        target=countup_worker.countup_worker,  # What's the function that this worker runs
-        work_arguments=(  # The function's arguments excluding input/output queues and controller
-            3,
-            100,
-        ),
-        input_queues=[],  # Note that input/output queues must be in the proper order
-        output_queues=[countup_to_add_random_queue],
-        controller=controller,  # Worker
-        local_logger=main_logger,  # Main logger to log any failures during worker creation
-    )
-    if not result:
-        print("Failed to create arguments for Countup")
-        return -1
-
-    # Get Pylance to stop complaining
-    assert countup_worker_properties is not None
-
-    result, add_random_worker_properties = worker_manager.WorkerProperties.create(
-        count=ADD_RANDOM_WORKER_COUNT,
-        target=add_random_worker.add_random_worker,
-        work_arguments=(
-            252,
-            10,
-            5,
-        ),
-        input_queues=[countup_to_add_random_queue],
-        output_queues=[add_random_to_concatenator_queue],
-        controller=controller,
-        local_logger=main_logger,
-    )
-    if not result:
-        print("Failed to create arguments for Add Random")
-        return -1
-
-    # Get Pylance to stop complaining
-    assert add_random_worker_properties is not None
-
-    result, concatenator_worker_properties = worker_manager.WorkerProperties.create(
-        count=CONCATENATOR_WORKER_COUNT,
-        target=concatenator_worker.concatenator_worker,
-        work_arguments=(
-            "Hello ",
-            " world!",
-        ),
-        input_queues=[add_random_to_concatenator_queue],
-        output_queues=[],
-        controller=controller,
-        local_logger=main_logger,
-    )
+    # Stages (workers and their arguments) and the queues between them
+    result, pipeline_config = read_yaml.open_config(PIPELINE_CONFIG_FILE_PATH)
     if not result:
-        print("Failed to create arguments for Concatenator")
+        print("ERROR: Failed to load pipeline configuration file")
         return -1
 
     # Get Pylance to stop complaining
-    assert concatenator_worker_properties is not None
+    assert pipeline_config is not None
 
-    # Prepare processes
-    # Data path: countup_worker to add_random_worker to concatenator_workers
-    worker_managers: list[worker_manager.WorkerManager] = []  # List of all worker managers
-
-    result, countup_manager = worker_manager.WorkerManager.create(
-        worker_properties=countup_worker_properties,
-        local_logger=main_logger,
+    result, example_pipeline = pipeline.Pipeline.create(
+        mp_manager=mp_manager,
+        controller=controller,  # Worker
+        local_logger=main_logger,  # Main logger to log any failures during worker creation
+        queue_depth_per_worker=QUEUE_DEPTH_PER_WORKER,
+        is_instrumented=True,  # For the statistics at the end
     )
     if not result:
-        print("Failed to create manager for Countup")
+        print("Failed to create pipeline")
         return -1
 
     # Get Pylance to stop complaining
-    assert countup_manager is not None
+    assert example_pipeline is not None
 
-    worker_managers.append(countup_manager)
-
-    result, add_random_manager = worker_manager.WorkerManager.create(
-        worker_properties=add_random_worker_properties,
-        local_logger=main_logger,
-    )
-    if not result:
-        print("Failed to create manager for Add Random")
+    # Queues are passed to workers after the configured work arguments
+    if not example_pipeline.add_from_config(pipeline_config, {}):
+        print("Failed to declare pipeline")
         return -1
 
-    # Get Pylance to stop complaining
-    assert add_random_manager is not None
-
-    worker_managers.append(add_random_manager)
-
-    result, concatenator_manager = worker_manager.WorkerManager.create(
-        worker_properties=concatenator_worker_properties,
-        local_logger=main_logger,
-    )
-    if not result:
-        print("Failed to create manager for Concatenator")
+    # Create the queues and prepare the processes
+    if not example_pipeline.build():
+        print("Failed to build pipeline")
         return -1
 
-    # Get Pylance to stop complaining
-    assert concatenator_manager is not None
-
-    worker_managers.append(concatenator_manager)
-
-    # Start worker processes
-    for manager in worker_managers:
-        manager.start_workers()
+    # Start worker processes, from producers to consumers
+    example_pipeline.start()
 
     main_logger.info("Started", True)
 
@@ -193,20 +108,13 @@ def main() -> int:
 
     time.sleep(2)
 
-    # Stop the processes
-    controller.request_exit()
-
-    main_logger.info("Requested exit", True)
-
-    # Fill and drain queues from END TO START
-    countup_to_add_random_queue.fill_and_drain_queue()
-    add_random_to_concatenator_queue.fill_and_drain_queue()
-
-    main_logger.info("Queues cleared", True)
+    snapshot = example_pipeline.get_snapshot()
+    main_logger.info(f"Pipeline statistics: {snapshot}", True)
 
-    # Clean up worker processes
-    for manager in worker_managers:
-        manager.join_workers()
+    # Stop the processes from END TO START, then clear the queues
+    for stage_name, stage_statistics in example_pipeline.shutdown(SHUTDOWN_TIMEOUT).items():
+        for stop_statistics in stage_statistics:
+            main_logger.info(f"{stage_name}: {stop_statistics}", True)
 
     main_logger.info("Stopped", True)
 
@@ -3,12 +3,16 @@ Decision-making logic.
 """
 
 import math
+import typing
 
 from pymavlink import mavutil
 
 from ..common.modules.logger import logger
 from ..telemetry import telemetry
 
+if typing.TYPE_CHECKING:
+    from utilities.workers import latency_trace
+
 
 class Position:
     """
@@ -21,6 +25,19 @@ class Position:
         self.z = z
 
 
+class CommandResponse:
+    """
+    Description of a sent command, with the trace of the telemetry it was decided from.
+    """
+
+    def __init__(self, message: str, trace: "latency_trace.TraceContext | None" = None) -> None:
+        self.message = message
+        self.trace = trace
+
+    def __str__(self) -> str:
+        return self.message
+
+
 # =================================================================================================
 #                            ↓ BOOTCAMPERS MODIFY BELOW THIS COMMENT ↓
 # =================================================================================================
@@ -77,8 +94,9 @@ class Command:  # pylint: disable=too-many-instance-attributes
         self.z_speed = z_speed
         self.angle_tolerance = angle_tolerance
         self.turning_speed = turning_speed
-        self.velocity_sum = [0.0, 0.0, 0.0]
-        self.data_count = 0
+        # Per vehicle (system id), so a worker given several vehicles does not mix them
+        self.velocity_sums: "dict[int | None, list[float]]" = {}
+        self.data_counts: "dict[int | None, int]" = {}
 
     def run(
         self,
@@ -88,15 +106,18 @@ class Command:  # pylint: disable=too-many-instance-attributes
         Make a decision based on received telemetry data.
         """
         try:
-            self.velocity_sum[0] += telemetry_data.x_velocity
-            self.velocity_sum[1] += telemetry_data.y_velocity
-            self.velocity_sum[2] += telemetry_data.z_velocity
-            self.data_count += 1
+            system_id = telemetry_data.system_id
+            velocity_sum = self.velocity_sums.setdefault(system_id, [0.0, 0.0, 0.0])
+            velocity_sum[0] += telemetry_data.x_velocity
+            velocity_sum[1] += telemetry_data.y_velocity
+            velocity_sum[2] += telemetry_data.z_velocity
+            data_count = self.data_counts.get(system_id, 0) + 1
+            self.data_counts[system_id] = data_count
 
             avg_velocity = [
-                self.velocity_sum[0] / self.data_count,
-                self.velocity_sum[1] / self.data_count,
-                self.velocity_sum[2] / self.data_count,
+                velocity_sum[0] / data_count,
+                velocity_sum[1] / data_count,
+                velocity_sum[2] / data_count,
             ]
             self.logger.info(f"Average velocity: {avg_velocity}")
 
@@ -117,6 +138,7 @@ class Command:  # pylint: disable=too-many-instance-attributes
                         self.target.z,
                         0,
                     )
+                    self.__mark_sent(telemetry_data)
                     return f"CHANGE_ALTITUDE: {height_diff:.2f}"
                 except (ConnectionError, OSError, ValueError) as e:
                     self.logger.error(f"Failed to send altitude command: {e}")
@@ -156,6 +178,7 @@ class Command:  # pylint: disable=too-many-instance-attributes
                         0,
                         0,
                     )
+                    self.__mark_sent(telemetry_data)
                     return f"CHANGE_YAW: {yaw_diff_deg:.2f}"
                 except (ConnectionError, OSError, ValueError) as e:
                     self.logger.error(f"Failed to send yaw command: {e}")
@@ -165,3 +188,18 @@ class Command:  # pylint: disable=too-many-instance-attributes
         except (ConnectionError, OSError, ValueError, TypeError) as e:
             self.logger.error(f"Error in command decision: {e}")
             return ""
+
+    def __mark_sent(self, telemetry_data: telemetry.TelemetryData) -> None:
+        """
+        Ends the trace of the telemetry once a command has been sent for it.
+        With the command writer's IntentConnection, the trace goes with the command instead,
+        and the writer ends it once the command is written.
+        """
+        if telemetry_data.trace is None:
+            return
+
+        attach_trace = getattr(self.connection, "attach_trace", None)
+        if attach_trace is not None:
+            attach_trace(telemetry_data.trace)
+        else:
+            telemetry_data.trace.mark("command_send")
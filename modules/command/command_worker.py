@@ -5,21 +5,24 @@ Command worker to make decisions based on Telemetry Data.
 import os
 import pathlib
 import queue
-
-from pymavlink import mavutil
+import time
 
 from utilities.workers import queue_proxy_wrapper
 from utilities.workers import worker_controller
 
 from . import command
+from ..command_writer import command_writer
 from ..common.modules.logger import logger
 
 
+# Maximum number of telemetry samples taken from the input queue at once
+MAX_BATCH_SIZE = 32
+
+
 # =================================================================================================
 #                            ↓ BOOTCAMPERS MODIFY BELOW THIS COMMENT ↓
 # =================================================================================================
 def command_worker(
-    connection: mavutil.mavfile,
     target: command.Position,
     height_tolerance: float,
     z_speed: float,
@@ -27,11 +30,14 @@ def command_worker(
     turning_speed: float,
     input_queue: queue_proxy_wrapper.QueueProxyWrapper,
     output_queue: queue_proxy_wrapper.QueueProxyWrapper,
+    intent_queue: queue_proxy_wrapper.QueueProxyWrapper,
     controller: worker_controller.WorkerController,
     # Add other necessary worker arguments here
 ) -> None:
     """
     Worker process.
+
+    intent_queue: Commands to send, for the command writer.
     """
     # =============================================================================================
     #                          ↑ BOOTCAMPERS MODIFY ABOVE THIS COMMENT ↑
@@ -53,6 +59,9 @@ def command_worker(
     # =============================================================================================
     #                          ↓ BOOTCAMPERS MODIFY BELOW THIS COMMENT ↓
     # =============================================================================================
+    # Commands are sent by the command writer, which coalesces and rate limits them
+    connection = command_writer.IntentConnection(intent_queue)
+
     # Instantiate class object (command.Command)
     result, command_obj = command.Command.create(
         connection, target, local_logger, height_tolerance, z_speed, angle_tolerance, turning_speed
@@ -62,13 +71,57 @@ def command_worker(
         return
 
     # Main loop: do work.
+    # Drain any backlog in 1 round-trip and send the resulting responses and commands
+    # in 1 round-trip each
     while not controller.is_exit_requested():
+        # Method blocks worker if pause has been requested, between batches
+        controller.check_pause()
+        # Main sees a stall if sending to the drone or putting into a full queue blocks
+        controller.report_progress()
+
         try:
-            command_data = input_queue.queue.get(timeout=1)
-            message = command_obj.run(command_data)
-            if message:
-                output_queue.queue.put(message)
-        except (ConnectionError, OSError, ValueError, queue.Empty) as e:
+            telemetry_batch = input_queue.get_many(MAX_BATCH_SIZE, timeout=1)
+            if len(telemetry_batch) == 0:
+                # Normal while the vehicle is quiet, so not an error
+                local_logger.debug("No telemetry received")
+                continue
+
+            work_start = time.monotonic()
+            responses = []
+            sentinel_count = 0
+            for command_data in telemetry_batch:
+                # Sentinel, finish the batch and then exit
+                if command_data is None:
+                    sentinel_count += 1
+                    continue
+
+                if command_data.trace is not None:
+                    command_data.trace.mark("command_dequeue")
+
+                message = command_obj.run(command_data)
+                if message:
+                    responses.append(command.CommandResponse(message, command_data.trace))
+
+            # Service time for autoscaling, excluding waits on a full queue downstream
+            controller.report_work(
+                len(telemetry_batch) - sentinel_count, time.monotonic() - work_start
+            )
+
+            output_queue.put_many(responses)
+            connection.flush()
+
+            if sentinel_count > 0:
+                # Sentinels for other workers go back into the queue, without blocking shutdown
+                try:
+                    for _ in range(sentinel_count - 1):
+                        input_queue.put(None, block=False)
+                except queue.Full:
+                    local_logger.warning("Input queue full, sentinels for other workers dropped")
+
+                break
+        except (ConnectionError, OSError, ValueError) as e:
             local_logger.error(f"Error in worker loop: {e}")
         except KeyboardInterrupt:
             continue
+
+    local_logger.info("Command worker exited")
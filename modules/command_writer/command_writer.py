@@ -0,0 +1,334 @@
+"""
+Sends the commands decided by the command workers, coalesced and rate limited.
+"""
+
+import time
+
+from pymavlink import mavutil
+
+from utilities.workers import latency_trace
+from utilities.workers import queue_proxy_wrapper
+from ..common.modules.logger import logger
+
+
+class CommandIntent:
+    """
+    A COMMAND_LONG that a command worker decided to send, sent by the command writer.
+    """
+
+    __slots__ = ("target_system", "target_component", "command", "params", "time", "trace")
+
+    def __init__(
+        self,
+        target_system: int,
+        target_component: int,
+        command: int,
+        params: "tuple[float, float, float, float, float, float, float]",
+        intent_time: "float | None" = None,
+        trace: "latency_trace.TraceContext | None" = None,
+    ) -> None:
+        """
+        command: MAV_CMD id.
+        params: Parameters 1 to 7 of the command.
+        intent_time: When the command was decided, now if None.
+        trace: Trace of the telemetry the command was decided on, ended when it is written.
+        """
+        self.target_system = target_system
+        self.target_component = target_component
+        self.command = command
+        self.params = params
+        self.time = time.monotonic() if intent_time is None else intent_time
+        self.trace = trace
+
+    def get_key(self) -> "tuple[int, int, int]":
+        """
+        Intents with the same key supersede each other, the newest is the one sent.
+        """
+        return self.target_system, self.target_component, self.command
+
+
+class _IntentSender:
+    """
+    `mav` of IntentConnection, records commands instead of sending them.
+    """
+
+    def __init__(self) -> None:
+        self.intents: "list[CommandIntent]" = []
+
+    def command_long_send(  # pylint: disable=too-many-arguments
+        self,
+        target_system: int,
+        target_component: int,
+        command: int,
+        confirmation: int,  # pylint: disable=unused-argument
+        param1: float,
+        param2: float,
+        param3: float,
+        param4: float,
+        param5: float,
+        param6: float,
+        param7: float,
+        force_mavlink1: bool = False,  # pylint: disable=unused-argument
+    ) -> None:
+        """
+        Same arguments as `MAVLink.command_long_send()` ,
+        the writer sets the confirmation and protocol version.
+        """
+        self.intents.append(
+            CommandIntent(
+                target_system,
+                target_component,
+                command,
+                (param1, param2, param3, param4, param5, param6, param7),
+            )
+        )
+
+
+class IntentConnection:
+    """
+    Stands in for `mavutil.mavfile` in a command worker, so that Command is used unchanged.
+    Commands sent with `mav.command_long_send()` are put into the queue of the command writer
+    by `flush()` , instead of being written to the socket.
+    """
+
+    def __init__(self, intent_queue: queue_proxy_wrapper.QueueProxyWrapper) -> None:
+        self.intent_queue = intent_queue
+        self.mav = _IntentSender()
+
+    def attach_trace(self, trace: latency_trace.TraceContext) -> None:
+        """
+        Carries the trace with the latest command sent, for the command writer to end
+        once it has written the command.
+        """
+        if len(self.mav.intents) > 0:
+            self.mav.intents[-1].trace = trace
+
+    def flush(self) -> int:
+        """
+        Puts the commands sent since the previous flush into the queue in 1 round-trip.
+
+        Returns the number of commands put.
+        """
+        intents = self.mav.intents
+        self.mav.intents = []
+        self.intent_queue.put_many(intents)
+        return len(intents)
+
+
+class _FrameBuffer:
+    """
+    File of the writer's MAVLink packer, collects packed frames for a single write.
+    """
+
+    def __init__(self) -> None:
+        self.frames: "list[bytes]" = []
+
+    def write(self, frame: bytes) -> None:
+        """
+        Called by `MAVLink.send()` with each packed frame.
+        """
+        self.frames.append(frame)
+
+
+class CommandWriterSnapshot:
+    """
+    Commands over the interval since the previous snapshot.
+    """
+
+    def __init__(
+        self,
+        sent_count: int,
+        suppressed_count: int,
+        pending_count: int,
+        write_count: int,
+        interval: float,
+    ) -> None:
+        self.sent_count = sent_count
+        # Superseded by a newer intent with the same key before they could be sent
+        self.suppressed_count = suppressed_count
+        # Waiting for their rate limit at the time of the snapshot
+        self.pending_count = pending_count
+        # Batches written to the connection
+        self.write_count = write_count
+        # Per second during the interval
+        self.sent_rate = sent_count / interval if interval > 0.0 else 0.0
+        self.suppressed_rate = suppressed_count / interval if interval > 0.0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"sent: {self.sent_count} ({self.sent_rate:.1f}/s), "
+            f"suppressed: {self.suppressed_count} ({self.suppressed_rate:.1f}/s), "
+            f"pending: {self.pending_count}, "
+            f"writes: {self.write_count}"
+        )
+
+
+class CommandWriter:  # pylint: disable=too-many-instance-attributes
+    """
+    Sole sender of commands to the connection.
+
+    Intents are kept per key (target and command id), a newer intent replacing the pending one,
+    and each key is sent at most once per its minimum interval.
+    All intents that are due are packed and written to the connection at once.
+    The traces of written intents are marked "command_send" , so that they span
+    the wait for the writer and the rate limit, and are kept for `get_sent_traces()` .
+    """
+
+    __create_key = object()
+
+    @classmethod
+    def create(
+        cls,
+        connection: mavutil.mavfile,
+        min_intervals: "dict[int, float]",
+        default_min_interval: float,
+        local_logger: logger.Logger,
+    ) -> "tuple[bool, CommandWriter | None]":
+        """
+        connection: Written with the packed commands.
+        min_intervals: Command id to minimum time between sends in seconds.
+        default_min_interval: Minimum time between sends of other commands in seconds.
+        local_logger: Existing logger from process.
+        """
+        intervals = list(min_intervals.values()) + [default_min_interval]
+        if any(interval < 0.0 for interval in intervals):
+            local_logger.error("Command minimum intervals must not be negative", True)
+            return False, None
+
+        return True, CommandWriter(
+            cls.__create_key, connection, min_intervals, default_min_interval, local_logger
+        )
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        class_private_create_key: object,
+        connection: mavutil.mavfile,
+        min_intervals: "dict[int, float]",
+        default_min_interval: float,
+        local_logger: logger.Logger,
+    ) -> None:
+        """
+        Private constructor, use create() method.
+        """
+        assert class_private_create_key is CommandWriter.__create_key, "Use create() method"
+
+        self.__connection = connection
+        self.__min_intervals = min_intervals
+        self.__default_min_interval = default_min_interval
+        self.__logger = local_logger
+        # Own packer with its own sequence numbers, so frames are packed without the socket
+        self.__frame_buffer = _FrameBuffer()
+        self.__mav = mavutil.mavlink.MAVLink(
+            self.__frame_buffer,
+            srcSystem=connection.source_system,
+            srcComponent=connection.source_component,
+        )
+        # Key to newest intent not yet sent, in order of first arrival
+        self.__pending: "dict[tuple[int, int, int], CommandIntent]" = {}
+        # Key to time of its latest send
+        self.__send_times: "dict[tuple[int, int, int], float]" = {}
+        self.__sent_count = 0
+        self.__suppressed_count = 0
+        self.__write_count = 0
+        self.__snapshot_time = time.monotonic()
+        self.__sent_traces: "list[latency_trace.TraceContext]" = []
+
+    def __get_min_interval(self, command: int) -> float:
+        return self.__min_intervals.get(command, self.__default_min_interval)
+
+    def __get_due_time(self, key: "tuple[int, int, int]") -> float:
+        """
+        Earliest time the key can be sent again.
+        """
+        send_time = self.__send_times.get(key)
+        if send_time is None:
+            return 0.0
+
+        return send_time + self.__get_min_interval(key[2])
+
+    def add(self, intents: "list[CommandIntent]") -> None:
+        """
+        Adds intents to send, superseding pending ones with the same key.
+        """
+        for intent in intents:
+            key = intent.get_key()
+            if key in self.__pending:
+                self.__suppressed_count += 1
+
+            self.__pending[key] = intent
+
+    def get_wait_time(self) -> "float | None":
+        """
+        Seconds until the next pending intent is due, 0 if one already is.
+
+        Returns None if there are no pending intents.
+        """
+        if len(self.__pending) == 0:
+            return None
+
+        due_time = min(self.__get_due_time(key) for key in self.__pending)
+        return max(due_time - time.monotonic(), 0.0)
+
+    def write(self) -> int:
+        """
+        Packs every pending intent that is due and writes them to the connection at once.
+        Intents whose write fails are dropped, as newer ones replace them.
+
+        Returns the number of commands written.
+        """
+        now = time.monotonic()
+        due_keys = [key for key in self.__pending if self.__get_due_time(key) <= now]
+        if len(due_keys) == 0:
+            return 0
+
+        traces = []
+        for key in due_keys:
+            intent = self.__pending.pop(key)
+            self.__mav.command_long_send(
+                intent.target_system, intent.target_component, intent.command, 0, *intent.params
+            )
+            self.__send_times[key] = now
+            if intent.trace is not None:
+                traces.append(intent.trace)
+
+        frames = self.__frame_buffer.frames
+        self.__frame_buffer.frames = []
+        try:
+            self.__connection.write(b"".join(frames))
+        except (ConnectionError, OSError) as e:
+            self.__logger.error(f"Failed to write {len(frames)} commands: {e}")
+            return 0
+
+        for trace in traces:
+            trace.mark("command_send")
+
+        self.__sent_traces.extend(traces)
+        self.__sent_count += len(frames)
+        self.__write_count += 1
+        return len(frames)
+
+    def get_sent_traces(self) -> "list[latency_trace.TraceContext]":
+        """
+        Returns the traces of the commands written since the previous call, now complete.
+        """
+        traces = self.__sent_traces
+        self.__sent_traces = []
+        return traces
+
+    def snapshot(self) -> CommandWriterSnapshot:
+        """
+        Statistics since the previous snapshot.
+        """
+        now = time.monotonic()
+        snapshot = CommandWriterSnapshot(
+            self.__sent_count,
+            self.__suppressed_count,
+            len(self.__pending),
+            self.__write_count,
+            now - self.__snapshot_time,
+        )
+        self.__sent_count = 0
+        self.__suppressed_count = 0
+        self.__write_count = 0
+        self.__snapshot_time = now
+        return snapshot
@@ -0,0 +1,100 @@
+"""
+Command writer worker that sends the commands decided by the command workers.
+"""
+
+import os
+import pathlib
+import queue
+import time
+
+from pymavlink import mavutil
+
+from utilities.workers import queue_proxy_wrapper
+from utilities.workers import worker_controller
+from . import command_writer
+from ..common.modules.logger import logger
+
+
+# Maximum number of intents taken from the input queue at once
+MAX_BATCH_SIZE = 64
+# Longest wait for intents, so that exit requests are noticed
+READ_TIMEOUT = 1  # seconds
+
+
+def command_writer_worker(  # pylint: disable=too-many-arguments
+    connection: mavutil.mavfile,
+    min_intervals: "dict[int, float]",
+    default_min_interval: float,
+    report_period: float,
+    input_queue: queue_proxy_wrapper.QueueProxyWrapper,
+    output_queue: queue_proxy_wrapper.QueueProxyWrapper,
+    trace_queue: queue_proxy_wrapper.QueueProxyWrapper,
+    controller: worker_controller.WorkerController,
+) -> None:
+    """
+    Worker process.
+
+    connection: Connection that only this worker sends commands to.
+    min_intervals: Command id to minimum time between sends in seconds.
+    default_min_interval: Minimum time between sends of other commands in seconds.
+    report_period: Time between sent and suppressed counts in seconds.
+    input_queue: Command intents from the command workers.
+    output_queue: Sent and suppressed counts for main.
+    trace_queue: Traces of the commands written, for main.
+    """
+    # Instantiate logger
+    worker_name = pathlib.Path(__file__).stem
+    process_id = os.getpid()
+    result, local_logger = logger.Logger.create(f"{worker_name}_{process_id}", True)
+    if not result:
+        print("ERROR: Worker failed to create logger")
+        return
+
+    # Get Pylance to stop complaining
+    assert local_logger is not None
+
+    local_logger.info("Logger initialized", True)
+
+    # Instantiate class object (command_writer.CommandWriter)
+    result, writer = command_writer.CommandWriter.create(
+        connection, min_intervals, default_min_interval, local_logger
+    )
+    if not result:
+        local_logger.error("Failed to create CommandWriter")
+        return
+
+    # Get Pylance to stop complaining
+    assert writer is not None
+
+    # Main loop: do work.
+    # Wait for intents until the next pending one is due, then write everything that is
+    previous_report_time = time.monotonic()
+    while not controller.is_exit_requested():
+        # Method blocks worker if pause has been requested
+        controller.check_pause()
+        # Main sees a stall if a write to the connection or a full output queue blocks
+        controller.report_progress()
+
+        wait_time = writer.get_wait_time()
+        timeout = READ_TIMEOUT if wait_time is None else min(wait_time, READ_TIMEOUT)
+        intents = input_queue.get_many(MAX_BATCH_SIZE, timeout=timeout)
+        sentinel_count = intents.count(None)
+        writer.add([intent for intent in intents if intent is not None])
+        writer.write()
+        trace_queue.put_many(writer.get_sent_traces())
+
+        if time.monotonic() - previous_report_time >= report_period:
+            previous_report_time = time.monotonic()
+            output_queue.put(writer.snapshot())
+
+        if sentinel_count > 0:
+            # Sentinels for other workers go back into the queue, without blocking shutdown
+            try:
+                for _ in range(sentinel_count - 1):
+                    input_queue.put(None, block=False)
+            except queue.Full:
+                local_logger.warning("Input queue full, sentinels for other workers dropped")
+
+            break
+
+    local_logger.info("Command writer loop exited")
@@ -16,6 +16,9 @@ class HeartbeatReceiver:
     HeartbeatReceiver class to send a heartbeat
     """
 
+    # Received by the heartbeat receiver worker, published to it by the MAVLink reader
+    MESSAGE_TYPES = ["HEARTBEAT"]
+
     __private_key = object()
 
     @classmethod
@@ -59,7 +62,7 @@ class HeartbeatReceiver:
         the connection is considered disconnected.
         """
         try:
-            msg = self.connection.recv_match(type="HEARTBEAT", blocking=False, timeout=1.0)
+            msg = self.connection.recv_match(type=self.MESSAGE_TYPES, blocking=False, timeout=1.0)
             if msg:
                 self.consecutive_failures = 0
                 self.logger.info("Heartbeat received successfully")
@@ -73,7 +76,7 @@ class HeartbeatReceiver:
             else:
                 state = "Disconnected"
                 self.logger.error("Connection considered disconnected")
-            output_queue.queue.put(state)
+            output_queue.put(state)
 
             return self.consecutive_failures <= disconnect_threshold
         except (ConnectionError, TimeoutError) as e:
@@ -4,22 +4,20 @@ Heartbeat worker that sends heartbeats periodically.
 
 import os
 import pathlib
-import time
-
-from pymavlink import mavutil
 
 from utilities.workers import queue_proxy_wrapper
 from utilities.workers import worker_controller
 from . import heartbeat_receiver
 from ..common.modules.logger import logger
+from ..mavlink_reader import mavlink_reader
 
 
 # =================================================================================================
 #                            ↓ BOOTCAMPERS MODIFY BELOW THIS COMMENT ↓
 # =================================================================================================
 def heartbeat_receiver_worker(
-    connection: mavutil.mavfile,
     heartbeat_period: float,
+    message_queue: queue_proxy_wrapper.QueueProxyWrapper,
     output_queue: queue_proxy_wrapper.QueueProxyWrapper,
     controller: worker_controller.WorkerController,
     # Add other necessary worker arguments here
@@ -27,7 +25,8 @@ def heartbeat_receiver_worker(
     """
     Worker process.
 
-    args... describe what the arguments are
+    heartbeat_period: Time between receive attempts in seconds.
+    message_queue: Heartbeat messages from the MAVLink reader.
     """
     # =============================================================================================
     #                          ↑ BOOTCAMPERS MODIFY ABOVE THIS COMMENT ↑
@@ -50,6 +49,8 @@ def heartbeat_receiver_worker(
     #                          ↓ BOOTCAMPERS MODIFY BELOW THIS COMMENT ↓
     # =============================================================================================
     # Instantiate class object (heartbeat_receiver.HeartbeatReceiver)
+    # Receives from the MAVLink reader instead of the connection
+    connection = mavlink_reader.SubscribedConnection(message_queue)
     result, heartbeat_receiver_obj = heartbeat_receiver.HeartbeatReceiver.create(
         connection, local_logger
     )
@@ -60,6 +61,11 @@ def heartbeat_receiver_worker(
     # Main loop: do work.
     local_logger.info("Starting heartbeat receiving loop")
     while not controller.is_exit_requested():
+        # Method blocks worker if pause has been requested
+        controller.check_pause()
+        # Main sees a stall if waiting for a heartbeat hangs past its timeout
+        controller.report_progress()
+
         local_logger.info("Attempting to receive heartbeat")
         try:
             working = heartbeat_receiver_obj.run(output_queue)
@@ -68,8 +74,9 @@ def heartbeat_receiver_worker(
         except (ConnectionError, OSError, ValueError) as e:
             local_logger.error(f"Failed to receive heartbeat: {e}", True)
 
+        # Returns immediately on exit request instead of sleeping out the period
         local_logger.info(f"Sleeping for {heartbeat_period} seconds")
-        time.sleep(heartbeat_period)
+        controller.wait_for_exit(heartbeat_period)
 
     local_logger.info("Heartbeat receiving loop exited")
 
@@ -16,6 +16,21 @@ from ..common.modules.logger import logger
 # =================================================================================================
 #                            ↓ BOOTCAMPERS MODIFY BELOW THIS COMMENT ↓
 # =================================================================================================
+def send_heartbeat(
+    heartbeat_sender_obj: heartbeat_sender.HeartbeatSender, local_logger: logger.Logger
+) -> None:
+    """
+    Sends a heartbeat, logging any failure.
+    """
+    local_logger.info("Attempting to send heartbeat")
+    try:
+        working = heartbeat_sender_obj.run()
+        if not working:
+            local_logger.error("Failed to send heartbeat")
+    except (ConnectionError, OSError, ValueError) as e:
+        local_logger.error(f"Failed to send heartbeat: {e}", True)
+
+
 def heartbeat_sender_worker(
     connection: mavutil.mavfile,
     heartbeat_period: float,
@@ -54,17 +69,25 @@ def heartbeat_sender_worker(
     # Main loop: do work.
     local_logger.info("Starting heartbeat sending loop")
 
+    # Heartbeats are sent on a fixed schedule so that waiting does not drift the period
+    next_heartbeat_time = time.monotonic()
     while not controller.is_exit_requested():
-        local_logger.info("Attempting to send heartbeat")
-        try:
-            working = heartbeat_sender_obj.run()
-            if not working:
-                local_logger.error("Failed to send heartbeat")
-        except (ConnectionError, OSError, ValueError) as e:
-            local_logger.error(f"Failed to send heartbeat: {e}", True)
+        # Method blocks worker if pause has been requested
+        controller.check_pause()
+        # Main sees a stall if sending a heartbeat blocks
+        controller.report_progress()
+
+        send_heartbeat(heartbeat_sender_obj, local_logger)
+
+        # Resuming from a pause starts a new schedule instead of catching up
+        next_heartbeat_time = max(next_heartbeat_time, time.monotonic()) + heartbeat_period
 
+        # Returns immediately on exit request instead of sleeping out the period
         local_logger.info(f"Sleeping for {heartbeat_period} seconds")
-        time.sleep(heartbeat_period)
+        if controller.wait_for_exit(next_heartbeat_time - time.monotonic()):
+            # The vehicle is still owed the heartbeat for this period, send it before exiting
+            time.sleep(max(next_heartbeat_time - time.monotonic(), 0.0))
+            send_heartbeat(heartbeat_sender_obj, local_logger)
 
     local_logger.info("Heartbeat sending loop exited")
 
@@ -0,0 +1,215 @@
+"""
+Reads the MAVLink connection once for all workers, publishing each message by type.
+"""
+
+import queue
+import select
+import time
+
+from pymavlink import mavutil
+
+from utilities.workers import queue_proxy_wrapper
+from . import message_dispatcher
+from ..common.modules.logger import logger
+
+
+class MavlinkReader:
+    """
+    Sole reader of the connection. Each message is decoded once and put into the queue
+    subscribed to its type, messages of other types are discarded.
+
+    Workers used to each call `recv_match()` on the same connection,
+    racing for and throwing away each other's messages.
+
+    A connection with a socket is read in large chunks and dispatched by message id,
+    so messages of other types are skipped by their header without being decoded.
+    Others, such as a connection delivered to by ThreadWorkerHost, are received from
+    with `recv_match()` .
+    """
+
+    __create_key = object()
+
+    # Time waiting for the first message of a batch
+    __READ_TIMEOUT = 0.1  # seconds
+    # Maximum messages published at once, so that the caller still checks for exit
+    __MAX_BATCH_SIZE = 100
+    # Maximum bytes read from the socket at once
+    __READ_SIZE = 65536
+
+    @classmethod
+    def create(
+        cls,
+        connection: mavutil.mavfile,
+        subscriptions: "dict[str, queue_proxy_wrapper.QueueProxyWrapper]",
+        local_logger: logger.Logger,
+    ) -> "tuple[bool, MavlinkReader | None]":
+        """
+        connection: Connection that only this reader receives from.
+        subscriptions: Message type to the queue its messages are put into.
+        local_logger: Existing logger from process.
+
+        Returns whether the reader was created and the reader.
+        """
+        if len(subscriptions) == 0:
+            local_logger.error("MAVLink reader requires at least 1 subscription", True)
+            return False, None
+
+        for message_type in subscriptions:
+            if message_dispatcher.MessageDispatcher.get_message_id(message_type) is None:
+                local_logger.error(f"Unknown message type: {message_type}", True)
+                return False, None
+
+        return True, MavlinkReader(cls.__create_key, connection, subscriptions, local_logger)
+
+    def __init__(
+        self,
+        class_private_create_key: object,
+        connection: mavutil.mavfile,
+        subscriptions: "dict[str, queue_proxy_wrapper.QueueProxyWrapper]",
+        local_logger: logger.Logger,
+    ) -> None:
+        """
+        Private constructor, use create() method.
+        """
+        assert class_private_create_key is MavlinkReader.__create_key, "Use create() method"
+
+        self.__connection = connection
+        self.__subscriptions = subscriptions
+        self.__message_types = list(subscriptions)
+        self.__local_logger = local_logger
+        # Message type to the messages received since they were last published
+        self.__batches: "dict[str, list[object]]" = {}
+        self.__batch_size = 0
+
+        self.__dispatcher = None
+        if getattr(connection, "fd", None) is not None:
+            self.__dispatcher = message_dispatcher.MessageDispatcher()
+            for message_type in self.__message_types:
+                self.__dispatcher.register(message_type, self.__add_to_batch)
+
+    def run(self) -> int:
+        """
+        Waits for a subscribed message, then publishes it with any others already received.
+        Messages of each queue are put together in 1 round-trip.
+
+        Returns the number of messages published.
+        """
+        if self.__dispatcher is None:
+            self.__receive_matching()
+        else:
+            self.__read_and_dispatch(self.__dispatcher)
+
+        count = self.__batch_size
+        for message_type, messages in self.__batches.items():
+            try:
+                self.__subscriptions[message_type].put_many(messages, self.__READ_TIMEOUT)
+            except queue.Full:
+                self.__local_logger.warning(
+                    f"Dropped {len(messages)} {message_type} messages, subscriber is full"
+                )
+
+        self.__batches = {}
+        self.__batch_size = 0
+        return count
+
+    def __add_to_batch(self, message: object) -> None:
+        """
+        Keeps the message to publish with the others of its type.
+        """
+        self.__batches.setdefault(message.get_type(), []).append(message)
+        self.__batch_size += 1
+
+    def __receive_matching(self) -> None:
+        """
+        Receives subscribed messages with `recv_match()`, which decodes every message.
+        """
+        blocking = True
+        while self.__batch_size < self.__MAX_BATCH_SIZE:
+            message = self.__connection.recv_match(
+                type=self.__message_types,
+                blocking=blocking,
+                timeout=self.__READ_TIMEOUT if blocking else None,
+            )
+            if message is None:
+                return
+
+            blocking = False
+            self.__add_to_batch(message)
+
+    def __read_and_dispatch(self, dispatcher: message_dispatcher.MessageDispatcher) -> None:
+        """
+        Waits for the socket, then reads everything already received and dispatches it.
+        Raises ConnectionError if the vehicle closed the connection.
+        """
+        readable, _, _ = select.select([self.__connection.fd], [], [], self.__READ_TIMEOUT)
+        if len(readable) == 0:
+            return
+
+        for i in range(self.__MAX_BATCH_SIZE):
+            # Empty once there is nothing more to read
+            data = self.__connection.recv(self.__READ_SIZE)
+            if len(data) == 0:
+                if i == 0 and message_dispatcher.MessageDispatcher.is_end_of_stream(
+                    self.__connection
+                ):
+                    raise ConnectionError("Connection closed by the vehicle")
+
+                return
+
+            dispatcher.parse(data)
+            if self.__batch_size >= self.__MAX_BATCH_SIZE:
+                return
+
+
+class SubscribedConnection:
+    """
+    Stands in for `mavutil.mavfile` in a worker that receives from a MavlinkReader queue,
+    so worker classes calling `recv_match()` are used unchanged. Only receives.
+    """
+
+    def __init__(self, message_queue: queue_proxy_wrapper.QueueProxyWrapper) -> None:
+        """
+        message_queue: Queue subscribed to the message types the worker receives.
+        """
+        self.__message_queue = message_queue
+        # Latest message of each type, for conditions, same as `mavutil.mavfile.messages`
+        self.messages = {}
+
+    def recv_match(
+        self,
+        condition: "str | None" = None,
+        type: "str | list[str] | set[str] | None" = None,  # pylint: disable=redefined-builtin
+        blocking: bool = False,
+        timeout: "float | None" = None,
+    ) -> "object | None":
+        """
+        Same as `mavutil.mavfile.recv_match()`, except that it waits up to `timeout`
+        even if not blocking, as waiting on the queue costs nothing unlike polling the socket.
+        """
+        if type is not None and isinstance(type, str):
+            type = [type]
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                if deadline is not None:
+                    message = self.__message_queue.get(
+                        timeout=max(deadline - time.monotonic(), 0.0)
+                    )
+                else:
+                    message = self.__message_queue.get(block=blocking)
+            except queue.Empty:
+                return None
+
+            if message is None:
+                # Sentinel, the reader has stopped
+                return None
+
+            self.messages[message.get_type()] = message
+            if type is not None and message.get_type() not in type:
+                continue
+
+            if not mavutil.evaluate_condition(condition, self.messages):
+                continue
+
+            return message
@@ -0,0 +1,92 @@
+"""
+MAVLink reader worker that publishes received messages to the workers that use them.
+"""
+
+import os
+import pathlib
+
+from pymavlink import mavutil
+
+from utilities.workers import queue_proxy_wrapper
+from utilities.workers import worker_controller
+from . import mavlink_reader
+from ..common.modules.logger import logger
+from ..heartbeat import heartbeat_receiver
+from ..telemetry import telemetry
+
+
+COMMAND_ACK_TYPES = ["COMMAND_ACK"]
+# Every type the worker publishes, for subscribing its connection to a router
+MESSAGE_TYPES = (
+    heartbeat_receiver.HeartbeatReceiver.MESSAGE_TYPES
+    + telemetry.Telemetry.MESSAGE_TYPES
+    + COMMAND_ACK_TYPES
+)
+
+
+def mavlink_reader_worker(
+    connection: mavutil.mavfile,
+    heartbeat_queue: queue_proxy_wrapper.QueueProxyWrapper | None,
+    telemetry_queue: queue_proxy_wrapper.QueueProxyWrapper | None,
+    command_ack_queue: queue_proxy_wrapper.QueueProxyWrapper | None,
+    controller: worker_controller.WorkerController,
+) -> None:
+    """
+    Worker process.
+
+    connection: Connection that only this worker receives from.
+    heartbeat_queue: Heartbeat receiver input, None to discard heartbeats.
+    telemetry_queue: Telemetry input, None to discard attitude and position.
+    command_ack_queue: Command acknowledgements, None to discard them.
+    """
+    # Instantiate logger
+    worker_name = pathlib.Path(__file__).stem
+    process_id = os.getpid()
+    result, local_logger = logger.Logger.create(f"{worker_name}_{process_id}", True)
+    if not result:
+        print("ERROR: Worker failed to create logger")
+        return
+
+    # Get Pylance to stop complaining
+    assert local_logger is not None
+
+    local_logger.info("Logger initialized", True)
+
+    subscriptions = {}
+    for message_types, message_queue in (
+        (heartbeat_receiver.HeartbeatReceiver.MESSAGE_TYPES, heartbeat_queue),
+        (telemetry.Telemetry.MESSAGE_TYPES, telemetry_queue),
+        (COMMAND_ACK_TYPES, command_ack_queue),
+    ):
+        if message_queue is None:
+            continue
+
+        for message_type in message_types:
+            subscriptions[message_type] = message_queue
+
+    # Instantiate class object (mavlink_reader.MavlinkReader)
+    result, reader = mavlink_reader.MavlinkReader.create(connection, subscriptions, local_logger)
+    if not result:
+        local_logger.error("Failed to create MavlinkReader")
+        return
+
+    # Get Pylance to stop complaining
+    assert reader is not None
+
+    # Main loop: do work.
+    while not controller.is_exit_requested():
+        # Method blocks worker if pause has been requested
+        controller.check_pause()
+        # Main sees a stall if reading the connection hangs
+        controller.report_progress()
+
+        try:
+            reader.run()
+        except ConnectionError as e:
+            # A closed connection stays readable, reading it again would only spin
+            local_logger.error(f"Connection lost, exiting: {e}", True)
+            break
+        except (OSError, ValueError) as e:
+            local_logger.error(f"Failed to read connection: {e}", True)
+
+    local_logger.info("MAVLink reader loop exited")
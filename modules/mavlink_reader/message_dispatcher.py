@@ -0,0 +1,229 @@
+"""
+Dispatches MAVLink messages from a byte stream by message id, decoding only those handled.
+"""
+
+import time
+
+from pymavlink import mavutil
+
+# Decodes both MAVLink 1 and 2 frames, with every message of the default dialect
+from pymavlink.dialects.v20 import all as mavlink
+
+
+class MessageDispatcher:
+    """
+    Splits a MAVLink byte stream into frames by reading their headers, and looks up each
+    frame's message id in a dispatch table. Only frames with a message handler are decoded,
+    and the others are skipped without decoding.
+
+    Every frame's checksum is checked, so that a stray marker byte, whose header claims
+    a length running into the following frames, does not swallow them. A frame failing it
+    is skipped by 1 byte only, like a decode error. Frames of message ids not in the dialect
+    have no checksum seed to check with, so they are dropped like pymavlink does.
+
+    A frame handler, if set, is given every complete frame that passed its checksum as bytes.
+    """
+
+    __MARKERS = (mavlink.PROTOCOL_MARKER_V1, mavlink.PROTOCOL_MARKER_V2)
+    __CHECKSUM_LENGTH = 2  # bytes
+
+    # Message name to id, for every message of the dialect
+    __MESSAGE_IDS = {
+        message_class.msgname: message_id
+        for message_id, message_class in mavlink.mavlink_map.items()
+    }
+
+    def __init__(self) -> None:
+        self.__mav = mavlink.MAVLink(None)
+        # Message id to the handlers of its decoded messages
+        self.__message_handlers: "dict[int, list[(object) -> None]]" = {}  # type: ignore
+        self.__frame_handler = None
+        # Bytes of an incomplete frame at the end of the data parsed so far
+        self.__buffer = bytearray()
+
+        # Since created
+        self.decoded_count = 0
+        self.skipped_count = 0
+        self.bad_count = 0
+
+    @classmethod
+    def get_message_id(cls, message_type: str) -> "int | None":
+        """
+        Returns the id of the message type, None if the dialect does not have it.
+        """
+        return cls.__MESSAGE_IDS.get(message_type)
+
+    def register(self, message_type: str, handler: "(object) -> None") -> bool:  # type: ignore
+        """
+        Calls the handler with every decoded message of the type.
+
+        Returns whether the dialect has the message type.
+        """
+        message_id = self.get_message_id(message_type)
+        if message_id is None:
+            return False
+
+        self.__message_handlers.setdefault(message_id, []).append(handler)
+        return True
+
+    def set_frame_handler(self, handler: "(int, bytearray) -> None") -> None:  # type: ignore
+        """
+        Calls the handler with the message id and bytes of every frame, None to stop.
+        The bytes are a copy, owned by the handler.
+        """
+        self.__frame_handler = handler
+
+    @classmethod
+    def read_header(
+        cls, buffer: "bytes | bytearray | memoryview", index: int
+    ) -> "tuple[int, int] | None":
+        """
+        Reads the header of the frame at the index, the same way as `parse()` .
+
+        Returns the frame's length and message id,
+        None if there is no frame marker at the index or the header is incomplete.
+        """
+        if index >= len(buffer) or buffer[index] not in cls.__MARKERS:
+            return None
+
+        if buffer[index] == mavlink.PROTOCOL_MARKER_V2:
+            if len(buffer) - index < mavlink.HEADER_LEN_V2:
+                return None
+
+            frame_length = mavlink.HEADER_LEN_V2 + buffer[index + 1] + cls.__CHECKSUM_LENGTH
+            if buffer[index + 2] & mavlink.MAVLINK_IFLAG_SIGNED:
+                frame_length += mavlink.MAVLINK_SIGNATURE_BLOCK_LEN
+
+            message_id = buffer[index + 7] | buffer[index + 8] << 8 | buffer[index + 9] << 16
+            return frame_length, message_id
+
+        if len(buffer) - index < mavlink.HEADER_LEN_V1:
+            return None
+
+        return mavlink.HEADER_LEN_V1 + buffer[index + 1] + cls.__CHECKSUM_LENGTH, buffer[index + 5]
+
+    @staticmethod
+    def is_end_of_stream(connection: mavutil.mavfile) -> bool:
+        """
+        Returns whether an empty read of the connection, right after it was found readable,
+        means the vehicle closed it. A closed stream stays readable, so it must not be waited
+        on again. A UDP socket is readable once for an ICMP error instead, and an automatically
+        reconnecting connection has already reconnected.
+        """
+        return not isinstance(connection, mavutil.mavudp) and not getattr(
+            connection, "autoreconnect", False
+        )
+
+    def parse(self, data: bytes) -> int:
+        """
+        Dispatches every frame completed by the data, keeping any incomplete frame for later.
+        The header is read inline rather than with `read_header()` , as this runs per frame.
+
+        Returns the number of frames dispatched.
+        """
+        buffer = self.__buffer
+        buffer += data
+        end = len(buffer)
+        index = 0
+        count = 0
+        while index < end:
+            marker = buffer[index]
+            if marker not in self.__MARKERS:
+                index = self.__find_marker(buffer, index)
+                continue
+
+            if marker == mavlink.PROTOCOL_MARKER_V2:
+                if end - index < mavlink.HEADER_LEN_V2:
+                    break
+
+                checksum_end = mavlink.HEADER_LEN_V2 + buffer[index + 1] + self.__CHECKSUM_LENGTH
+                frame_length = checksum_end
+                if buffer[index + 2] & mavlink.MAVLINK_IFLAG_SIGNED:
+                    frame_length += mavlink.MAVLINK_SIGNATURE_BLOCK_LEN
+
+                message_id = buffer[index + 7] | buffer[index + 8] << 8 | buffer[index + 9] << 16
+            else:
+                if end - index < mavlink.HEADER_LEN_V1:
+                    break
+
+                checksum_end = mavlink.HEADER_LEN_V1 + buffer[index + 1] + self.__CHECKSUM_LENGTH
+                frame_length = checksum_end
+                message_id = buffer[index + 5]
+
+            if end - index < frame_length:
+                break
+
+            handlers = self.__message_handlers.get(message_id)
+            # Decoding checks the checksum of handled frames
+            if handlers is None and not self.__is_checksum_valid(
+                buffer, index, index + checksum_end, message_id
+            ):
+                # Corrupted, or a marker byte that does not start a frame
+                self.bad_count += 1
+                index += 1
+                continue
+
+            frame = buffer[index : index + frame_length]
+            if handlers is None:
+                self.skipped_count += 1
+            else:
+                try:
+                    message = self.__mav.decode(frame)
+                except mavlink.MAVError:
+                    # Corrupted, or a marker byte that does not start a frame
+                    self.bad_count += 1
+                    index += 1
+                    continue
+
+                # Same as pymavlink, for the age of the message
+                message._timestamp = time.time()  # pylint: disable=protected-access
+                self.decoded_count += 1
+                for handler in handlers:
+                    handler(message)
+
+            if self.__frame_handler is not None:
+                self.__frame_handler(message_id, frame)
+
+            index += frame_length
+            count += 1
+
+        del buffer[:index]
+        return count
+
+    @staticmethod
+    def get_checksum(
+        buffer: "bytes | bytearray", index: int, checksum_end: int, message_id: int
+    ) -> "int | None":
+        """
+        Computes the checksum of the frame at the index, whose checksum ends at `checksum_end` .
+
+        Returns the checksum, None if the dialect does not have the message id.
+        """
+        message_class = mavlink.mavlink_map.get(message_id)
+        if message_class is None:
+            return None
+
+        # Same as pymavlink, over the frame after the marker and up to the checksum
+        checksum = mavlink.x25crc(bytes(buffer[index + 1 : checksum_end - 2]))
+        checksum.accumulate(bytes((message_class.crc_extra,)))
+        return checksum.crc
+
+    @classmethod
+    def __is_checksum_valid(
+        cls, buffer: bytearray, index: int, checksum_end: int, message_id: int
+    ) -> bool:
+        """
+        Returns whether the frame at the index has the checksum of its message id,
+        False if the dialect does not have the message id.
+        """
+        checksum = cls.get_checksum(buffer, index, checksum_end, message_id)
+        return checksum == buffer[checksum_end - 2] | buffer[checksum_end - 1] << 8
+
+    def __find_marker(self, buffer: bytearray, index: int) -> int:
+        """
+        Returns the index of the next frame marker after the index, the end if there is none.
+        """
+        self.bad_count += 1
+        positions = [buffer.find(marker, index + 1) for marker in self.__MARKERS]
+        positions = [position for position in positions if position >= 0]
+        return min(positions) if len(positions) > 0 else len(buffer)
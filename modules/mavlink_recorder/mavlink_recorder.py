@@ -0,0 +1,249 @@
+"""
+Records every MAVLink frame received to a tlog, for post-flight analysis.
+"""
+
+import pathlib
+import queue
+import select
+import threading
+import time
+
+from pymavlink import mavutil
+
+from . import tlog
+from ..common.modules.logger import logger
+from ..mavlink_reader import message_dispatcher
+
+
+class RecorderSnapshot:
+    """
+    Recording over the interval since the previous snapshot.
+    """
+
+    def __init__(
+        self,
+        frame_count: int,
+        byte_count: int,
+        backlog: int,
+        interval: float,
+    ) -> None:
+        self.frame_count = frame_count
+        # Of the tlog, including timestamps
+        self.byte_count = byte_count
+        # Batches of frames received but not yet written, at the time of the snapshot
+        self.backlog = backlog
+        # Per second during the interval
+        self.frame_rate = frame_count / interval if interval > 0.0 else 0.0
+        self.byte_rate = byte_count / interval if interval > 0.0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"recorded: {self.frame_count} ({self.frame_rate:.1f}/s, "
+            f"{self.byte_rate / 1e3:.1f}kB/s), "
+            f"backlog: {self.backlog}"
+        )
+
+
+class MavlinkRecorder:  # pylint: disable=too-many-instance-attributes
+    """
+    Receives every frame from its connection, timestamps it, and hands it to a background
+    writer thread, so that receiving never waits for the disk.
+
+    A connection with a socket is read in large chunks and split into frames by their header,
+    without decoding. Others are received from with `recv_match()` .
+
+    Timestamps are microseconds since the epoch as tlogs require, but taken from the monotonic
+    clock, so that they never decrease and seeking the index stays correct.
+    """
+
+    __create_key = object()
+
+    # Time waiting for the connection to be readable
+    __READ_TIMEOUT = 0.1  # seconds
+    # Maximum reads at once, so that the caller still checks for exit
+    __MAX_READ_COUNT = 100
+    # Maximum bytes read from the socket at once
+    __READ_SIZE = 65536
+    # Longest time recorded frames stay in the writer's buffers
+    __FLUSH_PERIOD = 1.0  # seconds
+
+    @classmethod
+    def create(
+        cls,
+        connection: mavutil.mavfile,
+        path: pathlib.Path,
+        local_logger: logger.Logger,
+    ) -> "tuple[bool, MavlinkRecorder | None]":
+        """
+        connection: Connection that receives every message, and that only this recorder uses.
+        path: Tlog to record to, continued if it already exists.
+        local_logger: Existing logger from process.
+
+        Returns whether the tlog was opened and the recorder.
+        """
+        result, writer = tlog.TlogWriter.create(path, local_logger)
+        if not result:
+            return False, None
+
+        # Get Pylance to stop complaining
+        assert writer is not None
+
+        return True, MavlinkRecorder(cls.__create_key, connection, writer, local_logger)
+
+    def __init__(
+        self,
+        class_private_create_key: object,
+        connection: mavutil.mavfile,
+        writer: tlog.TlogWriter,
+        local_logger: logger.Logger,
+    ) -> None:
+        """
+        Private constructor, use create() method.
+        """
+        assert class_private_create_key is MavlinkRecorder.__create_key, "Use create() method"
+
+        self.__connection = connection
+        self.__local_logger = local_logger
+        # Wall clock time of monotonic clock 0, in microseconds
+        self.__clock_offset = (time.time() - time.monotonic()) * 1e6
+        # Frames of the current read, as timestamp, message id, and bytes
+        self.__batch: "list[tuple[int, int, bytes]]" = []
+        # Continues after the last record of a tlog left by a previous recorder
+        self.__timestamp = writer.last_timestamp
+
+        self.__dispatcher = None
+        if getattr(connection, "fd", None) is not None:
+            self.__dispatcher = message_dispatcher.MessageDispatcher()
+            self.__dispatcher.set_frame_handler(self.__add_frame)
+
+        # Batches for the writer thread, None to stop it
+        self.__batches: "queue.SimpleQueue[list[tuple[int, int, bytes]] | None]" = (
+            queue.SimpleQueue()
+        )
+        self.__writer = writer
+        self.__writer_thread = threading.Thread(target=self.__write_batches, daemon=True)
+        self.__writer_thread.start()
+
+        self.__frame_count = 0
+        self.__snapshot_time = time.monotonic()
+        self.__snapshot_size = writer.get_size()
+
+    def __get_timestamp(self) -> int:
+        """
+        Returns now in microseconds since the epoch, never less than the previous timestamp.
+        """
+        self.__timestamp = max(int(time.monotonic() * 1e6 + self.__clock_offset), self.__timestamp)
+        return self.__timestamp
+
+    def __add_frame(self, message_id: int, frame: bytearray) -> None:
+        """
+        Keeps the frame to hand to the writer with the others of the read.
+        """
+        self.__batch.append((self.__timestamp, message_id, bytes(frame)))
+
+    def run(self) -> int:
+        """
+        Waits for the connection, then records everything already received.
+
+        Returns the number of frames recorded.
+        """
+        if self.__dispatcher is None:
+            self.__receive_matching()
+        else:
+            self.__read_frames(self.__dispatcher)
+
+        count = len(self.__batch)
+        if count > 0:
+            self.__batches.put(self.__batch)
+            self.__batch = []
+            self.__frame_count += count
+
+        return count
+
+    def __receive_matching(self) -> None:
+        """
+        Receives messages with `recv_match()`, which decodes every message.
+        """
+        blocking = True
+        for _ in range(self.__MAX_READ_COUNT):
+            message = self.__connection.recv_match(
+                blocking=blocking, timeout=self.__READ_TIMEOUT if blocking else None
+            )
+            if message is None:
+                return
+
+            blocking = False
+            self.__get_timestamp()
+            self.__add_frame(message.get_msgId(), message.get_msgbuf())
+
+    def __read_frames(self, dispatcher: message_dispatcher.MessageDispatcher) -> None:
+        """
+        Waits for the socket, then reads everything already received and splits it into frames.
+        Raises ConnectionError if the vehicle closed the connection.
+        """
+        readable, _, _ = select.select([self.__connection.fd], [], [], self.__READ_TIMEOUT)
+        if len(readable) == 0:
+            return
+
+        for i in range(self.__MAX_READ_COUNT):
+            # Empty once there is nothing more to read
+            data = self.__connection.recv(self.__READ_SIZE)
+            if len(data) == 0:
+                if i == 0 and message_dispatcher.MessageDispatcher.is_end_of_stream(
+                    self.__connection
+                ):
+                    raise ConnectionError("Connection closed by the vehicle")
+
+                return
+
+            self.__get_timestamp()
+            dispatcher.parse(data)
+
+    def __write_batches(self) -> None:
+        """
+        Writer thread, writes batches until stopped, flushing at least once per flush period.
+        """
+        previous_flush_time = time.monotonic()
+        while True:
+            try:
+                batch = self.__batches.get(timeout=self.__FLUSH_PERIOD)
+            except queue.Empty:
+                batch = []
+
+            if batch is None:
+                return
+
+            try:
+                for timestamp, message_id, frame in batch:
+                    self.__writer.append(timestamp, message_id, frame)
+
+                if time.monotonic() - previous_flush_time >= self.__FLUSH_PERIOD:
+                    previous_flush_time = time.monotonic()
+                    self.__writer.flush()
+            except OSError as e:
+                self.__local_logger.error(f"Failed to write tlog {self.__writer.path}: {e}")
+
+    def snapshot(self) -> RecorderSnapshot:
+        """
+        Statistics since the previous snapshot.
+        """
+        now = time.monotonic()
+        size = self.__writer.get_size()
+        snapshot = RecorderSnapshot(
+            self.__frame_count,
+            size - self.__snapshot_size,
+            self.__batches.qsize(),
+            now - self.__snapshot_time,
+        )
+        self.__frame_count = 0
+        self.__snapshot_time = now
+        self.__snapshot_size = size
+        return snapshot
+
+    def close(self) -> None:
+        """
+        Writes the remaining frames, then closes the tlog.
+        """
+        self.__batches.put(None)
+        self.__writer_thread.join()
+        self.__writer.close()
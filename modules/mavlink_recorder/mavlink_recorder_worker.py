@@ -0,0 +1,78 @@
+"""
+MAVLink recorder worker that records every received frame to a tlog.
+"""
+
+import os
+import pathlib
+import time
+
+from pymavlink import mavutil
+
+from utilities.workers import queue_proxy_wrapper
+from utilities.workers import worker_controller
+from . import mavlink_recorder
+from ..common.modules.logger import logger
+
+
+def mavlink_recorder_worker(
+    connection: mavutil.mavfile,
+    path: pathlib.Path,
+    report_period: float,
+    output_queue: queue_proxy_wrapper.QueueProxyWrapper,
+    controller: worker_controller.WorkerController,
+) -> None:
+    """
+    Worker process.
+
+    connection: Connection that receives every message, and that only this worker uses.
+    path: Tlog to record to, continued if the worker is restarted.
+    report_period: Time between recording statistics in seconds.
+    output_queue: Recording statistics for main.
+    """
+    # Instantiate logger
+    worker_name = pathlib.Path(__file__).stem
+    process_id = os.getpid()
+    result, local_logger = logger.Logger.create(f"{worker_name}_{process_id}", True)
+    if not result:
+        print("ERROR: Worker failed to create logger")
+        return
+
+    # Get Pylance to stop complaining
+    assert local_logger is not None
+
+    local_logger.info("Logger initialized", True)
+
+    # Instantiate class object (mavlink_recorder.MavlinkRecorder)
+    result, recorder = mavlink_recorder.MavlinkRecorder.create(connection, path, local_logger)
+    if not result:
+        local_logger.error("Failed to create MavlinkRecorder")
+        return
+
+    # Get Pylance to stop complaining
+    assert recorder is not None
+
+    # Main loop: do work.
+    previous_report_time = time.monotonic()
+    while not controller.is_exit_requested():
+        # Method blocks worker if pause has been requested
+        controller.check_pause()
+        # Main sees a stall if reading the connection or writing the tlog hangs
+        controller.report_progress()
+
+        try:
+            recorder.run()
+        except ConnectionError as e:
+            # A closed connection stays readable, reading it again would only spin
+            local_logger.error(f"Connection lost, exiting: {e}", True)
+            break
+        except (OSError, ValueError) as e:
+            local_logger.error(f"Failed to read connection: {e}", True)
+
+        if time.monotonic() - previous_report_time >= report_period:
+            previous_report_time = time.monotonic()
+            output_queue.put(recorder.snapshot())
+
+    # Write the frames still buffered, the tlog is complete up to here
+    recorder.close()
+
+    local_logger.info(f"MAVLink recorder loop exited, recorded to {path}")
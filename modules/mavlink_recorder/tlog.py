@@ -0,0 +1,416 @@
+"""
+Telemetry log (tlog) of raw MAVLink frames, with a time index of every frame and of each type.
+"""
+
+import bisect
+import mmap
+import os
+import pathlib
+import struct
+
+from ..common.modules.logger import logger
+from ..mavlink_reader import message_dispatcher
+
+
+# Each tlog record is the receive time in microseconds since the epoch, then the frame as is,
+# which is the format of ground control stations and `mavutil.mavlogfile`
+RECORD_HEADER = struct.Struct(">Q")
+# Each index entry is a record's timestamp, its offset in the tlog, and the frame's length
+INDEX_ENTRY = struct.Struct("<QQI")
+
+INDEX_DIRECTORY_SUFFIX = ".index"
+ALL_INDEX_NAME = "all"
+INDEX_FILE_SUFFIX = ".idx"
+
+
+def get_index_path(path: pathlib.Path, message_id: "int | None") -> pathlib.Path:
+    """
+    Index file of every frame of the tlog, or of the frames of the message id.
+    """
+    name = ALL_INDEX_NAME if message_id is None else str(message_id)
+    return pathlib.Path(f"{path}{INDEX_DIRECTORY_SUFFIX}", f"{name}{INDEX_FILE_SUFFIX}")
+
+
+class _IndexView:
+    """
+    Timestamps of a memory-mapped index, as a sequence for `bisect` .
+    """
+
+    def __init__(self, index: "mmap.mmap | bytes", count: int) -> None:
+        self.__index = index
+        self.__count = count
+
+    def __len__(self) -> int:
+        return self.__count
+
+    def __getitem__(self, position: int) -> int:
+        return INDEX_ENTRY.unpack_from(self.__index, position * INDEX_ENTRY.size)[0]
+
+
+class TlogWriter:
+    """
+    Appends records to a tlog, and an entry for each to the index of every frame
+    and to the index of its message id.
+
+    An existing tlog is appended to, after dropping any record that a writer killed
+    in the middle of writing left incomplete or unindexed, so a restarted recorder continues it.
+    """
+
+    __create_key = object()
+
+    @classmethod
+    def create(
+        cls, path: pathlib.Path, local_logger: logger.Logger
+    ) -> "tuple[bool, TlogWriter | None]":
+        """
+        path: Tlog to write, created along with its directory and index directory if needed.
+        local_logger: Existing logger from process.
+
+        Returns whether the files were opened and the writer.
+        """
+        is_unindexed = (
+            path.exists() and path.stat().st_size > 0 and not get_index_path(path, None).exists()
+        )
+        if is_unindexed and not build_index(path, local_logger):
+            return False, None
+
+        try:
+            get_index_path(path, None).parent.mkdir(parents=True, exist_ok=True)
+            end, last_timestamp = cls.__recover(path)
+            file = open(path, "ab")  # pylint: disable=consider-using-with
+            # Created now, as it marks the tlog as indexed even before the first record
+            # pylint: disable-next=consider-using-with
+            all_index_file = open(get_index_path(path, None), "ab")
+        except OSError as e:
+            local_logger.error(f"Failed to open tlog {path}: {e}", True)
+            return False, None
+
+        return True, TlogWriter(cls.__create_key, path, file, all_index_file, end, last_timestamp)
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        class_private_create_key: object,
+        path: pathlib.Path,
+        file: object,
+        all_index_file: object,
+        end: int,
+        last_timestamp: int,
+    ) -> None:
+        """
+        Private constructor, use create() method.
+        """
+        assert class_private_create_key is TlogWriter.__create_key, "Use create() method"
+
+        self.path = path
+        self.__file = file
+        self.__end = end
+        # Of the latest record, in microseconds since the epoch
+        self.last_timestamp = last_timestamp
+        # Message id to its index file, None for the index of every frame,
+        # opened when first used
+        self.__index_files = {None: all_index_file}
+
+    @staticmethod
+    def __recover(path: pathlib.Path) -> "tuple[int, int]":
+        """
+        Truncates the tlog and its indexes to the records that are both complete and indexed.
+
+        Returns the size of the tlog and the timestamp of its last record, 0 if none.
+        """
+        all_index_path = get_index_path(path, None)
+        if not path.exists() or not all_index_path.exists():
+            # New, or empty with no index, so any index left over is of another tlog
+            for index_path in all_index_path.parent.glob(f"*{INDEX_FILE_SUFFIX}"):
+                index_path.unlink()
+
+            path.touch()
+            return 0, 0
+
+        size = path.stat().st_size
+        with open(all_index_path, "rb") as file:
+            index = file.read()
+
+        # Records are written before their entries, so incomplete records are at the end
+        count = len(index) // INDEX_ENTRY.size
+        end = 0
+        last_timestamp = 0
+        while count > 0:
+            timestamp, offset, length = INDEX_ENTRY.unpack_from(
+                index, (count - 1) * INDEX_ENTRY.size
+            )
+            if offset + RECORD_HEADER.size + length <= size:
+                end = offset + RECORD_HEADER.size + length
+                last_timestamp = timestamp
+                break
+
+            count -= 1
+
+        os.truncate(path, end)
+        for index_path in all_index_path.parent.glob(f"*{INDEX_FILE_SUFFIX}"):
+            with open(index_path, "rb") as file:
+                index = file.read()
+
+            index_count = len(index) // INDEX_ENTRY.size
+            while index_count > 0:
+                _, offset, _ = INDEX_ENTRY.unpack_from(index, (index_count - 1) * INDEX_ENTRY.size)
+                if offset < end:
+                    break
+
+                index_count -= 1
+
+            os.truncate(index_path, index_count * INDEX_ENTRY.size)
+
+        return end, last_timestamp
+
+    def append(self, timestamp: int, message_id: int, frame: "bytes | bytearray") -> None:
+        """
+        Appends the frame as a record, timestamps must not decrease.
+
+        timestamp: Receive time in microseconds since the epoch.
+        """
+        offset = self.__end
+        self.__file.write(RECORD_HEADER.pack(timestamp))
+        self.__file.write(frame)
+        self.__end += RECORD_HEADER.size + len(frame)
+        self.last_timestamp = timestamp
+
+        entry = INDEX_ENTRY.pack(timestamp, offset, len(frame))
+        self.__get_index_file(None).write(entry)
+        self.__get_index_file(message_id).write(entry)
+
+    def __get_index_file(self, message_id: "int | None") -> object:
+        """
+        Returns the index file of the message id, opening it if needed.
+        """
+        index_file = self.__index_files.get(message_id)
+        if index_file is None:
+            # pylint: disable-next=consider-using-with
+            index_file = open(get_index_path(self.path, message_id), "ab")
+            self.__index_files[message_id] = index_file
+
+        return index_file
+
+    def get_size(self) -> int:
+        """
+        Returns the size of the tlog in bytes, including records not yet flushed.
+        """
+        return self.__end
+
+    def flush(self) -> None:
+        """
+        Writes buffered records, then their entries, so that entries never point past the tlog.
+        """
+        self.__file.flush()
+        for index_file in self.__index_files.values():
+            index_file.flush()
+
+    def close(self) -> None:
+        """
+        Flushes and closes the files.
+        """
+        self.flush()
+        self.__file.close()
+        for index_file in self.__index_files.values():
+            index_file.close()
+
+        self.__index_files = {}
+
+
+class TlogReader:
+    """
+    Memory-maps a tlog and its indexes, so that finding the frames at a time, of every type
+    or of 1 type, is a binary search of the index instead of a scan of the tlog.
+
+    Positions are of frames in the index, of every frame or of the message type's frames.
+    Frames recorded after the reader was created are not seen.
+    """
+
+    __create_key = object()
+
+    @classmethod
+    def create(
+        cls, path: pathlib.Path, local_logger: logger.Logger
+    ) -> "tuple[bool, TlogReader | None]":
+        """
+        path: Tlog to read, indexed with `build_index()` first if it was not recorded
+        by TlogWriter.
+        local_logger: Existing logger from process.
+
+        Returns whether the files were opened and the reader.
+        """
+        if not get_index_path(path, None).exists():
+            local_logger.error(f"Tlog {path} is not indexed", True)
+            return False, None
+
+        try:
+            with open(path, "rb") as file:
+                tlog = cls.__map(file)
+        except OSError as e:
+            local_logger.error(f"Failed to open tlog {path}: {e}", True)
+            return False, None
+
+        return True, TlogReader(cls.__create_key, path, tlog)
+
+    def __init__(
+        self, class_private_create_key: object, path: pathlib.Path, tlog: "mmap.mmap | bytes"
+    ) -> None:
+        """
+        Private constructor, use create() method.
+        """
+        assert class_private_create_key is TlogReader.__create_key, "Use create() method"
+
+        self.path = path
+        self.__tlog = tlog
+        # Message id to its index and entry count, None for the index of every frame
+        self.__indexes: "dict[int | None, tuple[mmap.mmap | bytes, int]]" = {}
+
+    @staticmethod
+    def __map(file: object) -> "mmap.mmap | bytes":
+        """
+        Memory-maps the whole file read only, an empty file cannot be mapped.
+        """
+        if os.fstat(file.fileno()).st_size == 0:
+            return b""
+
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __get_index(self, message_type: "str | None") -> "tuple[mmap.mmap | bytes, int]":
+        """
+        Returns the index of every frame, or of the message type, and its entry count.
+        """
+        message_id = None
+        if message_type is not None:
+            message_id = message_dispatcher.MessageDispatcher.get_message_id(message_type)
+            if message_id is None:
+                return b"", 0
+
+        index = self.__indexes.get(message_id)
+        if index is None:
+            index = (b"", 0)
+            try:
+                with open(get_index_path(self.path, message_id), "rb") as file:
+                    index_map = self.__map(file)
+                    index = (index_map, len(index_map) // INDEX_ENTRY.size)
+            except FileNotFoundError:
+                # No frame of the message type was recorded
+                pass
+
+            self.__indexes[message_id] = index
+
+        return index
+
+    def get_frame_count(self, message_type: "str | None" = None) -> int:
+        """
+        Returns the number of frames, or of frames of the message type.
+        """
+        return self.__get_index(message_type)[1]
+
+    def get_frame(self, position: int, message_type: "str | None" = None) -> "tuple[int, bytes]":
+        """
+        Returns the timestamp in microseconds since the epoch and the bytes of the frame
+        at the position.
+        """
+        index, _ = self.__get_index(message_type)
+        timestamp, offset, length = INDEX_ENTRY.unpack_from(index, position * INDEX_ENTRY.size)
+        start = offset + RECORD_HEADER.size
+        return timestamp, self.__tlog[start : start + length]
+
+    def seek(self, timestamp: int, message_type: "str | None" = None) -> int:
+        """
+        Returns the position of the first frame at or after the time,
+        the frame count if there is none.
+
+        timestamp: Microseconds since the epoch.
+        """
+        index, count = self.__get_index(message_type)
+        return bisect.bisect_left(_IndexView(index, count), timestamp)
+
+    def get_frames(
+        self, start_time: int, end_time: int, message_type: "str | None" = None
+    ) -> "list[tuple[int, bytes]]":
+        """
+        Returns the timestamps and bytes of the frames from the start time
+        up to but not including the end time, in microseconds since the epoch.
+        """
+        start = self.seek(start_time, message_type)
+        end = self.seek(end_time, message_type)
+        return [self.get_frame(position, message_type) for position in range(start, end)]
+
+    def get_time_range(self) -> "tuple[int, int] | None":
+        """
+        Returns the timestamps of the first and last frames, None if there are none.
+        """
+        count = self.get_frame_count()
+        if count == 0:
+            return None
+
+        return self.get_frame(0)[0], self.get_frame(count - 1)[0]
+
+    def close(self) -> None:
+        """
+        Unmaps the files.
+        """
+        for index, _ in self.__indexes.values():
+            if isinstance(index, mmap.mmap):
+                index.close()
+
+        if isinstance(self.__tlog, mmap.mmap):
+            self.__tlog.close()
+
+        self.__indexes = {}
+
+
+def build_index(path: pathlib.Path, local_logger: logger.Logger) -> bool:
+    """
+    Indexes a tlog recorded by something else, replacing any existing index.
+    Scans the whole tlog once, stopping at the first record that is not a MAVLink frame.
+    Seeking assumes that timestamps do not decrease, as when recorded by TlogWriter.
+
+    Returns whether the tlog was indexed.
+    """
+    try:
+        with open(path, "rb") as file:
+            data = file.read()
+    except OSError as e:
+        local_logger.error(f"Failed to read tlog {path}: {e}", True)
+        return False
+
+    records = []
+    offset = 0
+    while offset + RECORD_HEADER.size < len(data):
+        timestamp = RECORD_HEADER.unpack_from(data, offset)[0]
+        header = message_dispatcher.MessageDispatcher.read_header(data, offset + RECORD_HEADER.size)
+        if header is None:
+            break
+
+        length, message_id = header
+        if offset + RECORD_HEADER.size + length > len(data):
+            break
+
+        records.append((timestamp, message_id, offset, length))
+        offset += RECORD_HEADER.size + length
+
+    if offset < len(data):
+        local_logger.warning(f"Tlog {path} indexed up to byte {offset} of {len(data)}")
+
+    try:
+        index_directory = get_index_path(path, None).parent
+        index_directory.mkdir(parents=True, exist_ok=True)
+        for index_path in index_directory.glob(f"*{INDEX_FILE_SUFFIX}"):
+            index_path.unlink()
+
+        entries = {}
+        for timestamp, message_id, record_offset, length in records:
+            entry = INDEX_ENTRY.pack(timestamp, record_offset, length)
+            entries.setdefault(None, []).append(entry)
+            entries.setdefault(message_id, []).append(entry)
+
+        # Written even if empty, as it marks the tlog as indexed
+        entries.setdefault(None, [])
+        for message_id, message_entries in entries.items():
+            get_index_path(path, message_id).write_bytes(b"".join(message_entries))
+    except OSError as e:
+        local_logger.error(f"Failed to write index of tlog {path}: {e}", True)
+        return False
+
+    return True
@@ -0,0 +1,333 @@
+"""
+Replays a recorded tlog to a client as if it were the vehicle, for repeatable benchmarks.
+"""
+
+import pathlib
+import select
+import socket
+import time
+
+from utilities.workers import queue_statistics
+from ..common.modules.logger import logger
+from ..mavlink_reader import message_dispatcher
+from ..mavlink_recorder import tlog
+
+
+class ReplayResult:  # pylint: disable=too-many-instance-attributes
+    """
+    Frames sent by a replay, and how closely they kept to the schedule.
+    Lags are upper bounds of histogram buckets, so at most 12% over the true value.
+    """
+
+    def __init__(
+        self,
+        frame_count: int,
+        byte_count: int,
+        received_count: int,
+        duration: float,
+        lag_percentiles: "tuple[float, float, float]",
+    ) -> None:
+        self.frame_count = frame_count
+        self.byte_count = byte_count
+        # Frames sent by the client, such as heartbeats and commands
+        self.received_count = received_count
+        # Seconds from the start of the replay to the last write
+        self.duration = duration
+        # Per second during the replay
+        self.frame_rate = frame_count / duration if duration > 0.0 else 0.0
+        self.byte_rate = byte_count / duration if duration > 0.0 else 0.0
+        # Seconds each write was later than scheduled, 0 when not paced
+        self.lag_p50, self.lag_p95, self.lag_p99 = lag_percentiles
+
+    def __str__(self) -> str:
+        return (
+            f"sent: {self.frame_count} ({self.frame_rate:.1f}/s, "
+            f"{self.byte_rate / 1e3:.1f}kB/s) in {self.duration:.3f}s, "
+            f"received: {self.received_count}, "
+            f"lag p50: {self.lag_p50 * 1e3:.3f}ms, "
+            f"p95: {self.lag_p95 * 1e3:.3f}ms, "
+            f"p99: {self.lag_p99 * 1e3:.3f}ms"
+        )
+
+
+class MavlinkReplay:  # pylint: disable=too-many-instance-attributes
+    """
+    Serves the frames of a tlog on a `tcpin:` address, like the mock drones,
+    to a client connecting with `tcp:` .
+
+    Frames are sent as recorded, in order, and the frames recorded with the same timestamp,
+    which arrived together, are sent in 1 write. Writes are paced by the recorded timestamps
+    divided by the speed, scheduled from the first write so that lateness does not accumulate,
+    or sent back to back as fast as the client reads. Writes block instead of dropping frames,
+    so every run delivers the same bytes in the same order and at the same times.
+
+    The replay starts once the client has sent its first frame, usually a heartbeat,
+    so the client is ready and the start does not depend on how long it took to connect.
+    What the client sends is read and counted, so that it never blocks on a full socket.
+    """
+
+    __create_key = object()
+
+    __CONNECTION_PREFIX = "tcpin:"
+    # Bytes per write when not paced
+    __MAX_WRITE_SIZE = 65536
+    __READ_SIZE = 65536
+    # Time waiting for the client to read before giving up on it
+    __SEND_TIMEOUT = 5.0  # seconds
+
+    @classmethod
+    def create(  # pylint: disable=too-many-arguments
+        cls,
+        path: pathlib.Path,
+        connection_string: str,
+        speed: "float | None",
+        local_logger: logger.Logger,
+        start_time: "int | None" = None,
+        end_time: "int | None" = None,
+    ) -> "tuple[bool, MavlinkReplay | None]":
+        """
+        path: Tlog to replay, indexed first if it is not.
+        connection_string: `tcpin:host:port` to listen on.
+        speed: Multiple of real time, 1 for real time, None for as fast as possible.
+        local_logger: Existing logger from process.
+        start_time: Replays from the first frame at or after this time, None from the start.
+        end_time: Replays up to but not including this time, None to the end.
+        Times are microseconds since the epoch, as recorded.
+
+        Returns whether the tlog was opened and the address listened on, and the replay.
+        """
+        if speed is not None and speed <= 0.0:
+            local_logger.error(f"Replay speed must be greater than 0, got {speed}", True)
+            return False, None
+
+        if not connection_string.startswith(cls.__CONNECTION_PREFIX):
+            local_logger.error(f"Replay must listen on a tcpin address: {connection_string}", True)
+            return False, None
+
+        host, _, port = connection_string[len(cls.__CONNECTION_PREFIX) :].rpartition(":")
+        if not port.isdigit():
+            local_logger.error(f"Invalid replay address: {connection_string}", True)
+            return False, None
+
+        if not tlog.get_index_path(path, None).exists() and not tlog.build_index(
+            path, local_logger
+        ):
+            return False, None
+
+        result, reader = tlog.TlogReader.create(path, local_logger)
+        if not result:
+            return False, None
+
+        # Get Pylance to stop complaining
+        assert reader is not None
+
+        listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listen_socket.bind((host, int(port)))
+            listen_socket.listen(1)
+        except OSError as e:
+            local_logger.error(f"Failed to listen on {connection_string}: {e}", True)
+            listen_socket.close()
+            reader.close()
+            return False, None
+
+        start = 0 if start_time is None else reader.seek(start_time)
+        end = reader.get_frame_count() if end_time is None else reader.seek(end_time)
+        return True, MavlinkReplay(
+            cls.__create_key, reader, listen_socket, speed, (start, end), local_logger
+        )
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        class_private_create_key: object,
+        reader: tlog.TlogReader,
+        listen_socket: socket.socket,
+        speed: "float | None",
+        positions: "tuple[int, int]",
+        local_logger: logger.Logger,
+    ) -> None:
+        """
+        Private constructor, use create() method.
+        """
+        assert class_private_create_key is MavlinkReplay.__create_key, "Use create() method"
+
+        self.__reader = reader
+        self.__listen_socket = listen_socket
+        self.__speed = speed
+        self.__start, self.__end = positions
+        self.__local_logger = local_logger
+        self.__client_socket = None
+        # Counts the frames the client sends, without decoding them
+        self.__received_count = 0
+        self.__dispatcher = message_dispatcher.MessageDispatcher()
+        self.__dispatcher.set_frame_handler(self.__count_frame)
+
+    def get_frame_count(self) -> int:
+        """
+        Returns the number of frames the replay sends.
+        """
+        return self.__end - self.__start
+
+    def __count_frame(self, _message_id: int, _frame: bytearray) -> None:
+        self.__received_count += 1
+
+    def wait_for_client(self, timeout: float) -> bool:
+        """
+        Waits for a client to connect and send its first frame.
+
+        Returns whether it did within the timeout in seconds.
+        """
+        deadline = time.monotonic() + timeout
+        self.__listen_socket.settimeout(timeout)
+        try:
+            self.__client_socket, _ = self.__listen_socket.accept()
+        except OSError as e:
+            self.__local_logger.error(f"No client connected: {e}", True)
+            return False
+
+        self.__client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        while self.__received_count == 0:
+            remaining_time = deadline - time.monotonic()
+            if remaining_time <= 0.0:
+                self.__local_logger.error("Client sent nothing", True)
+                return False
+
+            self.__client_socket.settimeout(remaining_time)
+            try:
+                data = self.__client_socket.recv(self.__READ_SIZE)
+            except OSError as e:
+                self.__local_logger.error(f"Client sent nothing: {e}", True)
+                return False
+
+            if len(data) == 0:
+                self.__local_logger.error("Client disconnected", True)
+                return False
+
+            self.__dispatcher.parse(data)
+
+        self.__client_socket.settimeout(self.__SEND_TIMEOUT)
+        return True
+
+    def __receive(self) -> bool:
+        """
+        Reads whatever the client has sent, without waiting.
+
+        Returns whether the client is still connected.
+        """
+        # Polled, as a socket with a timeout waits in recv() even when asked not to
+        while len(select.select([self.__client_socket], [], [], 0.0)[0]) > 0:
+            data = self.__client_socket.recv(self.__READ_SIZE)
+            if len(data) == 0:
+                return False
+
+            self.__dispatcher.parse(data)
+
+        return True
+
+    def run(self) -> ReplayResult:
+        """
+        Sends every frame to the client connected by `wait_for_client()` , stopping early
+        if the client disconnects or stops reading.
+
+        Returns what was sent.
+        """
+        assert self.__client_socket is not None, "Call wait_for_client() first"
+
+        histogram = [0] * queue_statistics.QueueStatistics.BUCKET_COUNT
+        frame_count = 0
+        byte_count = 0
+        first_timestamp = None
+        start_time = time.monotonic()
+        # Frames of the next write, their size, and when they are due
+        frames = []
+        write_size = 0
+        due_time = start_time
+        try:
+            for position in range(self.__start, self.__end):
+                timestamp, frame = self.__reader.get_frame(position)
+                if first_timestamp is None:
+                    first_timestamp = timestamp
+
+                frame_due_time = start_time
+                if self.__speed is None:
+                    is_next_write = write_size + len(frame) > self.__MAX_WRITE_SIZE
+                else:
+                    frame_due_time += (timestamp - first_timestamp) / 1e6 / self.__speed
+                    is_next_write = frame_due_time != due_time
+
+                if is_next_write and len(frames) > 0:
+                    if not self.__write(frames, due_time, histogram):
+                        break
+
+                    frame_count += len(frames)
+                    byte_count += write_size
+                    frames = []
+                    write_size = 0
+
+                due_time = frame_due_time
+                frames.append(frame)
+                write_size += len(frame)
+            else:
+                if len(frames) > 0 and self.__write(frames, due_time, histogram):
+                    frame_count += len(frames)
+                    byte_count += write_size
+        except OSError as e:
+            self.__local_logger.error(f"Failed to send to the client: {e}", True)
+
+        return ReplayResult(
+            frame_count,
+            byte_count,
+            self.__received_count,
+            time.monotonic() - start_time,
+            (
+                queue_statistics.QueueStatistics.get_percentile(histogram, 0.50),
+                queue_statistics.QueueStatistics.get_percentile(histogram, 0.95),
+                queue_statistics.QueueStatistics.get_percentile(histogram, 0.99),
+            ),
+        )
+
+    def __write(self, frames: "list[bytes]", due_time: float, histogram: "list[int]") -> bool:
+        """
+        Waits until the frames are due if paced, sends them in 1 write,
+        then reads what the client has sent.
+
+        Returns whether the client is still connected.
+        """
+        lag = 0.0
+        if self.__speed is not None:
+            delay = due_time - time.monotonic()
+            if delay > 0.0:
+                time.sleep(delay)
+
+            lag = time.monotonic() - due_time
+
+        histogram[queue_statistics.QueueStatistics.get_bucket(lag)] += 1
+        self.__client_socket.sendall(b"".join(frames))
+        if not self.__receive():
+            self.__local_logger.warning("Client disconnected during the replay")
+            return False
+
+        return True
+
+    def close(self) -> None:
+        """
+        Disconnects the client, stops listening, and closes the tlog.
+
+        The client is disconnected once it has closed its side, up to the send timeout,
+        as closing with what it sends unread would reset the connection
+        and discard what it has not read yet.
+        """
+        if self.__client_socket is not None:
+            try:
+                self.__client_socket.shutdown(socket.SHUT_WR)
+                while len(self.__client_socket.recv(self.__READ_SIZE)) > 0:
+                    pass
+            except OSError:
+                pass
+
+            self.__client_socket.close()
+            self.__client_socket = None
+
+        self.__listen_socket.close()
+        self.__reader.close()
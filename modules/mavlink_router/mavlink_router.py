@@ -0,0 +1,434 @@
+"""
+Routes the one MAVLink connection to a local endpoint of each worker.
+"""
+
+import json
+import os
+import select
+import socket
+import time
+
+from pymavlink import mavutil
+from pymavlink.dialects.v20 import all as mavlink
+
+from utilities.workers import queue_statistics
+from ..common.modules.logger import logger
+from ..mavlink_reader import message_dispatcher
+
+
+class RouterSnapshot:  # pylint: disable=too-many-instance-attributes
+    """
+    Forwarding over the interval since the previous snapshot.
+    Latencies are upper bounds of histogram buckets, so at most 12% over the true value.
+    """
+
+    def __init__(
+        self,
+        endpoint_count: int,
+        forward_count: int,
+        upstream_count: int,
+        interval: float,
+        latency_percentiles: "tuple[float, float, float]",
+    ) -> None:
+        self.endpoint_count = endpoint_count
+        # Messages sent to endpoints, a message sent to 2 endpoints counts twice
+        self.forward_count = forward_count
+        # Messages from endpoints written to the connection
+        self.upstream_count = upstream_count
+        # Messages per second during the interval
+        self.forward_rate = forward_count / interval if interval > 0.0 else 0.0
+        self.upstream_rate = upstream_count / interval if interval > 0.0 else 0.0
+        # Seconds from the connection being readable to the message being sent to all endpoints
+        self.latency_p50, self.latency_p95, self.latency_p99 = latency_percentiles
+
+    def __str__(self) -> str:
+        return (
+            f"endpoints: {self.endpoint_count}, "
+            f"forwarded: {self.forward_rate:.1f}/s, "
+            f"upstream: {self.upstream_rate:.1f}/s, "
+            f"latency p50: {self.latency_p50 * 1e3:.3f}ms, "
+            f"p95: {self.latency_p95 * 1e3:.3f}ms, "
+            f"p99: {self.latency_p99 * 1e3:.3f}ms"
+        )
+
+
+class EndpointConnection:
+    """
+    Stands in for `mavutil.mavfile` in a worker, connected to the router instead of the vehicle.
+
+    The UDP socket is opened in the process that first uses the connection,
+    so every worker process gets its own endpoint even if they were given the same object.
+    Workers on threads of 1 process share the endpoint.
+    """
+
+    # Repeated so that a restarted router learns the endpoint again
+    __REGISTRATION_PERIOD = 1.0  # seconds
+
+    def __init__(
+        self,
+        router_address: "tuple[str, int]",
+        message_types: "list[str] | None",
+        source_system: int,
+        source_component: int,
+    ) -> None:
+        """
+        router_address: Host and port of the router.
+        message_types: Types forwarded to this endpoint, None for all, empty to only send.
+        source_system: System id of the messages sent, the same as the vehicle connection's.
+        source_component: Component id of the messages sent.
+        """
+        self.router_address = router_address
+        self.message_types = message_types
+        self.source_system = source_system
+        self.source_component = source_component
+        self.__connection = None
+        self.__process_id = None
+        self.__registration_time = 0.0
+
+    def __getstate__(self) -> dict:
+        # The socket belongs to the process that opened it
+        state = self.__dict__.copy()
+        state["_EndpointConnection__connection"] = None
+        state["_EndpointConnection__process_id"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+
+    def __getattr__(self, name: str) -> object:
+        # Everything, such as mav and recv_match, is of the connection of this process
+        return getattr(self.get_connection(), name)
+
+    def get_connection(self) -> mavutil.mavfile:
+        """
+        Returns the connection of this process, opening it if needed.
+        """
+        if self.__connection is None or self.__process_id != os.getpid():
+            host, port = self.router_address
+            self.__connection = mavutil.mavlink_connection(
+                f"udpout:{host}:{port}",
+                source_system=self.source_system,
+                source_component=self.source_component,
+            )
+            self.__process_id = os.getpid()
+            self.__registration_time = 0.0
+
+        now = time.monotonic()
+        if now - self.__registration_time >= self.__REGISTRATION_PERIOD:
+            self.__registration_time = now
+            self.__connection.write(MavlinkRouter.encode_registration(self.message_types))
+
+        return self.__connection
+
+
+class MavlinkRouter:  # pylint: disable=too-many-instance-attributes
+    """
+    Sole user of the vehicle connection, relaying it to an endpoint of each worker
+    over loopback UDP. Each endpoint is sent the messages of the types it subscribed to,
+    and anything an endpoint sends is written to the connection.
+
+    Messages are never decoded: frames are read in large chunks, routed by the message id
+    in their header, and forwarded as received.
+
+    Each endpoint packs its frames with its own sequence numbers, which interleaved would look
+    like lost messages to the vehicle, so the router renumbers frames sent upstream in one
+    sequence. Endpoints that stop registering, as their worker has exited, are removed.
+
+    Create in main before starting workers, so that endpoint registrations
+    wait in the socket until the router runs.
+    """
+
+    __create_key = object()
+
+    # Starts every registration datagram, which MAVLink frames never start with
+    __REGISTRATION_PREFIX = b"\x00register"
+
+    __READ_TIMEOUT = 0.1  # seconds
+    # Time without a registration before an endpoint is removed, several registration periods
+    __ENDPOINT_TIMEOUT = 5.0  # seconds
+    __MAX_DATAGRAM_SIZE = 65535  # bytes
+    # Maximum reads of the connection at once, so that endpoints are still served
+    __MAX_READ_COUNT = 100
+
+    @classmethod
+    def create(
+        cls,
+        connection: mavutil.mavfile,
+        address: "tuple[str, int]",
+        local_logger: logger.Logger,
+    ) -> "tuple[bool, MavlinkRouter | None]":
+        """
+        connection: Connection to the vehicle, that only this router receives from.
+        address: Local host and port that endpoints connect to.
+        local_logger: Existing logger from process.
+
+        Returns whether the router was created and the router.
+        """
+        if getattr(connection, "fd", None) is None:
+            local_logger.error("Connection has no file descriptor to wait on", True)
+            return False, None
+
+        router_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            router_socket.bind(address)
+        except OSError as e:
+            router_socket.close()
+            local_logger.error(f"Failed to bind router to {address}: {e}", True)
+            return False, None
+
+        router_socket.setblocking(False)
+        return True, MavlinkRouter(cls.__create_key, connection, router_socket, local_logger)
+
+    def __init__(
+        self,
+        class_private_create_key: object,
+        connection: mavutil.mavfile,
+        router_socket: socket.socket,
+        local_logger: logger.Logger,
+    ) -> None:
+        """
+        Private constructor, use create() method.
+        """
+        assert class_private_create_key is MavlinkRouter.__create_key, "Use create() method"
+
+        self.__connection = connection
+        self.__socket = router_socket
+        self.address = router_socket.getsockname()
+        self.__local_logger = local_logger
+        # Endpoint address to the ids of the message types it subscribed to, None for all
+        self.__endpoints: "dict[tuple[str, int], set[int] | None]" = {}
+        # Endpoint address to when it last registered
+        self.__registration_times: "dict[tuple[str, int], float]" = {}
+        self.__previous_expiry_time = time.monotonic()
+        # Of the next frame written to the connection
+        self.__sequence = 0
+        self.__dispatcher = message_dispatcher.MessageDispatcher()
+        self.__dispatcher.set_frame_handler(self.__forward_frame)
+        # When the connection was last readable, for the latency of the frames read
+        self.__ready_time = 0.0
+
+        # Since the previous snapshot
+        self.__forward_count = 0
+        self.__upstream_count = 0
+        self.__histogram = [0] * queue_statistics.QueueStatistics.BUCKET_COUNT
+        self.__previous_snapshot_time = time.monotonic()
+
+    @classmethod
+    def encode_registration(cls, message_types: "list[str] | None") -> bytes:
+        """
+        Datagram an endpoint sends to subscribe to the message types.
+        """
+        return cls.__REGISTRATION_PREFIX + json.dumps(message_types).encode()
+
+    def create_connection(self, message_types: "list[str] | None") -> EndpointConnection:
+        """
+        Returns a connection for a worker, opened by the worker when first used.
+
+        message_types: Types forwarded to the worker, None for all, empty to only send.
+        """
+        return EndpointConnection(
+            self.address,
+            message_types,
+            self.__connection.source_system,
+            self.__connection.source_component,
+        )
+
+    def get_endpoint_count(self) -> int:
+        """
+        Returns the number of registered endpoints.
+        """
+        return len(self.__endpoints)
+
+    def run(self) -> None:
+        """
+        Waits for either side to be readable, then forwards everything received.
+        Raises ConnectionError if the vehicle closed the connection.
+        """
+        try:
+            readable, _, _ = select.select(
+                [self.__connection.fd, self.__socket], [], [], self.__READ_TIMEOUT
+            )
+        except (OSError, ValueError) as e:
+            self.__local_logger.error(f"Failed to wait for the connection: {e}", True)
+            return
+
+        if self.__socket in readable:
+            self.__forward_upstream()
+
+        if self.__connection.fd in readable:
+            self.__ready_time = time.monotonic()
+            self.__forward_downstream()
+
+        if time.monotonic() - self.__previous_expiry_time >= self.__ENDPOINT_TIMEOUT:
+            self.__previous_expiry_time = time.monotonic()
+            self.__expire_endpoints()
+
+    def __forward_downstream(self) -> None:
+        """
+        Reads everything already received from the vehicle and forwards its frames.
+        """
+        for i in range(self.__MAX_READ_COUNT):
+            # Empty once there is nothing more to read
+            data = self.__connection.recv(self.__MAX_DATAGRAM_SIZE)
+            if len(data) == 0:
+                if i == 0 and message_dispatcher.MessageDispatcher.is_end_of_stream(
+                    self.__connection
+                ):
+                    raise ConnectionError("Connection closed by the vehicle")
+
+                return
+
+            self.__dispatcher.parse(data)
+
+    def __forward_frame(self, message_id: int, frame: bytearray) -> None:
+        """
+        Sends the frame to the endpoints subscribed to its message id.
+        """
+        for address, message_ids in list(self.__endpoints.items()):
+            if message_ids is not None and message_id not in message_ids:
+                continue
+
+            try:
+                self.__socket.sendto(frame, address)
+            except OSError as e:
+                # The worker has exited, it registers again from its new socket if restarted
+                self.__local_logger.warning(f"Removed endpoint {address}: {e}")
+                self.__remove_endpoint(address)
+                continue
+
+            self.__forward_count += 1
+
+        latency = time.monotonic() - self.__ready_time
+        self.__histogram[queue_statistics.QueueStatistics.get_bucket(latency)] += 1
+
+    def __forward_upstream(self) -> None:
+        """
+        Registers endpoints and writes what they send to the connection.
+        """
+        while True:
+            try:
+                data, address = self.__socket.recvfrom(self.__MAX_DATAGRAM_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                self.__local_logger.warning(f"Failed to receive from endpoint: {e}")
+                return
+
+            if data.startswith(self.__REGISTRATION_PREFIX):
+                self.__register(address, data[len(self.__REGISTRATION_PREFIX) :])
+                continue
+
+            self.__connection.write(self.__renumber(data))
+            self.__upstream_count += 1
+
+    def __renumber(self, data: bytes) -> bytes:
+        """
+        Gives each frame of the data the next sequence number, recomputing its checksum.
+        Frames with a bad checksum are left as they are for the vehicle to drop, as are signed
+        frames and those of message ids not in the dialect, which cannot be checksummed again.
+        """
+        frames = bytearray(data)
+        index = 0
+        while True:
+            header = message_dispatcher.MessageDispatcher.read_header(frames, index)
+            if header is None or index + header[0] > len(frames):
+                break
+
+            frame_length, message_id = header
+            checksum_end = index + frame_length
+            sequence_index = index + 2
+            if frames[index] == mavlink.PROTOCOL_MARKER_V2:
+                sequence_index = index + 4
+                if frames[index + 2] & mavlink.MAVLINK_IFLAG_SIGNED:
+                    index += frame_length
+                    continue
+
+            checksum = message_dispatcher.MessageDispatcher.get_checksum(
+                frames, index, checksum_end, message_id
+            )
+            if checksum == frames[checksum_end - 2] | frames[checksum_end - 1] << 8:
+                frames[sequence_index] = self.__sequence
+                self.__sequence = (self.__sequence + 1) % 256
+                checksum = message_dispatcher.MessageDispatcher.get_checksum(
+                    frames, index, checksum_end, message_id
+                )
+                # Get Pylance to stop complaining
+                assert checksum is not None
+                frames[checksum_end - 2 : checksum_end] = checksum.to_bytes(2, "little")
+
+            index += frame_length
+
+        return bytes(frames)
+
+    def __register(self, address: "tuple[str, int]", data: bytes) -> None:
+        """
+        Adds or updates the endpoint at the address.
+        """
+        try:
+            message_types = json.loads(data)
+        except ValueError:
+            self.__local_logger.warning(f"Invalid registration from {address}")
+            return
+
+        subscription = None
+        if message_types is not None:
+            subscription = set()
+            for message_type in message_types:
+                message_id = message_dispatcher.MessageDispatcher.get_message_id(message_type)
+                if message_id is None:
+                    self.__local_logger.warning(f"Endpoint {address} unknown type {message_type}")
+                    continue
+
+                subscription.add(message_id)
+
+        if address not in self.__endpoints:
+            self.__local_logger.info(f"Endpoint {address} subscribed to {message_types}")
+
+        self.__endpoints[address] = subscription
+        self.__registration_times[address] = time.monotonic()
+
+    def __expire_endpoints(self) -> None:
+        """
+        Removes endpoints that have not registered within the timeout.
+        """
+        now = time.monotonic()
+        for address, registration_time in list(self.__registration_times.items()):
+            if now - registration_time >= self.__ENDPOINT_TIMEOUT:
+                self.__local_logger.warning(f"Removed endpoint {address}: no longer registering")
+                self.__remove_endpoint(address)
+
+    def __remove_endpoint(self, address: "tuple[str, int]") -> None:
+        """
+        Stops forwarding to the endpoint, until it registers again.
+        """
+        self.__endpoints.pop(address, None)
+        self.__registration_times.pop(address, None)
+
+    def snapshot(self) -> RouterSnapshot:
+        """
+        Forwarding since the previous snapshot.
+        """
+        now = time.monotonic()
+        snapshot = RouterSnapshot(
+            len(self.__endpoints),
+            self.__forward_count,
+            self.__upstream_count,
+            now - self.__previous_snapshot_time,
+            (
+                queue_statistics.QueueStatistics.get_percentile(self.__histogram, 0.50),
+                queue_statistics.QueueStatistics.get_percentile(self.__histogram, 0.95),
+                queue_statistics.QueueStatistics.get_percentile(self.__histogram, 0.99),
+            ),
+        )
+
+        self.__forward_count = 0
+        self.__upstream_count = 0
+        self.__histogram = [0] * queue_statistics.QueueStatistics.BUCKET_COUNT
+        self.__previous_snapshot_time = now
+        return snapshot
+
+    def close(self) -> None:
+        """
+        Closes the endpoint socket, not the vehicle connection.
+        """
+        self.__socket.close()
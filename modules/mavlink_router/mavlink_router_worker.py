@@ -0,0 +1,62 @@
+"""
+MAVLink router worker that relays the vehicle connection to the other workers.
+"""
+
+import os
+import pathlib
+import time
+
+from utilities.workers import queue_proxy_wrapper
+from utilities.workers import worker_controller
+from . import mavlink_router
+from ..common.modules.logger import logger
+
+
+def mavlink_router_worker(
+    router: mavlink_router.MavlinkRouter,
+    report_period: float,
+    output_queue: queue_proxy_wrapper.QueueProxyWrapper,
+    controller: worker_controller.WorkerController,
+) -> None:
+    """
+    Worker process.
+
+    router: Router created by main, inherited by the worker.
+    report_period: Time between forwarding statistics in seconds.
+    output_queue: Forwarding statistics for main.
+    """
+    # Instantiate logger
+    worker_name = pathlib.Path(__file__).stem
+    process_id = os.getpid()
+    result, local_logger = logger.Logger.create(f"{worker_name}_{process_id}", True)
+    if not result:
+        print("ERROR: Worker failed to create logger")
+        return
+
+    # Get Pylance to stop complaining
+    assert local_logger is not None
+
+    local_logger.info("Logger initialized", True)
+
+    # Main loop: do work.
+    # Counted from here, not from whenever main created the router
+    router.snapshot()
+    previous_report_time = time.monotonic()
+    while not controller.is_exit_requested():
+        # Method blocks worker if pause has been requested
+        controller.check_pause()
+        # Main sees a stall if reading or forwarding a frame hangs
+        controller.report_progress()
+
+        try:
+            router.run()
+        except ConnectionError as e:
+            # A closed connection stays readable, reading it again would only spin
+            local_logger.error(f"Connection lost, exiting: {e}", True)
+            break
+
+        if time.monotonic() - previous_report_time >= report_period:
+            previous_report_time = time.monotonic()
+            output_queue.put(router.snapshot())
+
+    local_logger.info("MAVLink router loop exited")
@@ -2,18 +2,47 @@
 Telemetry gathering logic.
 """
 
+import struct
+import threading
 import time
 
 from pymavlink import mavutil
 
+from utilities.workers import latency_trace
 from ..common.modules.logger import logger
 
 
 class TelemetryData:  # pylint: disable=too-many-instance-attributes
     """
     Python struct to represent Telemtry Data. Contains the most recent attitude and position reading.
+
+    Pickled as its fixed layout binary encoding instead of an attribute dictionary,
+    so every queue sends it compactly. The trace, if any, is pickled alongside the encoding.
     """
 
+    __FIELDS = (
+        "time_since_boot",
+        "x",
+        "y",
+        "z",
+        "x_velocity",
+        "y_velocity",
+        "z_velocity",
+        "roll",
+        "pitch",
+        "yaw",
+        "roll_speed",
+        "pitch_speed",
+        "yaw_speed",
+        "system_id",
+    )
+    __slots__ = __FIELDS + ("trace",)
+
+    # Bitmask of the fields that are not None, time since boot, the floats, and the system id
+    __FORMAT = struct.Struct("=Hq12dB")
+    __ALL_PRESENT = (1 << len(__FIELDS)) - 1
+    ENCODED_SIZE = __FORMAT.size
+
     def __init__(
         self,
         time_since_boot: int | None = None,  # ms
@@ -29,6 +58,8 @@ class TelemetryData:  # pylint: disable=too-many-instance-attributes
         roll_speed: float | None = None,  # rad/s
         pitch_speed: float | None = None,  # rad/s
         yaw_speed: float | None = None,  # rad/s
+        system_id: int | None = None,
+        trace: "latency_trace.TraceContext | None" = None,
     ) -> None:
         self.time_since_boot = time_since_boot
         self.x = x
@@ -43,6 +74,57 @@ class TelemetryData:  # pylint: disable=too-many-instance-attributes
         self.roll_speed = roll_speed
         self.pitch_speed = pitch_speed
         self.yaw_speed = yaw_speed
+        # MAVLink system (vehicle) the messages came from
+        self.system_id = system_id
+        # Receive time and stage times of the messages this was formed from
+        self.trace = trace
+
+    def encode(self) -> bytes:
+        """
+        Fixed layout binary encoding, None fields are marked absent in the bitmask.
+        The trace is not encoded.
+        """
+        values = (
+            self.time_since_boot,
+            self.x,
+            self.y,
+            self.z,
+            self.x_velocity,
+            self.y_velocity,
+            self.z_velocity,
+            self.roll,
+            self.pitch,
+            self.yaw,
+            self.roll_speed,
+            self.pitch_speed,
+            self.yaw_speed,
+            self.system_id,
+        )
+        if None not in values:
+            return self.__FORMAT.pack(self.__ALL_PRESENT, *values)
+
+        mask = 0
+        for i, value in enumerate(values):
+            if value is not None:
+                mask |= 1 << i
+
+        return self.__FORMAT.pack(mask, *(0 if value is None else value for value in values))
+
+    @classmethod
+    def decode(
+        cls, data: bytes, trace: "latency_trace.TraceContext | None" = None
+    ) -> "TelemetryData":
+        """
+        Inverse of `encode()` .
+        """
+        mask, *values = cls.__FORMAT.unpack(data)
+        if mask != cls.__ALL_PRESENT:
+            values = [value if mask & (1 << i) else None for i, value in enumerate(values)]
+
+        return cls(*values, trace=trace)
+
+    def __reduce__(self) -> "tuple[object, tuple[bytes, latency_trace.TraceContext | None]]":
+        return _decode_telemetry_data, (self.encode(), self.trace)
 
     def __str__(self) -> str:
         return f"""{{
@@ -58,10 +140,27 @@ class TelemetryData:  # pylint: disable=too-many-instance-attributes
             yaw: {self.yaw},
             roll_speed: {self.roll_speed},
             pitch_speed: {self.pitch_speed},
-            yaw_speed: {self.yaw_speed}
+            yaw_speed: {self.yaw_speed},
+            system_id: {self.system_id}
         }}"""
 
 
+def _decode_telemetry_data(
+    data: bytes, trace: "latency_trace.TraceContext | None" = None
+) -> TelemetryData:
+    """
+    Unpickles TelemetryData, a module function is pickled by reference in fewer bytes.
+    """
+    return TelemetryData.decode(data, trace)
+
+
+def get_system_id(data: TelemetryData) -> "int | None":
+    """
+    Key to shard telemetry by, so that every sample of a vehicle goes to the same worker.
+    """
+    return data.system_id
+
+
 # =================================================================================================
 #                            ↓ BOOTCAMPERS MODIFY BELOW THIS COMMENT ↓
 # =================================================================================================
@@ -70,6 +169,9 @@ class Telemetry:
     Telemetry class to read position and attitude (orientation).
     """
 
+    # Received by the telemetry worker, published to it by the MAVLink reader
+    MESSAGE_TYPES = ["ATTITUDE", "LOCAL_POSITION_NED"]
+
     __private_key = object()
 
     @classmethod
@@ -94,11 +196,17 @@ class Telemetry:
 
         self.connection = connection
         self.logger = local_logger
+        # Sequence id of the next trace
+        self.sequence_id = 0
+        # Unique among running workers whatever the backend, so traces of several workers differ
+        self.trace_source = f"telemetry_{threading.get_native_id()}"
 
     def run(self) -> "TelemetryData | None":
         """
         Receive LOCAL_POSITION_NED and ATTITUDE messages from the drone,
         combining them together to form a single TelemetryData object.
+
+        The data is traced from the arrival of the message that completed it.
         """
         last_attitude = None
         last_position = None
@@ -106,10 +214,9 @@ class Telemetry:
 
         while time.time() - start_time < 1.0:
             try:
-                msg = self.connection.recv_match(
-                    type=["ATTITUDE", "LOCAL_POSITION_NED"], timeout=0.1
-                )
+                msg = self.connection.recv_match(type=self.MESSAGE_TYPES, timeout=0.1)
                 if msg:
+                    receive_time = self.__get_receive_time(msg)
                     if msg.get_type() == "ATTITUDE":
                         last_attitude = msg
                         self.logger.info("Received ATTITUDE message")
@@ -133,8 +240,14 @@ class Telemetry:
                             roll_speed=last_attitude.rollspeed,
                             pitch_speed=last_attitude.pitchspeed,
                             yaw_speed=last_attitude.yawspeed,
+                            system_id=msg.get_srcSystem(),
+                            trace=latency_trace.TraceContext(
+                                self.sequence_id, receive_time, self.trace_source
+                            ),
                         )
+                        self.sequence_id += 1
                         self.logger.info(f"Returning TelemetryData: {data}")
+                        data.trace.mark("telemetry")
                         return data
             except (ConnectionError, OSError, ValueError, TimeoutError) as e:
                 self.logger.error(f"Error receiving message: {e}")
@@ -145,6 +258,15 @@ class Telemetry:
         )
         return None
 
+    @staticmethod
+    def __get_receive_time(msg: object) -> float:
+        """
+        Monotonic time the message was read from the connection, which may be before
+        it was published to this worker, from the wall clock time pymavlink stamps it with.
+        """
+        now = time.time()
+        return time.monotonic() - max(now - getattr(msg, "_timestamp", now), 0.0)
+
 
 # =================================================================================================
 #                            ↑ BOOTCAMPERS MODIFY ABOVE THIS COMMENT ↑
@@ -5,26 +5,27 @@ Telemtry worker that gathers GPS data.
 import os
 import pathlib
 
-from pymavlink import mavutil
-
 from utilities.workers import queue_proxy_wrapper
 from utilities.workers import worker_controller
 
 from . import telemetry
 from ..common.modules.logger import logger
+from ..mavlink_reader import mavlink_reader
 
 
 # =================================================================================================
 #                            ↓ BOOTCAMPERS MODIFY BELOW THIS COMMENT ↓
 # =================================================================================================
 def telemetry_worker(
-    connection: mavutil.mavfile,
+    message_queue: queue_proxy_wrapper.QueueProxyWrapper,
     output_queue: queue_proxy_wrapper.QueueProxyWrapper,
     controller: worker_controller.WorkerController,
     # Add other necessary worker arguments here
 ) -> None:
     """
     Worker process.
+
+    message_queue: Attitude and position messages from the MAVLink reader.
     """
     # =============================================================================================
     #                          ↑ BOOTCAMPERS MODIFY ABOVE THIS COMMENT ↑
@@ -47,15 +48,22 @@ def telemetry_worker(
     #                          ↓ BOOTCAMPERS MODIFY BELOW THIS COMMENT ↓
     # =============================================================================================
     # Instantiate class object (telemetry.Telemetry)
+    # Receives from the MAVLink reader instead of the connection
+    connection = mavlink_reader.SubscribedConnection(message_queue)
     result, telemetry_obj = telemetry.Telemetry.create(connection, local_logger)
     if not result:
         local_logger.error("Failed to create Telemetry")
         return
     # Main loop: do work.
     while not controller.is_exit_requested():
+        # Method blocks worker if pause has been requested
+        controller.check_pause()
+        # Main sees a stall if receiving telemetry hangs past its window
+        controller.report_progress()
+
         telemetry_data = telemetry_obj.run()
         if telemetry_data:
-            output_queue.queue.put(telemetry_data)
+            output_queue.put(telemetry_data)
 
 
 # =================================================================================================
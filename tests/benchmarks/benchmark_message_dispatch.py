@@ -0,0 +1,179 @@
+"""
+Compare the time to receive the messages a worker subscribes to from a mixed MAVLink stream,
+decoding every message as `recv_match()` does or only the subscribed ones. To run:
+```
+python -m tests.benchmarks.benchmark_message_dispatch
+```
+"""
+
+import time
+
+from pymavlink.dialects.v20 import all as mavlink
+
+from modules.mavlink_reader import message_dispatcher
+
+
+# 10 messages every 10ms is 1 kHz
+ROUND_COUNT = 2000
+ROUND_PERIOD = 0.01  # seconds
+READ_SIZE = 4096  # bytes, per socket read for bulk reading
+REPEAT_COUNT = 3
+SUBSCRIBED_TYPES = ["ATTITUDE", "LOCAL_POSITION_NED"]
+
+
+def create_round(mav: mavlink.MAVLink, time_boot_ms: int, is_mixed: bool) -> "list[bytes]":
+    """
+    Frames sent by a vehicle in 1 round, 2 of them subscribed if mixed else all.
+    """
+    subscribed = [
+        mavlink.MAVLink_attitude_message(time_boot_ms, 0.1, 0.2, 0.3, 0.01, 0.02, 0.03),
+        mavlink.MAVLink_local_position_ned_message(time_boot_ms, 1.0, 2.0, 3.0, 0.1, 0.2, 0.3),
+    ]
+    if not is_mixed:
+        return [message.pack(mav) for message in subscribed * 5]
+
+    others = [
+        mavlink.MAVLink_raw_imu_message(time_boot_ms, 1, 2, 3, 4, 5, 6, 7, 8, 9),
+        mavlink.MAVLink_scaled_pressure_message(time_boot_ms, 1013.0, 0.1, 2000),
+        mavlink.MAVLink_sys_status_message(0, 0, 0, 500, 12000, 100, 90, 0, 0, 0, 0, 0, 0),
+        mavlink.MAVLink_gps_raw_int_message(time_boot_ms, 3, 1, 2, 3, 100, 100, 10, 0, 10),
+        mavlink.MAVLink_vfr_hud_message(10.0, 10.0, 90, 50, 30.0, 0.5),
+        mavlink.MAVLink_servo_output_raw_message(
+            time_boot_ms, 0, 1500, 1500, 1500, 1500, 0, 0, 0, 0
+        ),
+        mavlink.MAVLink_global_position_int_message(time_boot_ms, 1, 2, 3, 4, 5, 6, 7, 90),
+        mavlink.MAVLink_heartbeat_message(2, 3, 0, 0, 4, 3),
+    ]
+    return [message.pack(mav) for message in subscribed + others]
+
+
+def create_stream(is_mixed: bool) -> "tuple[bytes, int]":
+    """
+    Returns the bytes of every round and the number of messages.
+    """
+    mav = mavlink.MAVLink(None, srcSystem=1)
+    frames = []
+    for i in range(ROUND_COUNT):
+        frames.extend(create_round(mav, int(i * ROUND_PERIOD * 1000), is_mixed))
+
+    return b"".join(frames), len(frames)
+
+
+def receive_matching(stream: bytes) -> int:
+    """
+    Decodes every message like `recv_match()`, reading only the bytes the parser needs next,
+    and keeps the subscribed ones.
+    """
+    mav = mavlink.MAVLink(None)
+    count = 0
+    index = 0
+    while index < len(stream):
+        size = mav.bytes_needed()
+        message = mav.parse_char(stream[index : index + size])
+        index += size
+        if message is not None and message.get_type() in SUBSCRIBED_TYPES:
+            count += 1
+
+    return count
+
+
+def parse_buffer(stream: bytes) -> int:
+    """
+    Reads in bulk but still decodes every message.
+    """
+    mav = mavlink.MAVLink(None)
+    count = 0
+    for i in range(0, len(stream), READ_SIZE):
+        for message in mav.parse_buffer(stream[i : i + READ_SIZE]) or []:
+            if message.get_type() in SUBSCRIBED_TYPES:
+                count += 1
+
+    return count
+
+
+def dispatch(stream: bytes) -> int:
+    """
+    Reads in bulk and decodes only the subscribed messages.
+    """
+    dispatcher = message_dispatcher.MessageDispatcher()
+    messages = []
+    for message_type in SUBSCRIBED_TYPES:
+        dispatcher.register(message_type, messages.append)
+
+    for i in range(0, len(stream), READ_SIZE):
+        dispatcher.parse(stream[i : i + READ_SIZE])
+
+    return len(messages)
+
+
+def dispatch_frames(stream: bytes) -> int:
+    """
+    Reads in bulk and decodes nothing, routing frames by id like the MAVLink router.
+    """
+    dispatcher = message_dispatcher.MessageDispatcher()
+    subscribed_ids = {
+        message_dispatcher.MessageDispatcher.get_message_id(message_type)
+        for message_type in SUBSCRIBED_TYPES
+    }
+    frames = []
+
+    def route(message_id: int, frame: bytes) -> None:
+        if message_id in subscribed_ids:
+            frames.append(frame)
+
+    dispatcher.set_frame_handler(route)
+    for i in range(0, len(stream), READ_SIZE):
+        dispatcher.parse(stream[i : i + READ_SIZE])
+
+    return len(frames)
+
+
+def time_stream(receive: "(bytes) -> int", stream: bytes) -> "tuple[float, int]":  # type: ignore
+    """
+    Returns the best time to receive the stream in seconds and the messages received.
+    """
+    best_time = float("inf")
+    count = 0
+    for _ in range(REPEAT_COUNT):
+        start_time = time.perf_counter()
+        count = receive(stream)
+        best_time = min(best_time, time.perf_counter() - start_time)
+
+    return best_time, count
+
+
+def main() -> int:
+    """
+    Benchmark each way of receiving with the same streams.
+    """
+    methods = [
+        ("recv_match", receive_matching),
+        ("parse_buffer", parse_buffer),
+        ("dispatcher", dispatch),
+        ("dispatch frames", dispatch_frames),
+    ]
+
+    print(f"Stream rate: {10 / ROUND_PERIOD:.0f} messages/s, subscribed: {SUBSCRIBED_TYPES}")
+    print(
+        f"{'method':<18}{'stream':<14}{'received':>10}{'us/message':>12}"
+        f"{'max rate (/s)':>15}{'load at 1 kHz':>15}"
+    )
+    for stream_name, is_mixed in (("20% subscribed", True), ("all subscribed", False)):
+        stream, message_count = create_stream(is_mixed)
+        for name, receive in methods:
+            total_time, count = time_stream(receive, stream)
+            time_per_message = total_time / message_count
+            print(
+                f"{name:<18}{stream_name:<14}{count:>10}{time_per_message * 1e6:>12.2f}"
+                f"{1.0 / time_per_message:>15.0f}{time_per_message * 1000 * 100:>14.1f}%"
+            )
+
+    return 0
+
+
+if __name__ == "__main__":
+    result_main = main()
+    if result_main < 0:
+        print(f"Failed with return code {result_main}")
+    else:
+        print("Done!")
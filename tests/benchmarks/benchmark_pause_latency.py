@@ -0,0 +1,139 @@
+"""
+Measure the cost of checking for a pause and the time for a stage to become quiescent. To run:
+```
+python -m tests.benchmarks.benchmark_pause_latency
+```
+"""
+
+import statistics
+import time
+
+from modules.common.modules.logger import logger
+from modules.common.modules.logger import logger_main_setup
+from modules.common.modules.read_yaml import read_yaml
+from utilities.workers import pipeline as worker_pipeline
+from utilities.workers import worker_controller
+
+
+WORKER_COUNTS = [1, 2, 4, 8]
+WORK_TIME = 0.001  # seconds per item
+REPETITIONS = 20
+CHECK_COUNT = 1_000_000
+QUIESCENCE_TIMEOUT = 5.0  # seconds
+SHUTDOWN_TIMEOUT = 2.0  # seconds
+
+
+def busy_worker(work_time: float, controller: worker_controller.WorkerController) -> None:
+    """
+    Spins for the work time per item, checking for a pause between items.
+    """
+    while not controller.is_exit_requested():
+        controller.check_pause()
+
+        end_time = time.perf_counter() + work_time
+        while time.perf_counter() < end_time:
+            pass
+
+
+def time_check_pause() -> float:
+    """
+    Returns the time in seconds of 1 pause check when not paused.
+    """
+    controller = worker_controller.WorkerController()
+    start_time = time.perf_counter()
+    for _ in range(CHECK_COUNT):
+        controller.check_pause()
+
+    return (time.perf_counter() - start_time) / CHECK_COUNT
+
+
+def run_worker_count(
+    worker_count: int, main_logger: logger.Logger
+) -> "tuple[bool, tuple[float, float]]":
+    """
+    Repeatedly pauses a stage while another stage keeps running, and waits for it to be quiescent.
+
+    Returns whether the benchmark ran, and the median and maximum times in seconds.
+    """
+    controller = worker_controller.WorkerController()
+    result, pipeline = worker_pipeline.Pipeline.create(None, controller, main_logger)
+    if not result:
+        return False, (0.0, 0.0)
+
+    # Get Pylance to stop complaining
+    assert pipeline is not None
+
+    result = (
+        pipeline.add_stage("paused", busy_worker, worker_count, (WORK_TIME,))
+        and pipeline.add_stage("running", busy_worker, worker_count, (WORK_TIME,))
+        and pipeline.build()
+    )
+    if not result:
+        return False, (0.0, 0.0)
+
+    pipeline.start()
+
+    quiescence_times = []
+    for _ in range(REPETITIONS):
+        start_time = time.perf_counter()
+        pipeline.pause_stage("paused")
+        if not pipeline.wait_for_stage_quiescence("paused", QUIESCENCE_TIMEOUT):
+            pipeline.shutdown(SHUTDOWN_TIMEOUT)
+            return False, (0.0, 0.0)
+
+        quiescence_times.append(time.perf_counter() - start_time)
+        pipeline.resume_stage("paused")
+        # Let the workers get back into an item
+        time.sleep(WORK_TIME * 10)
+
+    pipeline.shutdown(SHUTDOWN_TIMEOUT)
+
+    return True, (statistics.median(quiescence_times), max(quiescence_times))
+
+
+def main() -> int:
+    """
+    Benchmark pausing stages of increasing worker counts.
+    """
+    # Configuration settings
+    result, config = read_yaml.open_config(logger.CONFIG_FILE_PATH)
+    if not result:
+        print("ERROR: Failed to load configuration file")
+        return -1
+
+    # Get Pylance to stop complaining
+    assert config is not None
+
+    # Setup main logger
+    result, main_logger, _ = logger_main_setup.setup_main_logger(config)
+    if not result:
+        print("ERROR: Failed to create main logger")
+        return -1
+
+    # Get Pylance to stop complaining
+    assert main_logger is not None
+
+    print(f"Pause check when not paused: {time_check_pause() * 1e9:.1f} ns")
+    print(
+        f"Pause a stage of workers doing {WORK_TIME * 1e3:.1f} ms items, "
+        f"while a stage of as many workers keeps running (ms)"
+    )
+    print(f"{'workers':<10}{'quiescent p50':>16}{'quiescent max':>16}")
+    for worker_count in WORKER_COUNTS:
+        result, times = run_worker_count(worker_count, main_logger)
+        if not result:
+            print(f"Failed to benchmark {worker_count} workers")
+            return -1
+
+        quiescence_median, quiescence_max = times
+        print(f"{worker_count:<10}{quiescence_median * 1e3:>16.3f}{quiescence_max * 1e3:>16.3f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    result_main = main()
+    if result_main < 0:
+        print(f"Failed with return code {result_main}")
+    else:
+        print("Done!")
@@ -0,0 +1,127 @@
+"""
+Compare throughput and latency of the queue backends. To run:
+```
+python -m tests.benchmarks.benchmark_queue_backends
+```
+"""
+
+import multiprocessing as mp
+import time
+
+from modules.telemetry import telemetry
+from utilities.workers import queue_proxy_wrapper
+
+
+MESSAGE_COUNT = 20000
+QUEUE_MAX_SIZE = 256
+CONSUMER_TIMEOUT = 10.0  # seconds
+# Latency is measured at a fixed rate so that it excludes time spent waiting behind a backlog
+LATENCY_MESSAGE_COUNT = 2000
+LATENCY_PERIOD = 0.0005  # seconds
+
+
+def producer(
+    output_queue: queue_proxy_wrapper.QueueProxyWrapper, count: int, period: float
+) -> None:
+    """
+    Puts timestamped telemetry followed by a sentinel.
+
+    period: Time between puts in seconds, 0 for as fast as possible.
+    """
+    data = telemetry.TelemetryData(
+        time_since_boot=1000,
+        x=1.0,
+        y=2.0,
+        z=3.0,
+        x_velocity=0.1,
+        y_velocity=0.2,
+        z_velocity=0.3,
+        roll=0.01,
+        pitch=0.02,
+        yaw=0.03,
+        roll_speed=0.001,
+        pitch_speed=0.002,
+        yaw_speed=0.003,
+    )
+    next_time = time.perf_counter()
+    for _ in range(count):
+        if period > 0.0:
+            next_time += period
+            while time.perf_counter() < next_time:
+                pass
+
+        output_queue.queue.put((time.perf_counter(), data))
+
+    output_queue.queue.put(None)
+
+
+def percentile(sorted_values: "list[float]", fraction: float) -> float:
+    """
+    Nearest rank percentile of already sorted values.
+    """
+    if len(sorted_values) == 0:
+        return 0.0
+
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run_backend(
+    mp_manager: "mp.managers.SyncManager", backend: str, count: int, period: float
+) -> "tuple[float, list[float]]":
+    """
+    Runs one producer process into the main process as the consumer.
+
+    Returns messages per second and sorted latencies in seconds.
+    """
+    benchmark_queue = queue_proxy_wrapper.QueueProxyWrapper(mp_manager, QUEUE_MAX_SIZE, backend)
+
+    latencies = []
+    producer_process = mp.Process(target=producer, args=(benchmark_queue, count, period))
+    start_time = time.perf_counter()
+    producer_process.start()
+    while True:
+        item = benchmark_queue.queue.get(timeout=CONSUMER_TIMEOUT)
+        if item is None:
+            break
+
+        sent_time, _ = item
+        latencies.append(time.perf_counter() - sent_time)
+
+    elapsed_time = time.perf_counter() - start_time
+    producer_process.join()
+    benchmark_queue.close()
+
+    latencies.sort()
+    return len(latencies) / elapsed_time, latencies
+
+
+def main() -> int:
+    """
+    Benchmark every backend with the same workload.
+    """
+    mp_manager = mp.Manager()
+
+    print(f"TelemetryData messages, queue max size {QUEUE_MAX_SIZE}")
+    print(f"Throughput: {MESSAGE_COUNT} messages as fast as possible")
+    print(f"Latency: {LATENCY_MESSAGE_COUNT} messages every {LATENCY_PERIOD * 1e6:.0f} us")
+    print(f"{'backend':<16}{'msg/s':>12}{'p50 (us)':>12}{'p99 (us)':>12}")
+    for backend in (
+        queue_proxy_wrapper.QueueProxyWrapper.BACKEND_MANAGER,
+        queue_proxy_wrapper.QueueProxyWrapper.BACKEND_SHARED_MEMORY,
+    ):
+        rate, _ = run_backend(mp_manager, backend, MESSAGE_COUNT, 0.0)
+        _, latencies = run_backend(mp_manager, backend, LATENCY_MESSAGE_COUNT, LATENCY_PERIOD)
+        p50 = percentile(latencies, 0.50)
+        p99 = percentile(latencies, 0.99)
+        print(f"{backend:<16}{rate:>12.0f}{p50 * 1e6:>12.1f}{p99 * 1e6:>12.1f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    result_main = main()
+    if result_main < 0:
+        print(f"Failed with return code {result_main}")
+    else:
+        print("Done!")
@@ -0,0 +1,200 @@
+"""
+Replay the same recorded flight at different speeds to telemetry and command,
+for throughput and latency that are repeatable from run to run. To run:
+```
+python -m tests.benchmarks.benchmark_replay
+```
+"""
+
+import multiprocessing as mp
+import pathlib
+import tempfile
+import time
+
+from pymavlink import mavutil
+from pymavlink.dialects.v20 import all as mavlink
+
+from modules.command import command
+from modules.common.modules.logger import logger
+from modules.mavlink_recorder import tlog
+from modules.mavlink_replay import mavlink_replay
+from modules.telemetry import telemetry
+from utilities.workers import latency_trace
+
+
+# Like the mock drones: attitude and position every 10ms, and a heartbeat every second
+ROUND_PERIOD = 10_000  # microseconds
+HEARTBEAT_PERIOD = 1_000_000  # microseconds
+FLIGHT_DURATION = 5  # seconds
+START_TIME = 1_700_000_000_000_000  # microseconds since the epoch
+# Multiples of real time, None for as fast as possible
+SPEEDS = [1.0, 5.0, None]
+REPEAT_COUNT = 2
+PORT = 12346
+CLIENT_TIMEOUT = 5.0  # seconds
+
+TARGET = command.Position(10, 20, 30)
+HEIGHT_TOLERANCE = 0.5
+Z_SPEED = 1
+ANGLE_TOLERANCE = 5
+TURNING_SPEED = 5
+
+
+def record_flight(path: pathlib.Path, local_logger: logger.Logger) -> int:
+    """
+    Records a flight climbing and turning towards the target.
+
+    Returns the number of frames recorded.
+    """
+    result, writer = tlog.TlogWriter.create(path, local_logger)
+    assert result
+    assert writer is not None
+
+    mav = mavlink.MAVLink(None, srcSystem=1)
+    count = 0
+    for i in range(FLIGHT_DURATION * 1_000_000 // ROUND_PERIOD):
+        timestamp = START_TIME + i * ROUND_PERIOD
+        time_boot_ms = i * ROUND_PERIOD // 1000
+        messages = [
+            mavlink.MAVLink_attitude_message(time_boot_ms, 0.0, 0.0, i * 0.001, 0.0, 0.0, 0.1),
+            mavlink.MAVLink_local_position_ned_message(
+                time_boot_ms, 0.0, 0.0, i * 0.01, 0.0, 0.0, 1.0
+            ),
+        ]
+        if (i * ROUND_PERIOD) % HEARTBEAT_PERIOD == 0:
+            messages.append(mavlink.MAVLink_heartbeat_message(2, 3, 0, 0, 4, 3))
+
+        for message in messages:
+            writer.append(timestamp, message.get_msgId(), message.pack(mav))
+            count += 1
+
+    writer.close()
+    return count
+
+
+def serve(path: pathlib.Path, speed: "float | None", result_queue: mp.Queue) -> None:
+    """
+    Replays the flight to 1 client, in its own process so the client does not slow it.
+    Puts whether it is listening, then the result or None.
+    """
+    result, local_logger = logger.Logger.create("benchmark_replay_serve", False)
+    assert result
+    assert local_logger is not None
+
+    result, replay = mavlink_replay.MavlinkReplay.create(
+        path, f"tcpin:127.0.0.1:{PORT}", speed, local_logger
+    )
+    result_queue.put(result)
+    if not result:
+        return
+
+    # Get Pylance to stop complaining
+    assert replay is not None
+
+    replay_result = None
+    if replay.wait_for_client(CLIENT_TIMEOUT):
+        replay_result = replay.run()
+
+    replay.close()
+    result_queue.put(replay_result)
+
+
+def run_client(
+    local_logger: logger.Logger, replay_process: mp.Process
+) -> "tuple[int, float, latency_trace.LatencySnapshot | None]":
+    """
+    Receives the replay with telemetry and decides with command, like the pipeline
+    in 1 process, until every round of the flight has been received,
+    or the replay has ended without sending them.
+
+    Returns the number of telemetry samples, the time in seconds from connecting
+    to the last sample, and the latency of the whole trace.
+    """
+    start_time = time.monotonic()
+    connection = mavutil.mavlink_connection(f"tcp:127.0.0.1:{PORT}")
+    connection.mav.heartbeat_send(
+        mavutil.mavlink.MAV_TYPE_GCS, mavutil.mavlink.MAV_AUTOPILOT_INVALID, 0, 0, 0
+    )
+    result, telemetry_instance = telemetry.Telemetry.create(connection, local_logger)
+    assert result
+    result, command_instance = command.Command.create(
+        connection, TARGET, local_logger, HEIGHT_TOLERANCE, Z_SPEED, ANGLE_TOLERANCE, TURNING_SPEED
+    )
+    assert result
+
+    statistics = latency_trace.LatencyStatistics()
+    sample_count = 0
+    end_time = start_time
+    while sample_count < FLIGHT_DURATION * 1_000_000 // ROUND_PERIOD:
+        data = telemetry_instance.run()
+        if data is None:
+            if not replay_process.is_alive():
+                break
+
+            continue
+
+        command_instance.run(data)
+        data.trace.mark("command")
+        statistics.record(data.trace)
+        sample_count += 1
+        end_time = time.monotonic()
+
+    connection.close()
+    snapshots = statistics.snapshot()
+    return sample_count, end_time - start_time, snapshots[-1] if len(snapshots) > 0 else None
+
+
+def main() -> int:
+    """
+    Benchmark each speed with the same flight.
+    """
+    result, local_logger = logger.Logger.create("benchmark_replay", False)
+    if not result:
+        print("ERROR: Failed to create logger")
+        return -1
+
+    # Get Pylance to stop complaining
+    assert local_logger is not None
+
+    print(
+        f"{'speed':<8}{'run':>4}{'frames':>8}{'time (s)':>10}{'samples/s':>11}"
+        f"{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}{'lag p99 (ms)':>14}{'received':>10}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        path = pathlib.Path(directory, "flight.tlog")
+        record_flight(path, local_logger)
+        for speed in SPEEDS:
+            for run in range(REPEAT_COUNT):
+                result_queue = mp.Queue()
+                replay_process = mp.Process(target=serve, args=(path, speed, result_queue))
+                replay_process.start()
+                if not result_queue.get():
+                    replay_process.join()
+                    print("ERROR: Failed to create replay")
+                    return -2
+
+                sample_count, client_time, latency = run_client(local_logger, replay_process)
+                replay_result = result_queue.get()
+                replay_process.join()
+                if replay_result is None or latency is None:
+                    print("ERROR: Replay did not run")
+                    return -3
+
+                name = "max" if speed is None else f"{speed:g}x"
+                print(
+                    f"{name:<8}{run:>4}{replay_result.frame_count:>8}"
+                    f"{replay_result.duration:>10.3f}{sample_count / client_time:>11.1f}"
+                    f"{latency.latency_p50 * 1e3:>10.3f}{latency.latency_p95 * 1e3:>10.3f}"
+                    f"{latency.latency_p99 * 1e3:>10.3f}{replay_result.lag_p99 * 1e3:>14.3f}"
+                    f"{replay_result.received_count:>10}"
+                )
+
+    return 0
+
+
+if __name__ == "__main__":
+    result_main = main()
+    if result_main < 0:
+        print(f"Failed with return code {result_main}")
+    else:
+        print("Done!")
@@ -0,0 +1,105 @@
+"""
+Compare encode and decode time and size of TelemetryData representations. To run:
+```
+python -m tests.benchmarks.benchmark_telemetry_codec
+```
+"""
+
+import pickle
+import timeit
+
+from modules.telemetry import telemetry
+
+
+SAMPLE_COUNT = 100000
+REPEAT_COUNT = 5
+
+
+class DictTelemetryData:  # pylint: disable=too-many-instance-attributes,too-few-public-methods
+    """
+    TelemetryData as it was before, pickled as an attribute dictionary.
+    """
+
+    def __init__(self, data: telemetry.TelemetryData) -> None:
+        self.time_since_boot = data.time_since_boot
+        self.x = data.x
+        self.y = data.y
+        self.z = data.z
+        self.x_velocity = data.x_velocity
+        self.y_velocity = data.y_velocity
+        self.z_velocity = data.z_velocity
+        self.roll = data.roll
+        self.pitch = data.pitch
+        self.yaw = data.yaw
+        self.roll_speed = data.roll_speed
+        self.pitch_speed = data.pitch_speed
+        self.yaw_speed = data.yaw_speed
+
+
+def time_per_sample(statement: "(...) -> object") -> float:  # type: ignore
+    """
+    Returns the best time of the statement in seconds per sample.
+    """
+    return min(timeit.repeat(statement, number=SAMPLE_COUNT, repeat=REPEAT_COUNT)) / SAMPLE_COUNT
+
+
+def main() -> int:
+    """
+    Benchmark each representation with the same sample.
+    """
+    data = telemetry.TelemetryData(
+        time_since_boot=1000,
+        x=1.0,
+        y=2.0,
+        z=3.0,
+        x_velocity=0.1,
+        y_velocity=0.2,
+        z_velocity=0.3,
+        roll=0.01,
+        pitch=0.02,
+        yaw=0.03,
+        roll_speed=0.001,
+        pitch_speed=0.002,
+        yaw_speed=0.003,
+    )
+    dict_data = DictTelemetryData(data)
+    protocol = pickle.HIGHEST_PROTOCOL
+
+    # Pickle is what the queues use, the raw codec is the lower bound
+    dict_pickled = pickle.dumps(dict_data, protocol)
+    pickled = pickle.dumps(data, protocol)
+    encoded = data.encode()
+    rows = [
+        (
+            "dict pickle",
+            len(dict_pickled),
+            time_per_sample(lambda: pickle.dumps(dict_data, protocol)),
+            time_per_sample(lambda: pickle.loads(dict_pickled)),
+        ),
+        (
+            "slots pickle",
+            len(pickled),
+            time_per_sample(lambda: pickle.dumps(data, protocol)),
+            time_per_sample(lambda: pickle.loads(pickled)),
+        ),
+        (
+            "raw codec",
+            len(encoded),
+            time_per_sample(data.encode),
+            time_per_sample(lambda: telemetry.TelemetryData.decode(encoded)),
+        ),
+    ]
+
+    print(f"{'format':<14}{'bytes':>8}{'encode (us)':>14}{'decode (us)':>14}")
+    for name, size, encode_time, decode_time in rows:
+        print(f"{name:<14}{size:>8}{encode_time * 1e6:>14.2f}{decode_time * 1e6:>14.2f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    result_main = main()
+    if result_main < 0:
+        print(f"Failed with return code {result_main}")
+    else:
+        print("Done!")
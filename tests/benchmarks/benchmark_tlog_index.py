@@ -0,0 +1,169 @@
+"""
+Compare the time to get every LOCAL_POSITION_NED of a 1 second window from recorded flights
+of different lengths, by scanning the tlog with pymavlink or by seeking its index. To run:
+```
+python -m tests.benchmarks.benchmark_tlog_index
+```
+"""
+
+import pathlib
+import tempfile
+import time
+
+from pymavlink import mavutil
+from pymavlink.dialects.v20 import all as mavlink
+
+from modules.common.modules.logger import logger
+from modules.mavlink_recorder import tlog
+
+
+# Like the mock drones: position, attitude, and 8 other messages every 10ms is 1 kHz
+ROUND_PERIOD = 10_000  # microseconds
+FLIGHT_DURATIONS = [10, 60, 300]  # seconds
+WINDOW_DURATION = 1_000_000  # microseconds
+START_TIME = 1_700_000_000_000_000  # microseconds since the epoch
+REPEAT_COUNT = 3
+MESSAGE_TYPE = "LOCAL_POSITION_NED"
+
+
+def create_round(mav: mavlink.MAVLink, time_boot_ms: int) -> "list[tuple[int, bytes]]":
+    """
+    Message ids and frames sent by a vehicle in 1 round.
+    """
+    messages = [
+        mavlink.MAVLink_attitude_message(time_boot_ms, 0.1, 0.2, 0.3, 0.01, 0.02, 0.03),
+        mavlink.MAVLink_local_position_ned_message(time_boot_ms, 1.0, 2.0, 3.0, 0.1, 0.2, 0.3),
+        mavlink.MAVLink_raw_imu_message(time_boot_ms, 1, 2, 3, 4, 5, 6, 7, 8, 9),
+        mavlink.MAVLink_scaled_pressure_message(time_boot_ms, 1013.0, 0.1, 2000),
+        mavlink.MAVLink_sys_status_message(0, 0, 0, 500, 12000, 100, 90, 0, 0, 0, 0, 0, 0),
+        mavlink.MAVLink_gps_raw_int_message(time_boot_ms, 3, 1, 2, 3, 100, 100, 10, 0, 10),
+        mavlink.MAVLink_vfr_hud_message(10.0, 10.0, 90, 50, 30.0, 0.5),
+        mavlink.MAVLink_servo_output_raw_message(
+            time_boot_ms, 0, 1500, 1500, 1500, 1500, 0, 0, 0, 0
+        ),
+        mavlink.MAVLink_global_position_int_message(time_boot_ms, 1, 2, 3, 4, 5, 6, 7, 90),
+        mavlink.MAVLink_heartbeat_message(2, 3, 0, 0, 4, 3),
+    ]
+    return [(message.get_msgId(), message.pack(mav)) for message in messages]
+
+
+def record_flight(path: pathlib.Path, duration: int, local_logger: logger.Logger) -> int:
+    """
+    Records a flight of the duration in seconds.
+
+    Returns the number of frames recorded.
+    """
+    result, writer = tlog.TlogWriter.create(path, local_logger)
+    assert result
+    assert writer is not None
+
+    mav = mavlink.MAVLink(None, srcSystem=1)
+    count = 0
+    for i in range(duration * 1_000_000 // ROUND_PERIOD):
+        timestamp = START_TIME + i * ROUND_PERIOD
+        for message_id, frame in create_round(mav, i * ROUND_PERIOD // 1000):
+            writer.append(timestamp, message_id, frame)
+            count += 1
+
+    writer.close()
+    return count
+
+
+def scan(
+    path: pathlib.Path,
+    start_time: int,
+    end_time: int,
+    local_logger: logger.Logger,  # pylint: disable=unused-argument
+) -> int:
+    """
+    Reads the tlog from the start with pymavlink, as without an index.
+
+    Returns the number of messages in the window.
+    """
+    log = mavutil.mavlink_connection(str(path))
+    count = 0
+    while True:
+        message = log.recv_match(type=MESSAGE_TYPE)
+        if message is None:
+            break
+
+        # pylint: disable-next=protected-access
+        timestamp = round(message._timestamp * 1e6)
+        if timestamp >= end_time:
+            break
+
+        if timestamp >= start_time:
+            count += 1
+
+    log.close()
+    return count
+
+
+def seek(path: pathlib.Path, start_time: int, end_time: int, local_logger: logger.Logger) -> int:
+    """
+    Opens the tlog and seeks its index to the window.
+
+    Returns the number of messages in the window.
+    """
+    result, reader = tlog.TlogReader.create(path, local_logger)
+    assert result
+    assert reader is not None
+
+    count = len(reader.get_frames(start_time, end_time, MESSAGE_TYPE))
+    reader.close()
+    return count
+
+
+def time_query(
+    query: "(pathlib.Path, int, int, logger.Logger) -> int",  # type: ignore
+    path: pathlib.Path,
+    start_time: int,
+    local_logger: logger.Logger,
+) -> "tuple[float, int]":
+    """
+    Returns the best time to query the window in seconds and the messages in it.
+    """
+    best_time = float("inf")
+    count = 0
+    for _ in range(REPEAT_COUNT):
+        query_start_time = time.perf_counter()
+        count = query(path, start_time, start_time + WINDOW_DURATION, local_logger)
+        best_time = min(best_time, time.perf_counter() - query_start_time)
+
+    return best_time, count
+
+
+def main() -> int:
+    """
+    Benchmark both ways of querying the same flights, for a window in the middle.
+    """
+    result, local_logger = logger.Logger.create("benchmark_tlog_index", False)
+    if not result:
+        print("ERROR: Failed to create logger")
+        return -1
+
+    # Get Pylance to stop complaining
+    assert local_logger is not None
+
+    print(f"Window: {WINDOW_DURATION / 1e6:.0f}s of {MESSAGE_TYPE}, in the middle of the flight")
+    print(f"{'flight (s)':<12}{'frames':>10}{'method':>8}{'found':>8}{'time (ms)':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for duration in FLIGHT_DURATIONS:
+            path = pathlib.Path(directory, f"flight_{duration}.tlog")
+            frame_count = record_flight(path, duration, local_logger)
+            start_time = START_TIME + duration * 1_000_000 // 2
+            for name, query in (("scan", scan), ("seek", seek)):
+                query_time, count = time_query(query, path, start_time, local_logger)
+                print(
+                    f"{duration:<12}{frame_count:>10}{name:>8}{count:>8}{query_time * 1e3:>12.3f}"
+                )
+
+    return 0
+
+
+if __name__ == "__main__":
+    result_main = main()
+    if result_main < 0:
+        print(f"Failed with return code {result_main}")
+    else:
+        print("Done!")
@@ -0,0 +1,178 @@
+"""
+Compare worker start and restart time of each start method. To run:
+```
+python -m tests.benchmarks.benchmark_worker_startup
+```
+"""
+
+import multiprocessing as mp
+import os
+import pathlib
+import time
+
+# Imported to include its import cost in the worker start time
+from pymavlink import mavutil  # pylint: disable=unused-import
+
+from modules.common.modules.logger import logger
+from modules.common.modules.logger import logger_main_setup
+from modules.common.modules.read_yaml import read_yaml
+from utilities.workers import queue_proxy_wrapper
+from utilities.workers import worker_controller
+from utilities.workers import worker_manager
+
+
+WORKER_COUNT = 4
+FIRST_ITEM_TIMEOUT = 30.0  # seconds
+START_METHODS = ["fork", "forkserver", "spawn"]
+FORKSERVER_PRELOAD_MODULES = [
+    "pymavlink.mavutil",
+    "modules.command.command_worker",
+    "modules.heartbeat.heartbeat_receiver_worker",
+    "modules.heartbeat.heartbeat_sender_worker",
+    "modules.telemetry.telemetry_worker",
+]
+
+
+def startup_probe_worker(
+    output_queue: queue_proxy_wrapper.QueueProxyWrapper,
+    controller: worker_controller.WorkerController,  # pylint: disable=unused-argument
+) -> None:
+    """
+    Does the same setup as a real worker, outputs once, and then exits.
+    """
+    worker_name = pathlib.Path(__file__).stem
+    process_id = os.getpid()
+    result, local_logger = logger.Logger.create(f"{worker_name}_{process_id}", True)
+    if not result:
+        print("ERROR: Worker failed to create logger")
+        return
+
+    # Get Pylance to stop complaining
+    assert local_logger is not None
+
+    output_queue.queue.put(process_id)
+
+
+def time_to_items(
+    output_queue: queue_proxy_wrapper.QueueProxyWrapper, start_time: float
+) -> "tuple[float, float]":
+    """
+    Waits for an item from every worker.
+
+    Returns time in seconds from start to the first item and to the last item.
+    """
+    output_queue.queue.get(timeout=FIRST_ITEM_TIMEOUT)
+    first_time = time.perf_counter() - start_time
+    for _ in range(WORKER_COUNT - 1):
+        output_queue.queue.get(timeout=FIRST_ITEM_TIMEOUT)
+
+    return first_time, time.perf_counter() - start_time
+
+
+def run_start_method(
+    start_method: str, main_logger: logger.Logger
+) -> "tuple[bool, tuple[float, float, float, float]]":
+    """
+    Starts the workers, waits for them to exit, and restarts them.
+
+    Returns whether the benchmark ran, and the first and last item times
+    in seconds of the start and of the restart.
+    """
+    mp.set_start_method(start_method, force=True)
+    if start_method == "forkserver":
+        mp.set_forkserver_preload(FORKSERVER_PRELOAD_MODULES)
+
+    controller = worker_controller.WorkerController()
+    mp_manager = mp.Manager()
+    output_queue = queue_proxy_wrapper.QueueProxyWrapper(mp_manager)
+
+    result, properties = worker_manager.WorkerProperties.create(
+        count=WORKER_COUNT,
+        target=startup_probe_worker,
+        work_arguments=(),
+        input_queues=[],
+        output_queues=[output_queue],
+        controller=controller,
+        local_logger=main_logger,
+    )
+    if not result:
+        return False, (0.0, 0.0, 0.0, 0.0)
+
+    # Get Pylance to stop complaining
+    assert properties is not None
+
+    result, manager = worker_manager.WorkerManager.create(
+        worker_properties=properties,
+        local_logger=main_logger,
+        start_method=start_method,
+    )
+    if not result:
+        return False, (0.0, 0.0, 0.0, 0.0)
+
+    # Get Pylance to stop complaining
+    assert manager is not None
+
+    start_time = time.perf_counter()
+    manager.start_workers()
+    start_first, start_last = time_to_items(output_queue, start_time)
+    manager.join_workers()
+
+    # The probe workers have exited, so all of them are restarted
+    restart_time = time.perf_counter()
+    manager.check_and_restart_dead_workers()
+    restart_first, restart_last = time_to_items(output_queue, restart_time)
+    manager.join_workers()
+
+    mp_manager.shutdown()
+
+    return True, (start_first, start_last, restart_first, restart_last)
+
+
+def main() -> int:
+    """
+    Benchmark every start method with the same workers.
+    """
+    # Configuration settings
+    result, config = read_yaml.open_config(logger.CONFIG_FILE_PATH)
+    if not result:
+        print("ERROR: Failed to load configuration file")
+        return -1
+
+    # Get Pylance to stop complaining
+    assert config is not None
+
+    # Setup main logger
+    result, main_logger, _ = logger_main_setup.setup_main_logger(config)
+    if not result:
+        print("ERROR: Failed to create main logger")
+        return -1
+
+    # Get Pylance to stop complaining
+    assert main_logger is not None
+
+    print(f"{WORKER_COUNT} workers, time from start to first item and to all items (ms)")
+    print(f"{'method':<12}{'start 1st':>12}{'start all':>12}{'restart 1st':>14}{'restart all':>14}")
+    for start_method in START_METHODS:
+        if start_method not in mp.get_all_start_methods():
+            continue
+
+        result, times = run_start_method(start_method, main_logger)
+        if not result:
+            print(f"Failed to benchmark {start_method}")
+            return -1
+
+        start_first, start_last, restart_first, restart_last = times
+        print(
+            f"{start_method:<12}{start_first * 1e3:>12.1f}{start_last * 1e3:>12.1f}"
+            f"{restart_first * 1e3:>14.1f}{restart_last * 1e3:>14.1f}"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    result_main = main()
+    if result_main < 0:
+        print(f"Failed with return code {result_main}")
+    else:
+        print("Done!")
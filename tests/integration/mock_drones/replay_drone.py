@@ -0,0 +1,63 @@
+"""
+Mock drone that replays a recorded flight, for running the pipeline against real traffic.
+"""
+
+import os
+import pathlib
+
+from modules.common.modules.logger import logger
+from modules.mavlink_replay import mavlink_replay
+
+
+CONNECTION_STRING = "tcpin:localhost:12345"
+# Recorded by bootcamp_main into its log directory, or by a ground control station
+TLOG_PATH = pathlib.Path("flight.tlog")
+# Multiple of real time, None for as fast as possible
+REPLAY_SPEED = 1.0
+CLIENT_TIMEOUT = 30  # seconds
+
+
+def main() -> int:
+    """
+    Replay the flight to the first client, once it has sent a heartbeat.
+    """
+    # Instantiate logger
+    drone_name = pathlib.Path(__file__).stem
+    process_id = os.getpid()
+    result, local_logger = logger.Logger.create(f"{drone_name}_{process_id}", True)
+    if not result:
+        print("ERROR: Worker failed to create drone logger")
+        return -1
+
+    # Get Pylance to stop complaining
+    assert local_logger is not None
+
+    local_logger.info("Logger initialized")
+
+    result, replay = mavlink_replay.MavlinkReplay.create(
+        TLOG_PATH, CONNECTION_STRING, REPLAY_SPEED, local_logger
+    )
+    if not result:
+        local_logger.error(f"Failed to create replay of {TLOG_PATH}")
+        return -2
+
+    # Get Pylance to stop complaining
+    assert replay is not None
+
+    local_logger.info(f"Replaying {replay.get_frame_count()} frames from {TLOG_PATH}")
+    if not replay.wait_for_client(CLIENT_TIMEOUT):
+        replay.close()
+        return -3
+
+    replay_result = replay.run()
+    replay.close()
+    local_logger.info(f"Replay: {replay_result}")
+    return 0
+
+
+if __name__ == "__main__":
+    result_main = main()
+    if result_main < 0:
+        print(f"Drone: Failed with return code {result_main}")
+    else:
+        print("Drone: Success!")
@@ -4,7 +4,6 @@ Test the command worker with a mocked drone.
 
 import math
 import multiprocessing as mp
-import queue
 import subprocess
 import threading
 import time
@@ -13,6 +12,7 @@ from pymavlink import mavutil
 
 from modules.command import command
 from modules.command import command_worker
+from modules.command_writer import command_writer_worker
 from modules.common.modules.logger import logger
 from modules.common.modules.logger import logger_main_setup
 from modules.common.modules.read_yaml import read_yaml
@@ -36,6 +36,7 @@ TURNING_SPEED = 5  # deg/s
 #                            ↓ BOOTCAMPERS MODIFY BELOW THIS COMMENT ↓
 # =================================================================================================
 # Add your own constants here
+OUTPUT_BATCH_SIZE = 32
 
 # =================================================================================================
 #                            ↑ BOOTCAMPERS MODIFY ABOVE THIS COMMENT ↑
@@ -72,11 +73,8 @@ def read_queue(
     Read and print the output queue.
     """
     while not controller.is_exit_requested():
-        try:
-            message = output_queue.queue.get(timeout=1)
+        for message in output_queue.get_many(OUTPUT_BATCH_SIZE, timeout=1):
             main_logger.info(message)
-        except queue.Empty:
-            continue
 
     main_logger.info("Read Queue")
 
@@ -147,6 +145,9 @@ def main() -> int:
     # Create your queues
     output_queue_wrapper = queue_proxy_wrapper.QueueProxyWrapper(manager)
     input_queue_wrapper = queue_proxy_wrapper.QueueProxyWrapper(manager)
+    intent_queue_wrapper = queue_proxy_wrapper.QueueProxyWrapper(manager)
+    writer_statistics_queue_wrapper = queue_proxy_wrapper.QueueProxyWrapper(manager)
+    writer_trace_queue_wrapper = queue_proxy_wrapper.QueueProxyWrapper(manager)
 
     # Test cases, DO NOT EDIT!
     path = [
@@ -245,8 +246,22 @@ def main() -> int:
         target=read_queue, args=(output_queue_wrapper, controller, main_logger)
     ).start()
 
+    # The command writer sends the commands, every one of them as they are not rate limited
+    threading.Thread(
+        target=command_writer_worker.command_writer_worker,
+        args=(
+            connection,
+            {},
+            0.0,
+            TELEMETRY_PERIOD * len(path),
+            intent_queue_wrapper,
+            writer_statistics_queue_wrapper,
+            writer_trace_queue_wrapper,
+            controller,
+        ),
+    ).start()
+
     command_worker.command_worker(
-        connection,
         TARGET,
         HEIGHT_TOLERANCE,
         Z_SPEED,
@@ -254,6 +269,7 @@ def main() -> int:
         TURNING_SPEED,
         input_queue_wrapper,
         output_queue_wrapper,
+        intent_queue_wrapper,
         controller,
     )
     # =============================================================================================
@@ -13,6 +13,7 @@ from modules.common.modules.logger import logger
 from modules.common.modules.logger import logger_main_setup
 from modules.common.modules.read_yaml import read_yaml
 from modules.heartbeat import heartbeat_receiver_worker
+from modules.mavlink_reader import mavlink_reader_worker
 from utilities.workers import queue_proxy_wrapper
 from utilities.workers import worker_controller
 
@@ -124,6 +125,10 @@ def main() -> int:
     # Create a multiprocess manager for synchronized queues
     manager = mp.Manager()
     # Create your queues
+    # Only the latest heartbeat, so a missed one is not made up by an older one
+    message_queue_wrapper = queue_proxy_wrapper.QueueProxyWrapper(
+        manager, policy=queue_proxy_wrapper.QueueProxyWrapper.POLICY_LATEST
+    )
     output_queue_wrapper = queue_proxy_wrapper.QueueProxyWrapper(manager)
 
     # Just set a timer to stop the worker after a while, since the worker infinite loops
@@ -138,9 +143,15 @@ def main() -> int:
         target=read_queue, args=(output_queue_wrapper, controller, main_logger)
     ).start()
 
+    # Read the connection for the worker
+    threading.Thread(
+        target=mavlink_reader_worker.mavlink_reader_worker,
+        args=(connection, message_queue_wrapper, None, None, controller),
+    ).start()
+
     heartbeat_receiver_worker.heartbeat_receiver_worker(
-        connection=connection,
         heartbeat_period=HEARTBEAT_PERIOD,
+        message_queue=message_queue_wrapper,
         output_queue=output_queue_wrapper,
         controller=controller,
     )
@@ -12,6 +12,7 @@ from pymavlink import mavutil
 from modules.common.modules.logger import logger
 from modules.common.modules.logger import logger_main_setup
 from modules.common.modules.read_yaml import read_yaml
+from modules.mavlink_reader import mavlink_reader_worker
 from modules.telemetry import telemetry_worker
 from utilities.workers import queue_proxy_wrapper
 from utilities.workers import worker_controller
@@ -122,6 +123,7 @@ def main() -> int:
     # Create a multiprocess manager for synchronized queues
     manager = mp.Manager()
     # Create your queues
+    message_queue_wrapper = queue_proxy_wrapper.QueueProxyWrapper(manager)
     output_queue_wrapper = queue_proxy_wrapper.QueueProxyWrapper(manager)
 
     # Just set a timer to stop the worker after a while, since the worker infinite loops
@@ -132,8 +134,14 @@ def main() -> int:
         target=read_queue, args=(output_queue_wrapper, controller, main_logger)
     ).start()
 
+    # Read the connection for the worker
+    threading.Thread(
+        target=mavlink_reader_worker.mavlink_reader_worker,
+        args=(connection, None, message_queue_wrapper, None, controller),
+    ).start()
+
     telemetry_worker.telemetry_worker(
-        connection=connection,
+        message_queue=message_queue_wrapper,
         output_queue=output_queue_wrapper,
         controller=controller,
     )
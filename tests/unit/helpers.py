@@ -0,0 +1,121 @@
+"""
+Fakes and MAVLink frames shared by the unit tests.
+"""
+
+import pathlib
+import socket
+
+from pymavlink.dialects.v20 import common as mavlink
+
+from modules.mavlink_recorder import tlog
+
+
+HEARTBEAT_ID = mavlink.MAVLINK_MSG_ID_HEARTBEAT
+POSITION_ID = mavlink.MAVLINK_MSG_ID_LOCAL_POSITION_NED
+
+
+class FakeLogger:
+    """
+    Discards logs.
+    """
+
+    def debug(self, message: str, log_with_frame_info: bool = True) -> None:
+        """
+        Discards the log.
+        """
+
+    def info(self, message: str, log_with_frame_info: bool = True) -> None:
+        """
+        Discards the log.
+        """
+
+    def warning(self, message: str, log_with_frame_info: bool = True) -> None:
+        """
+        Discards the log.
+        """
+
+    def error(self, message: str, log_with_frame_info: bool = True) -> None:
+        """
+        Discards the log.
+        """
+
+    def critical(self, message: str, log_with_frame_info: bool = True) -> None:
+        """
+        Discards the log.
+        """
+
+
+class FakeSocketConnection:
+    """
+    Connection with a socket, read in bulk.
+    """
+
+    def __init__(self, connection_socket: socket.socket) -> None:
+        connection_socket.setblocking(False)
+        self.__socket = connection_socket
+        self.fd = connection_socket.fileno()
+
+    def recv(self, n: int) -> bytes:
+        """
+        Same as `mavutil.mavfile.recv()`, empty if there is nothing to read.
+        """
+        try:
+            return self.__socket.recv(n)
+        except BlockingIOError:
+            return b""
+
+
+def get_free_port(socket_type: int = socket.SOCK_STREAM) -> int:
+    """
+    Local port that nothing is bound to.
+
+    socket_type: socket.SOCK_STREAM for TCP, socket.SOCK_DGRAM for UDP.
+    """
+    with socket.socket(socket.AF_INET, socket_type) as free_socket:
+        free_socket.bind(("127.0.0.1", 0))
+        return free_socket.getsockname()[1]
+
+
+def pack(message: object) -> bytes:
+    """
+    Frame of the message.
+    """
+    return message.pack(mavlink.MAVLink(None, srcSystem=1))
+
+
+def heartbeat() -> bytes:
+    """
+    Frame of a heartbeat.
+    """
+    return pack(mavlink.MAVLink_heartbeat_message(0, 0, 0, 0, 0, 3))
+
+
+def position(x: float) -> bytes:
+    """
+    Frame of a position.
+    """
+    return pack(mavlink.MAVLink_local_position_ned_message(0, x, 0.0, 0.0, 0, 0, 0))
+
+
+def write_flight(path: pathlib.Path) -> "list[bytes]":
+    """
+    A heartbeat every second and a position every half second, for 10 seconds from time 1000.
+
+    Returns the frames in order.
+    """
+    result, writer = tlog.TlogWriter.create(path, FakeLogger())
+    assert result
+    assert writer is not None
+
+    frames = []
+    for step in range(20):
+        timestamp = 1000 + step * 500_000
+        if step % 2 == 0:
+            writer.append(timestamp, HEARTBEAT_ID, heartbeat())
+            frames.append(heartbeat())
+
+        writer.append(timestamp, POSITION_ID, position(float(step)))
+        frames.append(position(float(step)))
+
+    writer.close()
+    return frames
@@ -0,0 +1,263 @@
+"""
+Test coalescing and rate limiting commands.
+"""
+
+import time
+
+import pytest
+
+from pymavlink import mavutil
+
+from modules.command_writer import command_writer
+from utilities.workers import latency_trace
+from utilities.workers import queue_proxy_wrapper
+from tests.unit import helpers
+
+
+# Test functions use test fixture signature names
+# No enable
+# pylint: disable=redefined-outer-name
+
+
+CHANGE_ALT = mavutil.mavlink.MAV_CMD_CONDITION_CHANGE_ALT
+YAW = mavutil.mavlink.MAV_CMD_CONDITION_YAW
+SHORT_INTERVAL = 0.05  # seconds
+
+
+class FakeConnection:
+    """
+    Records what is written, or fails to write.
+    """
+
+    source_system = 255
+    source_component = 0
+
+    def __init__(self, is_broken: bool = False) -> None:
+        self.is_broken = is_broken
+        self.writes = []
+
+    def write(self, buffer: bytes) -> None:
+        """
+        Same as `mavutil.mavfile.write()` .
+        """
+        if self.is_broken:
+            raise ConnectionResetError("Connection reset")
+
+        self.writes.append(buffer)
+
+
+def create_intent(command: int, param1: float) -> command_writer.CommandIntent:
+    """
+    Intent for vehicle 1 with only the first parameter set.
+    """
+    return command_writer.CommandIntent(1, 0, command, (param1, 0, 0, 0, 0, 0, 0))
+
+
+def decode(buffer: bytes) -> list:
+    """
+    Messages packed into the buffer.
+    """
+    return mavutil.mavlink.MAVLink(None).parse_buffer(buffer)
+
+
+@pytest.fixture()
+def connection() -> FakeConnection:
+    """
+    Connection that works.
+    """
+    return FakeConnection()
+
+
+def create_writer(
+    connection: FakeConnection, min_intervals: "dict[int, float]"
+) -> command_writer.CommandWriter:
+    """
+    Writer with no minimum interval for commands not given.
+    """
+    result, writer = command_writer.CommandWriter.create(
+        connection, min_intervals, 0.0, helpers.FakeLogger()
+    )
+    assert result
+    assert writer is not None
+    return writer
+
+
+class TestCommandWriter:
+    """
+    Sending the newest intent of each command, at most once per interval.
+    """
+
+    def test_coalesce(self, connection: FakeConnection) -> None:
+        """
+        Only the newest intent of each command is sent, all in 1 write.
+        """
+        # Setup
+        writer = create_writer(connection, {})
+        writer.add(
+            [
+                create_intent(CHANGE_ALT, 1.0),
+                create_intent(YAW, 10.0),
+                create_intent(CHANGE_ALT, 2.0),
+                create_intent(CHANGE_ALT, 3.0),
+            ]
+        )
+
+        # Run
+        count = writer.write()
+        snapshot = writer.snapshot()
+
+        # Test
+        assert count == 2
+        assert len(connection.writes) == 1
+        messages = decode(connection.writes[0])
+        assert [(message.command, message.param1) for message in messages] == [
+            (CHANGE_ALT, 3.0),
+            (YAW, 10.0),
+        ]
+        assert messages[0].get_srcSystem() == FakeConnection.source_system
+        assert messages[1].get_seq() == messages[0].get_seq() + 1
+        assert snapshot.sent_count == 2
+        assert snapshot.suppressed_count == 2
+        assert snapshot.pending_count == 0
+        assert snapshot.write_count == 1
+
+    def test_rate_limit(self, connection: FakeConnection) -> None:
+        """
+        A command is held until its interval has passed, other commands are not.
+        """
+        # Setup
+        writer = create_writer(connection, {CHANGE_ALT: 60.0})
+        writer.add([create_intent(CHANGE_ALT, 1.0)])
+        writer.write()
+
+        # Run
+        writer.add([create_intent(CHANGE_ALT, 2.0), create_intent(YAW, 10.0)])
+        count = writer.write()
+        wait_time = writer.get_wait_time()
+        snapshot = writer.snapshot()
+
+        # Test
+        assert count == 1
+        assert [message.command for message in decode(connection.writes[1])] == [YAW]
+        assert wait_time is not None
+        assert 0.0 < wait_time <= 60.0
+        assert snapshot.sent_count == 2
+        assert snapshot.pending_count == 1
+
+    def test_trace_ends_when_written(self, connection: FakeConnection) -> None:
+        """
+        The trace of an intent held by the rate limit ends when it is written, not before.
+        """
+        # Setup
+        writer = create_writer(connection, {CHANGE_ALT: SHORT_INTERVAL})
+        writer.add([create_intent(CHANGE_ALT, 1.0)])
+        writer.write()
+        trace = latency_trace.TraceContext(0)
+        intent = create_intent(CHANGE_ALT, 2.0)
+        intent.trace = trace
+        writer.add([intent])
+
+        # Run
+        count = writer.write()
+        held_traces = writer.get_sent_traces()
+        stages_while_held = list(trace.stages)
+        time.sleep(writer.get_wait_time() or 0.0)
+        writer.write()
+        sent_traces = writer.get_sent_traces()
+
+        # Test
+        assert count == 0
+        assert len(held_traces) == 0
+        assert len(stages_while_held) == 0
+        assert sent_traces == [trace]
+        assert trace.stages == ["command_send"]
+
+    def test_nothing_pending(self, connection: FakeConnection) -> None:
+        """
+        Nothing is written, and there is nothing to wait for.
+        """
+        writer = create_writer(connection, {})
+        assert writer.write() == 0
+        assert writer.get_wait_time() is None
+        assert len(connection.writes) == 0
+
+    def test_write_failure(self) -> None:
+        """
+        Intents that failed to write are dropped, not sent again.
+        """
+        # Setup
+        connection = FakeConnection(True)
+        writer = create_writer(connection, {})
+        writer.add([create_intent(CHANGE_ALT, 1.0)])
+
+        # Run
+        count = writer.write()
+
+        # Test
+        assert count == 0
+        assert writer.get_wait_time() is None
+        assert writer.snapshot().sent_count == 0
+
+    def test_negative_interval(self, connection: FakeConnection) -> None:
+        """
+        Intervals must not be negative.
+        """
+        result, writer = command_writer.CommandWriter.create(
+            connection, {YAW: -1.0}, 0.0, helpers.FakeLogger()
+        )
+        assert not result
+        assert writer is None
+
+
+class TestIntentConnection:
+    """
+    Queueing commands sent through the connection.
+    """
+
+    def test_flush(self) -> None:
+        """
+        Commands sent since the previous flush are put into the queue.
+        """
+        # Setup
+        intent_queue = queue_proxy_wrapper.QueueProxyWrapper(
+            None, 8, queue_proxy_wrapper.QueueProxyWrapper.BACKEND_SHARED_MEMORY
+        )
+        connection = command_writer.IntentConnection(intent_queue)
+        connection.mav.command_long_send(1, 0, YAW, 0, 10.0, 5, 1, 1, 0, 0, 0, 0)
+
+        # Run
+        count = connection.flush()
+        empty_count = connection.flush()
+        intents = intent_queue.get_many(8)
+        intent_queue.close()
+
+        # Test
+        assert count == 1
+        assert empty_count == 0
+        assert len(intents) == 1
+        assert intents[0].get_key() == (1, 0, YAW)
+        assert intents[0].params == (10.0, 5, 1, 1, 0, 0, 0)
+
+    def test_trace_carried(self) -> None:
+        """
+        The trace attached after a command goes through the queue with it.
+        """
+        # Setup
+        intent_queue = queue_proxy_wrapper.QueueProxyWrapper(
+            None, 8, queue_proxy_wrapper.QueueProxyWrapper.BACKEND_SHARED_MEMORY
+        )
+        connection = command_writer.IntentConnection(intent_queue)
+        trace = latency_trace.TraceContext(7)
+        trace.mark("command_dequeue")
+
+        # Run
+        connection.mav.command_long_send(1, 0, YAW, 0, 10.0, 5, 1, 1, 0, 0, 0, 0)
+        connection.attach_trace(trace)
+        connection.flush()
+        intents = intent_queue.get_many(8)
+        intent_queue.close()
+
+        # Test
+        assert len(intents) == 1
+        assert intents[0].trace.sequence_id == 7
+        assert intents[0].trace.stages == ["command_dequeue"]
@@ -0,0 +1,145 @@
+"""
+Test latency tracing.
+"""
+
+import json
+import pathlib
+
+from utilities.workers import latency_trace
+from tests.unit import helpers
+
+
+def make_trace(
+    sequence_id: int, receive_time: float, times: "list[float]", source: str = ""
+) -> "latency_trace.TraceContext":
+    """
+    Trace with stages "a", "b", ... finishing at the given times.
+    """
+    trace = latency_trace.TraceContext(sequence_id, receive_time, source)
+    for i, stage_time in enumerate(times):
+        trace.stages.append(chr(ord("a") + i))
+        trace.times.append(stage_time)
+
+    return trace
+
+
+class TestTraceContext:
+    """
+    Latencies of a single trace.
+    """
+
+    def test_stage_latencies(self) -> None:
+        """
+        Each stage is measured from the end of the previous one.
+        """
+        # Setup
+        trace = make_trace(0, 10.0, [10.5, 10.75, 12.0])
+
+        # Test
+        assert trace.get_stage_latencies() == [("a", 0.5), ("b", 0.25), ("c", 1.25)]
+        assert trace.get_total_latency() == 2.0
+
+    def test_mark(self) -> None:
+        """
+        Marks are in order and after receive.
+        """
+        # Setup
+        trace = latency_trace.TraceContext(3)
+
+        # Run
+        trace.mark("first")
+        trace.mark("second")
+
+        # Test
+        assert trace.stages == ["first", "second"]
+        assert trace.receive_time <= trace.times[0] <= trace.times[1]
+
+    def test_unmarked(self) -> None:
+        """
+        No stages means no latency.
+        """
+        assert latency_trace.TraceContext(0).get_total_latency() == 0.0
+
+
+class TestLatencyStatistics:
+    """
+    Percentiles over the traces of an interval.
+    """
+
+    def test_snapshot(self) -> None:
+        """
+        Each stage is aggregated separately, with the total last.
+        """
+        # Setup
+        statistics = latency_trace.LatencyStatistics()
+        for i in range(100):
+            # Stage "a" takes 1.5ms, stage "b" takes 1.5ms except for 1 slow trace
+            slow = 0.1 if i == 0 else 0.0
+            statistics.record(make_trace(i, 0.0, [0.0015, 0.003 + slow]))
+
+        # Run
+        snapshots = statistics.snapshot()
+
+        # Test
+        assert [snapshot.stage for snapshot in snapshots] == ["a", "b", "total"]
+        assert all(snapshot.count == 100 for snapshot in snapshots)
+        assert 0.0015 <= snapshots[0].latency_p99 <= 0.0017
+        assert 0.0015 <= snapshots[1].latency_p50 <= 0.0017
+        assert snapshots[1].latency_p99 <= 0.0017
+        assert 0.003 <= snapshots[2].latency_p50 <= 0.0034
+        assert snapshots[2].latency_p99 <= 0.0034
+
+    def test_snapshot_resets(self) -> None:
+        """
+        A snapshot only covers traces since the previous one.
+        """
+        # Setup
+        statistics = latency_trace.LatencyStatistics()
+        statistics.record(make_trace(0, 0.0, [0.001]))
+
+        # Run
+        statistics.snapshot()
+
+        # Test
+        assert len(statistics.snapshot()) == 0
+
+
+class TestTraceExporter:
+    """
+    Exporting traces to a file.
+    """
+
+    def test_export(self, tmp_path: pathlib.Path) -> None:
+        """
+        1 JSON object per trace, told apart by source as well as sequence id.
+        """
+        # Setup
+        path = tmp_path / "traces" / "traces.jsonl"
+        result, exporter = latency_trace.TraceExporter.create(path, helpers.FakeLogger())
+        assert result
+        assert exporter is not None
+
+        # Run
+        exporter.export(make_trace(0, 1.0, [2.0], "telemetry_1"))
+        exporter.export(make_trace(0, 3.0, [4.0, 5.0], "telemetry_2"))
+        exporter.close()
+
+        # Test
+        records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+        assert records == [
+            {"source": "telemetry_1", "sequence_id": 0, "receive": 1.0, "stages": {"a": 2.0}},
+            {
+                "source": "telemetry_2",
+                "sequence_id": 0,
+                "receive": 3.0,
+                "stages": {"a": 4.0, "b": 5.0},
+            },
+        ]
+
+    def test_unwritable(self, tmp_path: pathlib.Path) -> None:
+        """
+        Fails to create if the file cannot be opened.
+        """
+        result, exporter = latency_trace.TraceExporter.create(tmp_path, helpers.FakeLogger())
+        assert not result
+        assert exporter is None
@@ -0,0 +1,221 @@
+"""
+Test publishing MAVLink messages by type.
+"""
+
+import socket
+
+import pytest
+
+from pymavlink.dialects.v20 import common as mavlink
+
+from modules.mavlink_reader import mavlink_reader
+from utilities.workers import queue_proxy_wrapper
+from tests.unit import helpers
+
+
+# Test functions use test fixture signature names
+# No enable
+# pylint: disable=redefined-outer-name
+
+
+SYSTEM_ID = 7
+
+
+class FakeConnection:
+    """
+    Receives the given messages, same filtering as `mavutil.mavfile.recv_match()` .
+    """
+
+    def __init__(self, messages: list) -> None:
+        self.messages = messages
+
+    def recv_match(
+        self,
+        type: "list[str]",  # pylint: disable=redefined-builtin
+        blocking: bool,  # pylint: disable=unused-argument
+        timeout: "float | None",  # pylint: disable=unused-argument
+    ) -> "object | None":
+        """
+        Returns the next message of the types, discarding the others.
+        """
+        while len(self.messages) > 0:
+            message = self.messages.pop(0)
+            if message.get_type() in type:
+                return message
+
+        return None
+
+
+def create_message(message: object) -> object:
+    """
+    Encodes and decodes the message, as if received.
+    """
+    mav = mavlink.MAVLink(None, srcSystem=SYSTEM_ID)
+    return mav.decode(bytearray(message.pack(mav)))
+
+
+def create_queue(policy: str = queue_proxy_wrapper.QueueProxyWrapper.POLICY_BLOCK) -> object:
+    """
+    Shared memory queue, no manager required.
+    """
+    return queue_proxy_wrapper.QueueProxyWrapper(
+        None, 8, queue_proxy_wrapper.QueueProxyWrapper.BACKEND_SHARED_MEMORY, policy=policy
+    )
+
+
+@pytest.fixture()
+def messages() -> list:
+    """
+    Heartbeats interleaved with telemetry and a message nobody subscribes to.
+    """
+    return [
+        create_message(mavlink.MAVLink_heartbeat_message(0, 0, 0, 0, 0, 3)),
+        create_message(mavlink.MAVLink_attitude_message(1, 0.1, 0.2, 0.3, 0.0, 0.0, 0.0)),
+        create_message(mavlink.MAVLink_system_time_message(0, 1)),
+        create_message(mavlink.MAVLink_local_position_ned_message(2, 1.0, 2.0, 3.0, 0, 0, 0)),
+        create_message(mavlink.MAVLink_heartbeat_message(0, 0, 0, 0, 0, 3)),
+    ]
+
+
+class TestMavlinkReader:
+    """
+    Reading the connection and receiving from the subscribed queues.
+    """
+
+    def test_publish_by_type(self, messages: list) -> None:
+        """
+        Each subscriber gets every message of its types, in order, and nothing else.
+        """
+        # Setup
+        heartbeat_queue = create_queue()
+        telemetry_queue = create_queue()
+        result, reader = mavlink_reader.MavlinkReader.create(
+            FakeConnection(messages),
+            {
+                "HEARTBEAT": heartbeat_queue,
+                "ATTITUDE": telemetry_queue,
+                "LOCAL_POSITION_NED": telemetry_queue,
+            },
+            helpers.FakeLogger(),
+        )
+        assert result
+        assert reader is not None
+
+        # Run
+        count = reader.run()
+        heartbeats = heartbeat_queue.get_many(8)
+        telemetry = telemetry_queue.get_many(8)
+        heartbeat_queue.close()
+        telemetry_queue.close()
+
+        # Test
+        assert count == 4
+        assert [message.get_type() for message in heartbeats] == ["HEARTBEAT", "HEARTBEAT"]
+        assert [message.get_type() for message in telemetry] == ["ATTITUDE", "LOCAL_POSITION_NED"]
+        assert telemetry[0].get_srcSystem() == SYSTEM_ID
+
+    def test_bulk_read(self, messages: list) -> None:
+        """
+        A socket is read in bulk, with the same messages published.
+        """
+        # Setup
+        telemetry_queue = create_queue()
+        reader_socket, vehicle_socket = socket.socketpair()
+        result, reader = mavlink_reader.MavlinkReader.create(
+            helpers.FakeSocketConnection(reader_socket),
+            {"ATTITUDE": telemetry_queue, "LOCAL_POSITION_NED": telemetry_queue},
+            helpers.FakeLogger(),
+        )
+        assert result
+        assert reader is not None
+        vehicle_socket.sendall(b"".join(message.get_msgbuf() for message in messages))
+
+        # Run
+        count = reader.run()
+        telemetry = telemetry_queue.get_many(8)
+        idle_count = reader.run()
+        telemetry_queue.close()
+        reader_socket.close()
+        vehicle_socket.close()
+
+        # Test
+        assert count == 2
+        assert [message.get_type() for message in telemetry] == ["ATTITUDE", "LOCAL_POSITION_NED"]
+        assert telemetry[1].x == 1.0
+        assert idle_count == 0
+
+    def test_closed_connection(self, messages: list) -> None:
+        """
+        Messages sent before the vehicle closed the connection are published,
+        then the closed connection is reported instead of read again.
+        """
+        # Setup
+        telemetry_queue = create_queue()
+        reader_socket, vehicle_socket = socket.socketpair()
+        result, reader = mavlink_reader.MavlinkReader.create(
+            helpers.FakeSocketConnection(reader_socket),
+            {"ATTITUDE": telemetry_queue},
+            helpers.FakeLogger(),
+        )
+        assert result
+        assert reader is not None
+        vehicle_socket.sendall(messages[1].get_msgbuf())
+        vehicle_socket.close()
+
+        # Run
+        count = reader.run()
+        with pytest.raises(ConnectionError):
+            reader.run()
+
+        telemetry_queue.close()
+        reader_socket.close()
+
+        # Test
+        assert count == 1
+
+    def test_unknown_type(self) -> None:
+        """
+        Subscriptions must be to message types of the dialect.
+        """
+        message_queue = create_queue()
+        result, reader = mavlink_reader.MavlinkReader.create(
+            FakeConnection([]), {"NOT_A_MESSAGE": message_queue}, helpers.FakeLogger()
+        )
+        message_queue.close()
+        assert not result
+        assert reader is None
+
+    def test_no_subscriptions(self) -> None:
+        """
+        A reader with no subscribers would discard everything.
+        """
+        result, reader = mavlink_reader.MavlinkReader.create(
+            FakeConnection([]), {}, helpers.FakeLogger()
+        )
+        assert not result
+        assert reader is None
+
+    def test_subscribed_connection(self, messages: list) -> None:
+        """
+        Worker classes receive from the queue as they would from the connection.
+        """
+        # Setup
+        message_queue = create_queue()
+        message_queue.put_many(messages)
+        connection = mavlink_reader.SubscribedConnection(message_queue)
+
+        # Run
+        attitude = connection.recv_match(type="ATTITUDE", timeout=0.0)
+        position = connection.recv_match(
+            condition="LOCAL_POSITION_NED.x > 0", type=["LOCAL_POSITION_NED"], timeout=0.0
+        )
+        missing = connection.recv_match(type="ATTITUDE", timeout=0.01)
+        message_queue.close()
+
+        # Test
+        assert attitude is not None
+        assert attitude.get_type() == "ATTITUDE"
+        assert position is not None
+        assert position.x == 1.0
+        assert missing is None
+        assert "HEARTBEAT" in connection.messages
@@ -0,0 +1,217 @@
+"""
+Test recording frames to a tlog and finding them by time.
+"""
+
+import pathlib
+import socket
+
+import pytest
+
+from pymavlink import mavutil
+from pymavlink.dialects.v20 import common as mavlink
+
+from modules.mavlink_recorder import mavlink_recorder
+from modules.mavlink_recorder import tlog
+from tests.unit import helpers
+
+
+def open_reader(path: pathlib.Path) -> tlog.TlogReader:
+    """
+    Reader of the tlog, which must exist.
+    """
+    result, reader = tlog.TlogReader.create(path, helpers.FakeLogger())
+    assert result
+    assert reader is not None
+    return reader
+
+
+class TestTlog:
+    """
+    Writing tlogs and seeking their index.
+    """
+
+    def test_window(self, tmp_path: pathlib.Path) -> None:
+        """
+        Frames of a type within a window are found by the index of the type.
+        """
+        # Setup
+        path = pathlib.Path(tmp_path, "flight.tlog")
+        helpers.write_flight(path)
+        reader = open_reader(path)
+
+        # Run
+        frames = reader.get_frames(1000 + 2_000_000, 1000 + 3_000_000, "LOCAL_POSITION_NED")
+        heartbeat_count = reader.get_frame_count("HEARTBEAT")
+        total_count = reader.get_frame_count()
+        time_range = reader.get_time_range()
+        reader.close()
+
+        # Test
+        mav = mavlink.MAVLink(None)
+        assert [mav.decode(bytearray(frame)).x for _, frame in frames] == [4.0, 5.0]
+        assert [timestamp for timestamp, _ in frames] == [1000 + 2_000_000, 1000 + 2_500_000]
+        assert heartbeat_count == 10
+        assert total_count == 30
+        assert time_range == (1000, 1000 + 19 * 500_000)
+
+    def test_seek(self, tmp_path: pathlib.Path) -> None:
+        """
+        Seeking finds the first frame at or after the time.
+        """
+        path = pathlib.Path(tmp_path, "flight.tlog")
+        helpers.write_flight(path)
+        reader = open_reader(path)
+
+        assert reader.seek(0) == 0
+        # The heartbeat and position at the time
+        assert reader.seek(1000 + 500_000) == 2
+        assert reader.seek(1000 + 500_001) == 3
+        assert reader.seek(1000 + 500_001, "HEARTBEAT") == 1
+        assert reader.seek(1000 + 10_000_000) == 30
+        assert reader.get_frame_count("SYS_STATUS") == 0
+        reader.close()
+
+    def test_mavutil_compatible(self, tmp_path: pathlib.Path) -> None:
+        """
+        The tlog is read by pymavlink, with the recorded timestamps.
+        """
+        path = pathlib.Path(tmp_path, "flight.tlog")
+        helpers.write_flight(path)
+
+        log = mavutil.mavlink_connection(str(path))
+        first_message = log.recv_match(type="LOCAL_POSITION_NED")
+        log.close()
+
+        assert first_message is not None
+        assert first_message._timestamp == 1000 / 1e6  # pylint: disable=protected-access
+
+    def test_continue_after_incomplete_record(self, tmp_path: pathlib.Path) -> None:
+        """
+        A record that a killed writer left incomplete is dropped, and the tlog continued.
+        """
+        # Setup
+        path = pathlib.Path(tmp_path, "flight.tlog")
+        helpers.write_flight(path)
+        with open(path, "ab") as file:
+            file.write(tlog.RECORD_HEADER.pack(20_000_000) + helpers.heartbeat()[:4])
+
+        # Run
+        result, writer = tlog.TlogWriter.create(path, helpers.FakeLogger())
+        assert result
+        assert writer is not None
+        last_timestamp = writer.last_timestamp
+        writer.append(20_000_000, helpers.POSITION_ID, helpers.position(100.0))
+        writer.close()
+        reader = open_reader(path)
+        count = reader.get_frame_count("LOCAL_POSITION_NED")
+        timestamp, frame = reader.get_frame(count - 1, "LOCAL_POSITION_NED")
+        reader.close()
+
+        # Test
+        assert last_timestamp == 1000 + 19 * 500_000
+        assert count == 21
+        assert timestamp == 20_000_000
+        assert frame == helpers.position(100.0)
+
+    def test_build_index(self, tmp_path: pathlib.Path) -> None:
+        """
+        A tlog without an index is indexed by scanning it.
+        """
+        # Setup
+        path = pathlib.Path(tmp_path, "other.tlog")
+        path.write_bytes(
+            tlog.RECORD_HEADER.pack(5)
+            + helpers.heartbeat()
+            + tlog.RECORD_HEADER.pack(7)
+            + helpers.position(1.0)
+        )
+
+        # Run
+        result = tlog.build_index(path, helpers.FakeLogger())
+        reader = open_reader(path)
+        frames = reader.get_frames(0, 10, "LOCAL_POSITION_NED")
+        count = reader.get_frame_count()
+        reader.close()
+
+        # Test
+        assert result
+        assert count == 2
+        assert frames == [(7, helpers.position(1.0))]
+
+    def test_not_indexed(self, tmp_path: pathlib.Path) -> None:
+        """
+        Reading requires the index.
+        """
+        path = pathlib.Path(tmp_path, "other.tlog")
+        path.write_bytes(tlog.RECORD_HEADER.pack(5) + helpers.heartbeat())
+
+        result, reader = tlog.TlogReader.create(path, helpers.FakeLogger())
+        assert not result
+        assert reader is None
+
+
+class TestMavlinkRecorder:
+    """
+    Recording what is received.
+    """
+
+    def test_record(self, tmp_path: pathlib.Path) -> None:
+        """
+        Every frame received is recorded as is, in order.
+        """
+        # Setup
+        path = pathlib.Path(tmp_path, "flight.tlog")
+        recorder_socket, vehicle_socket = socket.socketpair()
+        result, recorder = mavlink_recorder.MavlinkRecorder.create(
+            helpers.FakeSocketConnection(recorder_socket), path, helpers.FakeLogger()
+        )
+        assert result
+        assert recorder is not None
+        frames = [helpers.heartbeat(), helpers.position(1.0), helpers.position(2.0)]
+        vehicle_socket.sendall(b"".join(frames))
+
+        # Run
+        count = recorder.run()
+        idle_count = recorder.run()
+        snapshot = recorder.snapshot()
+        recorder.close()
+        recorder_socket.close()
+        vehicle_socket.close()
+        reader = open_reader(path)
+        recorded_frames = [reader.get_frame(index)[1] for index in range(3)]
+        position_count = reader.get_frame_count("LOCAL_POSITION_NED")
+        reader.close()
+
+        # Test
+        assert count == 3
+        assert idle_count == 0
+        assert snapshot.frame_count == 3
+        assert recorded_frames == frames
+        assert position_count == 2
+
+    def test_closed_connection(self, tmp_path: pathlib.Path) -> None:
+        """
+        Frames sent before the vehicle closed the connection are recorded,
+        then the closed connection is reported instead of read again.
+        """
+        # Setup
+        path = pathlib.Path(tmp_path, "flight.tlog")
+        recorder_socket, vehicle_socket = socket.socketpair()
+        result, recorder = mavlink_recorder.MavlinkRecorder.create(
+            helpers.FakeSocketConnection(recorder_socket), path, helpers.FakeLogger()
+        )
+        assert result
+        assert recorder is not None
+        vehicle_socket.sendall(helpers.heartbeat())
+        vehicle_socket.close()
+
+        # Run
+        count = recorder.run()
+        with pytest.raises(ConnectionError):
+            recorder.run()
+
+        recorder.close()
+        recorder_socket.close()
+
+        # Test
+        assert count == 1
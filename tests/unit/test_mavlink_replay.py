@@ -0,0 +1,154 @@
+"""
+Test replaying a tlog to a client.
+"""
+
+import pathlib
+import socket
+import threading
+import time
+
+from modules.mavlink_replay import mavlink_replay
+from tests.unit import helpers
+
+
+CLIENT_TIMEOUT = 5.0  # seconds
+
+
+def replay_to_client(
+    replay: mavlink_replay.MavlinkReplay, port: int
+) -> "tuple[mavlink_replay.ReplayResult | None, bytes]":
+    """
+    Runs the replay in a thread and connects to it as a client that sends a heartbeat.
+
+    Returns the result of the replay and everything the client received.
+    """
+    results = []
+
+    def serve() -> None:
+        if replay.wait_for_client(CLIENT_TIMEOUT):
+            results.append(replay.run())
+
+        replay.close()
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    client_socket = socket.create_connection(("127.0.0.1", port), CLIENT_TIMEOUT)
+    client_socket.sendall(helpers.heartbeat())
+    data = b""
+    while True:
+        chunk = client_socket.recv(65536)
+        if len(chunk) == 0:
+            break
+
+        data += chunk
+
+    client_socket.close()
+    thread.join()
+    return (results[0] if len(results) > 0 else None), data
+
+
+def create_replay(
+    path: pathlib.Path,
+    port: int,
+    speed: "float | None",
+    start_time: "int | None" = None,
+    end_time: "int | None" = None,
+) -> mavlink_replay.MavlinkReplay:
+    """
+    Replay of the tlog on the port, which must be created.
+    """
+    result, replay = mavlink_replay.MavlinkReplay.create(
+        path, f"tcpin:127.0.0.1:{port}", speed, helpers.FakeLogger(), start_time, end_time
+    )
+    assert result
+    assert replay is not None
+    return replay
+
+
+class TestMavlinkReplay:
+    """
+    Replaying a recorded flight.
+    """
+
+    def test_as_fast_as_possible(self, tmp_path: pathlib.Path) -> None:
+        """
+        Every frame is sent as recorded, in order, without waiting.
+        """
+        # Setup
+        path = pathlib.Path(tmp_path, "flight.tlog")
+        frames = helpers.write_flight(path)
+        port = helpers.get_free_port()
+        replay = create_replay(path, port, None)
+
+        # Run
+        result, data = replay_to_client(replay, port)
+
+        # Test
+        assert result is not None
+        assert data == b"".join(frames)
+        assert result.frame_count == 30
+        assert result.byte_count == len(data)
+        assert result.received_count == 1
+        assert result.duration < 1.0
+
+    def test_paced(self, tmp_path: pathlib.Path) -> None:
+        """
+        At 20 times real time, the 9.5 seconds of the flight take about half a second.
+        """
+        # Setup
+        path = pathlib.Path(tmp_path, "flight.tlog")
+        frames = helpers.write_flight(path)
+        port = helpers.get_free_port()
+        replay = create_replay(path, port, 20.0)
+
+        # Run
+        start_time = time.monotonic()
+        result, data = replay_to_client(replay, port)
+        elapsed_time = time.monotonic() - start_time
+
+        # Test
+        assert result is not None
+        assert data == b"".join(frames)
+        assert result.frame_count == 30
+        assert 9.5 / 20.0 <= result.duration < 2.0
+        assert elapsed_time >= 9.5 / 20.0
+        assert result.lag_p50 < 0.1
+
+    def test_window(self, tmp_path: pathlib.Path) -> None:
+        """
+        Only the frames from the start time up to the end time are sent.
+        """
+        # Setup
+        path = pathlib.Path(tmp_path, "flight.tlog")
+        frames = helpers.write_flight(path)
+        port = helpers.get_free_port()
+        replay = create_replay(path, port, None, 1000 + 1_000_000, 1000 + 2_000_000)
+
+        # Run
+        frame_count = replay.get_frame_count()
+        result, data = replay_to_client(replay, port)
+
+        # Test
+        assert result is not None
+        assert frame_count == 3
+        # The heartbeat and position at 1 second and the position at 1.5 seconds
+        assert data == b"".join(frames[3:6])
+
+    def test_invalid_arguments(self, tmp_path: pathlib.Path) -> None:
+        """
+        The speed must be positive and the address a tcpin one.
+        """
+        path = pathlib.Path(tmp_path, "flight.tlog")
+        helpers.write_flight(path)
+
+        for speed, connection_string in (
+            (0.0, "tcpin:127.0.0.1:14550"),
+            (-1.0, "tcpin:127.0.0.1:14550"),
+            (1.0, "tcp:127.0.0.1:14550"),
+            (1.0, "tcpin:127.0.0.1"),
+        ):
+            result, replay = mavlink_replay.MavlinkReplay.create(
+                path, connection_string, speed, helpers.FakeLogger()
+            )
+            assert not result
+            assert replay is None
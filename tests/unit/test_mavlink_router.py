@@ -0,0 +1,199 @@
+"""
+Test relaying a MAVLink connection to local endpoints.
+"""
+
+import socket
+import time
+
+import pytest
+
+from pymavlink import mavutil
+
+from modules.mavlink_router import mavlink_router
+from tests.unit import helpers
+
+
+# Test functions use test fixture signature names and access class privates
+# No enable
+# pylint: disable=protected-access,redefined-outer-name
+
+
+ROUTER_HOST = "127.0.0.1"
+RECEIVE_TIMEOUT = 2.0  # seconds
+ENDPOINT_TIMEOUT = 0.2  # seconds
+VEHICLE_SYSTEM_ID = 1
+
+
+def run_until(router: mavlink_router.MavlinkRouter, is_done: "() -> bool") -> bool:  # type: ignore
+    """
+    Runs the router until the condition holds or the timeout.
+    """
+    deadline = time.monotonic() + RECEIVE_TIMEOUT
+    while time.monotonic() < deadline:
+        router.run()
+        if is_done():
+            return True
+
+    return False
+
+
+@pytest.fixture()
+def vehicle_and_router() -> "tuple[mavutil.mavfile, mavlink_router.MavlinkRouter]":  # type: ignore
+    """
+    Vehicle on a UDP port and a router connected to it.
+    """
+    port = helpers.get_free_port(socket.SOCK_DGRAM)
+    vehicle = mavutil.mavlink_connection(
+        f"udpin:{ROUTER_HOST}:{port}", source_system=VEHICLE_SYSTEM_ID
+    )
+    connection = mavutil.mavlink_connection(f"udpout:{ROUTER_HOST}:{port}")
+    result, router = mavlink_router.MavlinkRouter.create(
+        connection, (ROUTER_HOST, 0), helpers.FakeLogger()
+    )
+    assert result
+    assert router is not None
+
+    yield vehicle, router  # type: ignore
+
+    router.close()
+    connection.close()
+    vehicle.close()
+
+
+class TestMavlinkRouter:
+    """
+    Forwarding between the vehicle and endpoints.
+    """
+
+    def test_forward(
+        self, vehicle_and_router: "tuple[mavutil.mavfile, mavlink_router.MavlinkRouter]"
+    ) -> None:
+        """
+        Endpoints get only the types they subscribed to, and what they send reaches the vehicle.
+        """
+        # Setup
+        vehicle, router = vehicle_and_router
+        sender = router.create_connection([])
+        receiver = router.create_connection(["ATTITUDE"])
+
+        # Run
+        # Registers the endpoints, and the vehicle learns the router's address from the heartbeat
+        receiver.get_connection()
+        sender.mav.heartbeat_send(mavutil.mavlink.MAV_TYPE_GCS, 0, 0, 0, 0)
+        assert run_until(router, lambda: router.get_endpoint_count() == 2)
+        heartbeat = vehicle.recv_match(type="HEARTBEAT", blocking=True, timeout=RECEIVE_TIMEOUT)
+
+        vehicle.mav.heartbeat_send(mavutil.mavlink.MAV_TYPE_QUADROTOR, 0, 0, 0, 0)
+        vehicle.mav.attitude_send(1, 0.1, 0.2, 0.3, 0.0, 0.0, 0.0)
+        attitude = None
+        deadline = time.monotonic() + RECEIVE_TIMEOUT
+        while attitude is None and time.monotonic() < deadline:
+            router.run()
+            attitude = receiver.recv_match(blocking=False)
+
+        # The heartbeat was sent first, so would have arrived by now if it was forwarded
+        forwarded_heartbeat = receiver.recv_match(type="HEARTBEAT", blocking=False)
+        sender_message = sender.recv_match(blocking=False)
+        snapshot = router.snapshot()
+
+        # Test
+        assert heartbeat is not None
+        assert heartbeat.get_srcSystem() == sender.source_system
+        assert attitude is not None
+        assert attitude.get_type() == "ATTITUDE"
+        assert attitude.get_srcSystem() == VEHICLE_SYSTEM_ID
+        assert forwarded_heartbeat is None
+        assert sender_message is None
+        assert snapshot.endpoint_count == 2
+        assert snapshot.forward_count == 1
+        assert snapshot.upstream_count == 1
+        assert snapshot.latency_p50 > 0.0
+
+    def test_renumber(
+        self, vehicle_and_router: "tuple[mavutil.mavfile, mavlink_router.MavlinkRouter]"
+    ) -> None:
+        """
+        Frames of different endpoints reach the vehicle in 1 sequence, with valid checksums.
+        """
+        # Setup
+        vehicle, router = vehicle_and_router
+        senders = [router.create_connection([]), router.create_connection([])]
+
+        # Run
+        # Each endpoint numbers its own frames from 0
+        for _ in range(2):
+            for sender in senders:
+                sender.mav.heartbeat_send(mavutil.mavlink.MAV_TYPE_GCS, 0, 0, 0, 0)
+
+        heartbeats = []
+        deadline = time.monotonic() + RECEIVE_TIMEOUT
+        while len(heartbeats) < 4 and time.monotonic() < deadline:
+            router.run()
+            heartbeat = vehicle.recv_match(type="HEARTBEAT", blocking=False)
+            if heartbeat is not None:
+                heartbeats.append(heartbeat)
+
+        # Test
+        assert [heartbeat.get_seq() for heartbeat in heartbeats] == [0, 1, 2, 3]
+
+    def test_endpoint_expired(
+        self,
+        vehicle_and_router: "tuple[mavutil.mavfile, mavlink_router.MavlinkRouter]",
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        """
+        Endpoints that stop registering are no longer forwarded to.
+        """
+        # Setup
+        monkeypatch.setattr(
+            mavlink_router.MavlinkRouter, "_MavlinkRouter__ENDPOINT_TIMEOUT", ENDPOINT_TIMEOUT
+        )
+        _, router = vehicle_and_router
+        receiver = router.create_connection(["ATTITUDE"])
+        receiver.get_connection()
+        assert run_until(router, lambda: router.get_endpoint_count() == 1)
+
+        # Run
+        # The endpoint is not used again, so it does not register again
+        time.sleep(ENDPOINT_TIMEOUT)
+        is_expired = run_until(router, lambda: router.get_endpoint_count() == 0)
+
+        # Test
+        assert is_expired
+
+    def test_closed_connection(self) -> None:
+        """
+        A TCP connection closed by the vehicle is reported instead of read again.
+        """
+        # Setup
+        with socket.create_server((ROUTER_HOST, 0)) as server_socket:
+            port = server_socket.getsockname()[1]
+            connection = mavutil.mavlink_connection(f"tcp:{ROUTER_HOST}:{port}")
+            vehicle_socket, _ = server_socket.accept()
+
+        result, router = mavlink_router.MavlinkRouter.create(
+            connection, (ROUTER_HOST, 0), helpers.FakeLogger()
+        )
+        assert result
+        assert router is not None
+        vehicle_socket.close()
+
+        # Run and test
+        with pytest.raises(ConnectionError):
+            run_until(router, lambda: False)
+
+        router.close()
+        connection.close()
+
+    def test_address_in_use(
+        self, vehicle_and_router: "tuple[mavutil.mavfile, mavlink_router.MavlinkRouter]"
+    ) -> None:
+        """
+        A second router cannot take the same address.
+        """
+        vehicle, router = vehicle_and_router
+        result, other_router = mavlink_router.MavlinkRouter.create(
+            vehicle, router.address, helpers.FakeLogger()
+        )
+        assert not result
+        assert other_router is None
@@ -0,0 +1,128 @@
+"""
+Test dispatching MAVLink frames by message id.
+"""
+
+import pytest
+
+from pymavlink.dialects.v10 import all as mavlink_v1
+from pymavlink.dialects.v20 import all as mavlink_v2
+
+from modules.mavlink_reader import message_dispatcher
+
+
+# Test functions use test fixture signature names
+# No enable
+# pylint: disable=redefined-outer-name
+
+
+@pytest.fixture()
+def frames() -> "list[bytes]":
+    """
+    MAVLink 1 and 2 frames of handled and other types, with garbage between them.
+    """
+    mav_v1 = mavlink_v1.MAVLink(None, srcSystem=1)
+    mav_v2 = mavlink_v2.MAVLink(None, srcSystem=2)
+    return [
+        mavlink_v1.MAVLink_attitude_message(1, 0.1, 0.2, 0.3, 0.0, 0.0, 0.0).pack(mav_v1),
+        mavlink_v2.MAVLink_heartbeat_message(2, 3, 0, 0, 4, 3).pack(mav_v2),
+        b"\x01\x02not a frame",
+        mavlink_v2.MAVLink_attitude_message(2, 0.4, 0.5, 0.6, 0.0, 0.0, 0.0).pack(mav_v2),
+        mavlink_v2.MAVLink_vfr_hud_message(1.0, 2.0, 3, 4, 5.0, 6.0).pack(mav_v2),
+    ]
+
+
+class TestMessageDispatcher:
+    """
+    Splitting a byte stream into frames and dispatching them.
+    """
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+    def test_dispatch(self, frames: "list[bytes]", chunk_size: int) -> None:
+        """
+        Only handled types are decoded, however the stream is split.
+        """
+        # Setup
+        dispatcher = message_dispatcher.MessageDispatcher()
+        messages = []
+        message_ids = []
+        assert dispatcher.register("ATTITUDE", messages.append)
+        dispatcher.set_frame_handler(lambda message_id, _: message_ids.append(message_id))
+        stream = b"".join(frames)
+
+        # Run
+        count = 0
+        for i in range(0, len(stream), chunk_size):
+            count += dispatcher.parse(stream[i : i + chunk_size])
+
+        # Test
+        assert count == 4
+        assert [message.get_type() for message in messages] == ["ATTITUDE", "ATTITUDE"]
+        assert [message.get_srcSystem() for message in messages] == [1, 2]
+        assert messages[1].roll == pytest.approx(0.4)
+        assert message_ids == [30, 0, 30, 74]
+        assert dispatcher.decoded_count == 2
+        assert dispatcher.skipped_count == 2
+        assert dispatcher.bad_count > 0
+
+    def test_corrupted_frame(self, frames: "list[bytes]") -> None:
+        """
+        A handled frame failing its checksum is dropped, and the next frame is still found.
+        """
+        # Setup
+        dispatcher = message_dispatcher.MessageDispatcher()
+        messages = []
+        dispatcher.register("ATTITUDE", messages.append)
+        corrupted = bytearray(frames[3])
+        corrupted[12] ^= 0xFF
+
+        # Run
+        dispatcher.parse(bytes(corrupted) + frames[0])
+
+        # Test
+        assert [message.get_srcSystem() for message in messages] == [1]
+
+    def test_stray_marker(self, frames: "list[bytes]") -> None:
+        """
+        A marker byte whose header runs into the following frames does not swallow them,
+        even those that are not decoded.
+        """
+        # Setup
+        dispatcher = message_dispatcher.MessageDispatcher()
+        message_ids = []
+        dispatcher.set_frame_handler(lambda message_id, _: message_ids.append(message_id))
+        # MAVLink 1 marker and a length covering the frames after it
+        stray = bytes([mavlink_v1.PROTOCOL_MARKER_V1, 40, 0, 0, 0, 0])
+
+        # Run
+        count = dispatcher.parse(stray + frames[1] + frames[4])
+
+        # Test
+        assert count == 2
+        assert message_ids == [0, 74]
+        assert dispatcher.bad_count > 0
+
+    def test_corrupted_frame_not_forwarded(self, frames: "list[bytes]") -> None:
+        """
+        Frames that are not decoded still fail their checksum, and are not given to the handler.
+        """
+        # Setup
+        dispatcher = message_dispatcher.MessageDispatcher()
+        message_ids = []
+        dispatcher.set_frame_handler(lambda message_id, _: message_ids.append(message_id))
+        corrupted = bytearray(frames[4])
+        corrupted[12] ^= 0xFF
+
+        # Run
+        dispatcher.parse(bytes(corrupted) + frames[1])
+
+        # Test
+        assert message_ids == [0]
+        assert dispatcher.skipped_count == 1
+
+    def test_unknown_type(self) -> None:
+        """
+        Types missing from the dialect cannot be handled.
+        """
+        dispatcher = message_dispatcher.MessageDispatcher()
+        assert not dispatcher.register("NOT_A_MESSAGE", print)
+        assert message_dispatcher.MessageDispatcher.get_message_id("HEARTBEAT") == 0
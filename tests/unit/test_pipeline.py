@@ -0,0 +1,287 @@
+"""
+Test declaring and running a pipeline.
+"""
+
+import multiprocessing as mp
+import multiprocessing.managers
+import threading
+import time
+
+import pytest
+
+from utilities.workers import pipeline
+from utilities.workers import queue_proxy_wrapper
+from utilities.workers import worker_controller
+from utilities.workers import worker_manager
+from tests.unit import helpers
+
+
+# Test functions use test fixture signature names and access class privates
+# No enable
+# pylint: disable=protected-access,redefined-outer-name
+
+
+ITEM_COUNT = 10
+RECEIVE_TIMEOUT = 5.0  # seconds
+SHUTDOWN_TIMEOUT = 2.0  # seconds
+
+
+def source_worker(
+    count: int,
+    output_queue: queue_proxy_wrapper.QueueProxyWrapper,
+    controller: worker_controller.WorkerController,  # pylint: disable=unused-argument
+) -> None:
+    """
+    Puts the integers up to count.
+    """
+    for i in range(count):
+        output_queue.put(i)
+
+
+def double_worker(
+    input_queue: queue_proxy_wrapper.QueueProxyWrapper,
+    output_queue: queue_proxy_wrapper.QueueProxyWrapper,
+    controller: worker_controller.WorkerController,
+) -> None:
+    """
+    Doubles each item until sentinel or exit.
+    """
+    while not controller.is_exit_requested():
+        item = input_queue.get()
+        if item is None:
+            return
+
+        output_queue.put(2 * item)
+
+
+def tagging_worker(
+    input_queue: queue_proxy_wrapper.QueueProxyWrapper,
+    output_queue: queue_proxy_wrapper.QueueProxyWrapper,
+    controller: worker_controller.WorkerController,
+) -> None:
+    """
+    Outputs each item with the thread that got it, until sentinel or exit.
+    """
+    while not controller.is_exit_requested():
+        item = input_queue.get()
+        if item is None:
+            return
+
+        output_queue.put((threading.get_ident(), item))
+
+
+def get_parity(item: int) -> int:
+    """
+    Shard key of a test item.
+    """
+    return item % 2
+
+
+def counting_worker(
+    output_queue: queue_proxy_wrapper.QueueProxyWrapper,
+    controller: worker_controller.WorkerController,
+) -> None:
+    """
+    Puts an item every few milliseconds, checking for a pause between items.
+    """
+    while not controller.is_exit_requested():
+        controller.check_pause()
+        output_queue.put(0, timeout=RECEIVE_TIMEOUT)
+        time.sleep(0.005)
+
+
+@pytest.fixture(scope="module")
+def mp_manager() -> multiprocessing.managers.SyncManager:  # type: ignore
+    """
+    Manager server shared by the tests.
+    """
+    manager = mp.Manager()
+    yield manager  # type: ignore
+    manager.shutdown()
+
+
+@pytest.fixture()
+def empty_pipeline(mp_manager: multiprocessing.managers.SyncManager) -> pipeline.Pipeline:
+    """
+    Instrumented pipeline with no stages.
+    """
+    result, test_pipeline = pipeline.Pipeline.create(
+        mp_manager, worker_controller.WorkerController(), helpers.FakeLogger(), 2, True
+    )
+    assert result
+    assert test_pipeline is not None
+    return test_pipeline
+
+
+class TestPipeline:
+    """
+    Building, running, and stopping a pipeline.
+    """
+
+    def test_run(self, empty_pipeline: pipeline.Pipeline) -> None:
+        """
+        Items flow from the source through the doubler to main,
+        with stages declared out of order.
+        """
+        # Setup
+        thread = worker_manager.WorkerManager.BACKEND_THREAD
+        assert empty_pipeline.add_stage("double", double_worker, 3, backend=thread)
+        assert empty_pipeline.add_stage("source", source_worker, 1, (ITEM_COUNT,), thread)
+        assert empty_pipeline.add_queue("numbers", "source", "double")
+        assert empty_pipeline.add_queue("doubled", "double", None)
+        assert empty_pipeline.build()
+
+        doubled_queue = empty_pipeline.get_queue("doubled")
+        assert doubled_queue is not None
+
+        # Run
+        empty_pipeline.start()
+        items = [doubled_queue.get(timeout=RECEIVE_TIMEOUT) for _ in range(ITEM_COUNT)]
+        snapshot = empty_pipeline.get_snapshot()
+        statistics = empty_pipeline.shutdown(SHUTDOWN_TIMEOUT)
+
+        # Test
+        assert sorted(items) == [2 * i for i in range(ITEM_COUNT)]
+        assert [manager.get_target_name() for manager in empty_pipeline.get_managers()] == [
+            "source_worker",
+            "double_worker",
+        ]
+        # 3 doublers on the busier side of the queue
+        numbers_queue = empty_pipeline.get_queue("numbers")
+        assert numbers_queue is not None
+        assert numbers_queue.maxsize == 6
+        assert snapshot is not None
+        assert snapshot.throughput > 0.0
+        assert list(statistics) == ["double", "source"]
+        for stage_statistics in statistics.values():
+            for stop_statistics in stage_statistics:
+                assert stop_statistics.stop == worker_manager.WorkerStopStatistics.STOP_EXITED
+
+    def test_sharded_stage(self, empty_pipeline: pipeline.Pipeline) -> None:
+        """
+        Each worker of a sharded stage gets every item of its keys, and only those.
+        """
+        # Setup
+        thread = worker_manager.WorkerManager.BACKEND_THREAD
+        assert empty_pipeline.add_stage("source", source_worker, 1, (ITEM_COUNT,), thread)
+        assert empty_pipeline.add_stage("tag", tagging_worker, 2, backend=thread)
+        assert empty_pipeline.add_queue("numbers", "source", "tag", shard_key=get_parity)
+        assert empty_pipeline.add_queue("tagged", "tag", None)
+        assert empty_pipeline.build()
+        tagged_queue = empty_pipeline.get_queue("tagged")
+        tag_manager = empty_pipeline.get_manager("tag")
+        assert tagged_queue is not None
+        assert tag_manager is not None
+
+        # Run
+        empty_pipeline.start()
+        items = [tagged_queue.get(timeout=RECEIVE_TIMEOUT) for _ in range(ITEM_COUNT)]
+        is_scaled = tag_manager.scale_to(3)
+        empty_pipeline.shutdown(SHUTDOWN_TIMEOUT)
+
+        # Test
+        keys_by_worker = {}
+        for worker, item in items:
+            keys_by_worker.setdefault(worker, set()).add(get_parity(item))
+
+        assert sorted(item for _, item in items) == list(range(ITEM_COUNT))
+        assert sorted(sorted(keys) for keys in keys_by_worker.values()) == [[0], [1]]
+        assert not is_scaled
+
+    def test_sharded_queue_without_consumer(self, empty_pipeline: pipeline.Pipeline) -> None:
+        """
+        Only a queue into a stage can be sharded.
+        """
+        assert empty_pipeline.add_stage("source", source_worker, 1, (ITEM_COUNT,))
+        assert not empty_pipeline.add_queue("numbers", "source", None, shard_key=get_parity)
+
+    def test_cycle(self, empty_pipeline: pipeline.Pipeline) -> None:
+        """
+        Stages cannot feed back into each other.
+        """
+        # Setup
+        assert empty_pipeline.add_stage("first", double_worker, 1)
+        assert empty_pipeline.add_stage("second", double_worker, 1)
+        assert empty_pipeline.add_queue("forward", "first", "second")
+        assert empty_pipeline.add_queue("backward", "second", "first")
+
+        # Test
+        assert not empty_pipeline.build()
+
+    def test_unknown_stage(self, empty_pipeline: pipeline.Pipeline) -> None:
+        """
+        Queues must connect declared stages.
+        """
+        assert not empty_pipeline.add_queue("numbers", "source", None)
+
+    def test_config(self, empty_pipeline: pipeline.Pipeline) -> None:
+        """
+        Targets are imported and resources substituted.
+        """
+        # Setup
+        config = {
+            "stages": [
+                {
+                    "name": "source",
+                    "target": "tests.unit.test_pipeline.source_worker",
+                    "count": 1,
+                    "work_arguments": ["$count"],
+                },
+            ],
+            "queues": [{"name": "numbers", "producer": "source"}],
+        }
+
+        # Run
+        result = empty_pipeline.add_from_config(config, {"count": ITEM_COUNT})
+
+        # Test
+        assert result
+        assert empty_pipeline.build()
+        manager = empty_pipeline.get_manager("source")
+        assert manager is not None
+        assert manager.get_target_name() == "source_worker"
+
+    def test_config_bad_target(self, empty_pipeline: pipeline.Pipeline) -> None:
+        """
+        A target that cannot be imported is rejected.
+        """
+        config = {"stages": [{"name": "source", "target": "tests.unit.missing", "count": 1}]}
+        assert not empty_pipeline.add_from_config(config, {})
+
+    def test_pause_stage(self, empty_pipeline: pipeline.Pipeline) -> None:
+        """
+        Only the paused stage stops, once quiescent.
+        """
+        # Setup
+        thread = worker_manager.WorkerManager.BACKEND_THREAD
+        assert empty_pipeline.add_stage("paused", counting_worker, 2, backend=thread)
+        assert empty_pipeline.add_stage("running", counting_worker, 1, backend=thread)
+        assert empty_pipeline.add_queue("paused_output", "paused", None)
+        assert empty_pipeline.add_queue("running_output", "running", None)
+        assert empty_pipeline.build()
+        paused_queue = empty_pipeline.get_queue("paused_output")
+        running_queue = empty_pipeline.get_queue("running_output")
+        assert paused_queue is not None
+        assert running_queue is not None
+        empty_pipeline.start()
+
+        # Run
+        is_quiescent_before_pause = empty_pipeline.is_stage_quiescent("paused")
+        assert empty_pipeline.pause_stage("paused")
+        is_quiescent = empty_pipeline.wait_for_stage_quiescence("paused", RECEIVE_TIMEOUT)
+        paused_queue.drain_queue()
+        running_queue.drain_queue()
+        time.sleep(0.05)
+        paused_count = paused_queue.drain_queue()
+        running_count = running_queue.drain_queue()
+        assert empty_pipeline.resume_stage("paused")
+        is_resumed = paused_queue.get(timeout=RECEIVE_TIMEOUT) is not None
+        empty_pipeline.shutdown(SHUTDOWN_TIMEOUT)
+
+        # Test
+        assert not is_quiescent_before_pause
+        assert is_quiescent
+        assert paused_count == 0
+        assert running_count > 0
+        assert is_resumed
+        assert not empty_pipeline.pause_stage("missing")
@@ -0,0 +1,577 @@
+"""
+Test the queue wrapper and its backends.
+"""
+
+import multiprocessing as mp
+import multiprocessing.managers
+import queue
+import threading
+
+import pytest
+
+from utilities.workers import queue_proxy_wrapper
+
+
+# Test functions use test fixture signature names and access class privates
+# No enable
+# pylint: disable=protected-access,redefined-outer-name
+
+
+SLOT_COUNT = 4
+JOIN_TIMEOUT = 5.0  # seconds
+SLOT_SIZE = 256  # bytes
+
+
+class ProducerRacingQueue(queue.Queue):
+    """
+    Queue where another producer takes any space freed by `get_nowait()` .
+    """
+
+    def get_nowait(self) -> object:
+        """
+        Takes the oldest item and puts another in its place.
+        """
+        item = super().get_nowait()
+        self.put_nowait("other")
+        return item
+
+
+@pytest.fixture()
+def shared_memory_queue() -> queue_proxy_wrapper.QueueProxyWrapper:  # type: ignore
+    """
+    Bounded queue with the shared memory backend.
+    """
+    wrapper = queue_proxy_wrapper.QueueProxyWrapper(
+        None,
+        SLOT_COUNT,
+        queue_proxy_wrapper.QueueProxyWrapper.BACKEND_SHARED_MEMORY,
+        SLOT_SIZE,
+    )
+    yield wrapper  # type: ignore
+    wrapper.close()
+
+
+@pytest.fixture(scope="module")
+def mp_manager() -> multiprocessing.managers.SyncManager:  # type: ignore
+    """
+    Manager server shared by the manager backend tests.
+    """
+    manager = mp.Manager()
+    yield manager  # type: ignore
+    manager.shutdown()
+
+
+@pytest.fixture()
+def manager_queue(
+    mp_manager: multiprocessing.managers.SyncManager,
+) -> queue_proxy_wrapper.QueueProxyWrapper:  # type: ignore
+    """
+    Unbounded queue with the manager backend.
+    """
+    wrapper = queue_proxy_wrapper.QueueProxyWrapper(mp_manager)
+    yield wrapper  # type: ignore
+
+
+def put_range(output_queue: queue_proxy_wrapper.QueueProxyWrapper, count: int) -> None:
+    """
+    Producer process for the cross process test.
+    """
+    for i in range(count):
+        output_queue.queue.put(i)
+
+
+class TestSharedMemoryBackend:
+    """
+    Shared memory ring buffer behaves like a bounded queue.
+    """
+
+    def test_fifo_order(self, shared_memory_queue: queue_proxy_wrapper.QueueProxyWrapper) -> None:
+        """
+        Items come out in the order they were put in, across the ring wrap around.
+        """
+        # Setup
+        expected = list(range(3 * SLOT_COUNT))
+
+        # Run
+        actual = []
+        for item in expected:
+            shared_memory_queue.queue.put(item)
+            actual.append(shared_memory_queue.queue.get())
+
+        # Test
+        assert actual == expected
+
+    def test_empty_raises(self, shared_memory_queue: queue_proxy_wrapper.QueueProxyWrapper) -> None:
+        """
+        Nonblocking get on an empty queue.
+        """
+        with pytest.raises(queue.Empty):
+            shared_memory_queue.queue.get_nowait()
+
+    def test_full_raises(self, shared_memory_queue: queue_proxy_wrapper.QueueProxyWrapper) -> None:
+        """
+        Put on a full queue times out.
+        """
+        # Setup
+        for i in range(SLOT_COUNT):
+            shared_memory_queue.queue.put(i)
+
+        # Test
+        assert shared_memory_queue.queue.full()
+        with pytest.raises(queue.Full):
+            shared_memory_queue.queue.put(SLOT_COUNT, timeout=0.01)
+
+    def test_oversized_item(
+        self, shared_memory_queue: queue_proxy_wrapper.QueueProxyWrapper
+    ) -> None:
+        """
+        Items that do not fit in a slot are rejected without consuming a slot.
+        """
+        with pytest.raises(ValueError):
+            shared_memory_queue.queue.put(b"x" * SLOT_SIZE)
+
+        assert shared_memory_queue.queue.empty()
+
+    def test_cross_process(
+        self, shared_memory_queue: queue_proxy_wrapper.QueueProxyWrapper
+    ) -> None:
+        """
+        Items put by another process are received in order.
+        """
+        # Setup
+        count = 5 * SLOT_COUNT
+        expected = list(range(count))
+
+        # Run
+        producer = mp.Process(target=put_range, args=(shared_memory_queue, count))
+        producer.start()
+        actual = [shared_memory_queue.queue.get(timeout=5.0) for _ in range(count)]
+        producer.join()
+
+        # Test
+        assert actual == expected
+
+
+class TestBatching:
+    """
+    Batches move through either backend and come out as individual items.
+    """
+
+    def test_manager_batch_split(
+        self, manager_queue: queue_proxy_wrapper.QueueProxyWrapper
+    ) -> None:
+        """
+        A batch larger than the requested maximum is returned over several calls.
+        """
+        # Setup
+        manager_queue.put_many([0, 1, 2, 3, 4])
+        manager_queue.queue.put(5)
+
+        # Run
+        first = manager_queue.get_many(2, timeout=1.0)
+        second = manager_queue.get_many(10)
+        third = manager_queue.get_many(10)
+
+        # Test
+        assert first == [0, 1]
+        assert second == [2, 3, 4, 5]
+        assert third == []
+
+    def test_manager_batch_single_item(
+        self, manager_queue: queue_proxy_wrapper.QueueProxyWrapper
+    ) -> None:
+        """
+        A batch occupies a single item in the underlying queue.
+        """
+        # Run
+        manager_queue.put_many(list(range(10)))
+
+        # Test
+        assert manager_queue.queue.qsize() == 1
+
+    def test_shared_memory_batch(
+        self, shared_memory_queue: queue_proxy_wrapper.QueueProxyWrapper
+    ) -> None:
+        """
+        Batches are stored as individual items, so plain get still works.
+        """
+        # Setup
+        shared_memory_queue.put_many([0, 1, 2])
+
+        # Run
+        first = shared_memory_queue.queue.get_nowait()
+        rest = shared_memory_queue.get_many(10)
+
+        # Test
+        assert first == 0
+        assert rest == [1, 2]
+
+    def test_shared_memory_batch_all_or_nothing(
+        self, shared_memory_queue: queue_proxy_wrapper.QueueProxyWrapper
+    ) -> None:
+        """
+        A batch larger than the free space is rejected entirely.
+        """
+        # Setup
+        shared_memory_queue.queue.put(0)
+
+        # Run
+        with pytest.raises(queue.Full):
+            shared_memory_queue.put_many(list(range(SLOT_COUNT)), timeout=0.01)
+
+        # Test
+        assert shared_memory_queue.get_many(SLOT_COUNT) == [0]
+
+    def test_shared_memory_batch_larger_than_queue(
+        self, shared_memory_queue: queue_proxy_wrapper.QueueProxyWrapper
+    ) -> None:
+        """
+        A batch larger than the queue is put in parts as a consumer makes room.
+        """
+        # Setup
+        items = []
+
+        def consume() -> None:
+            while len(items) < SLOT_COUNT * 3:
+                items.extend(shared_memory_queue.get_many(SLOT_COUNT, timeout=0.1))
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+
+        # Run
+        shared_memory_queue.put_many(list(range(SLOT_COUNT * 3)), timeout=JOIN_TIMEOUT)
+        consumer.join(JOIN_TIMEOUT)
+
+        # Test
+        assert items == list(range(SLOT_COUNT * 3))
+
+    def test_shared_memory_underlying_batch_larger_than_queue(
+        self, shared_memory_queue: queue_proxy_wrapper.QueueProxyWrapper
+    ) -> None:
+        """
+        The underlying queue rejects a batch that could never fit, instead of waiting forever.
+        """
+        with pytest.raises(ValueError):
+            shared_memory_queue.queue.put_many(list(range(SLOT_COUNT + 1)))
+
+        assert shared_memory_queue.qsize() == 0
+
+    def test_manager_qsize_counts_batch_items(
+        self, manager_queue: queue_proxy_wrapper.QueueProxyWrapper
+    ) -> None:
+        """
+        The size counts each item of a batch, as consumers see them.
+        """
+        # Run
+        manager_queue.put_many(list(range(10)))
+        manager_queue.put(10)
+        full_size = manager_queue.qsize()
+        manager_queue.get_many(3)
+        partial_size = manager_queue.qsize()
+        manager_queue.get_many(10)
+        empty_size = manager_queue.qsize()
+
+        # Test
+        assert full_size == 11
+        # The rest of the first batch is pending in this process, not in the queue
+        assert partial_size == 1
+        assert empty_size == 0
+
+    def test_manager_batch_shared_by_threads(
+        self, manager_queue: queue_proxy_wrapper.QueueProxyWrapper
+    ) -> None:
+        """
+        Threads getting from batches each get different items, and together get all of them.
+        """
+        # Setup
+        for start in range(0, 1000, 50):
+            manager_queue.put_many(list(range(start, start + 50)))
+
+        results = [[] for _ in range(4)]
+
+        def consume(items: list) -> None:
+            while True:
+                batch = manager_queue.get_many(3, timeout=0.1)
+                if len(batch) == 0:
+                    return
+
+                items.extend(batch)
+
+        consumers = [threading.Thread(target=consume, args=(items,)) for items in results]
+
+        # Run
+        for consumer in consumers:
+            consumer.start()
+
+        for consumer in consumers:
+            consumer.join(JOIN_TIMEOUT)
+
+        # Test
+        assert sorted(item for items in results for item in items) == list(range(1000))
+
+    def test_get_many_empty_timeout(
+        self, shared_memory_queue: queue_proxy_wrapper.QueueProxyWrapper
+    ) -> None:
+        """
+        Waiting on an empty queue returns nothing.
+        """
+        assert shared_memory_queue.get_many(SLOT_COUNT, timeout=0.01) == []
+
+
+class TestInstrumentation:
+    """
+    Instrumented queues report depth, throughput, and wait times.
+    """
+
+    def test_not_instrumented(self, manager_queue: queue_proxy_wrapper.QueueProxyWrapper) -> None:
+        """
+        No snapshot without instrumentation.
+        """
+        assert manager_queue.get_snapshot() is None
+
+    def test_snapshot_counts(self, mp_manager: multiprocessing.managers.SyncManager) -> None:
+        """
+        Items are unwrapped on get and counted, including batches.
+        """
+        # Setup
+        instrumented_queue = queue_proxy_wrapper.QueueProxyWrapper(
+            mp_manager, name="test", is_instrumented=True
+        )
+        instrumented_queue.put(0)
+        instrumented_queue.put_many([1, 2, 3])
+
+        # Run
+        first = instrumented_queue.get(timeout=1.0)
+        second = instrumented_queue.get(timeout=1.0)
+        rest = instrumented_queue.get_many(10)
+        instrumented_queue.put(4)
+        snapshot = instrumented_queue.get_snapshot()
+
+        # Test
+        assert [first, second] + rest == [0, 1, 2, 3]
+        assert snapshot is not None
+        assert snapshot.name == "test"
+        assert snapshot.depth == 1
+        assert snapshot.put_count == 5
+        assert snapshot.get_count == 4
+        assert 0.0 < snapshot.wait_p50 <= snapshot.wait_p95 <= snapshot.wait_p99
+
+    def test_snapshot_interval(self) -> None:
+        """
+        Wait times only cover items got since the previous snapshot.
+        """
+        # Setup
+        instrumented_queue = queue_proxy_wrapper.QueueProxyWrapper(
+            None,
+            SLOT_COUNT,
+            queue_proxy_wrapper.QueueProxyWrapper.BACKEND_SHARED_MEMORY,
+            SLOT_SIZE,
+            "test",
+            True,
+        )
+        instrumented_queue.put_many([0, 1])
+        instrumented_queue.get_many(SLOT_COUNT)
+
+        # Run
+        first = instrumented_queue.get_snapshot()
+        second = instrumented_queue.get_snapshot()
+        instrumented_queue.close()
+
+        # Test
+        assert first is not None and second is not None
+        assert first.get_count == second.get_count == 2
+        assert first.wait_p99 > 0.0
+        assert second.wait_p99 == 0.0
+        assert second.get_rate == 0.0
+
+
+class TestPolicies:
+    """
+    Dropping policies never block producers and count what they drop.
+    """
+
+    @pytest.mark.parametrize(
+        "backend",
+        [
+            queue_proxy_wrapper.QueueProxyWrapper.BACKEND_MANAGER,
+            queue_proxy_wrapper.QueueProxyWrapper.BACKEND_SHARED_MEMORY,
+        ],
+    )
+    def test_latest(self, mp_manager: multiprocessing.managers.SyncManager, backend: str) -> None:
+        """
+        Only the newest item is kept.
+        """
+        # Setup
+        latest_queue = queue_proxy_wrapper.QueueProxyWrapper(
+            mp_manager,
+            backend=backend,
+            slot_size=SLOT_SIZE,
+            policy=queue_proxy_wrapper.QueueProxyWrapper.POLICY_LATEST,
+        )
+
+        # Run
+        latest_queue.put_many([0, 1, 2])
+        latest_queue.put(3)
+        items = latest_queue.get_many(10)
+        latest_queue.close()
+
+        # Test
+        assert items == [3]
+        assert latest_queue.get_drop_count() == 3
+
+    def test_drop_oldest(self, mp_manager: multiprocessing.managers.SyncManager) -> None:
+        """
+        The oldest items are evicted.
+        """
+        # Setup
+        drop_oldest_queue = queue_proxy_wrapper.QueueProxyWrapper(
+            mp_manager, 3, policy=queue_proxy_wrapper.QueueProxyWrapper.POLICY_DROP_OLDEST
+        )
+
+        # Run
+        for i in range(5):
+            drop_oldest_queue.put(i)
+
+        # Test
+        assert drop_oldest_queue.get_many(10) == [2, 3, 4]
+        assert drop_oldest_queue.get_drop_count() == 2
+
+    def test_drop_newest(self, mp_manager: multiprocessing.managers.SyncManager) -> None:
+        """
+        Items put into a full queue are dropped.
+        """
+        # Setup
+        drop_newest_queue = queue_proxy_wrapper.QueueProxyWrapper(
+            mp_manager, 3, policy=queue_proxy_wrapper.QueueProxyWrapper.POLICY_DROP_NEWEST
+        )
+
+        # Run
+        drop_newest_queue.put_many(list(range(5)))
+
+        # Test
+        assert drop_newest_queue.get_many(10) == [0, 1, 2]
+        assert drop_newest_queue.get_drop_count() == 2
+
+    def test_sentinel_not_evicted(self, mp_manager: multiprocessing.managers.SyncManager) -> None:
+        """
+        A sentinel stays in the queue and the newer item is dropped instead.
+        """
+        # Setup
+        latest_queue = queue_proxy_wrapper.QueueProxyWrapper(
+            mp_manager,
+            name="test",
+            is_instrumented=True,
+            policy=queue_proxy_wrapper.QueueProxyWrapper.POLICY_LATEST,
+        )
+
+        # Run
+        latest_queue.put(None)
+        latest_queue.put(1)
+        snapshot = latest_queue.get_snapshot()
+
+        # Test
+        assert latest_queue.get_many(10) == [None]
+        assert snapshot is not None
+        assert snapshot.drop_count == 1
+
+    def test_sentinel_space_taken(self) -> None:
+        """
+        Putting an evicted sentinel back never blocks, even if its space was taken meanwhile.
+        """
+        # Setup
+        latest_queue = queue_proxy_wrapper.QueueProxyWrapper(
+            None,
+            SLOT_COUNT,
+            queue_proxy_wrapper.QueueProxyWrapper.BACKEND_SHARED_MEMORY,
+            policy=queue_proxy_wrapper.QueueProxyWrapper.POLICY_LATEST,
+        )
+        latest_queue.close()
+        latest_queue.queue = ProducerRacingQueue(1)
+
+        # Run
+        latest_queue.put(None)
+        latest_queue.put(1)
+
+        # Test
+        assert latest_queue.queue.get_nowait() == "other"
+        assert latest_queue.get_drop_count() == 2
+
+    def test_drop_policy_requires_maxsize(
+        self, mp_manager: multiprocessing.managers.SyncManager
+    ) -> None:
+        """
+        An unbounded queue never has anything to drop.
+        """
+        with pytest.raises(ValueError):
+            queue_proxy_wrapper.QueueProxyWrapper(
+                mp_manager, policy=queue_proxy_wrapper.QueueProxyWrapper.POLICY_DROP_OLDEST
+            )
+
+
+class TestDrain:
+    """
+    Draining and sentinels work for any queue size.
+    """
+
+    def test_drain_unbounded(self, manager_queue: queue_proxy_wrapper.QueueProxyWrapper) -> None:
+        """
+        Everything is removed from an unbounded queue, including batches.
+        """
+        # Setup
+        for i in range(10):
+            manager_queue.put(i)
+
+        manager_queue.put_many(list(range(5)))
+
+        # Run
+        count = manager_queue.drain_queue()
+
+        # Test
+        assert count == 15
+        assert manager_queue.queue.empty()
+
+    def test_drain_shared_memory(
+        self, shared_memory_queue: queue_proxy_wrapper.QueueProxyWrapper
+    ) -> None:
+        """
+        A full shared memory queue is emptied.
+        """
+        # Setup
+        shared_memory_queue.put_many(list(range(SLOT_COUNT)))
+
+        # Run
+        count = shared_memory_queue.drain_queue()
+
+        # Test
+        assert count == SLOT_COUNT
+        assert shared_memory_queue.queue.empty()
+
+    def test_sentinel_per_consumer(
+        self, manager_queue: queue_proxy_wrapper.QueueProxyWrapper
+    ) -> None:
+        """
+        An unbounded queue gets exactly 1 sentinel per registered consumer.
+        """
+        # Setup
+        manager_queue.add_consumers(3)
+        manager_queue.add_consumers(-1)
+
+        # Run
+        manager_queue.fill_queue_with_sentinel()
+
+        # Test
+        assert manager_queue.get_many(10) == [None, None]
+
+    def test_fill_and_drain(self, manager_queue: queue_proxy_wrapper.QueueProxyWrapper) -> None:
+        """
+        Leftover items are removed and only the sentinels remain.
+        """
+        # Setup
+        manager_queue.add_consumers(1)
+        manager_queue.put_many([0, 1, 2])
+
+        # Run
+        manager_queue.fill_and_drain_queue()
+
+        # Test
+        assert manager_queue.get_many(10) == [None]
@@ -0,0 +1,50 @@
+"""
+Test the queue statistics histogram.
+"""
+
+import pytest
+
+from utilities.workers import queue_statistics
+
+
+class TestHistogram:
+    """
+    Wait times are bucketed with bounded relative error.
+    """
+
+    @pytest.mark.parametrize("wait_time", [2e-6, 1e-4, 0.0123, 1.0, 42.0])
+    def test_bucket_bounds(self, wait_time: float) -> None:
+        """
+        The bucket upper bound is at least the wait time and within one bucket ratio of it.
+        """
+        statistics = queue_statistics.QueueStatistics
+        bucket = statistics.get_bucket(wait_time)
+        upper_bound = statistics.get_bucket_upper_bound(bucket)
+
+        assert wait_time <= upper_bound * (1.0 + 1e-9)
+        assert upper_bound < wait_time * statistics.BUCKET_RATIO
+
+    def test_percentiles(self) -> None:
+        """
+        Percentiles of a known distribution.
+        """
+        # Setup
+        statistics = queue_statistics.QueueStatistics("test")
+        statistics.record_get([0.001] * 90 + [0.01] * 9 + [1.0])
+
+        # Run
+        snapshot = statistics.snapshot(0)
+
+        # Test
+        assert snapshot.wait_p50 == pytest.approx(0.001, rel=0.13)
+        assert snapshot.wait_p95 == pytest.approx(0.01, rel=0.13)
+        assert snapshot.wait_p99 == pytest.approx(0.01, rel=0.13)
+        assert snapshot.get_count == 100
+
+    def test_overflow_bucket(self) -> None:
+        """
+        Waits longer than the histogram range go in the last bucket.
+        """
+        statistics = queue_statistics.QueueStatistics
+        assert statistics.get_bucket(1e6) == statistics.BUCKET_COUNT - 1
+        assert statistics.get_bucket(0.0) == 0
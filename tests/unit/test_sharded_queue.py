@@ -0,0 +1,165 @@
+"""
+Test routing items to shards by key.
+"""
+
+import threading
+import time
+
+import pytest
+
+from utilities.workers import queue_proxy_wrapper
+from utilities.workers import sharded_queue
+
+
+# Test functions use test fixture signature names
+# No enable
+# pylint: disable=redefined-outer-name
+
+
+SHARD_COUNT = 3
+GET_TIMEOUT = 0.1  # seconds
+
+
+def get_vehicle(item: "tuple[str, int]") -> str:
+    """
+    Key of a test item.
+    """
+    return item[0]
+
+
+def create_shards(count: int) -> "list[queue_proxy_wrapper.QueueProxyWrapper]":
+    """
+    Instrumented shared memory shards.
+    """
+    return [
+        queue_proxy_wrapper.QueueProxyWrapper(
+            None,
+            16,
+            queue_proxy_wrapper.QueueProxyWrapper.BACKEND_SHARED_MEMORY,
+            name=f"test[{i}]",
+            is_instrumented=True,
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.fixture()
+def queue() -> sharded_queue.ShardedQueue:
+    """
+    Shards keyed by vehicle.
+    """
+    queue = sharded_queue.ShardedQueue(create_shards(SHARD_COUNT), get_vehicle, "test")
+    yield queue  # type: ignore
+    queue.close()
+
+
+class TestShardedQueue:
+    """
+    Putting into and getting from the shards.
+    """
+
+    def test_same_key_same_shard(self, queue: sharded_queue.ShardedQueue) -> None:
+        """
+        Every item of a key is in 1 shard, in order.
+        """
+        # Setup
+        items = [(vehicle, i) for i in range(4) for vehicle in ("a", "b", "c", "d")]
+
+        # Run
+        queue.put_many(items[:8])
+        for item in items[8:]:
+            queue.put(item)
+
+        # Test
+        for index in range(SHARD_COUNT):
+            shard_items = queue.get_shard(index).get_many(len(items))
+            for item in shard_items:
+                assert queue.get_shard_index(item) == index
+                assert [i for i in items if i[0] == item[0]] == [
+                    i for i in shard_items if i[0] == item[0]
+                ]
+
+    def test_integer_key(self) -> None:
+        """
+        Integer keys are spread in order.
+        """
+        queue = sharded_queue.ShardedQueue(create_shards(2), abs)
+        indices = [queue.get_shard_index(i) for i in range(4)]
+        queue.close()
+        assert indices == [0, 1, 0, 1]
+
+    def test_sentinel_broadcast(self, queue: sharded_queue.ShardedQueue) -> None:
+        """
+        Every shard gets the sentinel.
+        """
+        # Run
+        queue.put(None)
+        queue.put_many([("a", 0), None])
+
+        # Test
+        assert queue.drain_queue() == 2 * SHARD_COUNT + 1
+        for index in range(SHARD_COUNT):
+            assert queue.get_shard(index).get_many(1) == []
+
+    def test_snapshot(self, queue: sharded_queue.ShardedQueue) -> None:
+        """
+        Counts are totalled over the shards.
+        """
+        # Setup
+        items = [(vehicle, 0) for vehicle in ("a", "b", "c", "d", "e")]
+        queue.put_many(items)
+
+        # Run
+        got_items = queue.get_many(2)
+        snapshot = queue.get_snapshot()
+
+        # Test
+        assert len(got_items) == 2
+        assert snapshot is not None
+        assert snapshot.name == "test"
+        assert snapshot.put_count == len(items)
+        assert snapshot.get_count == 2
+        assert snapshot.depth == len(items) - 2
+
+    def test_qsize(self, queue: sharded_queue.ShardedQueue) -> None:
+        """
+        Size is the total over the shards.
+        """
+        queue.put_many([(vehicle, 0) for vehicle in ("a", "b", "c", "d", "e")])
+
+        assert queue.qsize() == 5
+
+    def test_get_many_timeout(self, queue: sharded_queue.ShardedQueue) -> None:
+        """
+        Waits up to the timeout for the first item, like QueueProxyWrapper.
+        """
+        # Run
+        start_time = time.monotonic()
+        items = queue.get_many(1, GET_TIMEOUT)
+        wait_time = time.monotonic() - start_time
+
+        # Test
+        assert items == []
+        assert wait_time >= GET_TIMEOUT
+
+    def test_get_many_wakes_on_put(self, queue: sharded_queue.ShardedQueue) -> None:
+        """
+        An item put into any shard while waiting is returned.
+        """
+        # Setup
+        timer = threading.Timer(GET_TIMEOUT, queue.put, (("a", 0),))
+        timer.start()
+
+        # Run
+        items = queue.get_many(1, 10 * GET_TIMEOUT)
+        timer.join()
+
+        # Test
+        assert items == [("a", 0)]
+
+    def test_no_shards(self) -> None:
+        """
+        At least 1 shard is required.
+        """
+        with pytest.raises(ValueError):
+            sharded_queue.ShardedQueue([], get_vehicle)
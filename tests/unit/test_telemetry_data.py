@@ -0,0 +1,84 @@
+"""
+Test the TelemetryData binary encoding.
+"""
+
+import pickle
+
+from modules.telemetry import telemetry
+from utilities.workers import latency_trace
+
+
+def fields(data: telemetry.TelemetryData) -> list:
+    """
+    Values of every field in order.
+    """
+    return [getattr(data, name) for name in telemetry.TelemetryData.__slots__]
+
+
+class TestTelemetryDataCodec:
+    """
+    Encoding round trips, including absent fields.
+    """
+
+    def test_round_trip(self) -> None:
+        """
+        All fields present.
+        """
+        # Setup
+        data = telemetry.TelemetryData(1000, 1.0, 2.0, 3.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 7, 8, 9)
+
+        # Run
+        encoded = data.encode()
+        decoded = telemetry.TelemetryData.decode(encoded)
+
+        # Test
+        assert len(encoded) == telemetry.TelemetryData.ENCODED_SIZE
+        assert fields(decoded) == fields(data)
+
+    def test_absent_fields(self) -> None:
+        """
+        None fields stay None instead of becoming 0 .
+        """
+        # Setup
+        data = telemetry.TelemetryData(x=0.0, z=-1.5, yaw_speed=0.25)
+
+        # Run
+        decoded = telemetry.TelemetryData.decode(data.encode())
+
+        # Test
+        assert fields(decoded) == fields(data)
+
+    def test_pickle_uses_encoding(self) -> None:
+        """
+        Pickling goes through the compact encoding.
+        """
+        # Setup
+        data = telemetry.TelemetryData(1000, x=1.0, y=2.0)
+
+        # Run
+        pickled = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+        unpickled = pickle.loads(pickled)
+
+        # Test
+        assert data.encode() in pickled
+        assert fields(unpickled) == fields(data)
+
+    def test_pickle_keeps_trace(self) -> None:
+        """
+        The trace is carried across the queue with the data.
+        """
+        # Setup
+        trace = latency_trace.TraceContext(5, 1.0, "telemetry_1")
+        trace.mark("telemetry")
+        data = telemetry.TelemetryData(1000, x=1.0, trace=trace)
+
+        # Run
+        unpickled = pickle.loads(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+
+        # Test
+        assert fields(unpickled) == fields(data)[:-1] + [unpickled.trace]
+        assert unpickled.trace.source == "telemetry_1"
+        assert unpickled.trace.sequence_id == 5
+        assert unpickled.trace.receive_time == 1.0
+        assert unpickled.trace.stages == ["telemetry"]
+        assert unpickled.trace.times == trace.times
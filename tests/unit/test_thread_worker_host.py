@@ -0,0 +1,181 @@
+"""
+Test the thread worker host.
+"""
+
+import socket
+import subprocess
+import sys
+import threading
+
+import pytest
+from pymavlink.dialects.v20 import common as mavlink
+
+from utilities.workers import thread_worker_host
+from utilities.workers import worker_controller
+from tests.unit import helpers
+
+
+# Test functions use test fixture signature names and access class privates
+# No enable
+# pylint: disable=protected-access,redefined-outer-name
+
+
+WORKER_COUNT = 3
+MESSAGE_COUNT = 5
+RECEIVE_TIMEOUT = 0.5  # seconds
+JOIN_TIMEOUT = 5.0  # seconds
+
+
+class FakeConnection:
+    """
+    Non-blocking socket with the part of the `mavutil.mavfile` interface the host uses.
+    """
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.__socket = sock
+        self.__parser = mavlink.MAVLink(None)
+        self.__pending: "list[mavlink.MAVLink_message]" = []
+        self.fd = sock.fileno()
+        self.mav = mavlink.MAVLink(None)
+        self.messages: "dict[str, mavlink.MAVLink_message]" = {}
+
+    def recv_msg(self) -> "mavlink.MAVLink_message | None":
+        """
+        Returns the next complete message, or None.
+        """
+        try:
+            data = self.__socket.recv(4096)
+        except BlockingIOError:
+            data = b""
+
+        for message in self.__parser.parse_buffer(data) or []:
+            self.messages[message.get_type()] = message
+            self.__pending.append(message)
+
+        if len(self.__pending) == 0:
+            return None
+
+        return self.__pending.pop(0)
+
+
+@pytest.fixture()
+def socket_pair() -> "tuple[socket.socket, socket.socket]":  # type: ignore
+    """
+    Host side is non-blocking.
+    """
+    host_side, drone_side = socket.socketpair()
+    host_side.setblocking(False)
+    yield host_side, drone_side  # type: ignore
+    host_side.close()
+    drone_side.close()
+
+
+def count_heartbeats(
+    connection: thread_worker_host.HostedMavlinkConnection,
+    counts: "list[int]",
+    index: int,
+    controller: worker_controller.WorkerController,
+) -> None:
+    """
+    Blocking worker function that counts received heartbeats until exit.
+    """
+    while not controller.is_exit_requested():
+        message = connection.recv_match(type="HEARTBEAT", blocking=False, timeout=RECEIVE_TIMEOUT)
+        if message is not None:
+            counts[index] += 1
+            if counts[index] == MESSAGE_COUNT:
+                return
+
+
+class TestThreadWorkerHost:
+    """
+    Running blocking worker functions on the host.
+    """
+
+    def test_create_without_fd(self) -> None:
+        """
+        The host needs a file descriptor to wait on.
+        """
+        result, host = thread_worker_host.ThreadWorkerHost.create(object(), helpers.FakeLogger())
+
+        assert not result
+        assert host is None
+
+    def test_every_worker_receives_every_message(
+        self, socket_pair: "tuple[socket.socket, socket.socket]"
+    ) -> None:
+        """
+        Messages are delivered to all workers instead of the first to read the socket.
+        """
+        host_side, drone_side = socket_pair
+        connection = FakeConnection(host_side)
+        result, host = thread_worker_host.ThreadWorkerHost.create(connection, helpers.FakeLogger())
+        assert result
+        assert host is not None
+
+        controller = worker_controller.WorkerController()
+        counts = [0] * WORKER_COUNT
+        workers = [
+            thread_worker_host.HostedWorker(
+                host, count_heartbeats, (connection, counts, index, controller)
+            )
+            for index in range(WORKER_COUNT)
+        ]
+        for worker in workers:
+            worker.start()
+
+        host.start()
+
+        # Workers subscribe as soon as they are submitted, so none of these are missed
+        drone = mavlink.MAVLink(None)
+        for _ in range(MESSAGE_COUNT):
+            drone_side.send(drone.heartbeat_encode(2, 3, 0, 0, 0).pack(drone))
+
+        for worker in workers:
+            worker.join(JOIN_TIMEOUT)
+
+        controller.request_exit()
+        host.stop()
+
+        assert not any(worker.is_alive() for worker in workers)
+        assert counts == [MESSAGE_COUNT] * WORKER_COUNT
+
+    def test_send_only_worker_is_bounded(
+        self, socket_pair: "tuple[socket.socket, socket.socket]"
+    ) -> None:
+        """
+        Messages a worker never receives are dropped, oldest first, instead of accumulating.
+        """
+        host_side, _ = socket_pair
+        connection = thread_worker_host.HostedMavlinkConnection(
+            FakeConnection(host_side), threading.Lock()
+        )
+        drone = mavlink.MAVLink(None)
+        for sequence in range(thread_worker_host.HostedMavlinkConnection.MAX_PENDING_MESSAGES + 5):
+            connection.deliver(drone.system_time_encode(sequence, 0))
+
+        message = connection.recv_match(type="SYSTEM_TIME")
+        assert message is not None
+        assert message.time_unix_usec == 5
+
+    def test_stuck_worker_does_not_keep_process_alive(self) -> None:
+        """
+        The interpreter exits after the host is stopped, even with a worker that never returns.
+        """
+        code = (
+            "import threading\n"
+            "from utilities.workers import thread_worker_host\n"
+            "class Logger:\n"
+            "    def error(self, message, log_with_frame_info=True): pass\n"
+            "_, host = thread_worker_host.ThreadWorkerHost.create(None, Logger())\n"
+            "host.start()\n"
+            "started = threading.Event()\n"
+            "def stuck(): started.set(); threading.Event().wait()\n"
+            "thread_worker_host.HostedWorker(host, stuck, ()).start()\n"
+            "started.wait()\n"
+            "host.stop()\n"
+        )
+
+        completed = subprocess.run([sys.executable, "-c", code], timeout=JOIN_TIMEOUT, check=False)
+
+        assert completed.returncode == 0
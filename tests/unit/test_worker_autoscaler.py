@@ -0,0 +1,232 @@
+"""
+Test scaling workers with their input queue depth.
+"""
+
+import time
+
+import pytest
+
+from utilities.workers import queue_proxy_wrapper
+from utilities.workers import worker_autoscaler
+from utilities.workers import worker_controller
+from utilities.workers import worker_manager
+from tests.unit import helpers
+
+
+MIN_COUNT = 1
+MAX_COUNT = 4
+TARGET_DRAIN_TIME = 1.0  # seconds
+SERVICE_TIME = 0.1  # seconds
+WORK_TIME = SERVICE_TIME * 6  # seconds per item reported by the workers
+SCALE_DOWN_DELAY = 5.0  # seconds
+SLOT_COUNT = 8
+WORKER_COUNT = 2
+WAIT_TIMEOUT = 5.0  # seconds
+
+
+def exit_on_sentinel_worker(
+    input_queue: queue_proxy_wrapper.QueueProxyWrapper,
+    controller: worker_controller.WorkerController,
+) -> None:
+    """
+    Takes items until a sentinel or exit, reporting each as taking WORK_TIME.
+    """
+    while not controller.is_exit_requested():
+        items = input_queue.get_many(1, 0.01)
+        if None in items:
+            return
+
+        controller.report_work(len(items), WORK_TIME * len(items))
+
+
+def create_manager(
+    input_queue: queue_proxy_wrapper.QueueProxyWrapper,
+) -> worker_manager.WorkerManager:
+    """
+    Thread workers consuming the queue, not started.
+    """
+    result, properties = worker_manager.WorkerProperties.create(
+        count=WORKER_COUNT,
+        target=exit_on_sentinel_worker,
+        work_arguments=(),
+        input_queues=[input_queue],
+        output_queues=[],
+        controller=worker_controller.WorkerController(),
+        local_logger=helpers.FakeLogger(),
+    )
+    assert result
+    assert properties is not None
+
+    result, manager = worker_manager.WorkerManager.create(
+        worker_properties=properties,
+        local_logger=helpers.FakeLogger(),
+        backend=worker_manager.WorkerManager.BACKEND_THREAD,
+    )
+    assert result
+    assert manager is not None
+    return manager
+
+
+def create_policy() -> worker_autoscaler.ScalingPolicy:
+    """
+    Policy where 1 worker drains 10 items in time.
+    """
+    result, policy = worker_autoscaler.ScalingPolicy.create(
+        min_count=MIN_COUNT,
+        max_count=MAX_COUNT,
+        target_drain_time=TARGET_DRAIN_TIME,
+        service_time=SERVICE_TIME,
+        scale_down_delay=SCALE_DOWN_DELAY,
+        local_logger=helpers.FakeLogger(),
+    )
+    assert result
+    assert policy is not None
+    return policy
+
+
+class TestScalingPolicy:
+    """
+    Worker counts for injected queue depths and times.
+    """
+
+    def test_scale_up_immediately(self) -> None:
+        """
+        Enough workers to drain the queue in time are wanted at once, within the bounds.
+        """
+        policy = create_policy()
+
+        assert policy.get_desired_count(25, 1, 0.0) == 3
+        assert policy.get_desired_count(100, 1, 0.0) == MAX_COUNT
+        assert policy.get_desired_count(0, 1, 0.0) == MIN_COUNT
+
+    def test_scale_down_after_delay(self) -> None:
+        """
+        Fewer workers are only wanted once they have been enough for the delay.
+        """
+        policy = create_policy()
+
+        assert policy.get_desired_count(0, 3, 0.0) == 3
+        assert policy.get_desired_count(0, 3, SCALE_DOWN_DELAY / 2) == 3
+        assert policy.get_desired_count(0, 3, SCALE_DOWN_DELAY) == MIN_COUNT
+
+    def test_burst_restarts_delay(self) -> None:
+        """
+        A burst needing the current workers again restarts the wait before scaling down.
+        """
+        policy = create_policy()
+
+        assert policy.get_desired_count(0, 3, 0.0) == 3
+        assert policy.get_desired_count(30, 3, 1.0) == 3
+        assert policy.get_desired_count(0, 3, 2.0) == 3
+        assert policy.get_desired_count(0, 3, SCALE_DOWN_DELAY) == 3
+        assert policy.get_desired_count(0, 3, 2.0 + SCALE_DOWN_DELAY) == MIN_COUNT
+
+    def test_service_time_estimate(self) -> None:
+        """
+        Measured service times move the estimate, and with it the workers wanted.
+        """
+        # Setup
+        policy = create_policy()
+
+        # Run
+        policy.update_service_time(SERVICE_TIME * 6)
+        # Ignored
+        policy.update_service_time(0.0)
+        desired_count = policy.get_desired_count(9, 1, 0.0)
+
+        # Test
+        assert policy.get_service_time() == pytest.approx(SERVICE_TIME * 2)
+        assert desired_count == 2
+
+    def test_invalid_arguments(self) -> None:
+        """
+        Bounds must be ordered and times positive.
+        """
+        for min_count, max_count, target_drain_time, service_time, scale_down_delay in (
+            (0, MAX_COUNT, TARGET_DRAIN_TIME, SERVICE_TIME, SCALE_DOWN_DELAY),
+            (MAX_COUNT, MIN_COUNT, TARGET_DRAIN_TIME, SERVICE_TIME, SCALE_DOWN_DELAY),
+            (MIN_COUNT, MAX_COUNT, 0.0, SERVICE_TIME, SCALE_DOWN_DELAY),
+            (MIN_COUNT, MAX_COUNT, TARGET_DRAIN_TIME, 0.0, SCALE_DOWN_DELAY),
+            (MIN_COUNT, MAX_COUNT, TARGET_DRAIN_TIME, SERVICE_TIME, -1.0),
+        ):
+            result, policy = worker_autoscaler.ScalingPolicy.create(
+                min_count=min_count,
+                max_count=max_count,
+                target_drain_time=target_drain_time,
+                service_time=service_time,
+                scale_down_delay=scale_down_delay,
+                local_logger=helpers.FakeLogger(),
+            )
+            assert not result
+            assert policy is None
+
+
+class TestWorkerAutoscaler:
+    """
+    Applying the policy to a manager.
+    """
+
+    @pytest.mark.parametrize(
+        "policy",
+        [
+            queue_proxy_wrapper.QueueProxyWrapper.POLICY_LATEST,
+            queue_proxy_wrapper.QueueProxyWrapper.POLICY_DROP_OLDEST,
+            queue_proxy_wrapper.QueueProxyWrapper.POLICY_DROP_NEWEST,
+        ],
+    )
+    def test_dropping_queue_rejected(self, policy: str) -> None:
+        """
+        A queue that drops instead of growing never shows a backlog to scale on.
+        """
+        # Setup
+        input_queue = queue_proxy_wrapper.QueueProxyWrapper(
+            None,
+            SLOT_COUNT,
+            queue_proxy_wrapper.QueueProxyWrapper.BACKEND_SHARED_MEMORY,
+            policy=policy,
+        )
+        manager = create_manager(input_queue)
+
+        # Run
+        result, autoscaler = worker_autoscaler.WorkerAutoscaler.create(
+            manager, create_policy(), helpers.FakeLogger()
+        )
+        input_queue.close()
+
+        # Test
+        assert not result
+        assert autoscaler is None
+
+    def test_service_time_measured(self) -> None:
+        """
+        Each scale updates the policy with the work the workers reported since the last one.
+        """
+        # Setup
+        input_queue = queue_proxy_wrapper.QueueProxyWrapper(
+            None, SLOT_COUNT, queue_proxy_wrapper.QueueProxyWrapper.BACKEND_SHARED_MEMORY
+        )
+        manager = create_manager(input_queue)
+        policy = create_policy()
+        result, autoscaler = worker_autoscaler.WorkerAutoscaler.create(
+            manager, policy, helpers.FakeLogger()
+        )
+        assert result
+        assert autoscaler is not None
+
+        manager.start_workers()
+        input_queue.put("item")
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        while manager.get_work()[0] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        # Run
+        autoscaler.scale(0.0)
+        measured_service_time = policy.get_service_time()
+        # Nothing reported since
+        autoscaler.scale(0.0)
+        manager.shutdown(time.monotonic() + WAIT_TIMEOUT)
+        input_queue.close()
+
+        # Test
+        assert measured_service_time == pytest.approx(SERVICE_TIME * 2)
+        assert policy.get_service_time() == pytest.approx(SERVICE_TIME * 2)
@@ -0,0 +1,292 @@
+"""
+Test the worker controller.
+"""
+
+import multiprocessing as mp
+import time
+
+import pytest
+
+from utilities.workers import worker_controller
+
+
+# Test functions use test fixture signature names and access class privates
+# No enable
+# pylint: disable=protected-access,redefined-outer-name
+
+
+WAIT_TIMEOUT = 5.0  # seconds
+
+
+@pytest.fixture()
+def controller() -> worker_controller.WorkerController:  # type: ignore
+    """
+    Controller with no requests.
+    """
+    yield worker_controller.WorkerController()  # type: ignore
+
+
+def wait_then_report(
+    controller: worker_controller.WorkerController, timeout: float, results: "mp.Queue"
+) -> None:
+    """
+    Worker process that waits for exit and reports how long it took.
+    """
+    start_time = time.monotonic()
+    is_exit_requested = controller.wait_for_exit(timeout)
+    results.put((is_exit_requested, time.monotonic() - start_time))
+
+
+def pause_then_report(controller: worker_controller.WorkerController, results: "mp.Queue") -> None:
+    """
+    Worker process that reports once it is past the pause check.
+    """
+    controller.check_pause()
+    results.put(True)
+
+
+class TestExit:
+    """
+    Exit request and clear.
+    """
+
+    def test_request_and_clear(self, controller: worker_controller.WorkerController) -> None:
+        """
+        Exit flag follows requests.
+        """
+        assert not controller.is_exit_requested()
+
+        controller.request_exit()
+        assert controller.is_exit_requested()
+
+        controller.clear_exit()
+        assert not controller.is_exit_requested()
+
+    def test_wait_for_exit_timeout(self, controller: worker_controller.WorkerController) -> None:
+        """
+        Waiting without a request returns False after the timeout.
+        """
+        assert not controller.wait_for_exit(0.01)
+
+    def test_wait_for_exit_wakes(self, controller: worker_controller.WorkerController) -> None:
+        """
+        A worker waiting a long period exits as soon as exit is requested.
+        """
+        # Setup
+        results = mp.Queue()
+        worker = mp.Process(target=wait_then_report, args=(controller, WAIT_TIMEOUT, results))
+        worker.start()
+
+        # Run
+        controller.request_exit()
+        is_exit_requested, waited = results.get(timeout=WAIT_TIMEOUT)
+        worker.join()
+
+        # Test
+        assert is_exit_requested
+        assert waited < WAIT_TIMEOUT
+
+
+class TestPause:
+    """
+    Pause and resume.
+    """
+
+    def test_not_paused(self, controller: worker_controller.WorkerController) -> None:
+        """
+        Pause check returns immediately when not paused.
+        """
+        controller.check_pause()
+
+    def test_pause_blocks_until_resume(
+        self, controller: worker_controller.WorkerController
+    ) -> None:
+        """
+        Paused worker continues after resume.
+        """
+        # Setup
+        results = mp.Queue()
+        controller.request_pause()
+        worker = mp.Process(target=pause_then_report, args=(controller, results))
+        worker.start()
+
+        # Run
+        is_blocked = results.empty() and worker.is_alive()
+        time.sleep(0.1)
+        is_still_blocked = results.empty()
+        controller.request_resume()
+        is_resumed = results.get(timeout=WAIT_TIMEOUT)
+        worker.join()
+
+        # Test
+        assert is_blocked
+        assert is_still_blocked
+        assert is_resumed
+
+    def test_exit_unblocks_pause(self, controller: worker_controller.WorkerController) -> None:
+        """
+        Paused worker continues on exit request so it can exit.
+        """
+        # Setup
+        results = mp.Queue()
+        controller.request_pause()
+        worker = mp.Process(target=pause_then_report, args=(controller, results))
+        worker.start()
+
+        # Run
+        controller.request_exit()
+        is_unblocked = results.get(timeout=WAIT_TIMEOUT)
+        worker.join()
+
+        # Test
+        assert is_unblocked
+
+
+class TestChild:
+    """
+    Child controllers for pausing a subset of workers.
+    """
+
+    def test_pause_only_child(self, controller: worker_controller.WorkerController) -> None:
+        """
+        Pausing a child does not pause the parent or its siblings.
+        """
+        # Setup
+        child = controller.create_child()
+        sibling = controller.create_child()
+
+        # Run
+        child.request_pause()
+
+        # Test
+        assert child.is_pause_requested()
+        assert not sibling.is_pause_requested()
+        assert not controller.is_pause_requested()
+        sibling.check_pause()
+
+    def test_parent_pauses_children(self, controller: worker_controller.WorkerController) -> None:
+        """
+        Pausing and resuming the parent applies to every child.
+        """
+        # Setup
+        child = controller.create_child()
+
+        # Run
+        controller.request_pause()
+        is_paused = child.is_pause_requested()
+        controller.request_resume()
+
+        # Test
+        assert is_paused
+        assert not child.is_pause_requested()
+
+    def test_exit_shared(self, controller: worker_controller.WorkerController) -> None:
+        """
+        Exit requested through either is seen by both, and unblocks paused children.
+        """
+        # Setup
+        child = controller.create_child()
+        child.request_pause()
+        results = mp.Queue()
+        worker = mp.Process(target=pause_then_report, args=(child, results))
+        worker.start()
+
+        # Run
+        child.request_exit()
+        is_unblocked = results.get(timeout=WAIT_TIMEOUT)
+        worker.join()
+        is_parent_exit_requested = controller.is_exit_requested()
+        controller.clear_exit()
+
+        # Test
+        assert is_unblocked
+        assert is_parent_exit_requested
+        assert not child.is_exit_requested()
+
+    def test_paused_count(self, controller: worker_controller.WorkerController) -> None:
+        """
+        Workers blocked in the pause check are counted until resumed.
+        """
+        # Setup
+        child = controller.create_child()
+        child.request_pause()
+        results = mp.Queue()
+        workers = [mp.Process(target=pause_then_report, args=(child, results)) for _ in range(2)]
+        for worker in workers:
+            worker.start()
+
+        # Run
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        while child.get_paused_count() < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        paused_count = child.get_paused_count()
+        child.request_resume()
+        for _ in workers:
+            results.get(timeout=WAIT_TIMEOUT)
+
+        for worker in workers:
+            worker.join()
+
+        # Test
+        assert paused_count == 2
+        assert child.get_paused_count() == 0
+        assert controller.get_paused_count() == 0
+
+
+class TestProgress:
+    """
+    Progress reports for finding stuck workers.
+    """
+
+    def test_stall_duration(self, controller: worker_controller.WorkerController) -> None:
+        """
+        Stall duration grows until progress is reported.
+        """
+        # Setup
+        controller.reset_progress()
+        time.sleep(0.05)
+
+        # Run
+        stall_duration = controller.get_stall_duration()
+        controller.report_progress()
+
+        # Test
+        assert stall_duration >= 0.05
+        assert controller.get_stall_duration() < 0.05
+        assert controller.get_progress_count() == 1
+
+    def test_paused_not_stalled(self, controller: worker_controller.WorkerController) -> None:
+        """
+        A worker blocked in the pause check is not stalled, and progresses when resumed.
+        """
+        # Setup
+        controller.request_pause()
+        results = mp.Queue()
+        worker = mp.Process(target=pause_then_report, args=(controller, results))
+        worker.start()
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        while controller.get_paused_count() == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        # Run
+        paused_stall_duration = controller.get_stall_duration()
+        controller.request_resume()
+        results.get(timeout=WAIT_TIMEOUT)
+        worker.join()
+
+        # Test
+        assert paused_stall_duration == 0.0
+        assert controller.get_progress_count() == 1
+
+    def test_work_totals(self, controller: worker_controller.WorkerController) -> None:
+        """
+        Reported work adds up, and is kept when the progress is reset for a new worker.
+        """
+        # Run
+        controller.report_work(2, 0.5)
+        controller.reset_progress()
+        controller.report_work(3, 0.25)
+
+        # Test
+        assert controller.get_work() == (5, 0.75)
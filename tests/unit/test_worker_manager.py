@@ -0,0 +1,441 @@
+"""
+Test stopping workers with the worker manager.
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from utilities.workers import queue_proxy_wrapper
+from utilities.workers import worker_controller
+from utilities.workers import worker_manager
+from tests.unit import helpers
+
+
+# Test functions use test fixture signature names and access class privates
+# No enable
+# pylint: disable=protected-access,redefined-outer-name
+
+
+WORKER_COUNT = 2
+SHUTDOWN_TIMEOUT = 0.5  # seconds
+# Escalation takes up to 1 second each for terminate and kill
+MAX_SHUTDOWN_TIME = SHUTDOWN_TIMEOUT + 2.0  # seconds
+STALL_TIMEOUT = 0.2  # seconds
+RESULT_TIMEOUT = 5.0  # seconds
+# Lowering priority is always allowed, unlike raising it
+WORKER_NICE = 5
+
+
+def exit_on_request_worker(controller: worker_controller.WorkerController) -> None:
+    """
+    Exits as soon as exit is requested.
+    """
+    controller.wait_for_exit()
+
+
+def stuck_worker(
+    controller: worker_controller.WorkerController,  # pylint: disable=unused-argument
+) -> None:
+    """
+    Ignores the exit request for longer than the test.
+    """
+    time.sleep(60.0)
+
+
+def progressing_worker(controller: worker_controller.WorkerController) -> None:
+    """
+    Reports progress every few milliseconds until exit is requested.
+    """
+    while not controller.wait_for_exit(0.005):
+        controller.report_progress()
+
+
+def idle_consumer_worker(
+    input_queue: queue_proxy_wrapper.QueueProxyWrapper,  # pylint: disable=unused-argument
+    controller: worker_controller.WorkerController,
+) -> None:
+    """
+    Leaves its input queue alone until exit is requested.
+    """
+    controller.wait_for_exit()
+
+
+def scheduling_reporting_worker(
+    output_queue: queue_proxy_wrapper.QueueProxyWrapper,
+    controller: worker_controller.WorkerController,
+) -> None:
+    """
+    Reports the CPUs it may run on and its niceness, then exits when requested.
+    """
+    output_queue.put((os.sched_getaffinity(0), os.getpriority(os.PRIO_PROCESS, 0)))
+    controller.wait_for_exit()
+
+
+def create_properties(
+    target: "(...) -> object",  # type: ignore
+    input_queues: "list[queue_proxy_wrapper.QueueProxyWrapper] | None" = None,
+) -> worker_manager.WorkerProperties:
+    """
+    Properties of workers without output queues.
+    """
+    result, properties = worker_manager.WorkerProperties.create(
+        count=WORKER_COUNT,
+        target=target,
+        work_arguments=(),
+        input_queues=[] if input_queues is None else input_queues,
+        output_queues=[],
+        controller=worker_controller.WorkerController(),
+        local_logger=helpers.FakeLogger(),
+    )
+    assert result
+    assert properties is not None
+    return properties
+
+
+def create_manager(
+    target: "(...) -> object",  # type: ignore
+    backend: str,
+    stall_timeout: "float | None" = None,
+) -> worker_manager.WorkerManager:
+    """
+    Starts workers without queues.
+    """
+    local_logger = helpers.FakeLogger()
+    properties = create_properties(target)
+    result, manager = worker_manager.WorkerManager.create(
+        worker_properties=properties,
+        local_logger=local_logger,
+        backend=backend,
+        stall_timeout=stall_timeout,
+    )
+    assert result
+    assert manager is not None
+
+    manager.start_workers()
+    return manager
+
+
+class TestShutdown:
+    """
+    Shutdown finishes in bounded time and reports how each worker stopped.
+    """
+
+    @pytest.mark.parametrize(
+        "backend",
+        [worker_manager.WorkerManager.BACKEND_PROCESS, worker_manager.WorkerManager.BACKEND_THREAD],
+    )
+    def test_exit(self, backend: str) -> None:
+        """
+        Workers that see the exit request exit by themselves.
+        """
+        # Setup
+        manager = create_manager(exit_on_request_worker, backend)
+
+        # Run
+        statistics = manager.shutdown(time.monotonic() + SHUTDOWN_TIMEOUT)
+
+        # Test
+        assert len(statistics) == WORKER_COUNT
+        for stop_statistics in statistics:
+            assert stop_statistics.stop == worker_manager.WorkerStopStatistics.STOP_EXITED
+            assert stop_statistics.stop_latency is not None
+            assert stop_statistics.stop_latency < SHUTDOWN_TIMEOUT
+
+    def test_stuck_process_terminated(self) -> None:
+        """
+        Processes still running at the deadline are terminated.
+        """
+        # Setup
+        manager = create_manager(stuck_worker, worker_manager.WorkerManager.BACKEND_PROCESS)
+        start_time = time.monotonic()
+
+        # Run
+        statistics = manager.shutdown(start_time + SHUTDOWN_TIMEOUT)
+
+        # Test
+        assert time.monotonic() - start_time < MAX_SHUTDOWN_TIME
+        for stop_statistics in statistics:
+            assert stop_statistics.stop == worker_manager.WorkerStopStatistics.STOP_TERMINATED
+            assert stop_statistics.stop_latency is not None
+            assert stop_statistics.stop_latency >= SHUTDOWN_TIMEOUT
+
+    def test_stuck_thread_abandoned(self) -> None:
+        """
+        Threads cannot be stopped, so they are reported instead of waited on forever.
+        """
+        # Setup
+        manager = create_manager(stuck_worker, worker_manager.WorkerManager.BACKEND_THREAD)
+        start_time = time.monotonic()
+
+        # Run
+        statistics = manager.shutdown(start_time + SHUTDOWN_TIMEOUT)
+
+        # Test
+        assert time.monotonic() - start_time < MAX_SHUTDOWN_TIME
+        for stop_statistics in statistics:
+            assert stop_statistics.stop == worker_manager.WorkerStopStatistics.STOP_ABANDONED
+            assert stop_statistics.stop_latency is None
+
+    @pytest.mark.parametrize(
+        "backend",
+        [
+            worker_manager.WorkerManager.BACKEND_THREAD,
+            worker_manager.WorkerManager.BACKEND_HOSTED_THREAD,
+        ],
+    )
+    def test_abandoned_worker_does_not_keep_process_alive(self, backend: str) -> None:
+        """
+        The process exits after shutdown, even with a stuck worker left running.
+        """
+        code = (
+            "import time\n"
+            "from tests.unit import helpers, test_worker_manager as t\n"
+            "from utilities.workers import thread_worker_host, worker_manager\n"
+            "_, host = thread_worker_host.ThreadWorkerHost.create(None, helpers.FakeLogger())\n"
+            "host.start()\n"
+            "properties = t.create_properties(t.stuck_worker)\n"
+            "_, manager = worker_manager.WorkerManager.create(\n"
+            f"    properties, helpers.FakeLogger(), backend={backend!r}, thread_host=host\n"
+            ")\n"
+            "manager.start_workers()\n"
+            "manager.shutdown(time.monotonic() + t.SHUTDOWN_TIMEOUT)\n"
+            "host.stop()\n"
+        )
+
+        completed = subprocess.run(
+            [sys.executable, "-c", code], timeout=MAX_SHUTDOWN_TIME + 5.0, check=False
+        )
+
+        assert completed.returncode == 0
+
+
+class TestStall:
+    """
+    Workers alive but not making progress are found, and killed if possible.
+    """
+
+    def test_stalled_process_killed_and_restarted(self) -> None:
+        """
+        Stuck processes are killed, then restarted like dead ones.
+        """
+        # Setup
+        manager = create_manager(
+            stuck_worker, worker_manager.WorkerManager.BACKEND_PROCESS, STALL_TIMEOUT
+        )
+        time.sleep(STALL_TIMEOUT * 2)
+
+        # Run
+        stalls = manager.kill_stalled_workers()
+        dead_count = manager.get_dead_worker_count()
+        is_restarted = manager.check_and_restart_dead_workers()
+        stalls_after_restart = manager.kill_stalled_workers()
+        manager.shutdown(time.monotonic())
+
+        # Test
+        assert len(stalls) == WORKER_COUNT
+        for stall in stalls:
+            assert stall.is_killed
+            assert stall.stall_duration >= STALL_TIMEOUT
+
+        assert dead_count == WORKER_COUNT
+        assert is_restarted
+        # Restarted workers get the full timeout again
+        assert len(stalls_after_restart) == 0
+
+    def test_progressing_worker_kept(self) -> None:
+        """
+        Workers reporting progress are not stalled, however long they run.
+        """
+        # Setup
+        manager = create_manager(
+            progressing_worker, worker_manager.WorkerManager.BACKEND_PROCESS, STALL_TIMEOUT
+        )
+        time.sleep(STALL_TIMEOUT * 2)
+
+        # Run
+        stalls = manager.kill_stalled_workers()
+        statistics = manager.shutdown(time.monotonic() + SHUTDOWN_TIMEOUT)
+
+        # Test
+        assert len(stalls) == 0
+        for stop_statistics in statistics:
+            assert stop_statistics.stop == worker_manager.WorkerStopStatistics.STOP_EXITED
+
+    def test_stalled_thread_reported_once(self) -> None:
+        """
+        Threads cannot be killed, so they are only reported, once per stall.
+        """
+        # Setup
+        manager = create_manager(
+            stuck_worker, worker_manager.WorkerManager.BACKEND_THREAD, STALL_TIMEOUT
+        )
+        time.sleep(STALL_TIMEOUT * 2)
+
+        # Run
+        stalls = manager.kill_stalled_workers()
+        stalls_again = manager.kill_stalled_workers()
+        manager.shutdown(time.monotonic())
+
+        # Test
+        assert len(stalls) == WORKER_COUNT
+        assert not any(stall.is_killed for stall in stalls)
+        assert len(stalls_again) == 0
+
+
+class TestScale:
+    """
+    Changing the number of workers while they run.
+    """
+
+    def test_scale_down_into_full_queue(self) -> None:
+        """
+        Retiring workers does not wait for space in a full input queue, and is cancelled instead.
+        """
+        # Setup
+        input_queue = queue_proxy_wrapper.QueueProxyWrapper(
+            None, 1, queue_proxy_wrapper.QueueProxyWrapper.BACKEND_SHARED_MEMORY
+        )
+        input_queue.put(0)
+        result, manager = worker_manager.WorkerManager.create(
+            worker_properties=create_properties(idle_consumer_worker, [input_queue]),
+            local_logger=helpers.FakeLogger(),
+            backend=worker_manager.WorkerManager.BACKEND_THREAD,
+        )
+        assert result
+        assert manager is not None
+        manager.start_workers()
+        start_time = time.monotonic()
+
+        # Run
+        is_scaled = manager.scale_to(1)
+        scale_time = time.monotonic() - start_time
+        worker_count = manager.get_worker_count()
+        consumer_count = input_queue.get_consumer_count()
+        manager.shutdown(time.monotonic() + SHUTDOWN_TIMEOUT)
+        input_queue.close()
+
+        # Test
+        assert not is_scaled
+        assert scale_time < SHUTDOWN_TIMEOUT
+        assert worker_count == WORKER_COUNT
+        assert consumer_count == WORKER_COUNT
+
+
+class TestScheduling:
+    """
+    CPU affinity and priority of the workers.
+    """
+
+    @pytest.mark.skipif(
+        not hasattr(os, "sched_setaffinity"), reason="CPU affinity is not supported"
+    )
+    def test_applied_in_process(self) -> None:
+        """
+        Processes run on the CPUs and at the niceness set, whatever main's are.
+        """
+        # Setup
+        cpu = min(os.sched_getaffinity(0))
+        output_queue = queue_proxy_wrapper.QueueProxyWrapper(
+            None, WORKER_COUNT, queue_proxy_wrapper.QueueProxyWrapper.BACKEND_SHARED_MEMORY
+        )
+        result, properties = worker_manager.WorkerProperties.create(
+            count=WORKER_COUNT,
+            target=scheduling_reporting_worker,
+            work_arguments=(),
+            input_queues=[],
+            output_queues=[output_queue],
+            controller=worker_controller.WorkerController(),
+            local_logger=helpers.FakeLogger(),
+            cpu_affinity={cpu},
+            nice=os.getpriority(os.PRIO_PROCESS, 0) + WORKER_NICE,
+        )
+        assert result
+        assert properties is not None
+        result, manager = worker_manager.WorkerManager.create(
+            worker_properties=properties,
+            local_logger=helpers.FakeLogger(),
+            backend=worker_manager.WorkerManager.BACKEND_PROCESS,
+        )
+        assert result
+        assert manager is not None
+
+        # Run
+        manager.start_workers()
+        reports = [output_queue.get(timeout=RESULT_TIMEOUT) for _ in range(WORKER_COUNT)]
+        manager.shutdown(time.monotonic() + SHUTDOWN_TIMEOUT)
+        output_queue.close()
+
+        # Test
+        for cpu_affinity, nice in reports:
+            assert cpu_affinity == {cpu}
+            assert nice == min(os.getpriority(os.PRIO_PROCESS, 0) + WORKER_NICE, 19)
+
+    def test_unchanged_without_settings(self) -> None:
+        """
+        Workers without scheduling settings run their target directly.
+        """
+        properties = create_properties(exit_on_request_worker)
+
+        target, arguments = properties.get_scheduled_worker_target_and_arguments()
+
+        assert target is exit_on_request_worker
+        assert arguments == properties.get_worker_arguments()
+
+    def test_rejected_for_threads(self) -> None:
+        """
+        Scheduling settings of a thread would apply to main, so only processes take them.
+        """
+        # Setup
+        result, properties = worker_manager.WorkerProperties.create(
+            count=WORKER_COUNT,
+            target=exit_on_request_worker,
+            work_arguments=(),
+            input_queues=[],
+            output_queues=[],
+            controller=worker_controller.WorkerController(),
+            local_logger=helpers.FakeLogger(),
+            nice=os.getpriority(os.PRIO_PROCESS, 0) + WORKER_NICE,
+        )
+        assert result
+        assert properties is not None
+
+        # Run
+        result, manager = worker_manager.WorkerManager.create(
+            worker_properties=properties,
+            local_logger=helpers.FakeLogger(),
+            backend=worker_manager.WorkerManager.BACKEND_THREAD,
+        )
+
+        # Test
+        assert not result
+        assert manager is None
+
+    def test_invalid_settings(self) -> None:
+        """
+        CPUs must exist, niceness be within its range, and not be set with a realtime priority.
+        """
+        for cpu_affinity, nice, realtime_priority in (
+            (set(), None, None),
+            ({os.cpu_count()}, None, None),
+            (None, 20, None),
+            (None, -21, None),
+            (None, 0, 1),
+        ):
+            result, properties = worker_manager.WorkerProperties.create(
+                count=WORKER_COUNT,
+                target=exit_on_request_worker,
+                work_arguments=(),
+                input_queues=[],
+                output_queues=[],
+                controller=worker_controller.WorkerController(),
+                local_logger=helpers.FakeLogger(),
+                cpu_affinity=cpu_affinity,
+                nice=nice,
+                realtime_priority=realtime_priority,
+            )
+            assert not result
+            assert properties is None
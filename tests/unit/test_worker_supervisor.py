@@ -0,0 +1,215 @@
+"""
+Test restarting dead workers with backoff.
+"""
+
+from utilities.workers import worker_manager
+from utilities.workers import worker_supervisor
+from tests.unit import helpers
+
+
+# Test functions access class privates
+# No enable
+# pylint: disable=protected-access
+
+
+POLL_PERIOD = 0.1  # seconds
+INITIAL_BACKOFF = 1.0  # seconds
+MAX_BACKOFF = 4.0  # seconds
+MAX_RESTARTS = 5
+CRASH_LOOP_WINDOW = 100.0  # seconds
+TIME_STEP = 0.5  # seconds
+
+
+class FakeManager:
+    """
+    Stands in for a WorkerManager whose workers die whenever the test says.
+    """
+
+    def __init__(self) -> None:
+        self.dead_count = 0
+        self.restart_times: "list[float]" = []
+        self.is_restart_working = True
+        # Time of the supervisor's check, as the restart is recorded at that time
+        self.now = 0.0
+
+    def get_target_name(self) -> str:
+        """
+        Name in the statistics.
+        """
+        return "fake_worker"
+
+    def kill_stalled_workers(self) -> "list[worker_manager.WorkerStall]":
+        """
+        Workers never stall.
+        """
+        return []
+
+    def get_dead_worker_count(self) -> int:
+        """
+        Number of workers the test killed.
+        """
+        return self.dead_count
+
+    def check_and_restart_dead_workers(self) -> bool:
+        """
+        Revives the dead workers, unless restarting is set to fail.
+        """
+        self.restart_times.append(self.now)
+        if not self.is_restart_working:
+            return False
+
+        self.dead_count = 0
+        return True
+
+
+def create_supervisor(
+    manager: FakeManager, max_restarts: int = MAX_RESTARTS
+) -> worker_supervisor.WorkerSupervisor:
+    """
+    Supervisor of the manager, not started, so that the test drives it with its own clock.
+    """
+    result, supervisor = worker_supervisor.WorkerSupervisor.create(
+        worker_managers=[manager],  # type: ignore
+        poll_period=POLL_PERIOD,
+        initial_backoff=INITIAL_BACKOFF,
+        max_backoff=MAX_BACKOFF,
+        max_restarts=max_restarts,
+        crash_loop_window=CRASH_LOOP_WINDOW,
+        autoscalers=[],
+        local_logger=helpers.FakeLogger(),
+    )
+    assert result
+    assert supervisor is not None
+    return supervisor
+
+
+def supervise(
+    supervisor: worker_supervisor.WorkerSupervisor, manager: FakeManager, now: float
+) -> None:
+    """
+    Runs 1 check of the supervisor thread at the time.
+    """
+    manager.now = now
+    for target in supervisor._WorkerSupervisor__targets:  # type: ignore
+        supervisor._WorkerSupervisor__supervise(target, now)  # type: ignore
+
+
+def kill_repeatedly(
+    supervisor: worker_supervisor.WorkerSupervisor,
+    manager: FakeManager,
+    start_time: float,
+    end_time: float,
+) -> None:
+    """
+    Kills a worker before every check from the start time up to the end time.
+    """
+    now = start_time
+    while now <= end_time:
+        manager.dead_count = 1
+        supervise(supervisor, manager, now)
+        now += TIME_STEP
+
+
+class TestWorkerSupervisor:
+    """
+    Restart decisions, with an injected clock.
+    """
+
+    def test_backoff_doubles_up_to_max(self) -> None:
+        """
+        A worker that keeps dying is restarted after 1, 2, then at most 4 seconds.
+        """
+        # Setup
+        manager = FakeManager()
+        supervisor = create_supervisor(manager)
+
+        # Run
+        kill_repeatedly(supervisor, manager, 0.0, 12.0)
+        statistics = supervisor.get_restart_statistics()[0]
+
+        # Test
+        assert manager.restart_times == [0.0, 1.0, 3.0, 7.0, 11.0]
+        assert statistics.restart_count == 5
+        assert not statistics.is_crash_looping
+
+    def test_crash_loop_stops_restarts(self) -> None:
+        """
+        After the maximum restarts within the window, the worker is left dead.
+        """
+        # Setup
+        manager = FakeManager()
+        supervisor = create_supervisor(manager, 3)
+
+        # Run
+        kill_repeatedly(supervisor, manager, 0.0, 20.0)
+        statistics = supervisor.get_restart_statistics()[0]
+
+        # Test
+        assert manager.restart_times == [0.0, 1.0, 3.0]
+        assert statistics.is_crash_looping
+
+    def test_backoff_reset_when_stable(self) -> None:
+        """
+        A worker that stays up for the window is restarted without waiting again.
+        """
+        # Setup
+        manager = FakeManager()
+        supervisor = create_supervisor(manager)
+        kill_repeatedly(supervisor, manager, 0.0, 1.0)
+        stable_time = 1.0 + CRASH_LOOP_WINDOW
+
+        # Run
+        # Alive for the window
+        supervise(supervisor, manager, stable_time)
+        kill_repeatedly(supervisor, manager, stable_time + TIME_STEP, stable_time + 2.0)
+
+        # Test
+        assert manager.restart_times == [
+            0.0,
+            1.0,
+            stable_time + TIME_STEP,
+            stable_time + TIME_STEP + INITIAL_BACKOFF,
+        ]
+
+    def test_failed_restart_counted(self) -> None:
+        """
+        A restart that fails is counted, and retried after the backoff.
+        """
+        # Setup
+        manager = FakeManager()
+        manager.is_restart_working = False
+        supervisor = create_supervisor(manager)
+        manager.dead_count = 1
+
+        # Run
+        supervise(supervisor, manager, 0.0)
+        supervise(supervisor, manager, INITIAL_BACKOFF / 2)
+        supervise(supervisor, manager, INITIAL_BACKOFF)
+        statistics = supervisor.get_restart_statistics()[0]
+
+        # Test
+        assert manager.restart_times == [0.0, INITIAL_BACKOFF]
+        assert statistics.failed_restart_count == 2
+        assert statistics.restart_count == 0
+
+    def test_invalid_arguments(self) -> None:
+        """
+        Backoff bounds must be ordered, and the crash loop cap positive.
+        """
+        for initial_backoff, max_backoff, max_restarts in (
+            (-1.0, MAX_BACKOFF, MAX_RESTARTS),
+            (MAX_BACKOFF, INITIAL_BACKOFF, MAX_RESTARTS),
+            (INITIAL_BACKOFF, MAX_BACKOFF, 0),
+        ):
+            result, supervisor = worker_supervisor.WorkerSupervisor.create(
+                worker_managers=[],
+                poll_period=POLL_PERIOD,
+                initial_backoff=initial_backoff,
+                max_backoff=max_backoff,
+                max_restarts=max_restarts,
+                crash_loop_window=CRASH_LOOP_WINDOW,
+                autoscalers=[],
+                local_logger=helpers.FakeLogger(),
+            )
+            assert not result
+            assert supervisor is None
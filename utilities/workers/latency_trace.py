@@ -0,0 +1,226 @@
+"""
+For measuring how long an input takes to pass through each stage of the pipeline.
+"""
+
+import json
+import pathlib
+import time
+
+from modules.common.modules.logger import logger
+from utilities.workers import queue_statistics
+
+
+class TraceContext:
+    """
+    Receive time and id of an input, and the time each stage finished with it.
+    Carried along with the data derived from the input, across queues and processes.
+
+    Times are `time.monotonic()` , which is the same clock in every process on the machine.
+    """
+
+    __slots__ = ("source", "sequence_id", "receive_time", "stages", "times")
+
+    RECEIVE_STAGE = "receive"
+
+    def __init__(
+        self, sequence_id: int, receive_time: "float | None" = None, source: str = ""
+    ) -> None:
+        """
+        sequence_id: Identifies the input, counted by its receiver.
+        receive_time: When the input arrived, now if None.
+        source: Identifies the receiver, as several receivers count the same sequence ids.
+        """
+        self.source = source
+        self.sequence_id = sequence_id
+        self.receive_time = time.monotonic() if receive_time is None else receive_time
+        # Names of the stages in the order they finished, with the matching times
+        self.stages = []
+        self.times = []
+
+    def mark(self, stage: str) -> None:
+        """
+        Records that the stage has finished with the input now.
+        """
+        self.stages.append(stage)
+        self.times.append(time.monotonic())
+
+    def get_stage_latencies(self) -> "list[tuple[str, float]]":
+        """
+        Seconds spent in each stage, since the previous stage (or receive) finished.
+        """
+        previous_times = [self.receive_time] + self.times[:-1]
+        return [
+            (stage, stage_time - previous_time)
+            for stage, stage_time, previous_time in zip(self.stages, self.times, previous_times)
+        ]
+
+    def get_total_latency(self) -> float:
+        """
+        Seconds from receive to the last stage finishing, 0 if no stage has.
+        """
+        if len(self.times) == 0:
+            return 0.0
+
+        return self.times[-1] - self.receive_time
+
+    def to_record(self) -> dict:
+        """
+        JSON serializable form for export.
+        """
+        return {
+            "source": self.source,
+            "sequence_id": self.sequence_id,
+            self.RECEIVE_STAGE: self.receive_time,
+            "stages": dict(zip(self.stages, self.times)),
+        }
+
+    def __str__(self) -> str:
+        stage_latencies = ", ".join(
+            f"{stage}: {latency * 1e3:.3f}ms" for stage, latency in self.get_stage_latencies()
+        )
+        return (
+            f"trace {self.source}/{self.sequence_id}: "
+            f"total: {self.get_total_latency() * 1e3:.3f}ms ({stage_latencies})"
+        )
+
+
+class LatencySnapshot:
+    """
+    Latency of a stage over the interval since the previous snapshot.
+    Latencies are upper bounds of histogram buckets, so at most 12% over the true value.
+    """
+
+    def __init__(
+        self,
+        stage: str,
+        count: int,
+        latency_percentiles: "tuple[float, float, float]",
+    ) -> None:
+        self.stage = stage
+        # Traces that passed through the stage during the interval
+        self.count = count
+        # Seconds, 0 if there were no traces
+        self.latency_p50, self.latency_p95, self.latency_p99 = latency_percentiles
+
+    def __str__(self) -> str:
+        return (
+            f"{self.stage}: "
+            f"count: {self.count}, "
+            f"p50: {self.latency_p50 * 1e3:.3f}ms, "
+            f"p95: {self.latency_p95 * 1e3:.3f}ms, "
+            f"p99: {self.latency_p99 * 1e3:.3f}ms"
+        )
+
+
+class LatencyStatistics:
+    """
+    Latency histograms of each stage, and of the whole trace, from completed traces.
+    Local to the process recording them, usually main reading the pipeline output.
+    """
+
+    TOTAL_STAGE = "total"
+
+    def __init__(self) -> None:
+        # Stage name to histogram since the previous snapshot, in the order stages were first seen
+        self.__histograms = {}
+
+    def record(self, trace: TraceContext) -> None:
+        """
+        Adds the latencies of a completed trace.
+        """
+        for stage, latency in trace.get_stage_latencies():
+            self.__add(stage, latency)
+
+        self.__add(self.TOTAL_STAGE, trace.get_total_latency())
+
+    def __add(self, stage: str, latency: float) -> None:
+        """
+        Adds a latency to the histogram of the stage.
+        """
+        histogram = self.__histograms.get(stage)
+        if histogram is None:
+            histogram = [0] * queue_statistics.QueueStatistics.BUCKET_COUNT
+            self.__histograms[stage] = histogram
+
+        histogram[queue_statistics.QueueStatistics.get_bucket(latency)] += 1
+
+    def snapshot(self) -> "list[LatencySnapshot]":
+        """
+        Percentiles of each stage since the previous snapshot, with the whole trace last.
+        """
+        snapshots = []
+        for stage, histogram in self.__histograms.items():
+            if stage == self.TOTAL_STAGE:
+                continue
+
+            snapshots.append(self.__snapshot_stage(stage, histogram))
+
+        total_histogram = self.__histograms.get(self.TOTAL_STAGE)
+        if total_histogram is not None:
+            snapshots.append(self.__snapshot_stage(self.TOTAL_STAGE, total_histogram))
+
+        self.__histograms = {}
+        return snapshots
+
+    @staticmethod
+    def __snapshot_stage(stage: str, histogram: "list[int]") -> LatencySnapshot:
+        """
+        Percentiles of 1 histogram.
+        """
+        return LatencySnapshot(
+            stage,
+            sum(histogram),
+            (
+                queue_statistics.QueueStatistics.get_percentile(histogram, 0.50),
+                queue_statistics.QueueStatistics.get_percentile(histogram, 0.95),
+                queue_statistics.QueueStatistics.get_percentile(histogram, 0.99),
+            ),
+        )
+
+
+class TraceExporter:
+    """
+    Writes completed traces to a file, 1 JSON object per line, for offline analysis.
+    """
+
+    __create_key = object()
+
+    @classmethod
+    def create(
+        cls, path: pathlib.Path, local_logger: logger.Logger
+    ) -> "tuple[bool, TraceExporter | None]":
+        """
+        path: File to write, created along with its directory, or truncated if it exists.
+        local_logger: Existing logger from process.
+
+        Returns whether the file was opened and the exporter.
+        """
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            file = open(path, "w", encoding="utf-8")  # pylint: disable=consider-using-with
+        except OSError as e:
+            local_logger.error(f"Failed to open trace file {path}: {e}", True)
+            return False, None
+
+        return True, TraceExporter(cls.__create_key, path, file)
+
+    def __init__(self, class_private_create_key: object, path: pathlib.Path, file: object) -> None:
+        """
+        Private constructor, use create() method.
+        """
+        assert class_private_create_key is TraceExporter.__create_key, "Use create() method"
+
+        self.path = path
+        self.__file = file
+
+    def export(self, trace: TraceContext) -> None:
+        """
+        Writes the trace, flushed when the file buffer fills or the exporter is closed.
+        """
+        self.__file.write(json.dumps(trace.to_record()) + "\n")
+
+    def close(self) -> None:
+        """
+        Flushes and closes the file.
+        """
+        self.__file.close()
@@ -0,0 +1,608 @@
+"""
+For declaring workers and the queues between them as a graph.
+"""
+
+import importlib
+import multiprocessing.managers
+import time
+
+from modules.common.modules.logger import logger
+from utilities.workers import thread_worker_host
+from utilities.workers import queue_proxy_wrapper
+from utilities.workers import queue_statistics
+from utilities.workers import sharded_queue
+from utilities.workers import worker_controller
+from utilities.workers import worker_manager
+
+
+class _Stage:  # pylint: disable=too-many-instance-attributes
+    """
+    Workers running the same target, and the names of the queues they get from and put into.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        target: "(...) -> object",  # type: ignore
+        count: int,
+        work_arguments: "tuple",
+        backend: str,
+        cpu_affinity: "set[int] | None",
+        nice: "int | None",
+        realtime_priority: "int | None",
+        stall_timeout: "float | None",
+    ) -> None:
+        self.name = name
+        self.target = target
+        self.count = count
+        self.work_arguments = work_arguments
+        self.backend = backend
+        self.cpu_affinity = cpu_affinity
+        self.nice = nice
+        self.realtime_priority = realtime_priority
+        self.stall_timeout = stall_timeout
+        # In the order the queues were added, which is their order in the worker arguments
+        self.input_queue_names: "list[str]" = []
+        self.output_queue_names: "list[str]" = []
+
+
+class _Edge:
+    """
+    Queue from a producer stage to a consumer stage, None for main.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        producer: "str | None",
+        consumer: "str | None",
+        backend: str,
+        policy: str,
+        shard_key: "(object) -> object | None",  # type: ignore
+    ) -> None:
+        self.name = name
+        self.producer = producer
+        self.consumer = consumer
+        self.backend = backend
+        self.policy = policy
+        self.shard_key = shard_key
+
+
+class PipelineSnapshot:
+    """
+    Statistics of every queue in the pipeline since the previous snapshot.
+    """
+
+    def __init__(
+        self, queue_snapshots: "list[queue_statistics.QueueSnapshot]", throughput: float
+    ) -> None:
+        self.queue_snapshots = queue_snapshots
+        # Items per second leaving the pipeline, either put into queues to main
+        # or got by stages without output queues
+        self.throughput = throughput
+
+    def __str__(self) -> str:
+        queue_snapshots = "\n".join(f"    {snapshot}" for snapshot in self.queue_snapshots)
+        return f"throughput: {self.throughput:.1f}/s\n{queue_snapshots}"
+
+
+class Pipeline:  # pylint: disable=too-many-instance-attributes
+    """
+    Stages of identical workers connected by queues, declared once and then built.
+
+    Worker arguments are the stage's work arguments, then its input queues,
+    then its output queues, in the order the queues were added, then the stage's controller.
+    Each stage has a child of the pipeline controller, so a single stage can be paused
+    with `pause_stage()` while exit and pipeline wide pause still reach every worker.
+    A queue holds `queue_depth_per_worker` items for each worker on its busier side,
+    so that every producer can put and every consumer can get without waiting on the others.
+    A sharded queue has a shard per consumer worker instead, each holding that many items
+    per producer worker, see ShardedQueue.
+
+    Declare stages and queues with `add_stage()` and `add_queue()` , or `add_from_config()` ,
+    then call `build()` , `start()` , and finally `shutdown()` .
+    """
+
+    __create_key = object()
+
+    # Prefix of work arguments in configuration that are replaced by a resource
+    __RESOURCE_PREFIX = "$"
+
+    __QUIESCENCE_POLL_PERIOD = 0.001  # seconds
+
+    @classmethod
+    def create(
+        cls,
+        mp_manager: multiprocessing.managers.SyncManager | None,
+        controller: worker_controller.WorkerController,
+        local_logger: logger.Logger,
+        queue_depth_per_worker: int = 2,
+        is_instrumented: bool = False,
+        thread_host: thread_worker_host.ThreadWorkerHost | None = None,
+    ) -> "tuple[bool, Pipeline | None]":
+        """
+        Creates an empty pipeline.
+
+        mp_manager: Manager to host queues with the manager backend.
+        controller: Controller of every worker in the pipeline.
+        local_logger: Existing logger from process.
+        queue_depth_per_worker: Queue size per worker, 0 or less for unbounded queues.
+        is_instrumented: Whether to instrument every queue, required for snapshots.
+        thread_host: Host for stages with the hosted thread backend.
+
+        Returns whether the pipeline was created and the pipeline.
+        """
+        return True, Pipeline(
+            cls.__create_key,
+            mp_manager,
+            controller,
+            local_logger,
+            queue_depth_per_worker,
+            is_instrumented,
+            thread_host,
+        )
+
+    def __init__(
+        self,
+        class_private_create_key: object,
+        mp_manager: multiprocessing.managers.SyncManager | None,
+        controller: worker_controller.WorkerController,
+        local_logger: logger.Logger,
+        queue_depth_per_worker: int,
+        is_instrumented: bool,
+        thread_host: thread_worker_host.ThreadWorkerHost | None,
+    ) -> None:
+        """
+        Private constructor, use create() method.
+        """
+        assert class_private_create_key is Pipeline.__create_key, "Use create() method"
+
+        self.__mp_manager = mp_manager
+        self.__controller = controller
+        self.__local_logger = local_logger
+        self.__queue_depth_per_worker = queue_depth_per_worker
+        self.__is_instrumented = is_instrumented
+        self.__thread_host = thread_host
+
+        self.__stages: "dict[str, _Stage]" = {}
+        self.__edges: "dict[str, _Edge]" = {}
+
+        # Set by build()
+        self.__queues: (
+            "dict[str, queue_proxy_wrapper.QueueProxyWrapper | sharded_queue.ShardedQueue]"
+        ) = {}
+        self.__managers: "dict[str, worker_manager.WorkerManager]" = {}
+        self.__stage_controllers: "dict[str, worker_controller.WorkerController]" = {}
+
+    def add_stage(
+        self,
+        name: str,
+        target: "(...) -> object",  # type: ignore
+        count: int,
+        work_arguments: "tuple" = (),
+        backend: str = worker_manager.WorkerManager.BACKEND_PROCESS,
+        cpu_affinity: "set[int] | None" = None,
+        nice: "int | None" = None,
+        realtime_priority: "int | None" = None,
+        stall_timeout: "float | None" = None,
+    ) -> bool:
+        """
+        Declares a stage, see WorkerProperties and WorkerManager for the arguments.
+
+        name: Unique name of the stage.
+
+        Returns whether the stage was added.
+        """
+        if len(self.__managers) > 0:
+            self.__local_logger.error("Cannot add a stage to a built pipeline", True)
+            return False
+
+        if name in self.__stages:
+            self.__local_logger.error(f"Duplicate stage: {name}", True)
+            return False
+
+        self.__stages[name] = _Stage(
+            name,
+            target,
+            count,
+            tuple(work_arguments),
+            backend,
+            cpu_affinity,
+            nice,
+            realtime_priority,
+            stall_timeout,
+        )
+        return True
+
+    def add_queue(
+        self,
+        name: str,
+        producer: "str | None",
+        consumer: "str | None",
+        backend: str = queue_proxy_wrapper.QueueProxyWrapper.BACKEND_MANAGER,
+        policy: str = queue_proxy_wrapper.QueueProxyWrapper.POLICY_BLOCK,
+        shard_key: "(object) -> object | None" = None,  # type: ignore
+    ) -> bool:
+        """
+        Declares a queue from the producer stage to the consumer stage.
+        It comes after the queues previously added to those stages in their worker arguments.
+
+        name: Unique name of the queue.
+        producer: Name of the stage putting into the queue, None for main.
+        consumer: Name of the stage getting from the queue, None for main.
+        backend: Queue backend.
+        policy: Queue policy.
+        shard_key: Returns the key of an item to shard the queue by, None to not shard.
+            Each consumer worker then gets every item of its keys, see ShardedQueue.
+
+        Returns whether the queue was added.
+        """
+        if len(self.__managers) > 0:
+            self.__local_logger.error("Cannot add a queue to a built pipeline", True)
+            return False
+
+        if name in self.__edges:
+            self.__local_logger.error(f"Duplicate queue: {name}", True)
+            return False
+
+        if producer is None and consumer is None:
+            self.__local_logger.error(f"Queue {name} must have a producer or a consumer", True)
+            return False
+
+        for stage_name in (producer, consumer):
+            if stage_name is not None and stage_name not in self.__stages:
+                self.__local_logger.error(f"Queue {name} has unknown stage: {stage_name}", True)
+                return False
+
+        if shard_key is not None and consumer is None:
+            self.__local_logger.error(f"Sharded queue {name} must have a consumer stage", True)
+            return False
+
+        self.__edges[name] = _Edge(name, producer, consumer, backend, policy, shard_key)
+        if producer is not None:
+            self.__stages[producer].output_queue_names.append(name)
+
+        if consumer is not None:
+            self.__stages[consumer].input_queue_names.append(name)
+
+        return True
+
+    def add_from_config(self, config: dict, resources: "dict[str, object]") -> bool:
+        """
+        Declares the stages and queues in configuration, for example loaded from YAML:
+        ```
+        stages:
+          - name: countup
+            target: package.module.worker_function
+            count: 2
+            work_arguments: [3, 100, $resource_name]
+            backend: process  # Optional
+            stall_timeout: 10  # Optional
+        queues:
+          - name: countup_to_add_random
+            producer: countup  # Omit for main
+            consumer: add_random  # Omit for main
+            backend: manager  # Optional
+            policy: block  # Optional
+            shard_key: package.module.key_function  # Optional
+        ```
+
+        config: Configuration with `stages` and `queues` lists.
+        resources: Objects that cannot be configured, such as the connection,
+            referred to in work arguments by `$` followed by their key.
+
+        Returns whether everything was added.
+        """
+        try:
+            for stage_config in config["stages"]:
+                result, target = self.__import_target(stage_config["target"])
+                if not result:
+                    return False
+
+                work_arguments = []
+                for argument in stage_config.get("work_arguments", []):
+                    if isinstance(argument, str) and argument.startswith(self.__RESOURCE_PREFIX):
+                        argument = resources[argument[len(self.__RESOURCE_PREFIX) :]]
+
+                    work_arguments.append(argument)
+
+                result = self.add_stage(
+                    stage_config["name"],
+                    target,
+                    stage_config["count"],
+                    tuple(work_arguments),
+                    stage_config.get("backend", worker_manager.WorkerManager.BACKEND_PROCESS),
+                    stall_timeout=stage_config.get("stall_timeout"),
+                )
+                if not result:
+                    return False
+
+            for queue_config in config.get("queues", []):
+                shard_key = None
+                if "shard_key" in queue_config:
+                    result, shard_key = self.__import_target(queue_config["shard_key"])
+                    if not result:
+                        return False
+
+                result = self.add_queue(
+                    queue_config["name"],
+                    queue_config.get("producer"),
+                    queue_config.get("consumer"),
+                    queue_config.get(
+                        "backend", queue_proxy_wrapper.QueueProxyWrapper.BACKEND_MANAGER
+                    ),
+                    queue_config.get("policy", queue_proxy_wrapper.QueueProxyWrapper.POLICY_BLOCK),
+                    shard_key,
+                )
+                if not result:
+                    return False
+        except (KeyError, TypeError) as e:
+            self.__local_logger.error(f"Invalid pipeline configuration, missing: {e}", True)
+            return False
+
+        return True
+
+    def __import_target(self, path: str) -> "tuple[bool, (...) -> object]":  # type: ignore
+        """
+        Imports the function at `package.module.function` , a worker target or a shard key.
+        """
+        module_name, _, function_name = path.rpartition(".")
+        try:
+            target = getattr(importlib.import_module(module_name), function_name)
+        except (ImportError, AttributeError, ValueError) as e:
+            self.__local_logger.error(f"Cannot import worker target {path}: {e}", True)
+            return False, None
+
+        return True, target
+
+    def build(self) -> bool:
+        """
+        Creates the queues and the workers of every stage.
+
+        Returns whether the pipeline was built.
+        """
+        result, stage_order = self.__sort_stages()
+        if not result:
+            return False
+
+        for edge in self.__edges.values():
+            producer_count = self.__stages[edge.producer].count if edge.producer is not None else 1
+            consumer_count = self.__stages[edge.consumer].count if edge.consumer is not None else 1
+            try:
+                if edge.shard_key is None:
+                    self.__queues[edge.name] = self.__create_queue(
+                        edge, edge.name, max(producer_count, consumer_count)
+                    )
+                    continue
+
+                shards = [
+                    self.__create_queue(edge, f"{edge.name}[{i}]", producer_count)
+                    for i in range(consumer_count)
+                ]
+                self.__queues[edge.name] = sharded_queue.ShardedQueue(
+                    shards, edge.shard_key, edge.name
+                )
+            except ValueError as e:
+                self.__local_logger.error(f"Failed to create queue {edge.name}: {e}", True)
+                return False
+
+        for stage_name in stage_order:
+            stage = self.__stages[stage_name]
+            stage_controller = self.__controller.create_child()
+            result, properties = worker_manager.WorkerProperties.create(
+                count=stage.count,
+                target=stage.target,
+                work_arguments=stage.work_arguments,
+                input_queues=[self.__queues[name] for name in stage.input_queue_names],
+                output_queues=[self.__queues[name] for name in stage.output_queue_names],
+                controller=stage_controller,
+                local_logger=self.__local_logger,
+                cpu_affinity=stage.cpu_affinity,
+                nice=stage.nice,
+                realtime_priority=stage.realtime_priority,
+            )
+            if not result:
+                self.__local_logger.error(f"Failed to create {stage_name} properties", True)
+                return False
+
+            # Get Pylance to stop complaining
+            assert properties is not None
+
+            result, manager = worker_manager.WorkerManager.create(
+                worker_properties=properties,
+                local_logger=self.__local_logger,
+                backend=stage.backend,
+                thread_host=self.__thread_host,
+                stall_timeout=stage.stall_timeout,
+            )
+            if not result:
+                self.__local_logger.error(f"Failed to create {stage_name} manager", True)
+                return False
+
+            # Get Pylance to stop complaining
+            assert manager is not None
+
+            self.__managers[stage_name] = manager
+            self.__stage_controllers[stage_name] = stage_controller
+
+        return True
+
+    def __create_queue(
+        self, edge: _Edge, name: str, worker_count: int
+    ) -> queue_proxy_wrapper.QueueProxyWrapper:
+        """
+        Creates a queue, or a shard, holding items for the given number of workers.
+        """
+        return queue_proxy_wrapper.QueueProxyWrapper(
+            self.__mp_manager,
+            max(worker_count * self.__queue_depth_per_worker, 0),
+            edge.backend,
+            name=name,
+            is_instrumented=self.__is_instrumented,
+            policy=edge.policy,
+        )
+
+    def __sort_stages(self) -> "tuple[bool, list[str]]":
+        """
+        Orders stages so that each comes after the stages that put into its input queues.
+
+        Returns whether there was no cycle and the order.
+        """
+        remaining_producers = {
+            name: {
+                self.__edges[queue_name].producer
+                for queue_name in stage.input_queue_names
+                if self.__edges[queue_name].producer is not None
+            }
+            for name, stage in self.__stages.items()
+        }
+
+        order = []
+        ready = [name for name, producers in remaining_producers.items() if len(producers) == 0]
+        while len(ready) > 0:
+            name = ready.pop(0)
+            order.append(name)
+            for queue_name in self.__stages[name].output_queue_names:
+                consumer = self.__edges[queue_name].consumer
+                if consumer is None or name not in remaining_producers[consumer]:
+                    continue
+
+                remaining_producers[consumer].remove(name)
+                if len(remaining_producers[consumer]) == 0:
+                    ready.append(consumer)
+
+        if len(order) < len(self.__stages):
+            cycle = sorted(set(self.__stages) - set(order))
+            self.__local_logger.error(f"Pipeline has a cycle through stages: {cycle}", True)
+            return False, []
+
+        return True, order
+
+    def start(self) -> None:
+        """
+        Starts the stages in order from producers to consumers.
+        """
+        for manager in self.__managers.values():
+            manager.start_workers()
+
+    def shutdown(self, timeout: float) -> "dict[str, list[worker_manager.WorkerStopStatistics]]":
+        """
+        Stops the stages in order from consumers to producers within the timeout,
+        see `WorkerManager.shutdown()` , and then drains every queue.
+
+        timeout: Time in seconds all stages have to exit before being stopped forcibly.
+
+        Returns how each worker of each stage stopped.
+        """
+        deadline = time.monotonic() + timeout
+        self.__controller.request_exit()
+
+        statistics = {}
+        for stage_name, manager in reversed(self.__managers.items()):
+            statistics[stage_name] = manager.shutdown(deadline)
+
+        for pipeline_queue in self.__queues.values():
+            pipeline_queue.drain_queue()
+
+        return statistics
+
+    def pause_stage(self, name: str) -> bool:
+        """
+        Requests the workers of the built stage to pause, the others keep running.
+
+        Returns whether there is such a stage.
+        """
+        stage_controller = self.__stage_controllers.get(name)
+        if stage_controller is None:
+            self.__local_logger.error(f"Unknown stage: {name}", True)
+            return False
+
+        stage_controller.request_pause()
+        return True
+
+    def resume_stage(self, name: str) -> bool:
+        """
+        Requests the workers of the built stage to resume.
+
+        Returns whether there is such a stage.
+        """
+        stage_controller = self.__stage_controllers.get(name)
+        if stage_controller is None:
+            self.__local_logger.error(f"Unknown stage: {name}", True)
+            return False
+
+        stage_controller.request_resume()
+        return True
+
+    def is_stage_quiescent(self, name: str) -> bool:
+        """
+        Returns whether the stage is paused and all of its workers are blocked in the pause check,
+        so none of them is in the middle of an item. False if there is no such stage.
+        """
+        stage_controller = self.__stage_controllers.get(name)
+        if stage_controller is None or not stage_controller.is_pause_requested():
+            return False
+
+        return stage_controller.get_paused_count() >= self.__managers[name].get_worker_count()
+
+    def wait_for_stage_quiescence(self, name: str, timeout: float) -> bool:
+        """
+        Blocks until the paused stage is quiescent or the timeout elapses.
+        Workers only reach the pause check between items,
+        so this takes up to the longest time a worker spends on an item or waiting for one.
+
+        timeout: Time waiting in seconds.
+
+        Returns whether the stage is quiescent.
+        """
+        deadline = time.monotonic() + timeout
+        while not self.is_stage_quiescent(name):
+            if time.monotonic() >= deadline:
+                return False
+
+            time.sleep(self.__QUIESCENCE_POLL_PERIOD)
+
+        return True
+
+    def get_queue(
+        self, name: str
+    ) -> "queue_proxy_wrapper.QueueProxyWrapper | sharded_queue.ShardedQueue | None":
+        """
+        Returns the built queue, None if there is no such queue.
+        """
+        return self.__queues.get(name)
+
+    def get_manager(self, name: str) -> "worker_manager.WorkerManager | None":
+        """
+        Returns the manager of the built stage, None if there is no such stage.
+        """
+        return self.__managers.get(name)
+
+    def get_managers(self) -> "list[worker_manager.WorkerManager]":
+        """
+        Returns the managers of every stage, in order from producers to consumers.
+        """
+        return list(self.__managers.values())
+
+    def get_snapshot(self) -> "PipelineSnapshot | None":
+        """
+        Statistics of every queue since the previous snapshot, only call from main.
+
+        Returns None if the pipeline is not instrumented.
+        """
+        if not self.__is_instrumented:
+            return None
+
+        queue_snapshots = []
+        throughput = 0.0
+        for name, edge in self.__edges.items():
+            snapshot = self.__queues[name].get_snapshot()
+            assert snapshot is not None
+            queue_snapshots.append(snapshot)
+
+            if edge.consumer is None:
+                throughput += snapshot.put_rate
+            elif len(self.__stages[edge.consumer].output_queue_names) == 0:
+                throughput += snapshot.get_rate
+
+        return PipelineSnapshot(queue_snapshots, throughput)
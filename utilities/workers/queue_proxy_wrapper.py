@@ -2,59 +2,459 @@
 Queue.
 """
 
+import multiprocessing as mp
 import multiprocessing.managers
 import queue
+import threading
 import time
 
+from utilities.workers import queue_statistics
+from utilities.workers import shared_memory_queue
 
-class QueueProxyWrapper:
+
+class _ItemBatch(list):
+    """
+    Several items moved through a manager queue as a single item by `put_many()` .
+    """
+
+
+class _TimestampedItem:
+    """
+    Item, or batch of items, with the time it was put into an instrumented queue.
+    """
+
+    __slots__ = ("timestamp", "item")
+
+    def __init__(self, timestamp: float, item: object) -> None:
+        self.timestamp = timestamp
+        self.item = item
+
+
+class QueueProxyWrapper:  # pylint: disable=too-many-instance-attributes
     """
     Wrapper for an underlying queue proxy which also stores `maxsize`.
 
     `maxsize <= 0` means infinite size.
+
+    `backend` selects the underlying queue:
+    * "manager": Queue proxy hosted by the SyncManager server process.
+    * "shared_memory": Ring buffer in shared memory, no server process round-trip.
+      Items must pickle to at most `slot_size` bytes,
+      and `maxsize <= 0` is bounded to `SHARED_MEMORY_DEFAULT_SLOT_COUNT` items.
+
+    With the manager backend, `put_many()` moves the whole batch as 1 queue item,
+    so items put that way must be consumed with `get()` or `get_many()` ,
+    and `qsize()` adds the other items of queued batches to the underlying queue's size.
+    With the shared memory backend, batches larger than the queue are put in parts.
+
+    If instrumented, items are timestamped when put with `put()` or `put_many()`
+    and their wait is recorded when got with `get()` or `get_many()` ,
+    for `get_snapshot()` to report. Items put directly into `queue` are not timestamped.
+
+    `policy` selects what `put()` and `put_many()` do when the queue is full:
+    * "block": Wait for space.
+    * "drop_oldest": Evict the oldest item, so consumers see bounded-age data.
+    * "drop_newest": Drop the item being put.
+    * "latest": Keep only the newest item, same as "drop_oldest" with `maxsize` 1 .
+    Producers never block with the dropping policies, which require `maxsize > 0` .
+    Sentinels (None) are always queued, waiting for space if needed, and are never evicted.
     """
 
+    BACKEND_MANAGER = "manager"
+    BACKEND_SHARED_MEMORY = "shared_memory"
+
+    POLICY_BLOCK = "block"
+    POLICY_DROP_OLDEST = "drop_oldest"
+    POLICY_DROP_NEWEST = "drop_newest"
+    POLICY_LATEST = "latest"
+
+    SHARED_MEMORY_DEFAULT_SLOT_COUNT = 256
+    SHARED_MEMORY_DEFAULT_SLOT_SIZE = 4096  # bytes
+
     __QUEUE_TIMEOUT = 0.1  # seconds
-    __QUEUE_DELAY = 0.1  # seconds
 
-    def __init__(self, mp_manager: multiprocessing.managers.SyncManager, maxsize: int = 0) -> None:
-        self.queue = mp_manager.Queue(maxsize)
+    def __init__(
+        self,
+        mp_manager: multiprocessing.managers.SyncManager | None,
+        maxsize: int = 0,
+        backend: str = BACKEND_MANAGER,
+        slot_size: int = SHARED_MEMORY_DEFAULT_SLOT_SIZE,
+        name: str = "queue",
+        is_instrumented: bool = False,
+        policy: str = POLICY_BLOCK,
+    ) -> None:
+        """
+        mp_manager: Manager to host the queue, only required for the manager backend.
+        maxsize: Maximum number of items in the queue.
+        backend: Underlying queue implementation.
+        slot_size: Maximum pickled item size in bytes for the shared memory backend.
+        name: Name of the queue in snapshots.
+        is_instrumented: Whether to record depth, throughput, and wait times.
+        policy: What to do when putting into a full queue.
+        """
+        if policy == self.POLICY_LATEST:
+            maxsize = 1
+        elif policy in (self.POLICY_DROP_OLDEST, self.POLICY_DROP_NEWEST):
+            if maxsize <= 0:
+                raise ValueError(f"Queue policy {policy} requires maxsize > 0")
+        elif policy != self.POLICY_BLOCK:
+            raise ValueError(f"Unknown queue policy: {policy}")
+
+        if backend == self.BACKEND_MANAGER:
+            if mp_manager is None:
+                raise ValueError("Manager backend requires a SyncManager")
+
+            self.queue = mp_manager.Queue(maxsize)
+        elif backend == self.BACKEND_SHARED_MEMORY:
+            slot_count = maxsize if maxsize > 0 else self.SHARED_MEMORY_DEFAULT_SLOT_COUNT
+            self.queue = shared_memory_queue.SharedMemoryQueue(slot_count, slot_size)
+        else:
+            raise ValueError(f"Unknown queue backend: {backend}")
+
         self.maxsize = maxsize
+        self.backend = backend
+        self.name = name
+        self.policy = policy
+        self.__drop_count = mp.Value("Q", 0)
+        self.__consumer_count = mp.Value("i", 0)
+        self.__statistics = queue_statistics.QueueStatistics(name) if is_instrumented else None
+        # Items of queued manager batches other than the first, for qsize()
+        self.__batch_extra_count = mp.Value("q", 0)
+        # Items of a manager batch beyond the requested maximum, local to this process
+        # Locked as thread workers in this process share them
+        self.__pending_items = []
+        self.__pending_lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        """
+        Pickled for spawned workers without the lock, and without items pending in this process.
+        """
+        state = self.__dict__.copy()
+        del state["_QueueProxyWrapper__pending_lock"]
+        state["_QueueProxyWrapper__pending_items"] = []
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.__pending_lock = threading.Lock()
+
+    def put(self, item: object, block: bool = True, timeout: "float | None" = None) -> None:
+        """
+        Puts the item into the queue, same as `queue.put()` with the block policy.
+        The other policies ignore `block` and `timeout` .
+        """
+        wrapped_item = item
+        if self.__statistics is not None:
+            wrapped_item = _TimestampedItem(time.monotonic(), item)
+
+        if item is None or self.policy == self.POLICY_BLOCK:
+            self.queue.put(wrapped_item, block, timeout)
+        elif not self.__put_or_drop(wrapped_item):
+            return
+
+        if self.__statistics is not None:
+            self.__statistics.record_put(1)
+
+    def __put_or_drop(self, wrapped_item: object) -> bool:
+        """
+        Puts the item without blocking, dropping an item if the queue is full.
+
+        Returns whether the item was put.
+        """
+        while True:
+            try:
+                self.queue.put_nowait(wrapped_item)
+                return True
+            except queue.Full:
+                pass
+
+            if self.policy == self.POLICY_DROP_NEWEST:
+                self.__record_drop()
+                return False
+
+            try:
+                oldest_item = self.queue.get_nowait()
+            except queue.Empty:
+                # Consumed in the meantime, try again
+                continue
+
+            if self.__is_sentinel(oldest_item):
+                # Put the sentinel back in the freed space and drop the new item instead
+                # Another producer can take the space first, then the sentinel is dropped too
+                try:
+                    self.queue.put_nowait(oldest_item)
+                except queue.Full:
+                    self.__record_drop()
+
+                self.__record_drop()
+                return False
+
+            self.__record_drop()
+
+    def __record_drop(self) -> None:
+        """
+        Counts a dropped item.
+        """
+        with self.__drop_count.get_lock():
+            self.__drop_count.value += 1
+
+    @staticmethod
+    def __is_sentinel(wrapped_item: object) -> bool:
+        """
+        Whether the item in the underlying queue is a sentinel.
+        """
+        if isinstance(wrapped_item, _TimestampedItem):
+            return wrapped_item.item is None
+
+        return wrapped_item is None
+
+    def get_drop_count(self) -> int:
+        """
+        Returns the number of items dropped by the policy since the queue was created.
+        """
+        return self.__drop_count.value
+
+    def get(self, block: bool = True, timeout: "float | None" = None) -> object:
+        """
+        Gets an item from the queue, same as `queue.get()` .
+        """
+        with self.__pending_lock:
+            if len(self.__pending_items) > 0:
+                return self.__pending_items.pop(0)
+
+        item = self.__unwrap([self.queue.get(block, timeout)])[0]
+        if isinstance(item, _ItemBatch):
+            self.__add_batch_extra_count(1 - len(item))
+            with self.__pending_lock:
+                self.__pending_items.extend(item[1:])
+
+            return item[0]
+
+        return item
+
+    def __add_batch_extra_count(self, count: int) -> None:
+        """
+        Counts the items of manager batches put, or got, beyond their first.
+        """
+        with self.__batch_extra_count.get_lock():
+            self.__batch_extra_count.value += count
+
+    def qsize(self) -> int:
+        """
+        Approximate number of items in the queue, counting every item of a batch.
+        """
+        return self.queue.qsize() + max(self.__batch_extra_count.value, 0)
+
+    def put_many(self, items: list, timeout: "float | None" = None) -> None:
+        """
+        Puts all items into the queue in 1 round-trip.
+        With the shared memory backend, a batch larger than the queue is put in parts,
+        each put entirely or not at all, so a timeout can leave the first parts put.
+
+        timeout: Time waiting in seconds before raising `queue.Full`, None is forever.
+        """
+        if len(items) == 0:
+            return
+
+        if self.policy != self.POLICY_BLOCK:
+            # The dropping policies apply to each item
+            for item in items:
+                self.put(item)
+
+            return
+
+        if self.backend == self.BACKEND_SHARED_MEMORY:
+            wrapped_items = items
+            if self.__statistics is not None:
+                timestamp = time.monotonic()
+                wrapped_items = [_TimestampedItem(timestamp, item) for item in items]
+
+            # A batch can take at most every slot at once
+            slot_count = self.queue.get_slot_count()
+            deadline = None if timeout is None else time.monotonic() + timeout
+            for start in range(0, len(wrapped_items), slot_count):
+                remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+                self.queue.put_many(wrapped_items[start : start + slot_count], timeout=remaining)
+        else:
+            if self.__statistics is not None:
+                self.queue.put(
+                    _TimestampedItem(time.monotonic(), _ItemBatch(items)), timeout=timeout
+                )
+            else:
+                self.queue.put(_ItemBatch(items), timeout=timeout)
+
+            self.__add_batch_extra_count(len(items) - 1)
+
+        if self.__statistics is not None:
+            self.__statistics.record_put(len(items))
+
+    def get_many(self, max_items: int, timeout: float = 0.0) -> list:
+        """
+        Gets up to `max_items` items that are already in the queue.
+
+        timeout: Time waiting in seconds for the first item, less than or equal to 0 to not wait.
+
+        Returns a list of items, empty if there were none.
+        """
+        if max_items <= 0:
+            return []
+
+        block = timeout > 0.0
+        if self.backend == self.BACKEND_SHARED_MEMORY:
+            try:
+                return self.__unwrap(
+                    self.queue.get_many(max_items, block, timeout if block else None)
+                )
+            except queue.Empty:
+                return []
+
+        with self.__pending_lock:
+            items = self.__pending_items[:max_items]
+            self.__pending_items = self.__pending_items[max_items:]
+            is_pending = len(self.__pending_items) > 0
+
+        if len(items) > 0:
+            block = False
+
+        while len(items) < max_items and not is_pending:
+            try:
+                item = self.queue.get(timeout=timeout) if block else self.queue.get_nowait()
+            except queue.Empty:
+                break
+
+            block = False
+            item = self.__unwrap([item])[0]
+            if isinstance(item, _ItemBatch):
+                self.__add_batch_extra_count(1 - len(item))
+                remaining = max_items - len(items)
+                items.extend(item[:remaining])
+                if remaining < len(item):
+                    with self.__pending_lock:
+                        self.__pending_items.extend(item[remaining:])
+
+                    is_pending = True
+            else:
+                items.append(item)
+
+        return items
+
+    def get_snapshot(self) -> "queue_statistics.QueueSnapshot | None":
+        """
+        Statistics since the previous snapshot, only call from main.
+
+        Returns None if the queue is not instrumented.
+        """
+        if self.__statistics is None:
+            return None
+
+        return self.__statistics.snapshot(self.qsize(), self.get_drop_count())
+
+    def __unwrap(self, items: list) -> list:
+        """
+        Removes timestamps from the got items and records their wait times.
+        """
+        if self.__statistics is None:
+            return items
+
+        now = time.monotonic()
+        wait_times = []
+        unwrapped_items = []
+        for item in items:
+            if isinstance(item, _TimestampedItem):
+                # Every item of a batch waited as long as the batch
+                count = len(item.item) if isinstance(item.item, _ItemBatch) else 1
+                wait_times.extend([now - item.timestamp] * count)
+                item = item.item
+
+            unwrapped_items.append(item)
+
+        self.__statistics.record_get(wait_times)
+        return unwrapped_items
+
+    def add_consumers(self, count: int) -> None:
+        """
+        Registers workers that get from the queue and exit on sentinel,
+        so that `fill_queue_with_sentinel()` wakes each of them.
+
+        count: Number of consumers started, negative for consumers that have exited.
+        """
+        with self.__consumer_count.get_lock():
+            self.__consumer_count.value = max(self.__consumer_count.value + count, 0)
+
+    def get_consumer_count(self) -> int:
+        """
+        Returns the number of registered consumers.
+        """
+        return self.__consumer_count.value
+
+    def wake_consumers(self, count: int) -> None:
+        """
+        Puts up to `count` sentinels without waiting, stopping once the queue is full,
+        for waking consumers blocked in a get when they have been asked to exit.
+        """
+        for _ in range(count):
+            try:
+                self.queue.put_nowait(None)
+            except queue.Full:
+                return
 
     def fill_queue_with_sentinel(self, timeout: float = 0.0) -> None:
         """
-        Fills the queue with sentinel (None).
+        Puts a sentinel (None) for each registered consumer.
 
-        timeout: Time waiting before giving up, must be greater than 0 .
+        timeout: Time waiting for space before giving up, must be greater than 0 .
         """
         if timeout <= 0.0:
             timeout = self.__QUEUE_TIMEOUT
 
         try:
-            for _ in range(self.maxsize):
+            for _ in range(self.get_consumer_count()):
                 self.queue.put(None, timeout=timeout)
         except queue.Full:
             return
 
-    def drain_queue(self, timeout: float = 0.0) -> None:
+    def drain_queue(self) -> int:
         """
-        Drains the queue.
+        Removes every item in the queue without waiting, whatever its size.
 
-        timeout: Time waiting in seconds before giving up, must be greater than 0 .
+        Returns the number of items removed.
         """
-        if timeout <= 0.0:
-            timeout = self.__QUEUE_TIMEOUT
+        with self.__pending_lock:
+            count = len(self.__pending_items)
+            self.__pending_items = []
 
-        try:
-            for _ in range(self.maxsize):
-                self.queue.get(timeout=timeout)
-        except queue.Empty:
-            return
+        while True:
+            try:
+                if self.backend == self.BACKEND_SHARED_MEMORY:
+                    items = self.queue.get_many(self.SHARED_MEMORY_DEFAULT_SLOT_COUNT, False)
+                else:
+                    # The manager proxy has no bulk get, but a batch is removed as 1 item
+                    items = [self.queue.get_nowait()]
+            except queue.Empty:
+                return count
+
+            for item in items:
+                if isinstance(item, _TimestampedItem):
+                    item = item.item
+
+                if isinstance(item, _ItemBatch):
+                    self.__add_batch_extra_count(1 - len(item))
+                    count += len(item)
+                else:
+                    count += 1
 
     def fill_and_drain_queue(self) -> None:
         """
-        Fill with sentinel and then drain.
+        Drains leftover items to unblock producers and free their memory,
+        then puts a sentinel for each registered consumer to wake them.
         """
-        self.fill_queue_with_sentinel()
-        time.sleep(self.__QUEUE_DELAY)
         self.drain_queue()
+        self.fill_queue_with_sentinel()
+
+    def close(self) -> None:
+        """
+        Releases resources held by the underlying queue.
+        Call from main after all workers have been joined.
+        """
+        if self.backend == self.BACKEND_SHARED_MEMORY:
+            self.queue.close()
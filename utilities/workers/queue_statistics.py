@@ -0,0 +1,183 @@
+"""
+For measuring how much a queue backs up.
+"""
+
+import math
+import multiprocessing as mp
+import time
+
+
+class QueueSnapshot:  # pylint: disable=too-many-instance-attributes
+    """
+    Statistics of a queue over the interval since the previous snapshot.
+    Wait times are upper bounds of histogram buckets, so at most 12% over the true value.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        depth: int,
+        max_depth: int,
+        put_count: int,
+        get_count: int,
+        drop_count: int,
+        put_rate: float,
+        get_rate: float,
+        wait_percentiles: "tuple[float, float, float]",
+    ) -> None:
+        self.name = name
+        # Sampled when the snapshot is taken, and the maximum of all samples
+        self.depth = depth
+        self.max_depth = max_depth
+        # Totals since the queue was created
+        self.put_count = put_count
+        self.get_count = get_count
+        self.drop_count = drop_count
+        # Items per second during the interval
+        self.put_rate = put_rate
+        self.get_rate = get_rate
+        # Seconds from put to get during the interval, 0 if no items were got
+        self.wait_p50, self.wait_p95, self.wait_p99 = wait_percentiles
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name}: "
+            f"depth: {self.depth} (max {self.max_depth}), "
+            f"put: {self.put_rate:.1f}/s, "
+            f"get: {self.get_rate:.1f}/s, "
+            f"dropped: {self.drop_count}, "
+            f"wait p50: {self.wait_p50 * 1e3:.3f}ms, "
+            f"p95: {self.wait_p95 * 1e3:.3f}ms, "
+            f"p99: {self.wait_p99 * 1e3:.3f}ms"
+        )
+
+
+class QueueStatistics:  # pylint: disable=too-many-instance-attributes
+    """
+    Counters and a wait time histogram in shared memory,
+    updated by every process using the queue and read by main.
+
+    Bucket `i` holds wait times up to `MIN_WAIT * BUCKET_RATIO ** i` ,
+    with the last bucket also holding anything longer.
+    """
+
+    MIN_WAIT = 1e-6  # seconds
+    BUCKETS_PER_DECADE = 20
+    BUCKET_COUNT = 8 * BUCKETS_PER_DECADE + 1  # Up to 100 seconds
+    BUCKET_RATIO = 10.0 ** (1.0 / BUCKETS_PER_DECADE)
+
+    def __init__(self, name: str) -> None:
+        """
+        name: Name of the queue in snapshots.
+        """
+        self.name = name
+        self.__lock = mp.Lock()
+        self.__put_count = mp.RawValue("Q", 0)
+        self.__get_count = mp.RawValue("Q", 0)
+        self.__histogram = mp.RawArray("Q", self.BUCKET_COUNT)
+
+        # State of the previous snapshot, local to the process taking snapshots
+        self.__max_depth = 0
+        self.__previous_time = time.monotonic()
+        self.__previous_put_count = 0
+        self.__previous_get_count = 0
+        self.__previous_histogram = [0] * self.BUCKET_COUNT
+
+    @classmethod
+    def get_bucket(cls, wait_time: float) -> int:
+        """
+        Index of the histogram bucket holding the wait time.
+        """
+        if wait_time <= cls.MIN_WAIT:
+            return 0
+
+        bucket = math.ceil(math.log10(wait_time / cls.MIN_WAIT) * cls.BUCKETS_PER_DECADE)
+        return min(bucket, cls.BUCKET_COUNT - 1)
+
+    @classmethod
+    def get_bucket_upper_bound(cls, bucket: int) -> float:
+        """
+        Longest wait time in seconds held by the bucket.
+        """
+        return cls.MIN_WAIT * cls.BUCKET_RATIO**bucket
+
+    def record_put(self, count: int) -> None:
+        """
+        Records that items were put.
+        """
+        with self.__lock:
+            self.__put_count.value += count
+
+    def record_get(self, wait_times: "list[float]") -> None:
+        """
+        Records the time in seconds that each got item waited in the queue.
+        """
+        if len(wait_times) == 0:
+            return
+
+        buckets = [self.get_bucket(wait_time) for wait_time in wait_times]
+        with self.__lock:
+            self.__get_count.value += len(buckets)
+            for bucket in buckets:
+                self.__histogram[bucket] += 1
+
+    def snapshot(self, depth: int, drop_count: int = 0) -> QueueSnapshot:
+        """
+        Statistics since the previous snapshot, only call from 1 process.
+
+        depth: Current number of items in the queue.
+        drop_count: Number of items dropped by the queue policy.
+        """
+        now = time.monotonic()
+        with self.__lock:
+            put_count = self.__put_count.value
+            get_count = self.__get_count.value
+            histogram = list(self.__histogram)
+
+        interval = max(now - self.__previous_time, 1e-9)
+        put_rate = (put_count - self.__previous_put_count) / interval
+        get_rate = (get_count - self.__previous_get_count) / interval
+        interval_histogram = [
+            count - previous_count
+            for count, previous_count in zip(histogram, self.__previous_histogram)
+        ]
+
+        self.__max_depth = max(self.__max_depth, depth)
+        self.__previous_time = now
+        self.__previous_put_count = put_count
+        self.__previous_get_count = get_count
+        self.__previous_histogram = histogram
+
+        return QueueSnapshot(
+            self.name,
+            depth,
+            self.__max_depth,
+            put_count,
+            get_count,
+            drop_count,
+            put_rate,
+            get_rate,
+            (
+                self.get_percentile(interval_histogram, 0.50),
+                self.get_percentile(interval_histogram, 0.95),
+                self.get_percentile(interval_histogram, 0.99),
+            ),
+        )
+
+    @classmethod
+    def get_percentile(cls, histogram: "list[int]", fraction: float) -> float:
+        """
+        Time in seconds that the fraction of recorded times were at most, 0 if there are none.
+        """
+        total = sum(histogram)
+        if total == 0:
+            return 0.0
+
+        rank = math.ceil(fraction * total)
+        cumulative = 0
+        for bucket, count in enumerate(histogram):
+            cumulative += count
+            if cumulative >= rank:
+                return cls.get_bucket_upper_bound(bucket)
+
+        return cls.get_bucket_upper_bound(cls.BUCKET_COUNT - 1)
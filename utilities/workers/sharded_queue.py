@@ -0,0 +1,204 @@
+"""
+Queue partitioned by key, so that each key is always consumed by the same worker.
+"""
+
+import time
+import zlib
+
+from utilities.workers import queue_proxy_wrapper
+from utilities.workers import queue_statistics
+
+
+class ShardedQueue:
+    """
+    Shards (queues) that items are routed to by key, each consumed by a single worker.
+    Workers that keep state per key, such as per vehicle, then see every item of their keys.
+
+    Producers use it like a QueueProxyWrapper. WorkerManager gives each consumer worker
+    its own shard as the input queue instead, and keeps it when the worker is restarted,
+    so the consumer stage must have exactly `shard_count` workers and cannot be scaled.
+
+    Integer keys go to shard `key % shard_count` , others by a hash that is the same
+    in every process. A sentinel (None) is put into every shard.
+    """
+
+    # Maximum time between checks of the shards while waiting for an item
+    __POLL_PERIOD = 0.01  # seconds
+
+    def __init__(
+        self,
+        shards: "list[queue_proxy_wrapper.QueueProxyWrapper]",
+        key_function: "(object) -> object",  # type: ignore
+        name: str = "queue",
+    ) -> None:
+        """
+        shards: Queue of each consumer worker, in worker order.
+        key_function: Returns the key of an item, must be picklable (module level function).
+        name: Name of the queue in snapshots.
+        """
+        if len(shards) == 0:
+            raise ValueError("Sharded queue requires at least 1 shard")
+
+        self.shards = shards
+        self.shard_count = len(shards)
+        self.key_function = key_function
+        self.name = name
+        # Of each shard
+        self.maxsize = shards[0].maxsize
+
+    def get_shard_index(self, item: object) -> int:
+        """
+        Returns the index of the shard the item is routed to.
+        """
+        key = self.key_function(item)
+        if isinstance(key, int):
+            return key % self.shard_count
+
+        # The built in hash of strings differs between processes
+        return zlib.crc32(str(key).encode()) % self.shard_count
+
+    def get_shard(self, index: int) -> queue_proxy_wrapper.QueueProxyWrapper:
+        """
+        Returns the shard consumed by the worker at the index.
+        """
+        return self.shards[index]
+
+    def put(self, item: object, block: bool = True, timeout: "float | None" = None) -> None:
+        """
+        Puts the item into the shard of its key, see `QueueProxyWrapper.put()` .
+        """
+        if item is None:
+            for shard in self.shards:
+                shard.put(None, block, timeout)
+
+            return
+
+        self.shards[self.get_shard_index(item)].put(item, block, timeout)
+
+    def put_many(self, items: list, timeout: "float | None" = None) -> None:
+        """
+        Puts the items into the shards of their keys, 1 round-trip per shard.
+        """
+        shard_items = [[] for _ in range(self.shard_count)]
+        for item in items:
+            if item is None:
+                for items_of_shard in shard_items:
+                    items_of_shard.append(None)
+
+                continue
+
+            shard_items[self.get_shard_index(item)].append(item)
+
+        for shard, items_of_shard in zip(self.shards, shard_items):
+            shard.put_many(items_of_shard, timeout)
+
+    def qsize(self) -> int:
+        """
+        Approximate number of items in all shards.
+        """
+        return sum(shard.qsize() for shard in self.shards)
+
+    def get_many(self, max_items: int, timeout: float = 0.0) -> list:
+        """
+        Gets up to `max_items` items that are already in the shards.
+        For emptying the queue from main, consumers get from their own shard.
+
+        timeout: Time waiting in seconds for the first item, less than or equal to 0 to not wait.
+            The shards are polled while waiting, as no single queue wakes on a put to any shard.
+
+        Returns a list of items, empty if there were none.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            items = []
+            for shard in self.shards:
+                items.extend(shard.get_many(max_items - len(items)))
+
+            remaining_time = deadline - time.monotonic()
+            if len(items) > 0 or remaining_time <= 0.0:
+                return items
+
+            time.sleep(min(remaining_time, self.__POLL_PERIOD))
+
+    def add_consumers(self, count: int) -> None:
+        """
+        Registers consumers with every shard, `count` is for all shards so is split evenly.
+        """
+        for shard in self.shards:
+            shard.add_consumers(count // self.shard_count)
+
+    def get_consumer_count(self) -> int:
+        """
+        Returns the number of registered consumers of all shards.
+        """
+        return sum(shard.get_consumer_count() for shard in self.shards)
+
+    def wake_consumers(self, count: int) -> None:
+        """
+        Puts a sentinel into every shard without waiting, `count` is for all shards.
+        """
+        for shard in self.shards:
+            shard.wake_consumers(max(count // self.shard_count, 1))
+
+    def fill_queue_with_sentinel(self, timeout: float = 0.0) -> None:
+        """
+        Puts a sentinel for each registered consumer of every shard.
+        """
+        for shard in self.shards:
+            shard.fill_queue_with_sentinel(timeout)
+
+    def drain_queue(self) -> int:
+        """
+        Removes every item in every shard without waiting.
+
+        Returns the number of items removed.
+        """
+        return sum(shard.drain_queue() for shard in self.shards)
+
+    def fill_and_drain_queue(self) -> None:
+        """
+        Drains every shard, then puts a sentinel for each registered consumer.
+        """
+        for shard in self.shards:
+            shard.fill_and_drain_queue()
+
+    def get_drop_count(self) -> int:
+        """
+        Returns the number of items dropped by the policy of every shard.
+        """
+        return sum(shard.get_drop_count() for shard in self.shards)
+
+    def get_snapshot(self) -> "queue_statistics.QueueSnapshot | None":
+        """
+        Statistics of all shards since the previous snapshot, only call from main.
+        Counts and rates are totals, depth is the total of each shard's,
+        and wait percentiles are the worst shard's.
+
+        Returns None if the shards are not instrumented.
+        """
+        snapshots = [shard.get_snapshot() for shard in self.shards]
+        if any(snapshot is None for snapshot in snapshots):
+            return None
+
+        return queue_statistics.QueueSnapshot(
+            self.name,
+            sum(snapshot.depth for snapshot in snapshots),
+            sum(snapshot.max_depth for snapshot in snapshots),
+            sum(snapshot.put_count for snapshot in snapshots),
+            sum(snapshot.get_count for snapshot in snapshots),
+            sum(snapshot.drop_count for snapshot in snapshots),
+            sum(snapshot.put_rate for snapshot in snapshots),
+            sum(snapshot.get_rate for snapshot in snapshots),
+            (
+                max(snapshot.wait_p50 for snapshot in snapshots),
+                max(snapshot.wait_p95 for snapshot in snapshots),
+                max(snapshot.wait_p99 for snapshot in snapshots),
+            ),
+        )
+
+    def close(self) -> None:
+        """
+        Releases resources held by every shard.
+        """
+        for shard in self.shards:
+            shard.close()
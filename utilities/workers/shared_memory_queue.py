@@ -0,0 +1,252 @@
+"""
+Queue backed by a ring buffer in shared memory.
+"""
+
+import multiprocessing as mp
+import os
+import pickle
+import queue
+import struct
+import time
+from multiprocessing import shared_memory
+
+
+class SharedMemoryQueue:  # pylint: disable=too-many-instance-attributes
+    """
+    Multi-producer multi-consumer queue with the same `put`/`get` interface as `queue.Queue` .
+
+    Items are pickled directly into fixed size slots of a shared memory ring buffer,
+    so there is no round-trip through the SyncManager server process.
+    Producers and consumers hold separate locks, so a put never waits on a get.
+    Each pickled item must fit in `slot_size` bytes.
+    """
+
+    # Header: head (total items read), tail (total items written)
+    __INDEX_FORMAT = "=Q"
+    __HEAD_OFFSET = 0
+    __TAIL_OFFSET = struct.calcsize(__INDEX_FORMAT)
+    __HEADER_SIZE = 2 * struct.calcsize(__INDEX_FORMAT)
+    # Slot: payload length followed by payload
+    __LENGTH_FORMAT = "=I"
+    __LENGTH_SIZE = struct.calcsize(__LENGTH_FORMAT)
+
+    def __init__(self, slot_count: int, slot_size: int) -> None:
+        """
+        Constructor allocates the shared memory and synchronization primitives.
+
+        slot_count: Number of items the queue can hold, must be greater than 0 .
+        slot_size: Maximum size in bytes of a pickled item, must be greater than 0 .
+        """
+        if slot_count <= 0 or slot_size <= 0:
+            raise ValueError(f"Invalid slot count {slot_count} or slot size {slot_size}")
+
+        self.__slot_count = slot_count
+        self.__slot_size = slot_size
+        self.__slot_stride = self.__LENGTH_SIZE + slot_size
+
+        self.__memory = shared_memory.SharedMemory(
+            create=True,
+            size=self.__HEADER_SIZE + slot_count * self.__slot_stride,
+        )
+        self.__write_index(self.__HEAD_OFFSET, 0)
+        self.__write_index(self.__TAIL_OFFSET, 0)
+        self.__owner_pid = os.getpid()
+
+        self.__free_slots = mp.Semaphore(slot_count)
+        self.__used_slots = mp.Semaphore(0)
+        self.__put_lock = mp.Lock()
+        self.__get_lock = mp.Lock()
+        # Held while a batch takes its slots, so concurrent batches do not each hold
+        # part of the ring waiting for the rest
+        self.__reserve_lock = mp.Lock()
+
+    def __read_index(self, offset: int) -> int:
+        """
+        Reads the head or tail index.
+        """
+        return struct.unpack_from(self.__INDEX_FORMAT, self.__memory.buf, offset)[0]
+
+    def __write_index(self, offset: int, value: int) -> None:
+        """
+        Writes the head or tail index.
+        """
+        struct.pack_into(self.__INDEX_FORMAT, self.__memory.buf, offset, value)
+
+    def __slot_offset(self, index: int) -> int:
+        """
+        Byte offset of the slot for the monotonically increasing index.
+        """
+        return self.__HEADER_SIZE + (index % self.__slot_count) * self.__slot_stride
+
+    def put(self, item: object, block: bool = True, timeout: "float | None" = None) -> None:
+        """
+        Puts an item into the queue.
+
+        block: Whether to wait for a free slot.
+        timeout: Time waiting in seconds before raising `queue.Full`, None is forever.
+        """
+        data = pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.__slot_size:
+            raise ValueError(f"Item of {len(data)} bytes exceeds slot size {self.__slot_size}")
+
+        if not self.__free_slots.acquire(block, timeout):
+            raise queue.Full
+
+        with self.__put_lock:
+            tail = self.__read_index(self.__TAIL_OFFSET)
+            offset = self.__slot_offset(tail)
+            struct.pack_into(self.__LENGTH_FORMAT, self.__memory.buf, offset, len(data))
+            start = offset + self.__LENGTH_SIZE
+            self.__memory.buf[start : start + len(data)] = data
+            self.__write_index(self.__TAIL_OFFSET, tail + 1)
+
+        self.__used_slots.release()
+
+    def put_many(self, items: list, block: bool = True, timeout: "float | None" = None) -> None:
+        """
+        Puts all items into the queue with a single lock acquisition.
+        Either all items are put or none are, so there can be at most `get_slot_count()` items.
+
+        block: Whether to wait for enough free slots.
+        timeout: Time waiting in seconds before raising `queue.Full`, None is forever.
+        """
+        if len(items) > self.__slot_count:
+            raise ValueError(f"Batch of {len(items)} items exceeds slot count {self.__slot_count}")
+
+        datas = [pickle.dumps(item, pickle.HIGHEST_PROTOCOL) for item in items]
+        for data in datas:
+            if len(data) > self.__slot_size:
+                raise ValueError(f"Item of {len(data)} bytes exceeds slot size {self.__slot_size}")
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+        if not self.__reserve_lock.acquire(block, remaining):
+            raise queue.Full
+
+        try:
+            acquired_count = 0
+            for _ in datas:
+                remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+                if not self.__free_slots.acquire(block, remaining):
+                    for _ in range(acquired_count):
+                        self.__free_slots.release()
+
+                    raise queue.Full
+
+                acquired_count += 1
+        finally:
+            self.__reserve_lock.release()
+
+        with self.__put_lock:
+            tail = self.__read_index(self.__TAIL_OFFSET)
+            for i, data in enumerate(datas):
+                offset = self.__slot_offset(tail + i)
+                struct.pack_into(self.__LENGTH_FORMAT, self.__memory.buf, offset, len(data))
+                start = offset + self.__LENGTH_SIZE
+                self.__memory.buf[start : start + len(data)] = data
+
+            self.__write_index(self.__TAIL_OFFSET, tail + len(datas))
+
+        for _ in datas:
+            self.__used_slots.release()
+
+    def put_nowait(self, item: object) -> None:
+        """
+        Puts an item into the queue without blocking.
+        """
+        self.put(item, False)
+
+    def get(self, block: bool = True, timeout: "float | None" = None) -> object:
+        """
+        Removes and returns an item from the queue.
+
+        block: Whether to wait for an item.
+        timeout: Time waiting in seconds before raising `queue.Empty`, None is forever.
+        """
+        if not self.__used_slots.acquire(block, timeout):
+            raise queue.Empty
+
+        with self.__get_lock:
+            head = self.__read_index(self.__HEAD_OFFSET)
+            offset = self.__slot_offset(head)
+            length = struct.unpack_from(self.__LENGTH_FORMAT, self.__memory.buf, offset)[0]
+            start = offset + self.__LENGTH_SIZE
+            data = bytes(self.__memory.buf[start : start + length])
+            self.__write_index(self.__HEAD_OFFSET, head + 1)
+
+        self.__free_slots.release()
+
+        return pickle.loads(data)
+
+    def get_many(self, max_items: int, block: bool = True, timeout: "float | None" = None) -> list:
+        """
+        Removes and returns up to `max_items` items with a single lock acquisition.
+        Only waits for the first item, the rest are whatever is already in the queue.
+
+        block: Whether to wait for the first item.
+        timeout: Time waiting in seconds before raising `queue.Empty`, None is forever.
+        """
+        if max_items <= 0:
+            return []
+
+        if not self.__used_slots.acquire(block, timeout):
+            raise queue.Empty
+
+        count = 1
+        while count < max_items and self.__used_slots.acquire(False):
+            count += 1
+
+        datas = []
+        with self.__get_lock:
+            head = self.__read_index(self.__HEAD_OFFSET)
+            for i in range(count):
+                offset = self.__slot_offset(head + i)
+                length = struct.unpack_from(self.__LENGTH_FORMAT, self.__memory.buf, offset)[0]
+                start = offset + self.__LENGTH_SIZE
+                datas.append(bytes(self.__memory.buf[start : start + length]))
+
+            self.__write_index(self.__HEAD_OFFSET, head + count)
+
+        for _ in range(count):
+            self.__free_slots.release()
+
+        return [pickle.loads(data) for data in datas]
+
+    def get_nowait(self) -> object:
+        """
+        Removes and returns an item from the queue without blocking.
+        """
+        return self.get(False)
+
+    def get_slot_count(self) -> int:
+        """
+        Returns the number of items the queue can hold.
+        """
+        return self.__slot_count
+
+    def qsize(self) -> int:
+        """
+        Approximate number of items in the queue.
+        """
+        return max(self.__read_index(self.__TAIL_OFFSET) - self.__read_index(self.__HEAD_OFFSET), 0)
+
+    def empty(self) -> bool:
+        """
+        Approximate check of whether the queue is empty.
+        """
+        return self.qsize() == 0
+
+    def full(self) -> bool:
+        """
+        Approximate check of whether the queue is full.
+        """
+        return self.qsize() >= self.__slot_count
+
+    def close(self) -> None:
+        """
+        Releases the shared memory.
+        Only the creating process frees the memory, other processes just unmap it.
+        """
+        self.__memory.close()
+        if os.getpid() == self.__owner_pid:
+            self.__memory.unlink()
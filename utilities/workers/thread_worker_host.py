@@ -0,0 +1,370 @@
+"""
+For running workers on threads that share one MAVLink connection read by one event loop.
+"""
+
+import asyncio
+import concurrent.futures
+import queue
+import threading
+import time
+
+from pymavlink import mavutil
+
+from modules.common.modules.logger import logger
+
+
+class _LockedSender:
+    """
+    Serializes sends of several workers on the underlying `mav` object,
+    as packing a message increments its sequence number.
+    """
+
+    def __init__(self, mav: object, lock: threading.Lock) -> None:
+        self.__mav = mav
+        self.__lock = lock
+
+    def __getattr__(self, name: str) -> object:
+        attribute = getattr(self.__mav, name)
+        if not callable(attribute):
+            return attribute
+
+        def locked_call(*args: object, **kwargs: object) -> object:
+            with self.__lock:
+                return attribute(*args, **kwargs)
+
+        return locked_call
+
+
+class HostedMavlinkConnection:
+    """
+    Stands in for `mavutil.mavfile` in a worker run by ThreadWorkerHost,
+    so worker functions and classes are used unchanged.
+
+    Messages are decoded once by the host and delivered to every connection,
+    so workers no longer race each other for messages on the socket.
+    Sending goes through the underlying connection.
+
+    Messages not yet received are bounded, dropping the oldest, as workers that only send,
+    such as the heartbeat sender, never receive what is delivered to them.
+    """
+
+    # Messages are only delivered by the host, the socket must not be read directly
+    fd = None
+
+    # About 10 seconds of telemetry at the rates of the mock drones
+    MAX_PENDING_MESSAGES = 1000
+
+    def __init__(self, connection: mavutil.mavfile, send_lock: threading.Lock) -> None:
+        self.__connection = connection
+        self.__send_lock = send_lock
+        self.__messages: "queue.Queue[object]" = queue.Queue(self.MAX_PENDING_MESSAGES)
+        self.mav = _LockedSender(connection.mav, send_lock)
+
+    def __getattr__(self, name: str) -> object:
+        # Anything else, such as target_system, is read from the underlying connection
+        return getattr(self.__connection, name)
+
+    def write(self, buffer: bytes) -> None:
+        """
+        Writes already packed frames, so that they are not interleaved with other workers' sends.
+        """
+        with self.__send_lock:
+            self.__connection.write(buffer)
+
+    def deliver(self, message: object) -> None:
+        """
+        Called by the host for every received message.
+        Drops the oldest message not yet received if there are too many.
+        """
+        # Only the host delivers, so the queue has room after taking 1 out
+        while True:
+            try:
+                self.__messages.put_nowait(message)
+                return
+            except queue.Full:
+                pass
+
+            try:
+                self.__messages.get_nowait()
+            except queue.Empty:
+                pass
+
+    def recv_match(
+        self,
+        condition: "str | None" = None,
+        type: "str | list[str] | set[str] | None" = None,  # pylint: disable=redefined-builtin
+        blocking: bool = False,
+        timeout: "float | None" = None,
+    ) -> "object | None":
+        """
+        Same as `mavutil.mavfile.recv_match()`, except that it waits up to `timeout`
+        even if not blocking, as waiting for a delivered message costs nothing
+        unlike polling the socket.
+        """
+        if type is not None and isinstance(type, str):
+            type = [type]
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                if deadline is not None:
+                    message = self.__messages.get(timeout=max(deadline - time.monotonic(), 0.0))
+                elif blocking:
+                    message = self.__messages.get()
+                else:
+                    message = self.__messages.get_nowait()
+            except queue.Empty:
+                return None
+
+            if type is not None and message.get_type() not in type:
+                continue
+
+            if not mavutil.evaluate_condition(condition, self.__connection.messages):
+                continue
+
+            return message
+
+
+class HostedWorker:
+    """
+    Worker run by ThreadWorkerHost, with the interface of `mp.Process` used by WorkerManager.
+    """
+
+    def __init__(
+        self,
+        host: "ThreadWorkerHost",
+        target: "(...) -> object",  # type: ignore
+        args: "tuple",
+    ) -> None:
+        self.name = f"{getattr(target, '__name__', 'worker')}-hosted"
+        self.__host = host
+        self.__target = target
+        self.__args = args
+        self.__future: "concurrent.futures.Future | None" = None
+
+    def start(self) -> None:
+        """
+        Starts the worker on the host.
+        """
+        self.__future = self.__host.submit(self.__target, self.__args)
+
+    def is_alive(self) -> bool:
+        """
+        Returns whether the worker has started and not yet returned.
+        """
+        return self.__future is not None and not self.__future.done()
+
+    def join(self, timeout: "float | None" = None) -> None:
+        """
+        Waits for the worker to return.
+        """
+        if self.__future is not None:
+            concurrent.futures.wait([self.__future], timeout)
+
+
+class ThreadWorkerHost:  # pylint: disable=too-many-instance-attributes
+    """
+    Event loop in a thread of the owning process that reads the MAVLink socket, if given one.
+
+    The loop wakes only when the socket is readable, decodes each message once,
+    and delivers it to the HostedMavlinkConnection of every worker.
+    Worker functions keep their signatures: each blocks in a daemon thread of its own,
+    awaited on the loop, with the host's connection in its arguments replaced by
+    its own HostedMavlinkConnection. Only native coroutines, from `submit_coroutine()` ,
+    run on the loop itself.
+
+    Like any thread, a hosted worker cannot be killed, so a stalled one is not restarted.
+    The threads are daemons so that a worker stuck in a receive after `stop()`
+    does not keep the process from exiting, as an executor's threads would.
+    """
+
+    __create_key = object()
+
+    @classmethod
+    def create(
+        cls,
+        connection: "mavutil.mavfile | None",
+        local_logger: logger.Logger,
+    ) -> "tuple[bool, ThreadWorkerHost | None]":
+        """
+        Creates a host, call start() before starting any workers.
+
+        connection: Connection with a socket that the host exclusively reads,
+            None if the workers have their own connections.
+        local_logger: Existing logger from process.
+
+        Returns whether the host was created and the host.
+        """
+        if connection is not None and getattr(connection, "fd", None) is None:
+            local_logger.error("Connection has no file descriptor to wait on", True)
+            return False, None
+
+        return True, ThreadWorkerHost(cls.__create_key, connection, local_logger)
+
+    def __init__(
+        self,
+        class_private_create_key: object,
+        connection: "mavutil.mavfile | None",
+        local_logger: logger.Logger,
+    ) -> None:
+        """
+        Private constructor, use create() method.
+        """
+        assert class_private_create_key is ThreadWorkerHost.__create_key, "Use create() method"
+
+        self.__connection = connection
+        self.__local_logger = local_logger
+        self.__send_lock = threading.Lock()
+        self.__subscribers: "list[HostedMavlinkConnection]" = []
+        self.__subscribers_lock = threading.Lock()
+
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(
+            target=self.__loop.run_forever, name="thread_worker_host", daemon=True
+        )
+
+    def start(self) -> None:
+        """
+        Starts the event loop and reading the connection.
+        """
+        if self.__connection is not None:
+            self.__loop.call_soon_threadsafe(
+                self.__loop.add_reader, self.__connection.fd, self.__on_readable
+            )
+
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops reading the connection and the event loop.
+        Call after the workers have been joined.
+        """
+        if not self.__thread.is_alive():
+            return
+
+        if self.__connection is not None:
+            self.__loop.call_soon_threadsafe(self.__loop.remove_reader, self.__connection.fd)
+
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+        self.__loop.close()
+
+    def create_connection(self) -> HostedMavlinkConnection:
+        """
+        Returns a new connection that receives every message read from now on.
+        """
+        connection = HostedMavlinkConnection(self.__connection, self.__send_lock)
+        with self.__subscribers_lock:
+            self.__subscribers.append(connection)
+
+        return connection
+
+    def submit(
+        self, target: "(...) -> object", args: "tuple"  # type: ignore
+    ) -> concurrent.futures.Future:
+        """
+        Runs a worker function on the host.
+
+        target: Worker function.
+        args: Worker arguments, the host's connection is replaced by a new HostedMavlinkConnection.
+
+        Returns a future that completes when the worker function returns.
+        """
+        worker_connections = []
+        worker_args = []
+        for arg in args:
+            if self.__connection is not None and arg is self.__connection:
+                arg = self.create_connection()
+                worker_connections.append(arg)
+
+            worker_args.append(arg)
+
+        return self.submit_coroutine(
+            self.__run_in_thread(target, tuple(worker_args), worker_connections)
+        )
+
+    def submit_coroutine(self, coroutine: "object") -> concurrent.futures.Future:
+        """
+        Runs a native coroutine on the event loop.
+
+        Returns a future that completes when the coroutine does.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.__loop)
+
+    async def __run_in_thread(
+        self,
+        target: "(...) -> object",  # type: ignore
+        args: "tuple",
+        worker_connections: "list[HostedMavlinkConnection]",
+    ) -> None:
+        """
+        Awaits a blocking worker function running in its own thread.
+        """
+        future = self.__loop.create_future()
+        thread = threading.Thread(
+            target=self.__call,
+            args=(target, args, future),
+            name=f"hosted_worker_{getattr(target, '__name__', 'worker')}",
+            daemon=True,
+        )
+        thread.start()
+        try:
+            await future
+        # Catching all exceptions so that the worker dies like a process would
+        # pylint: disable-next=broad-exception-caught
+        except Exception as e:
+            self.__local_logger.error(f"Hosted worker {target.__name__} raised: {e}", True)
+        finally:
+            with self.__subscribers_lock:
+                for connection in worker_connections:
+                    self.__subscribers.remove(connection)
+
+    def __call(
+        self,
+        target: "(...) -> object",  # type: ignore
+        args: "tuple",
+        future: asyncio.Future,
+    ) -> None:
+        """
+        Runs the worker function in its thread, and completes the future on the loop.
+        """
+        try:
+            result = target(*args)
+        # Passed to the loop to be handled like an awaited exception
+        # pylint: disable-next=broad-exception-caught
+        except Exception as e:
+            self.__complete(future.set_exception, e)
+            return
+
+        self.__complete(future.set_result, result)
+
+    def __complete(self, callback: "(object) -> None", value: object) -> None:  # type: ignore
+        """
+        Completes a future from a worker thread, unless the loop has stopped.
+        """
+        try:
+            self.__loop.call_soon_threadsafe(callback, value)
+        except RuntimeError:
+            # The host was stopped while the worker ran, nothing waits for it any more
+            pass
+
+    def __on_readable(self) -> None:
+        """
+        Decodes all complete messages and delivers them.
+        """
+        try:
+            while True:
+                message = self.__connection.recv_msg()
+                if message is None:
+                    return
+
+                if message.get_type() == "BAD_DATA":
+                    continue
+
+                with self.__subscribers_lock:
+                    subscribers = list(self.__subscribers)
+
+                for subscriber in subscribers:
+                    subscriber.deliver(message)
+        except (ConnectionError, OSError) as e:
+            self.__local_logger.error(f"Failed to read connection: {e}", True)
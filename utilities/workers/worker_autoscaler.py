@@ -0,0 +1,247 @@
+"""
+For scaling the number of workers with their input queue depth.
+"""
+
+import math
+
+from modules.common.modules.logger import logger
+from utilities.workers import queue_proxy_wrapper
+from utilities.workers import worker_manager
+
+
+class ScalingPolicy:
+    """
+    Decides how many workers are needed to drain the input queue in time.
+
+    Workers needed = queue depth * service time per item / target drain time,
+    bounded to [min_count, max_count] .
+    Scaling up is immediate, scaling down waits until fewer workers
+    have been enough for `scale_down_delay` so that bursts do not cause churn.
+    """
+
+    __create_key = object()
+
+    # Weight of the newest sample in the service time moving average
+    __SERVICE_TIME_SMOOTHING = 0.2
+
+    @classmethod
+    def create(
+        cls,
+        min_count: int,
+        max_count: int,
+        target_drain_time: float,
+        service_time: float,
+        scale_down_delay: float,
+        local_logger: logger.Logger,
+    ) -> "tuple[bool, ScalingPolicy | None]":
+        """
+        Creates a scaling policy.
+
+        min_count: Minimum number of workers.
+        max_count: Maximum number of workers.
+        target_drain_time: Time in seconds the workers should take to drain the queue.
+        service_time: Initial estimate of time in seconds one worker takes per item.
+        scale_down_delay: Time in seconds fewer workers must suffice before scaling down.
+        local_logger: Existing logger from process.
+
+        Returns whether the policy was created and the policy.
+        """
+        if min_count <= 0 or max_count < min_count:
+            local_logger.error(f"Invalid worker count bounds: [{min_count}, {max_count}]", True)
+            return False, None
+
+        if target_drain_time <= 0.0 or service_time <= 0.0:
+            local_logger.error(
+                f"Drain time {target_drain_time} and service time {service_time} "
+                "must be greater than zero",
+                True,
+            )
+            return False, None
+
+        if scale_down_delay < 0.0:
+            local_logger.error("Scale down delay must not be negative", True)
+            return False, None
+
+        return True, ScalingPolicy(
+            cls.__create_key,
+            min_count,
+            max_count,
+            target_drain_time,
+            service_time,
+            scale_down_delay,
+        )
+
+    def __init__(
+        self,
+        class_private_create_key: object,
+        min_count: int,
+        max_count: int,
+        target_drain_time: float,
+        service_time: float,
+        scale_down_delay: float,
+    ) -> None:
+        """
+        Private constructor, use create() method.
+        """
+        assert class_private_create_key is ScalingPolicy.__create_key, "Use create() method"
+
+        self.__min_count = min_count
+        self.__max_count = max_count
+        self.__target_drain_time = target_drain_time
+        self.__service_time = service_time
+        self.__scale_down_delay = scale_down_delay
+        self.__scale_down_since: "float | None" = None
+
+    def update_service_time(self, service_time: float) -> None:
+        """
+        Adds a measured time in seconds one worker took per item to the estimate.
+        """
+        if service_time <= 0.0:
+            return
+
+        self.__service_time += self.__SERVICE_TIME_SMOOTHING * (service_time - self.__service_time)
+
+    def get_service_time(self) -> float:
+        """
+        Returns the current estimate of time in seconds one worker takes per item.
+        """
+        return self.__service_time
+
+    def get_desired_count(self, queue_depth: int, current_count: int, now: float) -> int:
+        """
+        Number of workers there should be.
+
+        queue_depth: Number of items in the input queue.
+        current_count: Number of workers now.
+        now: Current monotonic time in seconds.
+        """
+        needed_count = math.ceil(queue_depth * self.__service_time / self.__target_drain_time)
+        desired_count = min(max(needed_count, self.__min_count), self.__max_count)
+
+        if desired_count >= current_count:
+            self.__scale_down_since = None
+            return desired_count
+
+        if self.__scale_down_since is None:
+            self.__scale_down_since = now
+
+        if now - self.__scale_down_since < self.__scale_down_delay:
+            return current_count
+
+        self.__scale_down_since = None
+        return desired_count
+
+
+class WorkerAutoscaler:
+    """
+    Applies a scaling policy to the workers of a manager using its first input queue.
+
+    The policy's service time estimate is updated on every scale from the work
+    the workers report with `WorkerController.report_work()` ,
+    so workers that do not report keep the initial estimate.
+    """
+
+    __create_key = object()
+
+    @classmethod
+    def create(
+        cls,
+        manager: worker_manager.WorkerManager,
+        policy: ScalingPolicy,
+        local_logger: logger.Logger,
+    ) -> "tuple[bool, WorkerAutoscaler | None]":
+        """
+        Creates an autoscaler, the workers must exit on sentinel to be scaled down
+        and should report their work to measure the service time.
+        The input queue must block when full, as a dropping policy keeps the depth
+        from ever showing a backlog.
+
+        manager: Manager of the workers to scale.
+        policy: Scaling policy.
+        local_logger: Existing logger from process.
+
+        Returns whether the autoscaler was created and the autoscaler.
+        """
+        if len(manager.get_input_queues()) == 0:
+            local_logger.error(
+                f"Cannot autoscale {manager.get_target_name()}, it has no input queue", True
+            )
+            return False, None
+
+        input_queue = manager.get_input_queues()[0]
+        if not isinstance(input_queue, queue_proxy_wrapper.QueueProxyWrapper):
+            local_logger.error(
+                f"Cannot autoscale {manager.get_target_name()}, its input queue is sharded", True
+            )
+            return False, None
+
+        if input_queue.policy != queue_proxy_wrapper.QueueProxyWrapper.POLICY_BLOCK:
+            local_logger.error(
+                f"Cannot autoscale {manager.get_target_name()}, its input queue "
+                f"{input_queue.name} has the {input_queue.policy} policy",
+                True,
+            )
+            return False, None
+
+        return True, WorkerAutoscaler(cls.__create_key, manager, policy, local_logger)
+
+    def __init__(
+        self,
+        class_private_create_key: object,
+        manager: worker_manager.WorkerManager,
+        policy: ScalingPolicy,
+        local_logger: logger.Logger,
+    ) -> None:
+        """
+        Private constructor, use create() method.
+        """
+        assert class_private_create_key is WorkerAutoscaler.__create_key, "Use create() method"
+
+        self.__manager = manager
+        self.__input_queue = manager.get_input_queues()[0]
+        self.__policy = policy
+        self.__local_logger = local_logger
+        self.__previous_work_count, self.__previous_work_time = manager.get_work()
+
+    def get_policy(self) -> ScalingPolicy:
+        """
+        Returns the scaling policy.
+        """
+        return self.__policy
+
+    def scale(self, now: float) -> bool:
+        """
+        Scales the workers to the count the policy wants for the current queue depth,
+        after updating the policy with the service time measured since the previous scale.
+
+        now: Current monotonic time in seconds.
+
+        Returns whether the workers are at the desired count or scaling towards it.
+        """
+        self.__update_service_time()
+
+        queue_depth = self.__input_queue.qsize()
+        current_count = self.__manager.get_worker_count()
+        desired_count = self.__policy.get_desired_count(queue_depth, current_count, now)
+        if desired_count == current_count:
+            return True
+
+        self.__local_logger.info(
+            f"{self.__manager.get_target_name()} queue depth {queue_depth}, "
+            f"scaling from {current_count} to {desired_count} workers",
+            True,
+        )
+        return self.__manager.scale_to(desired_count)
+
+    def __update_service_time(self) -> None:
+        """
+        Updates the policy with the mean time per item the workers reported since the last update.
+        """
+        work_count, work_time = self.__manager.get_work()
+        item_count = work_count - self.__previous_work_count
+        if item_count <= 0:
+            return
+
+        self.__policy.update_service_time((work_time - self.__previous_work_time) / item_count)
+        self.__previous_work_count = work_count
+        self.__previous_work_time = work_time
@@ -6,67 +6,230 @@ import multiprocessing as mp
 import time
 
 
-class WorkerController:
+class _ExitState:
+    """
+    Exit request shared by a controller and all of its children,
+    with the pause state of each of them so that exit can wake paused workers.
+    """
+
+    def __init__(self) -> None:
+        self.is_exit_requested = mp.RawValue("b", 0)
+        self.exit_event = mp.Event()
+        # Pause flag and resume event of every controller sharing the exit request
+        self.pause_states: "list[tuple[object, object]]" = []
+
+    def set_resume_events(self) -> None:
+        """
+        Wakes every paused worker.
+        """
+        for _, resume_event in self.pause_states:
+            resume_event.set()
+
+    def clear_resume_events_if_paused(self) -> None:
+        """
+        Blocks paused workers again.
+        """
+        for is_paused, resume_event in self.pause_states:
+            if is_paused.value:
+                resume_event.clear()
+
+
+class WorkerController:  # pylint: disable=too-many-instance-attributes
     """
     For interprocess communication from main to worker.
     Contains exit and pause requests.
+
+    Requests are flags in shared memory, so checking them is a single memory read.
+    Each flag has an event alongside it for workers that need to block on a change.
+
+    A child controller, from `create_child()` , shares the exit request of its parent
+    but can be paused on its own, so that only the workers given the child pause.
+    Pausing or resuming the parent also pauses or resumes all of its children.
+
+    Workers call `report_progress()` every iteration of their loop,
+    so that main can tell a stuck worker from a slow one with `get_stall_duration()` .
+    Only meaningful for a controller given to a single worker, as WorkerManager does.
     """
 
-    __QUEUE_DELAY = 0.1  # seconds
+    def __init__(self, exit_state: "_ExitState | None" = None) -> None:
+        """
+        Constructor creates shared flags and events.
 
-    def __init__(self) -> None:
+        exit_state: Exit request of the parent, use `create_child()` instead.
         """
-        Constructor creates internal queue and semaphore.
+        self.__is_paused = mp.RawValue("b", 0)
+        self.__resume_event = mp.Event()
+        self.__resume_event.set()
+        # Number of workers blocked in `check_pause()` , only updated when paused
+        self.__paused_count = mp.Value("i", 0)
+        self.__children: "list[WorkerController]" = []
+        # Written only by the worker, except when main resets it before starting a worker
+        self.__progress_count = mp.RawValue("Q", 0)
+        self.__progress_time = mp.RawValue("d", time.monotonic())
+        # Written only by the worker, totals kept across the workers that reuse this controller
+        self.__work_count = mp.RawValue("Q", 0)
+        self.__work_time = mp.RawValue("d", 0.0)
+
+        self.__exit_state = _ExitState() if exit_state is None else exit_state
+        self.__exit_state.pause_states.append((self.__is_paused, self.__resume_event))
+        self.__is_exit_requested = self.__exit_state.is_exit_requested
+        self.__exit_event = self.__exit_state.exit_event
+
+    def create_child(self) -> "WorkerController":
         """
-        self.__pause = mp.BoundedSemaphore(1)
-        self.__is_paused = False
-        self.__exit_queue = mp.Queue(1)
+        Creates a controller for a subset of the workers, such as a pipeline stage,
+        paused if this controller is.
+        Create children in main before starting the workers that use them.
+        """
+        child = WorkerController(self.__exit_state)
+        if self.__is_paused.value:
+            child.request_pause()
+
+        self.__children.append(child)
+        return child
 
     def request_pause(self) -> None:
         """
-        Requests worker processes to pause.
+        Requests worker processes to pause, including those of child controllers.
         """
-        if not self.__is_paused:
-            self.__pause.acquire()
-            self.__is_paused = True
+        self.__is_paused.value = 1
+        if not self.__is_exit_requested.value:
+            self.__resume_event.clear()
+
+        for child in self.__children:
+            child.request_pause()
 
     def request_resume(self) -> None:
         """
-        Requests worker processes to resume.
+        Requests worker processes to resume, including those of child controllers.
         """
-        if self.__is_paused:
-            self.__pause.release()
-            self.__is_paused = False
+        self.__is_paused.value = 0
+        self.__resume_event.set()
+
+        for child in self.__children:
+            child.request_resume()
+
+    def is_pause_requested(self) -> bool:
+        """
+        Returns whether main has requested the worker processes to pause.
+        """
+        return bool(self.__is_paused.value)
 
     def check_pause(self) -> None:
         """
         Blocks worker if main has requested it to pause, otherwise continues.
+        An exit request also unblocks the worker.
         """
-        self.__pause.acquire()
-        self.__pause.release()
+        if not self.__is_paused.value:
+            return
+
+        with self.__paused_count.get_lock():
+            self.__paused_count.value += 1
+
+        try:
+            while self.__is_paused.value and not self.__is_exit_requested.value:
+                self.__resume_event.wait()
+        finally:
+            # Time spent paused is not a stall
+            self.report_progress()
+            with self.__paused_count.get_lock():
+                self.__paused_count.value -= 1
+
+    def get_paused_count(self) -> int:
+        """
+        Returns the number of workers blocked in `check_pause()` ,
+        including those of child controllers.
+        Once it reaches the number of workers, they are quiescent.
+        """
+        return self.__paused_count.value + sum(
+            child.get_paused_count() for child in self.__children
+        )
+
+    def report_progress(self) -> None:
+        """
+        Records that the worker is still making progress, call at least once per loop iteration.
+        """
+        self.__progress_count.value += 1
+        self.__progress_time.value = time.monotonic()
+
+    def get_progress_count(self) -> int:
+        """
+        Returns the number of times the worker has reported progress since the last reset.
+        """
+        return self.__progress_count.value
+
+    def report_work(self, item_count: int, work_time: float) -> None:
+        """
+        Records that the worker spent `work_time` seconds processing `item_count` items,
+        for measuring its service time. Time waiting for items is not work.
+        """
+        # Time first, so that main never sees items without the time spent on them
+        self.__work_time.value += work_time
+        self.__work_count.value += item_count
+
+    def get_work(self) -> "tuple[int, float]":
+        """
+        Returns the total number of items the workers of this controller have processed
+        and the total time in seconds spent processing them.
+        """
+        work_count = self.__work_count.value
+        return work_count, self.__work_time.value
+
+    def get_stall_duration(self) -> float:
+        """
+        Returns the time in seconds since the worker last reported progress,
+        0 while it is blocked in `check_pause()` .
+        """
+        if self.__paused_count.value > 0:
+            return 0.0
+
+        return max(time.monotonic() - self.__progress_time.value, 0.0)
+
+    def reset_progress(self) -> None:
+        """
+        Restarts the stall duration from now, call before starting a worker with this controller.
+        """
+        self.__progress_count.value = 0
+        self.__progress_time.value = time.monotonic()
+        with self.__paused_count.get_lock():
+            # Left behind by a worker killed while paused
+            self.__paused_count.value = 0
 
     def request_exit(self) -> None:
         """
-        Requests worker processes to exit.
+        Requests worker processes to exit, shared by the parent and all children.
         Does nothing if already requested.
         """
-        time.sleep(self.__QUEUE_DELAY)
-        if self.__exit_queue.empty():
-            self.__exit_queue.put(None)
+        self.__is_exit_requested.value = 1
+        self.__exit_event.set()
+        # Wake paused workers so they can see the exit request
+        self.__exit_state.set_resume_events()
 
     def clear_exit(self) -> None:
         """
-        Clears the exit request condition.
+        Clears the exit request condition, shared by the parent and all children.
         Does nothing if already cleared.
         """
-        time.sleep(self.__QUEUE_DELAY)
-        if not self.__exit_queue.empty():
-            _ = self.__exit_queue.get()
+        self.__is_exit_requested.value = 0
+        self.__exit_event.clear()
+        self.__exit_state.clear_resume_events_if_paused()
 
     def is_exit_requested(self) -> bool:
         """
         Returns whether main has requested the worker process to exit.
-        There is a race condition, but it's fine because the worker process
-        will do at most 1 additional loop.
         """
-        return not self.__exit_queue.empty()
+        return bool(self.__is_exit_requested.value)
+
+    def wait_for_exit(self, timeout: "float | None" = None) -> bool:
+        """
+        Blocks until main requests exit or the timeout elapses.
+        Use instead of `time.sleep()` so that the worker exits immediately when requested.
+
+        timeout: Time waiting in seconds, None is forever.
+
+        Returns whether main has requested the worker process to exit.
+        """
+        if self.__is_exit_requested.value:
+            return True
+
+        return self.__exit_event.wait(timeout)
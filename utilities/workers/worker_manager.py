@@ -3,13 +3,55 @@ For managing workers.
 """
 
 import multiprocessing as mp
+import multiprocessing.connection
+import multiprocessing.process
+import os
+import queue
+import threading
+import time
 
 from modules.common.modules.logger import logger
+from utilities.workers import thread_worker_host
 from utilities.workers import worker_controller
 from utilities.workers import queue_proxy_wrapper
+from utilities.workers import sharded_queue
 
 
-class WorkerProperties:
+def _run_with_scheduling(
+    target: "(...) -> object",  # type: ignore
+    cpu_affinity: "set[int] | None",
+    nice: "int | None",
+    realtime_priority: "int | None",
+    *args: object,
+) -> None:
+    """
+    Applies the scheduling settings to the calling worker process and then runs the target.
+    Failures are logged to the worker's log, and the target runs regardless.
+    """
+    try:
+        if cpu_affinity is not None:
+            os.sched_setaffinity(0, cpu_affinity)
+
+        if nice is not None:
+            os.setpriority(os.PRIO_PROCESS, 0, nice)
+
+        if realtime_priority is not None:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(realtime_priority))
+    except OSError as e:
+        # Same name as the logger the worker creates, so that this is in the worker's log
+        result, local_logger = logger.Logger.create(f"{target.__name__}_{os.getpid()}", True)
+        if result:
+            # Get Pylance to stop complaining
+            assert local_logger is not None
+
+            local_logger.warning(f"Failed to apply scheduling settings: {e}", True)
+        else:
+            print("ERROR: Worker failed to create logger")
+
+    target(*args)
+
+
+class WorkerProperties:  # pylint: disable=too-many-instance-attributes
     """
     Worker Properties.
     """
@@ -26,6 +68,9 @@ class WorkerProperties:
         output_queues: "list[queue_proxy_wrapper.QueueProxyWrapper]",
         controller: worker_controller.WorkerController,
         local_logger: logger.Logger,
+        cpu_affinity: "set[int] | None" = None,
+        nice: "int | None" = None,
+        realtime_priority: "int | None" = None,
     ) -> "tuple[bool, WorkerProperties | None]":
         """
         Creates worker properties.
@@ -37,6 +82,10 @@ class WorkerProperties:
         output_queues: Output queues.
         controller: Worker controller.
         local_logger: Existing logger from process.
+        cpu_affinity: CPUs the workers may run on, None for any.
+        nice: Niceness of the workers from -20 (highest priority) to 19, None to inherit.
+        realtime_priority: SCHED_FIFO priority of the workers, None for normal scheduling.
+            Overrides niceness, so only one of the two can be set.
 
         Returns the WorkerProperties object.
         """
@@ -47,6 +96,47 @@ class WorkerProperties:
             )
             return False, None
 
+        if cpu_affinity is not None:
+            if not hasattr(os, "sched_setaffinity"):
+                local_logger.error("CPU affinity is not supported on this platform", True)
+                return False, None
+
+            cpu_count = os.cpu_count() or 0
+            if len(cpu_affinity) == 0 or not all(0 <= cpu < cpu_count for cpu in cpu_affinity):
+                local_logger.error(
+                    f"CPU affinity {cpu_affinity} is not a subset of CPUs 0 to {cpu_count - 1}",
+                    True,
+                )
+                return False, None
+
+        if nice is not None and realtime_priority is not None:
+            local_logger.error("Niceness has no effect with a realtime priority", True)
+            return False, None
+
+        if nice is not None:
+            if not hasattr(os, "setpriority"):
+                local_logger.error("Niceness is not supported on this platform", True)
+                return False, None
+
+            if not -20 <= nice <= 19:
+                local_logger.error(f"Niceness {nice} is not within -20 to 19", True)
+                return False, None
+
+        if realtime_priority is not None:
+            if not hasattr(os, "sched_setscheduler"):
+                local_logger.error("Realtime priority is not supported on this platform", True)
+                return False, None
+
+            min_priority = os.sched_get_priority_min(os.SCHED_FIFO)
+            max_priority = os.sched_get_priority_max(os.SCHED_FIFO)
+            if not min_priority <= realtime_priority <= max_priority:
+                local_logger.error(
+                    f"Realtime priority {realtime_priority} is not within "
+                    f"{min_priority} to {max_priority}",
+                    True,
+                )
+                return False, None
+
         return True, WorkerProperties(
             cls.__create_key,
             count,
@@ -55,6 +145,9 @@ class WorkerProperties:
             input_queues,
             output_queues,
             controller,
+            cpu_affinity,
+            nice,
+            realtime_priority,
         )
 
     def __init__(
@@ -66,6 +159,9 @@ class WorkerProperties:
         input_queues: "list[queue_proxy_wrapper.QueueProxyWrapper]",
         output_queues: "list[queue_proxy_wrapper.QueueProxyWrapper]",
         controller: worker_controller.WorkerController,
+        cpu_affinity: "set[int] | None",
+        nice: "int | None",
+        realtime_priority: "int | None",
     ) -> None:
         """
         Private constructor, use create() method.
@@ -78,18 +174,36 @@ class WorkerProperties:
         self.__input_queues = input_queues
         self.__output_queues = output_queues
         self.__controller = controller
+        self.__cpu_affinity = cpu_affinity
+        self.__nice = nice
+        self.__realtime_priority = realtime_priority
 
-    def get_worker_arguments(self) -> "tuple":
+    def get_worker_arguments(
+        self,
+        controller: "worker_controller.WorkerController | None" = None,
+        worker_index: int = 0,
+    ) -> "tuple":
         """
         Concatenates the worker properties into a tuple.
 
+        controller: Controller of the single worker, None for the shared controller.
+        worker_index: Position of the worker, selecting its shard of sharded input queues.
+
         Returns the worker properties as a tuple.
         """
+        input_queues = tuple(
+            (
+                input_queue.get_shard(worker_index)
+                if isinstance(input_queue, sharded_queue.ShardedQueue)
+                else input_queue
+            )
+            for input_queue in self.__input_queues
+        )
         return (
             self.__work_arguments
-            + tuple(self.__input_queues)
+            + input_queues
             + tuple(self.__output_queues)
-            + (self.__controller,)
+            + (self.__controller if controller is None else controller,)
         )
 
     def get_worker_count(self) -> int:
@@ -104,12 +218,70 @@ class WorkerProperties:
         """
         return self.__target
 
+    def get_scheduled_worker_target_and_arguments(
+        self,
+        controller: "worker_controller.WorkerController | None" = None,
+        worker_index: int = 0,
+    ) -> "tuple[(...) -> object, tuple]":  # type: ignore
+        """
+        Wraps the worker target to apply the scheduling settings before it runs, if any.
+
+        controller: Controller of the single worker, None for the shared controller.
+        worker_index: Position of the worker, selecting its shard of sharded input queues.
+
+        Returns the function to run in the worker and its arguments.
+        """
+        if not self.is_scheduled():
+            return self.__target, self.get_worker_arguments(controller, worker_index)
+
+        return (
+            _run_with_scheduling,
+            (
+                self.__target,
+                self.__cpu_affinity,
+                self.__nice,
+                self.__realtime_priority,
+            )
+            + self.get_worker_arguments(controller, worker_index),
+        )
+
     def get_input_queues(self) -> "list[queue_proxy_wrapper.QueueProxyWrapper]":
         """
         Returns the input queues.
         """
         return self.__input_queues
 
+    def is_scheduled(self) -> bool:
+        """
+        Returns whether any scheduling setting is set, which only worker processes can apply.
+        """
+        return (
+            self.__cpu_affinity is not None
+            or self.__nice is not None
+            or self.__realtime_priority is not None
+        )
+
+    def is_sharded(self) -> bool:
+        """
+        Returns whether any input queue is sharded, fixing the number of workers.
+        """
+        return any(
+            isinstance(input_queue, sharded_queue.ShardedQueue)
+            for input_queue in self.__input_queues
+        )
+
+    def get_output_queues(self) -> "list[queue_proxy_wrapper.QueueProxyWrapper]":
+        """
+        Returns the output queues.
+        """
+        return self.__output_queues
+
+    def get_controller(self) -> worker_controller.WorkerController:
+        """
+        Returns the controller.
+        """
+        return self.__controller
+
     def get_target_name(self) -> str:
         """
         Returns the name of the target.
@@ -117,33 +289,172 @@ class WorkerProperties:
         return self.__target.__name__
 
 
-class WorkerManager:
+class WorkerStopStatistics:
+    """
+    How a single worker stopped during shutdown.
+    """
+
+    STOP_EXITED = "exited"
+    STOP_TERMINATED = "terminated"
+    STOP_KILLED = "killed"
+    # Threads cannot be stopped from outside, they are left running
+    # until they return or the process exits, which they do not prevent as they are daemons
+    STOP_ABANDONED = "abandoned"
+
+    def __init__(self, worker_name: str) -> None:
+        self.worker_name = worker_name
+        self.stop = self.STOP_EXITED
+        # Seconds from the start of shutdown to the worker being seen stopped, None if abandoned
+        self.stop_latency: "float | None" = None
+
+    def __str__(self) -> str:
+        if self.stop_latency is None:
+            return f"{self.worker_name}: {self.stop}"
+
+        return f"{self.worker_name}: {self.stop} after {self.stop_latency:.3f}s"
+
+
+class _WorkerSlot:
+    """
+    Position of a worker and its own controller, kept by the worker that replaces it.
+    """
+
+    def __init__(self, index: int, controller: worker_controller.WorkerController) -> None:
+        self.index = index
+        self.controller = controller
+
+
+class WorkerStall:
+    """
+    A worker found to have stopped reporting progress.
+    """
+
+    def __init__(self, worker_name: str, stall_duration: float, is_killed: bool) -> None:
+        self.worker_name = worker_name
+        # Seconds since the worker last reported progress when found
+        self.stall_duration = stall_duration
+        # Processes are killed to be restarted, threads cannot be
+        self.is_killed = is_killed
+
+    def __str__(self) -> str:
+        action = "killed" if self.is_killed else "left running"
+        return f"{self.worker_name}: stalled for {self.stall_duration:.3f}s, {action}"
+
+
+class WorkerManager:  # pylint: disable=too-many-instance-attributes
     """
     For interprocess communication from main to worker.
     Contains exit and pause requests.
+
+    `backend` selects what a worker is:
+    * "process": A process per worker.
+    * "thread": A thread per worker in the process that owns the manager.
+      Suits I/O bound workers that mostly sleep or block, saving a process each.
+    * "hosted_thread": A thread per worker, started by a ThreadWorkerHost in the process
+      that owns the manager, receiving from the host's connection instead of reading the socket
+      itself. Saves the socket reads of every worker, not the threads.
+
+    Only processes can be killed. Stalled thread workers are only reported,
+    so the supervisor cannot restart them, and shutdown abandons any still running.
+    Only processes can have their own CPU affinity and priority,
+    as those of a thread would change the scheduling of main as well.
+
+    Each worker gets its own child of the properties' controller, for reporting progress,
+    and its own shard of any sharded input queue, both reused by the worker that replaces it.
+    With `stall_timeout` , `kill_stalled_workers()` kills workers that are alive but have not
+    reported progress for that long, such as one stuck in a receive, so they get restarted.
     """
 
+    BACKEND_PROCESS = "process"
+    BACKEND_THREAD = "thread"
+    BACKEND_HOSTED_THREAD = "hosted_thread"
+
     __create_key = object()
 
+    # Time for a terminated or killed process to exit
+    __ESCALATION_TIMEOUT = 1.0  # seconds
+    # Maximum time between checks of thread workers during shutdown
+    __SHUTDOWN_POLL_PERIOD = 0.01  # seconds
+    # Maximum time waiting for space in a full input queue for a retirement sentinel
+    __SENTINEL_TIMEOUT = 0.1  # seconds
+
     @classmethod
     def create(
         cls,
         worker_properties: WorkerProperties,
         local_logger: logger.Logger,
+        start_method: "str | None" = None,
+        backend: str = BACKEND_PROCESS,
+        thread_host: "thread_worker_host.ThreadWorkerHost | None" = None,
+        stall_timeout: "float | None" = None,
     ) -> "tuple[bool, WorkerManager | None]":
         """
         Create identical workers and append them to a workers list.
 
         worker_properties: Worker properties.
         local_logger: Existing logger from process.
+        start_method: "fork", "forkserver", or "spawn", None for the default start method.
+            Other than with "fork", the worker arguments are pickled, and the controller and
+            shared memory queues must have been created with the same start method
+            (simplest is to call `mp.set_start_method()` at the start of main).
+            With "forkserver", `mp.set_forkserver_preload()` imports modules once for all workers.
+            Only used by the process backend.
+        backend: "process", "thread", or "hosted_thread".
+        thread_host: Host to run the workers on, required by the hosted thread backend.
+        stall_timeout: Time in seconds without progress before a worker is considered stuck,
+            None to not check. Allow for the longest blocking call in the worker's loop.
 
         Returns whether the workers were able to be created and the Worker Manager.
         """
+        if backend not in (cls.BACKEND_PROCESS, cls.BACKEND_THREAD, cls.BACKEND_HOSTED_THREAD):
+            local_logger.error(f"Unknown worker backend: {backend}", True)
+            return False, None
+
+        if backend == cls.BACKEND_HOSTED_THREAD and thread_host is None:
+            local_logger.error("Hosted thread backend requires a thread host", True)
+            return False, None
+
+        if backend != cls.BACKEND_PROCESS and worker_properties.is_scheduled():
+            local_logger.error(
+                f"{worker_properties.get_target_name()} has scheduling settings, "
+                f"which the {backend} backend cannot apply",
+                True,
+            )
+            return False, None
+
+        if worker_properties.is_sharded():
+            for input_queue in worker_properties.get_input_queues():
+                if (
+                    isinstance(input_queue, sharded_queue.ShardedQueue)
+                    and input_queue.shard_count != worker_properties.get_worker_count()
+                ):
+                    local_logger.error(
+                        f"Sharded queue {input_queue.name} has {input_queue.shard_count} shards "
+                        f"for {worker_properties.get_worker_count()} workers",
+                        True,
+                    )
+                    return False, None
+
+        if stall_timeout is not None and stall_timeout <= 0.0:
+            local_logger.error(f"Stall timeout must be greater than zero: {stall_timeout}", True)
+            return False, None
+
+        try:
+            context = mp.get_context(start_method)
+        except ValueError as e:
+            local_logger.error(f"Invalid start method {start_method}: {e}", True)
+            return False, None
+
         workers = []
-        for _ in range(0, worker_properties.get_worker_count()):
+        worker_slots = {}
+        for i in range(0, worker_properties.get_worker_count()):
+            slot = _WorkerSlot(i, worker_properties.get_controller().create_child())
             result, worker = WorkerManager.__create_single_worker(
-                worker_properties.get_worker_target(),
-                worker_properties.get_worker_arguments(),
+                backend,
+                context,
+                thread_host,
+                worker_properties,
+                slot,
                 local_logger,
             )
             if not result:
@@ -151,19 +462,30 @@ class WorkerManager:
                 return False, None
 
             workers.append(worker)
+            worker_slots[worker] = slot
 
         return True, WorkerManager(
             cls.__create_key,
+            backend,
+            context,
+            thread_host,
             workers,
+            worker_slots,
             worker_properties,
+            stall_timeout,
             local_logger,
         )
 
     def __init__(
         self,
         class_private_create_key: object,
-        workers: "list[mp.Process]",
+        backend: str,
+        context: mp.context.BaseContext,
+        thread_host: "thread_worker_host.ThreadWorkerHost | None",
+        workers: "list[mp.Process | threading.Thread | thread_worker_host.HostedWorker]",
+        worker_slots: "dict[object, _WorkerSlot]",
         worker_properties: WorkerProperties,
+        stall_timeout: "float | None",
         local_logger: logger.Logger,
     ) -> None:
         """
@@ -171,23 +493,61 @@ class WorkerManager:
         """
         assert class_private_create_key is WorkerManager.__create_key, "Use create() method"
 
+        self.__backend = backend
+        self.__context = context
+        self.__thread_host = thread_host
         self.__workers = workers
+        # Slot of each worker, and those of retired workers for reuse when scaling up
+        self.__worker_slots = worker_slots
+        self.__spare_slots: "list[_WorkerSlot]" = []
         self.__worker_properties = worker_properties
+        self.__stall_timeout = stall_timeout
+        # Stalled workers that could not be killed, reported once until they progress again
+        self.__reported_stalled_workers = set()
         self.__local_logger = local_logger
+        # Workers can be restarted from a supervisor thread while main uses the manager
+        self.__workers_lock = threading.Lock()
+        # Workers sent a sentinel by scale_to() that have not exited yet
+        self.__pending_retirement_count = 0
 
     @staticmethod
-    def __create_single_worker(target: "(...) -> object", args: "tuple", local_logger: logger.Logger) -> "tuple[bool, mp.Process | None]":  # type: ignore
+    def __create_single_worker(
+        backend: str,
+        context: mp.context.BaseContext,
+        thread_host: "thread_worker_host.ThreadWorkerHost | None",
+        worker_properties: WorkerProperties,
+        slot: _WorkerSlot,
+        local_logger: logger.Logger,
+    ) -> "tuple[bool, mp.Process | threading.Thread | thread_worker_host.HostedWorker | None]":
         """
         Creates a single worker.
 
-        target: Function.
-        args: Target function arguments.
+        backend: "process", "thread", or "hosted_thread".
+        context: Multiprocessing context of the start method.
+        thread_host: Host for the hosted thread backend.
+        worker_properties: Worker properties.
+        slot: Position and controller of the worker.
         local_logger: Existing logger from process.
 
         Returns whether a worker was created and the worker.
         """
+        target, args = worker_properties.get_scheduled_worker_target_and_arguments(
+            slot.controller, slot.index
+        )
         try:
-            worker = mp.Process(target=target, args=args)
+            if backend == WorkerManager.BACKEND_HOSTED_THREAD:
+                assert thread_host is not None
+                worker = thread_worker_host.HostedWorker(thread_host, target, args)
+            elif backend == WorkerManager.BACKEND_THREAD:
+                # Daemon so that a stuck worker thread does not keep the process alive
+                worker = threading.Thread(
+                    target=target,
+                    args=args,
+                    name=worker_properties.get_target_name(),
+                    daemon=True,
+                )
+            else:
+                worker = context.Process(target=target, args=args)
         # Catching all exceptions for library call
         # pylint: disable-next=broad-exception-caught
         except Exception as e:
@@ -200,22 +560,321 @@ class WorkerManager:
         """
         Start workers.
         """
-        for worker in self.__workers:
-            worker.start()
+        with self.__workers_lock:
+            for worker in self.__workers:
+                self.__worker_slots[worker].controller.reset_progress()
+                worker.start()
+
+            self.__add_consumers(len(self.__workers))
 
     def join_workers(self) -> None:
         """
         Join workers.
         """
-        for worker in self.__workers:
+        with self.__workers_lock:
+            workers = list(self.__workers)
+
+        for worker in workers:
             worker.join()
 
+    def shutdown(self, deadline: float) -> "list[WorkerStopStatistics]":
+        """
+        Stops the workers in bounded time, even if some are stuck.
+
+        Requests exit, puts a sentinel per worker into each input queue to wake blocked consumers,
+        and empties bounded output queues to unblock producers.
+        Workers still running at `deadline` are terminated, then killed if that does not work.
+        Returns at most 2 seconds after the deadline, to allow for escalation.
+        Stop the supervisor first, otherwise it restarts the exiting workers.
+
+        Threads cannot be terminated, so those still running at the deadline
+        are abandoned: they keep running, and can still use their queues and connection,
+        until the process exits. Their threads are daemons, so the process can exit
+        without waiting for them, which bounds the whole shutdown rather than this call alone.
+
+        deadline: Monotonic time in seconds by which the workers should have exited.
+
+        Returns how each worker stopped.
+        """
+        start_time = time.monotonic()
+        with self.__workers_lock:
+            workers = list(self.__workers)
+            running_count = len(workers) - self.__pending_retirement_count
+            self.__add_consumers(-running_count)
+
+        self.__worker_properties.get_controller().request_exit()
+        for input_queue in self.__worker_properties.get_input_queues():
+            input_queue.wake_consumers(running_count)
+
+        for output_queue in self.__worker_properties.get_output_queues():
+            if output_queue.maxsize > 0:
+                output_queue.get_many(output_queue.maxsize)
+
+        statistics = {worker: WorkerStopStatistics(worker.name) for worker in workers}
+        running = self.__wait_for_workers(workers, statistics, start_time, deadline)
+
+        if len(running) > 0:
+            self.__local_logger.warning(
+                f"{len(running)} {self.get_target_name()} worker(s) did not exit by the deadline",
+                True,
+            )
+
+        for stop, method_name in [
+            (WorkerStopStatistics.STOP_TERMINATED, "terminate"),
+            (WorkerStopStatistics.STOP_KILLED, "kill"),
+        ]:
+            processes = [
+                worker
+                for worker in running
+                if isinstance(worker, multiprocessing.process.BaseProcess)
+            ]
+            if len(processes) == 0:
+                break
+
+            for process in processes:
+                getattr(process, method_name)()
+                statistics[process].stop = stop
+
+            running = self.__wait_for_workers(
+                running,
+                statistics,
+                start_time,
+                time.monotonic() + self.__ESCALATION_TIMEOUT,
+            )
+
+        for worker in running:
+            statistics[worker].stop = WorkerStopStatistics.STOP_ABANDONED
+            self.__local_logger.error(f"Could not stop worker {worker.name}", True)
+
+        return list(statistics.values())
+
+    def __wait_for_workers(
+        self,
+        workers: "list[mp.Process | threading.Thread | thread_worker_host.HostedWorker]",
+        statistics: "dict[object, WorkerStopStatistics]",
+        start_time: float,
+        deadline: float,
+    ) -> "list[mp.Process | threading.Thread | thread_worker_host.HostedWorker]":
+        """
+        Waits until the workers have stopped or the deadline, recording when each stopped.
+
+        Returns the workers still running.
+        """
+        running = list(workers)
+        while True:
+            now = time.monotonic()
+            still_running = []
+            for worker in running:
+                if worker.is_alive():
+                    still_running.append(worker)
+                    continue
+
+                statistics[worker].stop_latency = now - start_time
+
+            running = still_running
+            if len(running) == 0 or now >= deadline:
+                return running
+
+            # Processes wake the wait as soon as they exit, others are polled
+            timeout = deadline - now
+            sentinels = [
+                worker.sentinel
+                for worker in running
+                if isinstance(worker, multiprocessing.process.BaseProcess)
+            ]
+            if len(sentinels) < len(running):
+                timeout = min(timeout, self.__SHUTDOWN_POLL_PERIOD)
+
+            if len(sentinels) > 0:
+                multiprocessing.connection.wait(sentinels, timeout)
+            else:
+                time.sleep(timeout)
+
+    def get_target_name(self) -> str:
+        """
+        Returns the name of the target the workers run.
+        """
+        return self.__worker_properties.get_target_name()
+
+    def get_worker_count(self) -> int:
+        """
+        Returns the number of workers, excluding those being retired.
+        """
+        with self.__workers_lock:
+            self.__remove_retired_workers()
+            return len(self.__workers) - self.__pending_retirement_count
+
+    def get_input_queues(self) -> "list[queue_proxy_wrapper.QueueProxyWrapper]":
+        """
+        Returns the input queues of the workers.
+        """
+        return self.__worker_properties.get_input_queues()
+
+    def get_dead_worker_count(self) -> int:
+        """
+        Returns the number of workers that have exited, excluding those retired by scale_to().
+        """
+        with self.__workers_lock:
+            self.__remove_retired_workers()
+            return sum(1 for worker in self.__workers if not worker.is_alive())
+
+    def get_work(self) -> "tuple[int, float]":
+        """
+        Returns the total number of items processed and seconds spent processing them,
+        as reported by the workers with `WorkerController.report_work()` ,
+        including retired and dead workers.
+        """
+        with self.__workers_lock:
+            slots = list(self.__worker_slots.values()) + self.__spare_slots
+
+        work_count = 0
+        work_time = 0.0
+        for slot in slots:
+            slot_work_count, slot_work_time = slot.controller.get_work()
+            work_count += slot_work_count
+            work_time += slot_work_time
+
+        return work_count, work_time
+
+    def scale_to(self, count: int) -> bool:
+        """
+        Starts or retires workers until there are `count` workers.
+
+        Workers are retired by putting a sentinel (None) into the first input queue,
+        so only workers that exit on sentinel can be scaled down.
+        A retiring worker finishes the items queued ahead of its sentinel first.
+        If the queue stays full, the retirements without a sentinel are cancelled.
+
+        count: Desired number of workers.
+
+        Returns whether the workers were started or retirements requested.
+        """
+        if count <= 0:
+            self.__local_logger.error(f"Cannot scale to {count} workers", True)
+            return False
+
+        target_name = self.__worker_properties.get_target_name()
+        if self.__worker_properties.is_sharded():
+            self.__local_logger.error(f"Cannot scale {target_name}, its input is sharded", True)
+            return False
+
+        with self.__workers_lock:
+            self.__remove_retired_workers()
+            current_count = len(self.__workers) - self.__pending_retirement_count
+            if count == current_count:
+                return True
+
+            if count > current_count:
+                for _ in range(count - current_count):
+                    if len(self.__spare_slots) > 0:
+                        slot = self.__spare_slots.pop()
+                    else:
+                        slot = _WorkerSlot(
+                            len(self.__worker_slots),
+                            self.__worker_properties.get_controller().create_child(),
+                        )
+
+                    result, worker = WorkerManager.__create_single_worker(
+                        self.__backend,
+                        self.__context,
+                        self.__thread_host,
+                        self.__worker_properties,
+                        slot,
+                        self.__local_logger,
+                    )
+                    if not result:
+                        self.__spare_slots.append(slot)
+                        self.__local_logger.error(f"Failed to scale up {target_name}", True)
+                        return False
+
+                    slot.controller.reset_progress()
+                    worker.start()
+                    self.__workers.append(worker)
+                    self.__worker_slots[worker] = slot
+                    self.__add_consumers(1)
+
+                self.__local_logger.info(
+                    f"Scaled {target_name} up from {current_count} to {count}", True
+                )
+                return True
+
+            input_queues = self.__worker_properties.get_input_queues()
+            if len(input_queues) == 0:
+                self.__local_logger.error(
+                    f"Cannot scale down {target_name}, it has no input queue for sentinels", True
+                )
+                return False
+
+            retirement_count = current_count - count
+            self.__pending_retirement_count += retirement_count
+            self.__add_consumers(-retirement_count)
+
+        # Put without holding the lock, which the supervisor needs while the queue is full
+        put_count = 0
+        try:
+            for _ in range(retirement_count):
+                input_queues[0].put(None, timeout=self.__SENTINEL_TIMEOUT)
+                put_count += 1
+        except queue.Full:
+            with self.__workers_lock:
+                self.__pending_retirement_count -= retirement_count - put_count
+                self.__add_consumers(retirement_count - put_count)
+
+            self.__local_logger.warning(
+                f"Input queue of {target_name} is full, retiring {put_count} "
+                f"of {retirement_count} workers",
+                True,
+            )
+            return False
+
+        self.__local_logger.info(
+            f"Scaling {target_name} down from {current_count} to {count}", True
+        )
+        return True
+
+    def __add_consumers(self, count: int) -> None:
+        """
+        Registers started workers, or unregisters stopping ones, with the input queues.
+        """
+        for input_queue in self.__worker_properties.get_input_queues():
+            input_queue.add_consumers(count)
+
+    def __remove_retired_workers(self) -> None:
+        """
+        Removes exited workers that were retired, caller holds the workers lock.
+        """
+        if self.__pending_retirement_count == 0:
+            return
+
+        new_workers = []
+        for worker in self.__workers:
+            if self.__pending_retirement_count > 0 and not worker.is_alive():
+                self.__pending_retirement_count -= 1
+                self.__spare_slots.append(self.__worker_slots.pop(worker))
+                self.__reported_stalled_workers.discard(worker)
+                continue
+
+            new_workers.append(worker)
+
+        self.__workers = new_workers
+
     def check_and_restart_dead_workers(self) -> bool:
         """
         Check and restart dead workers.
 
         Returns whether the dead workers were able to be restarted.
         """
+        with self.__workers_lock:
+            self.__remove_retired_workers()
+            return self.__restart_dead_workers()
+
+    def __restart_dead_workers(self) -> bool:
+        """
+        Replaces dead workers with new started workers, caller holds the workers lock.
+
+        Returns whether the dead workers were able to be restarted.
+        """
+        is_all_restarted = True
         new_workers = []
         for worker in self.__workers:
             if worker.is_alive():
@@ -229,19 +888,77 @@ class WorkerManager:
                 True,
             )
 
-            # Create a new worker
+            # Create a new worker in the slot of the dead one
+            slot = self.__worker_slots[worker]
             result, new_worker = WorkerManager.__create_single_worker(
-                self.__worker_properties.get_worker_target(),
-                self.__worker_properties.get_worker_arguments(),
+                self.__backend,
+                self.__context,
+                self.__thread_host,
+                self.__worker_properties,
+                slot,
                 self.__local_logger,
             )
             if not result:
                 self.__local_logger.error(f"Failed to restart {target_and_worker_name}", True)
-                return False
+                # Keep the dead worker so that the restart is tried again next time
+                new_workers.append(worker)
+                is_all_restarted = False
+                continue
 
-            # Append the new worker
+            # Start and append the new worker
+            slot.controller.reset_progress()
+            new_worker.start()
             new_workers.append(new_worker)
+            del self.__worker_slots[worker]
+            self.__worker_slots[new_worker] = slot
+            self.__reported_stalled_workers.discard(worker)
 
         self.__workers = new_workers
 
-        return True
+        return is_all_restarted
+
+    def kill_stalled_workers(self) -> "list[WorkerStall]":
+        """
+        Kills workers that are alive but have not reported progress within the stall timeout,
+        so that `check_and_restart_dead_workers()` restarts them.
+        A killed worker does not release any lock it holds, such as that of a shared memory queue.
+        Threads cannot be killed, they are only reported.
+
+        Returns the stalls found, empty if there is no stall timeout.
+        """
+        if self.__stall_timeout is None:
+            return []
+
+        target_name = self.__worker_properties.get_target_name()
+        stalls = []
+        with self.__workers_lock:
+            for worker in self.__workers:
+                stall_duration = self.__worker_slots[worker].controller.get_stall_duration()
+                if stall_duration < self.__stall_timeout or not worker.is_alive():
+                    self.__reported_stalled_workers.discard(worker)
+                    continue
+
+                if not isinstance(worker, multiprocessing.process.BaseProcess):
+                    if worker in self.__reported_stalled_workers:
+                        continue
+
+                    self.__reported_stalled_workers.add(worker)
+                    self.__local_logger.error(
+                        f"Worker {target_name} {worker.name} stalled for {stall_duration:.3f}s "
+                        f"and cannot be killed",
+                        True,
+                    )
+                    stalls.append(WorkerStall(worker.name, stall_duration, False))
+                    continue
+
+                self.__local_logger.warning(
+                    f"Worker {target_name} {worker.name} stalled for {stall_duration:.3f}s, "
+                    f"killing",
+                    True,
+                )
+                worker.kill()
+                # Dead once reaped, so that it is restarted on the next check
+                worker.join(self.__ESCALATION_TIMEOUT)
+                stalls.append(WorkerStall(worker.name, stall_duration, True))
+
+        return stalls
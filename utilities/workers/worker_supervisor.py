@@ -0,0 +1,254 @@
+"""
+For restarting dead and stalled workers.
+"""
+
+import threading
+import time
+
+from modules.common.modules.logger import logger
+from utilities.workers import worker_autoscaler
+from utilities.workers import worker_manager
+
+
+class RestartStatistics:
+    """
+    Restart history of the workers of a single target.
+    """
+
+    def __init__(self, target_name: str) -> None:
+        self.target_name = target_name
+        self.restart_count = 0
+        self.failed_restart_count = 0
+        # Seconds from detecting a dead worker to its replacement being started
+        self.recover_times: "list[float]" = []
+        # Seconds each stalled worker had not reported progress for when found
+        self.stall_durations: "list[float]" = []
+        self.is_crash_looping = False
+
+    def __str__(self) -> str:
+        if len(self.recover_times) > 0:
+            mean_recover_time = sum(self.recover_times) / len(self.recover_times)
+            max_recover_time = max(self.recover_times)
+        else:
+            mean_recover_time = 0.0
+            max_recover_time = 0.0
+
+        return (
+            f"{self.target_name}: "
+            f"restarts: {self.restart_count}, "
+            f"failed restarts: {self.failed_restart_count}, "
+            f"mean time to recover: {mean_recover_time:.3f}s, "
+            f"max time to recover: {max_recover_time:.3f}s, "
+            f"stalls: {len(self.stall_durations)}, "
+            f"max stall: {max(self.stall_durations, default=0.0):.3f}s, "
+            f"crash looping: {self.is_crash_looping}"
+        )
+
+
+class _SupervisedTarget:
+    """
+    Restart state of a single worker manager.
+    """
+
+    def __init__(self, manager: worker_manager.WorkerManager, initial_backoff: float) -> None:
+        self.manager = manager
+        self.backoff = initial_backoff
+        self.next_restart_time = 0.0
+        self.dead_since: "float | None" = None
+        self.restart_times: "list[float]" = []
+        self.statistics = RestartStatistics(manager.get_target_name())
+
+
+class WorkerSupervisor:  # pylint: disable=too-many-instance-attributes
+    """
+    Thread in main that restarts dead workers and runs autoscalers.
+    Stalled workers are killed first, see `WorkerManager.kill_stalled_workers()` ,
+    and then restarted like dead ones. Only processes can be killed,
+    stalled threads are only counted in the statistics.
+
+    Consecutive restarts of a target are delayed by an exponentially increasing backoff.
+    A target that needs more than `max_restarts` restarts within `crash_loop_window`
+    is considered crash looping and is no longer restarted.
+    """
+
+    __create_key = object()
+
+    @classmethod
+    def create(
+        cls,
+        worker_managers: "list[worker_manager.WorkerManager]",
+        poll_period: float,
+        initial_backoff: float,
+        max_backoff: float,
+        max_restarts: int,
+        crash_loop_window: float,
+        autoscalers: "list[worker_autoscaler.WorkerAutoscaler]",
+        local_logger: logger.Logger,
+    ) -> "tuple[bool, WorkerSupervisor | None]":
+        """
+        Creates a supervisor, call start() to begin supervising.
+
+        worker_managers: Managers of the workers to supervise.
+        poll_period: Time between checks for dead workers in seconds.
+        initial_backoff: Minimum time between restarts of a target in seconds.
+        max_backoff: Maximum time between restarts of a target in seconds.
+        max_restarts: Number of restarts within the window before giving up on a target.
+        crash_loop_window: Window in seconds for counting restarts, also the time a target
+            must stay up for the backoff to reset.
+        autoscalers: Autoscalers to run every poll.
+        local_logger: Existing logger from process.
+
+        Returns whether the supervisor was created and the supervisor.
+        """
+        if poll_period <= 0.0:
+            local_logger.error("Supervisor poll period must be greater than zero", True)
+            return False, None
+
+        if initial_backoff < 0.0 or max_backoff < initial_backoff:
+            local_logger.error(
+                f"Invalid supervisor backoff: initial {initial_backoff}, max {max_backoff}",
+                True,
+            )
+            return False, None
+
+        if max_restarts <= 0 or crash_loop_window <= 0.0:
+            local_logger.error(
+                f"Invalid supervisor crash loop cap: {max_restarts} in {crash_loop_window}s",
+                True,
+            )
+            return False, None
+
+        return True, WorkerSupervisor(
+            cls.__create_key,
+            worker_managers,
+            poll_period,
+            initial_backoff,
+            max_backoff,
+            max_restarts,
+            crash_loop_window,
+            autoscalers,
+            local_logger,
+        )
+
+    def __init__(
+        self,
+        class_private_create_key: object,
+        worker_managers: "list[worker_manager.WorkerManager]",
+        poll_period: float,
+        initial_backoff: float,
+        max_backoff: float,
+        max_restarts: int,
+        crash_loop_window: float,
+        autoscalers: "list[worker_autoscaler.WorkerAutoscaler]",
+        local_logger: logger.Logger,
+    ) -> None:
+        """
+        Private constructor, use create() method.
+        """
+        assert class_private_create_key is WorkerSupervisor.__create_key, "Use create() method"
+
+        self.__targets = [
+            _SupervisedTarget(manager, initial_backoff) for manager in worker_managers
+        ]
+        self.__poll_period = poll_period
+        self.__initial_backoff = initial_backoff
+        self.__max_backoff = max_backoff
+        self.__max_restarts = max_restarts
+        self.__crash_loop_window = crash_loop_window
+        self.__autoscalers = autoscalers
+        self.__local_logger = local_logger
+
+        self.__stop_event = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, name="worker_supervisor", daemon=True)
+
+    def start(self) -> None:
+        """
+        Starts the supervisor thread.
+        """
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops the supervisor thread.
+        Call before requesting workers to exit, otherwise the exiting workers are restarted.
+        Worker counts are left as the autoscalers last set them.
+        """
+        self.__stop_event.set()
+        if self.__thread.is_alive():
+            self.__thread.join()
+
+    def get_restart_statistics(self) -> "list[RestartStatistics]":
+        """
+        Returns the restart statistics of each supervised target.
+        """
+        return [target.statistics for target in self.__targets]
+
+    def __run(self) -> None:
+        """
+        Supervisor thread loop.
+        """
+        while not self.__stop_event.wait(self.__poll_period):
+            for target in self.__targets:
+                self.__supervise(target, time.monotonic())
+
+            for autoscaler in self.__autoscalers:
+                autoscaler.scale(time.monotonic())
+
+    def __supervise(self, target: _SupervisedTarget, now: float) -> None:
+        """
+        Restarts the dead workers of the target if its backoff has elapsed.
+        """
+        if target.statistics.is_crash_looping:
+            return
+
+        for stall in target.manager.kill_stalled_workers():
+            target.statistics.stall_durations.append(stall.stall_duration)
+
+        target_name = target.statistics.target_name
+        dead_count = target.manager.get_dead_worker_count()
+        if dead_count == 0:
+            target.dead_since = None
+            # Stable for long enough, forgive earlier crashes
+            if (
+                len(target.restart_times) > 0
+                and now - target.restart_times[-1] >= self.__crash_loop_window
+            ):
+                target.restart_times = []
+                target.backoff = self.__initial_backoff
+
+            return
+
+        if target.dead_since is None:
+            target.dead_since = now
+            self.__local_logger.warning(f"{dead_count} dead worker(s) in {target_name}", True)
+
+        if now < target.next_restart_time:
+            return
+
+        target.restart_times = [
+            restart_time
+            for restart_time in target.restart_times
+            if now - restart_time < self.__crash_loop_window
+        ]
+        if len(target.restart_times) >= self.__max_restarts:
+            target.statistics.is_crash_looping = True
+            self.__local_logger.error(
+                f"{target_name} restarted {len(target.restart_times)} times within "
+                f"{self.__crash_loop_window}s, no longer restarting",
+                True,
+            )
+            return
+
+        result = target.manager.check_and_restart_dead_workers()
+        target.restart_times.append(now)
+        target.next_restart_time = now + target.backoff
+        target.backoff = min(max(2.0 * target.backoff, self.__initial_backoff), self.__max_backoff)
+        if not result:
+            target.statistics.failed_restart_count += 1
+            return
+
+        recover_time = time.monotonic() - target.dead_since
+        target.statistics.restart_count += dead_count
+        target.statistics.recover_times.append(recover_time)
+        target.dead_since = None
+        self.__local_logger.info(f"Restarted {target_name} after {recover_time:.3f}s", True)